@@ -0,0 +1,28 @@
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class SyncCursorPagination(CursorPagination):
+    """
+    Cursor pages in (updated_at, id) order. A row edited while a client is paging moves to the
+    end of the list, so the client sees it again on a later page instead of missing it, and
+    the first page of a `since=` sync holds the oldest changes.
+    """
+    ordering = ('updated_at', 'id')
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        self.page_size = settings.API_PAGE_SIZE
+        self.max_page_size = settings.API_MAX_PAGE_SIZE
+        return super().get_page_size(request)
+
+    def get_paginated_response(self, data, synced_at=None):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('synced_at', synced_at),
+            ('results', data),
+        ]))
@@ -0,0 +1,103 @@
+from django.utils import timezone
+from rest_framework import serializers
+
+from staffs.models import News, StaffLeaveRequest, Timetable
+from students.models import LeaveRequest, StudentAttendance, StudentMarks
+
+
+class SparseFieldsMixin:
+    """
+    Honours ?fields=a,b,c by dropping every other field from the output. `id` is always kept,
+    since clients merge delta syncs by it; unknown names are a 400.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        requested = request.query_params.get('fields') if request is not None else None
+        if not requested:
+            return
+        wanted = {name.strip() for name in requested.split(',') if name.strip()}
+        unknown = wanted - set(self.fields)
+        if unknown:
+            raise serializers.ValidationError({'fields': f"Unknown field(s): {', '.join(sorted(unknown))}"})
+        for name in set(self.fields) - wanted - {'id'}:
+            self.fields.pop(name)
+
+
+class AttendanceSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    subject_code = serializers.CharField(source='subject.code')
+    subject_name = serializers.CharField(source='subject.name')
+
+    class Meta:
+        model = StudentAttendance
+        fields = ['id', 'date', 'time', 'end_time', 'status', 'subject_code', 'subject_name', 'updated_at']
+
+
+class MarksSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    subject_code = serializers.CharField(source='subject.code')
+    subject_name = serializers.CharField(source='subject.name')
+    semester = serializers.IntegerField(source='subject.semester')
+    credits = serializers.IntegerField(source='subject.credits')
+
+    class Meta:
+        model = StudentMarks
+        fields = [
+            'id', 'subject_code', 'subject_name', 'semester', 'credits',
+            'test1_marks', 'test2_marks', 'internal_marks', 'updated_at',
+        ]
+
+
+class LeaveRequestSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = LeaveRequest
+        fields = [
+            'id', 'leave_type', 'start_date', 'end_date', 'reason', 'status',
+            'rejection_reason', 'rejected_by', 'created_at', 'updated_at',
+        ]
+
+
+class StaffLeaveRequestSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = StaffLeaveRequest
+        fields = ['id', 'leave_type', 'start_date', 'end_date', 'reason', 'status', 'rejection_reason', 'created_at', 'updated_at']
+
+
+class NewsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    # False once the item is switched off or past its end date: a delta sync reports it so the
+    # app can drop it
+    is_visible = serializers.SerializerMethodField()
+    is_new = serializers.SerializerMethodField()
+
+    class Meta:
+        model = News
+        fields = ['id', 'content', 'link', 'date', 'target', 'start_date', 'end_date', 'is_visible', 'is_new', 'updated_at']
+
+    def get_is_visible(self, news):
+        today = timezone.localdate()
+        return (
+            news.is_active
+            and (news.start_date is None or news.start_date <= today)
+            and (news.end_date is None or news.end_date >= today)
+        )
+
+    def get_is_new(self, news):
+        return news.should_show_new_indicator()
+
+
+class TimetableEntrySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    subject_code = serializers.CharField(source='subject.code', default=None)
+    subject_name = serializers.CharField(source='subject.name', default=None)
+    staff_name = serializers.SerializerMethodField()
+    location = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Timetable
+        fields = ['id', 'semester', 'day', 'period', 'batch', 'subject_code', 'subject_name', 'staff_name', 'location']
+
+    def get_staff_name(self, entry):
+        staff = entry.staff or (entry.subject.staff if entry.subject else None)
+        return staff.name if staff else None
+
+    def get_location(self, entry):
+        return entry.subject.get_location_display() if entry.subject else None
@@ -0,0 +1,103 @@
+import datetime
+
+from django.test import TestCase
+from django.urls import reverse
+
+from staffs.models import News, Staff, Subject, Timetable
+from students.models import Student, StudentAttendance, StudentMarks
+
+
+class MobileAPITestCase(TestCase):
+    def setUp(self):
+        self.staff = Staff.objects.create(staff_id="API01", name="Api Staff", email="api01@example.com", is_profile_complete=True)
+        self.student = Student.objects.create(
+            roll_number="APISTU01", student_name="Api Student", student_email="apistu@example.com",
+            current_semester=3, lab_batch='A',
+        )
+        self.subject = Subject.objects.create(code='IT301', name='Networks', semester=3, staff=self.staff)
+        for day in range(5):
+            StudentAttendance.objects.create(
+                student=self.student, subject=self.subject, date=datetime.date(2026, 7, day + 1),
+                status='Absent' if day == 0 else 'Present',
+            )
+        StudentMarks.objects.create(student=self.student, subject=self.subject, test1_marks=40)
+        Timetable.objects.create(semester=3, day='Tuesday', period=2, subject=self.subject, staff=self.staff)
+        Timetable.objects.create(semester=3, day='Monday', period=1, batch='B', subject=self.subject)
+
+    def _login(self, key, value):
+        session = self.client.session
+        session[key] = value
+        session.save()
+
+    def test_requires_a_portal_login(self):
+        response = self.client.get(reverse('v1:student_attendance'))
+        self.assertEqual(response.status_code, 401)
+
+        self._login('staff_id', self.staff.staff_id)
+        self.assertEqual(self.client.get(reverse('v1:student_attendance')).status_code, 401)
+
+    def test_attendance_pages_with_a_cursor_and_sparse_fields(self):
+        self._login('student_roll_number', self.student.roll_number)
+
+        first = self.client.get(reverse('v1:student_attendance'), {'page_size': 3, 'fields': 'status'}).json()
+        self.assertEqual(len(first['results']), 3)
+        self.assertEqual(set(first['results'][0]), {'id', 'status'})
+        second = self.client.get(first['next']).json()
+        self.assertEqual(len(second['results']), 2)
+        self.assertIsNone(second['next'])
+        self.assertEqual(
+            len({row['id'] for row in first['results'] + second['results']}), 5,
+        )
+
+        response = self.client.get(reverse('v1:student_attendance'), {'fields': 'status,grade'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_since_returns_only_rows_changed_after_the_last_sync(self):
+        self._login('student_roll_number', self.student.roll_number)
+        synced_at = self.client.get(reverse('v1:student_marks')).json()['synced_at']
+
+        marks = StudentMarks.objects.get()
+        delta = self.client.get(reverse('v1:student_marks'), {'since': synced_at}).json()
+        self.assertEqual(delta['results'], [])
+
+        marks.test2_marks = 45
+        marks.save()
+        delta = self.client.get(reverse('v1:student_marks'), {'since': synced_at}).json()
+        self.assertEqual([(row['id'], row['test2_marks']) for row in delta['results']], [(marks.id, 45)])
+
+        self.assertEqual(self.client.get(reverse('v1:student_marks'), {'since': 'yesterday'}).status_code, 400)
+
+    def test_unchanged_response_is_not_modified(self):
+        self._login('student_roll_number', self.student.roll_number)
+        response = self.client.get(reverse('v1:student_timetable'))
+        self.assertEqual(response.status_code, 200)
+        # Batch B's period is not the student's
+        self.assertEqual([(e['day'], e['period']) for e in response.json()['results']], [('Tuesday', 2)])
+
+        again = self.client.get(reverse('v1:student_timetable'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b'')
+
+        Timetable.objects.create(semester=3, day='Friday', period=7, subject=self.subject)
+        changed = self.client.get(reverse('v1:student_timetable'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+
+    def test_news_delta_reports_items_that_were_switched_off(self):
+        shown = News.objects.create(content='Exam schedule out', target='Student')
+        News.objects.create(content='Staff meeting', target='Staff')
+        self._login('student_roll_number', self.student.roll_number)
+
+        listing = self.client.get(reverse('v1:news')).json()
+        self.assertEqual([row['id'] for row in listing['results']], [shown.id])
+
+        shown.is_active = False
+        shown.save()
+        delta = self.client.get(reverse('v1:news'), {'since': listing['synced_at']}).json()
+        self.assertEqual([(row['id'], row['is_visible']) for row in delta['results']], [(shown.id, False)])
+
+    def test_staff_summary_and_timetable(self):
+        self._login('staff_id', self.staff.staff_id)
+        summary = self.client.get(reverse('v1:staff_summary')).json()
+        self.assertEqual([s['code'] for s in summary['subjects']], ['IT301'])
+        timetable = self.client.get(reverse('v1:staff_timetable')).json()
+        self.assertEqual([(e['day'], e['subject_code'], e['staff_name']) for e in timetable['results']], [('Tuesday', 'IT301', 'Api Staff')])
@@ -0,0 +1,15 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('student/summary/', views.StudentSummaryView.as_view(), name='student_summary'),
+    path('student/attendance/', views.StudentAttendanceView.as_view(), name='student_attendance'),
+    path('student/marks/', views.StudentMarksView.as_view(), name='student_marks'),
+    path('student/timetable/', views.StudentTimetableView.as_view(), name='student_timetable'),
+    path('student/leave-requests/', views.StudentLeaveRequestsView.as_view(), name='student_leave_requests'),
+    path('staff/summary/', views.StaffSummaryView.as_view(), name='staff_summary'),
+    path('staff/timetable/', views.StaffTimetableView.as_view(), name='staff_timetable'),
+    path('staff/leave-requests/', views.StaffLeaveRequestsView.as_view(), name='staff_leave_requests'),
+    path('news/', views.NewsView.as_view(), name='news'),
+]
@@ -0,0 +1,240 @@
+"""
+Version 1 of the mobile REST API: read-only views of what the student and staff dashboards show.
+
+Requests are authenticated by the portal's session cookie, which the TWA shares with the HTML
+pages, and resolved through ssm.principals. Collections are cursor-paginated in
+(updated_at, id) order and accept
+
+- ?since=<ISO datetime>: only rows changed after it. Pass the `synced_at` of the last page of
+  the previous sync. Deleted rows are not reported; news that was switched off comes back with
+  is_visible false.
+- ?fields=a,b: only those fields (and id).
+- ?page_size=N: up to API_MAX_PAGE_SIZE.
+
+Every 200 GET carries an ETag; a request whose If-None-Match matches it gets a 304 and no body.
+"""
+import hashlib
+
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.http import quote_etag
+from rest_framework import generics
+from rest_framework.exceptions import NotAuthenticated, ValidationError
+from rest_framework.response import Response
+from rest_framework.versioning import NamespaceVersioning
+
+from ssm import principals
+from staffs.models import News, StaffLeaveRequest, Timetable
+from students.models import LeaveRequest, StudentAttendance, StudentGPA, StudentMarks
+
+from .pagination import SyncCursorPagination
+from .serializers import (
+    AttendanceSerializer, LeaveRequestSerializer, MarksSerializer, NewsSerializer, StaffLeaveRequestSerializer,
+    TimetableEntrySerializer,
+)
+
+TIMETABLE_DAY_ORDER = {day: i for i, (day, _) in enumerate(Timetable.DAYS_OF_WEEK)}
+
+
+class PortalAPIView(generics.GenericAPIView):
+    """Base view: resolves the logged-in student or staff member and adds ETags to GET responses."""
+    authentication_classes = ()
+    permission_classes = ()
+    versioning_class = NamespaceVersioning
+    # 'student', 'staff', or None for either
+    principal_kind = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.student = principals.current_student(request, required=False) if self.principal_kind != 'staff' else None
+        self.staff = principals.current_staff(request, required=False) if self.principal_kind != 'student' else None
+        if self.student is None and self.staff is None:
+            raise NotAuthenticated('Log in to the portal first.')
+
+    def get_authenticate_header(self, request):
+        # Makes NotAuthenticated a 401, which tells the app to show its login page
+        return 'Session realm="portal"'
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method not in ('GET', 'HEAD') or response.status_code != 200:
+            return response
+        response.render()
+        etag = quote_etag(hashlib.sha256(response.content).hexdigest()[:32])
+        response['ETag'] = etag
+        # Cached only by the app, and always revalidated
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Cookie'])
+        return get_conditional_response(request, etag=etag, response=response)
+
+
+class SyncListView(PortalAPIView):
+    """A cursor-paginated collection that supports ?since= delta syncs."""
+    pagination_class = SyncCursorPagination
+
+    def current(self, queryset):
+        """Narrows a full (non-delta) listing; delta syncs also see rows that left it."""
+        return queryset
+
+    def get(self, request, *args, **kwargs):
+        since = self._since(request)
+        queryset = self.get_queryset()
+        queryset = queryset.filter(updated_at__gt=since) if since else self.current(queryset)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        # The newest change delivered so far: on the last page, the `since` for the next sync
+        synced_at = page[-1].updated_at if page else since
+        return self.paginator.get_paginated_response(serializer.data, synced_at=synced_at)
+
+    @staticmethod
+    def _since(request):
+        value = request.query_params.get('since')
+        if not value:
+            return None
+        try:
+            since = parse_datetime(value.replace(' ', '+'))
+        except ValueError:
+            since = None
+        if since is None:
+            raise ValidationError({'since': 'Expected an ISO 8601 date and time.'})
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
+
+
+class StudentSummaryView(PortalAPIView):
+    principal_kind = 'student'
+
+    def get(self, request, *args, **kwargs):
+        student = self.student
+        attendance = StudentAttendance.objects.filter(
+            student=student, subject__semester=student.current_semester,
+        ).aggregate(total=Count('id'), present=Count('id', filter=Q(status='Present')))
+        gpa = StudentGPA.objects.filter(student=student).aggregate(
+            points=Sum(F('gpa') * F('total_credits')), credits=Sum('total_credits'),
+        )
+        return Response({
+            'roll_number': student.roll_number,
+            'student_name': student.student_name,
+            'program_level': student.program_level,
+            'current_semester': student.current_semester,
+            'lab_batch': student.lab_batch,
+            'is_profile_complete': student.is_profile_complete,
+            'attendance': {
+                'total': attendance['total'],
+                'present': attendance['present'],
+                'percentage': round(attendance['present'] / attendance['total'] * 100, 1) if attendance['total'] else 0,
+            },
+            'cgpa': round(gpa['points'] / gpa['credits'], 2) if gpa['credits'] else 0.0,
+            'pending_leave_requests': LeaveRequest.objects.filter(student=student, status__startswith='Pending').count(),
+            'news_count': _visible_news(News.objects.filter(target__in=['All', 'Student'])).count(),
+        })
+
+
+class StudentAttendanceView(SyncListView):
+    principal_kind = 'student'
+    serializer_class = AttendanceSerializer
+
+    def get_queryset(self):
+        return StudentAttendance.objects.filter(student=self.student).select_related('subject')
+
+
+class StudentMarksView(SyncListView):
+    principal_kind = 'student'
+    serializer_class = MarksSerializer
+
+    def get_queryset(self):
+        return StudentMarks.objects.filter(student=self.student).select_related('subject')
+
+
+class StudentLeaveRequestsView(SyncListView):
+    principal_kind = 'student'
+    serializer_class = LeaveRequestSerializer
+
+    def get_queryset(self):
+        return LeaveRequest.objects.filter(student=self.student)
+
+
+class StudentTimetableView(PortalAPIView):
+    """The student's weekly class timetable: their semester, for the whole class and their lab batch."""
+    principal_kind = 'student'
+    serializer_class = TimetableEntrySerializer
+
+    def get(self, request, *args, **kwargs):
+        entries = _timetable().filter(semester=self.student.current_semester).filter(
+            Q(batch='All') | Q(batch=self.student.lab_batch or 'All')
+        )
+        return Response({'results': self.get_serializer(_in_week_order(entries), many=True).data})
+
+
+class StaffSummaryView(PortalAPIView):
+    principal_kind = 'staff'
+
+    def get(self, request, *args, **kwargs):
+        staff = self.staff
+        return Response({
+            'staff_id': staff.staff_id,
+            'name': staff.name,
+            'designation': staff.designation,
+            'roles': list(staff.get_roles_list()),
+            'assigned_semester': staff.assigned_semester,
+            'assigned_batch': staff.assigned_batch,
+            'subjects': [
+                {'code': subject.code, 'name': subject.name, 'semester': subject.semester}
+                for subject in staff.get_teaching_subjects()
+            ],
+            'pending_leave_requests': StaffLeaveRequest.objects.filter(staff=staff, status='Pending').count(),
+            'news_count': _visible_news(News.objects.all()).count(),
+        })
+
+
+class StaffLeaveRequestsView(SyncListView):
+    principal_kind = 'staff'
+    serializer_class = StaffLeaveRequestSerializer
+
+    def get_queryset(self):
+        return StaffLeaveRequest.objects.filter(staff=self.staff)
+
+
+class StaffTimetableView(PortalAPIView):
+    """The periods assigned to the staff member, as on the My Timetable page."""
+    principal_kind = 'staff'
+    serializer_class = TimetableEntrySerializer
+
+    def get(self, request, *args, **kwargs):
+        entries = _timetable().filter(staff=self.staff)
+        return Response({'results': self.get_serializer(_in_week_order(entries), many=True).data})
+
+
+class NewsView(SyncListView):
+    """Announcements for the logged-in user: staff see every target, students 'All' and 'Student'."""
+    serializer_class = NewsSerializer
+
+    def get_queryset(self):
+        if self.student is not None:
+            return News.objects.filter(target__in=['All', 'Student'])
+        return News.objects.all()
+
+    def current(self, queryset):
+        return _visible_news(queryset)
+
+
+def _visible_news(queryset):
+    today = timezone.localdate()
+    return queryset.filter(
+        Q(is_active=True)
+        & (Q(start_date__isnull=True) | Q(start_date__lte=today))
+        & (Q(end_date__isnull=True) | Q(end_date__gte=today))
+    )
+
+
+def _timetable():
+    return Timetable.objects.select_related(
+        'staff', 'subject__staff', 'subject__lab', 'subject__classroom',
+    )
+
+
+def _in_week_order(entries):
+    return sorted(entries, key=lambda entry: (TIMETABLE_DAY_ORDER.get(entry.day, 99), entry.period, entry.batch))
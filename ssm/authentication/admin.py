@@ -1,3 +1,11 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import DeviceSession
+
+
+@admin.register(DeviceSession)
+class DeviceSessionAdmin(admin.ModelAdmin):
+    list_display = ('user', 'client_type', 'ip_address', 'created_at', 'last_used_at', 'expires_at', 'revoked_at')
+    list_filter = ('client_type',)
+    search_fields = ('user__username', 'sid', 'ip_address')
+    readonly_fields = ('sid', 'jti', 'created_at')
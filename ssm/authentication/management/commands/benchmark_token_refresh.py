@@ -0,0 +1,86 @@
+import statistics
+import time
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from authentication import tokens
+from authentication.serializers import SessionTokenRefreshSerializer
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Time token/refresh/ as the outstanding and blacklisted token tables grow, to check that '
+        'refresh latency and queries per refresh stay flat. Runs in a transaction that is rolled back'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--volumes', type=int, nargs='+', default=[1000, 10000, 100000],
+            help='Outstanding token counts to measure at; half of each is blacklisted (default 1000 10000 100000)',
+        )
+        parser.add_argument('--refreshes', type=int, default=100, help='Refreshes timed per volume (default 100)')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(sorted(options['volumes']), options['refreshes'])
+                raise _Rollback
+        except _Rollback:
+            pass
+        self.stdout.write(self.style.SUCCESS('Benchmark data rolled back'))
+
+    def _run(self, volumes, refreshes):
+        user = get_user_model().objects.create_user(username=f'bench-{uuid.uuid4().hex[:12]}', password=None)
+        refresh = RefreshToken.for_user(user)
+        tokens.start_session(user, RequestFactory().post('/api/auth/token/'), 'mobile', refresh)
+        refresh = str(refresh)
+
+        for volume in volumes:
+            self._fill(user, volume)
+            timings = []
+            queries = 0
+            for _ in range(refreshes):
+                with CaptureQueriesContext(connection) as ctx:
+                    start = time.perf_counter()
+                    serializer = SessionTokenRefreshSerializer(data={'refresh': refresh})
+                    serializer.is_valid(raise_exception=True)
+                    timings.append((time.perf_counter() - start) * 1000)
+                queries += len(ctx.captured_queries)
+                refresh = serializer.validated_data['refresh']
+            timings.sort()
+            self.stdout.write(
+                f'{OutstandingToken.objects.count():>9} outstanding, {BlacklistedToken.objects.count():>9} blacklisted: '
+                f'p50 {statistics.median(timings):.2f} ms, p95 {timings[int(len(timings) * 0.95) - 1]:.2f} ms, '
+                f'{queries / refreshes:.1f} queries/refresh'
+            )
+
+    def _fill(self, user, volume, batch_size=5000):
+        """Adds tokens until the outstanding table holds `volume` rows, half of the new ones blacklisted."""
+        now = timezone.now()
+        missing = volume - OutstandingToken.objects.count()
+        while missing > 0:
+            rows = OutstandingToken.objects.bulk_create([
+                OutstandingToken(
+                    user=user, jti=uuid.uuid4().hex, token='-', created_at=now,
+                    expires_at=now + timedelta(days=i % 90 + 1),
+                )
+                for i in range(min(batch_size, missing))
+            ])
+            BlacklistedToken.objects.bulk_create([BlacklistedToken(token=row) for row in rows[::2]])
+            missing -= len(rows)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE token_blacklist_outstandingtoken, token_blacklist_blacklistedtoken')
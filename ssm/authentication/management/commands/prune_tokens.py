@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from authentication import tokens
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes expired JWT refresh tokens from the outstanding and blacklisted token tables, '
+        'and expired device sessions, in batches'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per query (default 1000)')
+        parser.add_argument('--dry-run', action='store_true', help='Show what would be deleted without deleting it')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            counts = tokens.expired_counts()
+            self.stdout.write(self.style.WARNING(
+                f"DRY RUN: Would delete {counts['outstanding']} outstanding tokens "
+                f"({counts['blacklisted']} blacklisted) and {counts['sessions']} device sessions"
+            ))
+            return
+
+        deleted = tokens.prune_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {deleted['outstanding']} outstanding tokens ({deleted['blacklisted']} blacklisted) "
+            f"and {deleted['sessions']} device sessions"
+        ))
@@ -1,3 +1,36 @@
+import uuid
+
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class DeviceSession(models.Model):
+    """
+    One API login on one device. Its refresh token carries the session's sid claim, which
+    survives rotation, so `jti` always names the newest refresh token issued to the device.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='device_sessions')
+    sid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    jti = models.CharField(max_length=255)
+    client_type = models.CharField(max_length=10, default='web')
+    user_agent = models.CharField(max_length=255, blank=True)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField()
+    expires_at = models.DateTimeField()
+    revoked_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-last_used_at']
+        indexes = [
+            models.Index(fields=['user', 'expires_at'], name='auth_devsess_user_exp_idx'),
+            models.Index(fields=['expires_at'], name='auth_devsess_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} on {self.client_type} ({self.sid})"
+
+    @property
+    def is_active(self):
+        from django.utils import timezone
+        return self.revoked_at is None and self.expires_at > timezone.now()
@@ -1,8 +1,10 @@
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
 from rest_framework_simplejwt.settings import api_settings
 from django.contrib.auth.models import update_last_login
 from datetime import timedelta
 
+from . import tokens
+
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
@@ -16,7 +18,9 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         return token
 
     def validate(self, attrs):
-        data = super().validate(attrs)
+        # Authenticates only: TokenObtainPairSerializer.validate() would also issue (and store
+        # as outstanding) a refresh token that is thrown away below
+        data = super(TokenObtainPairSerializer, self).validate(attrs)
 
         # Detect Client Type
         request = self.context['request']
@@ -46,7 +50,9 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
              
              # Example: Force web refresh token to expire in 24 hours instead of 90 days
              refresh.set_exp(lifetime=timedelta(days=1))
-        
+
+        tokens.start_session(self.user, request, client_type, refresh)
+
         data['refresh'] = str(refresh)
         data['access'] = str(refresh.access_token)
 
@@ -54,3 +60,15 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
             update_last_login(None, self.user)
 
         return data
+
+
+class SessionTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refuses tokens whose DeviceSession was logged out and moves the session to the rotated token."""
+
+    def validate(self, attrs):
+        # Unverified read of the sid claim only; super().validate() verifies the token
+        session = tokens.check_session(self.token_class(attrs['refresh'], verify=False))
+        data = super().validate(attrs)
+        if session is not None and 'refresh' in data:
+            tokens.record_rotation(session, self.token_class(data['refresh'], verify=False))
+        return data
@@ -1,3 +1,110 @@
+import io
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from .models import DeviceSession
+
+
+class TokenLifecycleTestCase(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='apiuser', password='pass12345')
+        self.client = APIClient()
+
+    def _login(self, client_type='mobile', user_agent='TestPhone/1.0'):
+        response = self.client.post(
+            reverse('token_obtain_pair'), {'username': 'apiuser', 'password': 'pass12345'},
+            format='json', HTTP_X_CLIENT_TYPE=client_type, HTTP_USER_AGENT=user_agent,
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def _refresh(self, refresh):
+        return self.client.post(reverse('token_refresh'), {'refresh': refresh}, format='json')
+
+    def _seed_tokens(self, count, expires_at):
+        rows = OutstandingToken.objects.bulk_create([
+            OutstandingToken(user=self.user, jti=uuid.uuid4().hex, token='-', created_at=timezone.now(), expires_at=expires_at)
+            for _ in range(count)
+        ])
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=row) for row in rows[::2]])
+
+    def test_login_starts_one_session_and_refresh_follows_it(self):
+        tokens = self._login(client_type='web')
+
+        # One outstanding row per login, stored with the web token's 1-day expiry
+        outstanding = OutstandingToken.objects.get()
+        self.assertLess(outstanding.expires_at, timezone.now() + timedelta(days=2))
+        session = DeviceSession.objects.get()
+        self.assertEqual((session.client_type, session.user_agent, session.jti), ('web', 'TestPhone/1.0', outstanding.jti))
+
+        response = self._refresh(tokens['refresh'])
+        self.assertEqual(response.status_code, 200)
+        session.refresh_from_db()
+        self.assertNotEqual(session.jti, outstanding.jti)
+        self.assertTrue(BlacklistedToken.objects.filter(token=outstanding).exists())
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.json()['access']}")
+        listed = self.client.get(reverse('auth_sessions')).json()['sessions']
+        self.assertEqual([(s['sid'], s['current']) for s in listed], [(str(session.sid), True)])
+
+    def test_revoking_a_session_logs_out_only_that_device(self):
+        phone = self._login(user_agent='Phone')
+        laptop = self._login(client_type='web', user_agent='Laptop')
+        phone_sid = DeviceSession.objects.get(user_agent='Phone').sid
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {laptop['access']}")
+        response = self.client.delete(reverse('auth_session_revoke', args=[phone_sid]))
+        self.assertEqual(response.status_code, 204)
+
+        self.assertEqual(self._refresh(phone['refresh']).status_code, 401)
+        self.assertEqual(self._refresh(laptop['refresh']).status_code, 200)
+        self.assertEqual([s['user_agent'] for s in self.client.get(reverse('auth_sessions')).json()['sessions']], ['Laptop'])
+
+    def test_logout_all_blacklists_every_refresh_token(self):
+        first = self._login()
+        second = self._login(client_type='web')
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {second['access']}")
+        response = self.client.post(reverse('auth_logout_all'))
+        self.assertEqual(response.status_code, 205)
+        self.assertEqual(response.json()['sessions'], 2)
+
+        self.assertEqual(BlacklistedToken.objects.count(), OutstandingToken.objects.count())
+        self.assertEqual(self._refresh(first['refresh']).status_code, 401)
+        self.assertEqual(self._refresh(second['refresh']).status_code, 401)
+
+    def test_prune_tokens_deletes_only_expired_rows(self):
+        self._login()
+        self._seed_tokens(7, timezone.now() - timedelta(days=1))
+        DeviceSession.objects.create(user=self.user, jti='old', last_used_at=timezone.now(), expires_at=timezone.now() - timedelta(days=1))
+
+        call_command('prune_tokens', '--batch-size', '3', stdout=io.StringIO())
+
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+        self.assertFalse(BlacklistedToken.objects.exists())
+        self.assertEqual(list(DeviceSession.objects.values_list('user_agent', flat=True)), ['TestPhone/1.0'])
+
+    def test_refresh_queries_do_not_grow_with_token_volume(self):
+        refresh = self._login()['refresh']
+
+        def refresh_queries():
+            nonlocal refresh
+            with CaptureQueriesContext(connection) as ctx:
+                response = self._refresh(refresh)
+            self.assertEqual(response.status_code, 200)
+            refresh = response.json()['refresh']
+            return len(ctx.captured_queries)
 
-# Create your tests here.
+        baseline = refresh_queries()
+        self._seed_tokens(2000, timezone.now() + timedelta(days=30))
+        self.assertEqual(refresh_queries(), baseline)
@@ -0,0 +1,133 @@
+"""
+Refresh token lifecycle for the JWT API (api/auth/).
+
+Each login through token/ starts a DeviceSession and puts its id in the refresh token's sid
+claim. Rotation on token/refresh/ keeps the claim, so the session follows the device through
+every refresh token it is issued, and refreshing with a token whose session was logged out
+fails even before its own jti is blacklisted.
+
+simplejwt keeps one OutstandingToken row per refresh token and one BlacklistedToken row per
+rotation or logout. Both are only needed until the token expires; prune_expired() (run by
+`python manage.py prune_tokens`) deletes them in batches, with the sessions that expired.
+"""
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from ssm.login_protection import client_ip
+
+from .models import DeviceSession
+
+SID_CLAIM = 'sid'
+
+
+def start_session(user, request, client_type, refresh):
+    """Records the device a new refresh token was issued to and tags the token with the session."""
+    session = DeviceSession.objects.create(
+        user=user,
+        jti=refresh['jti'],
+        client_type=client_type[:10],
+        user_agent=request.META.get('HTTP_USER_AGENT', '')[:255],
+        ip_address=client_ip(request) or None,
+        last_used_at=timezone.now(),
+        expires_at=datetime_from_epoch(refresh['exp']),
+    )
+    refresh[SID_CLAIM] = str(session.sid)
+    # for_user() stored the row before the claims and the lifetime were final; without this a
+    # 1-day web token's row kept the 90-day default expiry and was pruned 89 days late
+    OutstandingToken.objects.filter(jti=refresh['jti']).update(
+        token=str(refresh), expires_at=datetime_from_epoch(refresh['exp']),
+    )
+    return session
+
+
+def check_session(refresh):
+    """The token's DeviceSession, or None for tokens issued before sessions; raises TokenError if logged out."""
+    sid = refresh.get(SID_CLAIM)
+    if not sid:
+        return None
+    session = DeviceSession.objects.filter(sid=sid).first()
+    if session is None or session.revoked_at is not None:
+        raise TokenError('This session has been logged out.')
+    return session
+
+
+def record_rotation(session, refresh):
+    """Points the session at the refresh token that replaced its previous one."""
+    DeviceSession.objects.filter(pk=session.pk).update(
+        jti=refresh['jti'], last_used_at=timezone.now(), expires_at=datetime_from_epoch(refresh['exp']),
+    )
+
+
+def active_sessions(user):
+    return DeviceSession.objects.filter(user=user, revoked_at__isnull=True, expires_at__gt=timezone.now())
+
+
+def end_session(refresh):
+    """Logs out the device holding this refresh token."""
+    refresh.blacklist()
+    sid = refresh.get(SID_CLAIM)
+    if sid:
+        DeviceSession.objects.filter(sid=sid, revoked_at__isnull=True).update(revoked_at=timezone.now())
+
+
+def revoke_session(session):
+    """Logs out one of a user's devices: blacklists its current refresh token and closes the session."""
+    with transaction.atomic():
+        outstanding = OutstandingToken.objects.filter(jti=session.jti).first()
+        if outstanding is not None:
+            BlacklistedToken.objects.get_or_create(token=outstanding)
+        DeviceSession.objects.filter(pk=session.pk).update(revoked_at=timezone.now())
+
+
+def revoke_all(user):
+    """
+    Logs the user out everywhere: blacklists every unexpired refresh token they hold and closes
+    their sessions. Returns the number of sessions closed. Access tokens already issued stay
+    valid until they expire (ACCESS_TOKEN_LIFETIME).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        live = OutstandingToken.objects.filter(user=user, expires_at__gt=now, blacklistedtoken__isnull=True)
+        BlacklistedToken.objects.bulk_create(
+            [BlacklistedToken(token_id=pk) for pk in live.values_list('pk', flat=True)],
+            ignore_conflicts=True,
+        )
+        return DeviceSession.objects.filter(user=user, revoked_at__isnull=True).update(revoked_at=now)
+
+
+def prune_expired(batch_size=1000, now=None):
+    """
+    Deletes expired outstanding tokens (their blacklist rows go with them) and expired device
+    sessions, batch_size rows per query. Returns the number of rows deleted per table.
+    """
+    now = now or timezone.now()
+    deleted = {'outstanding': 0, 'blacklisted': 0, 'sessions': 0}
+    for pks, model in _batches(OutstandingToken.objects.filter(expires_at__lte=now), batch_size):
+        counts = model.objects.filter(pk__in=pks).delete()[1]
+        deleted['outstanding'] += counts.get(OutstandingToken._meta.label, 0)
+        deleted['blacklisted'] += counts.get(BlacklistedToken._meta.label, 0)
+    for pks, model in _batches(DeviceSession.objects.filter(expires_at__lte=now), batch_size):
+        deleted['sessions'] += model.objects.filter(pk__in=pks).delete()[0]
+    return deleted
+
+
+def expired_counts(now=None):
+    now = now or timezone.now()
+    return {
+        'outstanding': OutstandingToken.objects.filter(expires_at__lte=now).count(),
+        'blacklisted': BlacklistedToken.objects.filter(token__expires_at__lte=now).count(),
+        'sessions': DeviceSession.objects.filter(expires_at__lte=now).count(),
+    }
+
+
+def _batches(queryset, batch_size):
+    # order_by() drops OutstandingToken's default ordering, so each batch is a plain index range scan
+    while True:
+        pks = list(queryset.order_by().values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return
+        yield pks, queryset.model
+
@@ -1,11 +1,14 @@
 from django.urls import path
-from rest_framework_simplejwt.views import (
-    TokenRefreshView,
+from .views import (
+    CustomTokenObtainPairView, DeviceSessionListView, DeviceSessionRevokeView, LogoutAllView, LogoutView,
+    SessionTokenRefreshView,
 )
-from .views import CustomTokenObtainPairView, LogoutView
 
 urlpatterns = [
     path('token/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/refresh/', SessionTokenRefreshView.as_view(), name='token_refresh'),
     path('logout/', LogoutView.as_view(), name='auth_logout'),
+    path('logout/all/', LogoutAllView.as_view(), name='auth_logout_all'),
+    path('sessions/', DeviceSessionListView.as_view(), name='auth_sessions'),
+    path('sessions/<uuid:sid>/', DeviceSessionRevokeView.as_view(), name='auth_session_revoke'),
 ]
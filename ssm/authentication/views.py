@@ -1,10 +1,13 @@
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.conf import settings
-from .serializers import CustomTokenObtainPairSerializer
+from django.shortcuts import get_object_or_404
+from . import tokens
+from .models import DeviceSession
+from .serializers import CustomTokenObtainPairSerializer, SessionTokenRefreshSerializer
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
@@ -67,7 +70,7 @@ class LogoutView(APIView):
             
             if refresh_token:
                 token = RefreshToken(refresh_token)
-                token.blacklist()
+                tokens.end_session(token)
 
             response = Response({"detail": "Successfully logged out."}, status=status.HTTP_205_RESET_CONTENT)
             
@@ -78,3 +81,48 @@ class LogoutView(APIView):
             return response
         except Exception as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class SessionTokenRefreshView(TokenRefreshView):
+    serializer_class = SessionTokenRefreshSerializer
+
+
+class DeviceSessionListView(APIView):
+    """The devices the user is logged in on through the API, most recently used first."""
+
+    def get(self, request):
+        current = request.auth.get(tokens.SID_CLAIM) if request.auth else None
+        sessions = [
+            {
+                'sid': str(session.sid),
+                'client_type': session.client_type,
+                'user_agent': session.user_agent,
+                'ip_address': session.ip_address,
+                'created_at': session.created_at,
+                'last_used_at': session.last_used_at,
+                'expires_at': session.expires_at,
+                'current': str(session.sid) == current,
+            }
+            for session in tokens.active_sessions(request.user)
+        ]
+        return Response({'sessions': sessions})
+
+
+class DeviceSessionRevokeView(APIView):
+    def delete(self, request, sid):
+        session = get_object_or_404(DeviceSession, sid=sid, user=request.user, revoked_at__isnull=True)
+        tokens.revoke_session(session)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class LogoutAllView(APIView):
+    """Logs the user out on every device; access tokens already issued run out within ACCESS_TOKEN_LIFETIME."""
+
+    def post(self, request):
+        closed = tokens.revoke_all(request.user)
+        response = Response(
+            {"detail": "Logged out on all devices.", "sessions": closed}, status=status.HTTP_205_RESET_CONTENT,
+        )
+        response.delete_cookie('access_token')
+        response.delete_cookie('refresh_token')
+        return response
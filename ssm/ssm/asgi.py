@@ -2,6 +2,8 @@
 ASGI config for ssm project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Run it with uvicorn for the async deployment mode, e.g.
+``uvicorn ssm.asgi:application --workers 2``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -12,5 +14,10 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ssm.settings')
+# Under ASGI the ORM work of each request runs on a thread of its own, so a persistent
+# connection would never be reused and would linger until garbage collection. Connect per
+# request unless DB_CONN_MAX_AGE is exported by the process environment (a .env file does not
+# override this); DB_POOL_MAX_SIZE gives reuse through a pool instead.
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
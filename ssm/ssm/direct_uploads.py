@@ -0,0 +1,380 @@
+"""
+Uploads that go from the browser straight to the bucket instead of through a web worker.
+
+1. POST /uploads/presign/ {"target", "field", "params", "filename", "content_type", "size"}
+   checks that the logged-in student or staff member may upload that file (TARGETS), records a
+   DirectUpload and answers with a presigned PUT for a staging key:
+   {"id", "method", "url", "headers", "expires_at"}.
+2. The browser PUTs the file to that URL, with those headers.
+3. POST /uploads/<id>/complete/ checks that the object reached the bucket with the declared
+   size and queues it. A worker (a thread pool in the web process, or `manage.py
+   process_direct_uploads`) compresses it as form uploads are (ssm.validators.compress_file),
+   stores it in the target field and deletes the staging object. GET /uploads/<id>/ reports
+   how far it got.
+
+Only storages with presigned_upload() (R2Storage, and LocalBucketStorage, its stand-in on the
+local disk) take part; with any other the presign answers 501 and static/js/direct_upload.js
+posts the form as before.
+"""
+import concurrent.futures
+import datetime
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, models, transaction
+from django.db.models import F, Q
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+from django.views.decorators.csrf import csrf_exempt
+
+from ssm import principals
+
+logger = logging.getLogger(__name__)
+
+IMAGE_TYPES = ('image/jpeg', 'image/png', 'image/webp')
+DOCUMENT_TYPES = IMAGE_TYPES + ('application/pdf',)
+MAX_ATTEMPTS = 3
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+
+class UploadError(ValueError):
+    """A request the upload flow refuses; the message is reported back with `status`."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+# owner: 'student' or 'staff'; fields: the file fields that may be uploaded (None: all of the
+# model's); clean_params(params) validates what the page sends; resolve(owner_id, params)
+# returns the instance the file is stored on
+Target = namedtuple('Target', 'owner model fields clean_params resolve')
+
+
+def _no_params(params):
+    return {}
+
+
+def _fee_challan_params(params):
+    from students.models import FeeChallanRecord
+    try:
+        year = int(params.get('academic_year'))
+    except (TypeError, ValueError):
+        year = None
+    if year not in dict(FeeChallanRecord.YEAR_CHOICES):
+        raise UploadError('Choose the academic year of the challan.')
+    return {'academic_year': year}
+
+
+def _fee_challan_record(roll_number, params):
+    from students.models import FeeChallanRecord
+    return FeeChallanRecord.objects.get_or_create(student_id=roll_number, academic_year=params['academic_year'])[0]
+
+
+def _student_documents(roll_number, params):
+    from students.models import StudentDocuments
+    return StudentDocuments.objects.get_or_create(student_id=roll_number)[0]
+
+
+def _staff(staff_id, params):
+    from staffs.models import Staff
+    return Staff.objects.get(pk=staff_id)
+
+
+TARGETS = {
+    'fee_challan': Target(
+        'student', 'students.FeeChallanRecord', ('tuition_fee_challan', 'hostel_fee_challan'),
+        _fee_challan_params, _fee_challan_record,
+    ),
+    'student_documents': Target('student', 'students.StudentDocuments', None, _no_params, _student_documents),
+    'staff_documents': Target(
+        'staff', 'staffs.Staff',
+        ('photo', 'joining_order', 'appointment_order', 'board_order', 'joining_letter', 'sslc_marksheet', 'hsc_marksheet'),
+        _no_params, _staff,
+    ),
+}
+
+
+def issue(target_name, owner_id, field_name, filename, content_type, size, params=None):
+    """Records a DirectUpload and returns the presigned PUT the browser sends the file with."""
+    from django.apps import apps
+    from staffs.models import DirectUpload
+
+    target = TARGETS[target_name]
+    field = _upload_field(apps.get_model(target.model), target, field_name)
+    allowed = IMAGE_TYPES if isinstance(field, models.ImageField) else DOCUMENT_TYPES
+    if content_type not in allowed:
+        raise UploadError(f"{field.verbose_name.capitalize()} must be one of: {', '.join(allowed)}.")
+    if not isinstance(size, int) or not 0 < size <= settings.DIRECT_UPLOAD_MAX_BYTES:
+        raise UploadError(f'Files can be up to {settings.DIRECT_UPLOAD_MAX_BYTES // (1024 * 1024)} MB.')
+    params = target.clean_params(params if isinstance(params, dict) else {})
+    filename = get_valid_filename(os.path.basename(str(filename or '')))[-100:] or 'upload'
+
+    owner = {'owner_type': target.owner, 'owner_id': owner_id}
+    if DirectUpload.objects.filter(status='pending', **owner).count() >= settings.DIRECT_UPLOAD_MAX_PENDING:
+        raise UploadError('Too many uploads are waiting to finish. Try again in a few minutes.', status=429)
+
+    upload_id = uuid.uuid4()
+    now = timezone.now()
+    upload = DirectUpload.objects.create(
+        id=upload_id, target=target_name, field=field.name, params=params,
+        key=f'{settings.DIRECT_UPLOAD_STAGING_PREFIX}{upload_id}/{filename}',
+        filename=filename, content_type=content_type, size=size,
+        expires_at=now + datetime.timedelta(seconds=settings.DIRECT_UPLOAD_URL_EXPIRY), **owner,
+    )
+    grant = default_storage.presigned_upload(upload.key, content_type, size, settings.DIRECT_UPLOAD_URL_EXPIRY)
+    return dict(grant, id=str(upload.id), expires_at=upload.expires_at.isoformat())
+
+
+def complete(upload):
+    """Queues an upload whose object is in the bucket; raises UploadError if it is not (yet)."""
+    from staffs.models import DirectUpload
+
+    if upload.status != 'pending':
+        return upload
+    if not default_storage.exists(upload.key) or default_storage.size(upload.key) != upload.size:
+        raise UploadError('The file has not reached storage. Upload it again.', status=409)
+    now = timezone.now()
+    if DirectUpload.objects.filter(pk=upload.pk, status='pending').update(status='uploaded', completed_at=now):
+        upload.status, upload.completed_at = 'uploaded', now
+        enqueue(upload)
+    else:
+        upload.refresh_from_db()
+    return upload
+
+
+# ==========================================
+# VIEWS
+# ==========================================
+
+def presign_view(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    try:
+        body = json.loads(request.body)
+        target = TARGETS[body['target']]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected a JSON object with a known "target".'}, status=400)
+    owner_id = _owner_id(request, target.owner)
+    if owner_id is None:
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+    if not hasattr(default_storage, 'presigned_upload'):
+        return JsonResponse({'error': 'Direct uploads are not available with this storage.'}, status=501)
+
+    try:
+        grant = issue(
+            body['target'], owner_id, body.get('field'), body.get('filename'),
+            body.get('content_type'), body.get('size'), body.get('params'),
+        )
+    except UploadError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    return JsonResponse(grant)
+
+
+def upload_status_view(request, upload_id):
+    upload = _owned_upload(request, upload_id)
+    return JsonResponse(_status(upload))
+
+
+def complete_view(request, upload_id):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    upload = _owned_upload(request, upload_id)
+    try:
+        upload = complete(upload)
+    except UploadError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    return JsonResponse(_status(upload))
+
+
+@csrf_exempt
+def local_bucket_view(request, token):
+    """Takes the PUTs sent to LocalBucketStorage's presigned URLs, as the bucket would."""
+    from ssm.storage_backends import LOCAL_BUCKET_SALT, LocalBucketStorage
+
+    if not isinstance(default_storage, LocalBucketStorage):
+        raise Http404('No local bucket is configured.')
+    if request.method != 'PUT':
+        return HttpResponse(status=405)
+    try:
+        policy = signing.loads(token, salt=LOCAL_BUCKET_SALT, max_age=settings.DIRECT_UPLOAD_URL_EXPIRY)
+    except signing.BadSignature:
+        return HttpResponse('Request has expired or the signature does not match.', status=403)
+    if request.content_type != policy['content_type']:
+        return HttpResponse('Content-Type does not match the signed one.', status=403)
+    body = request.read(policy['size'] + 1)
+    if len(body) != policy['size']:
+        return HttpResponse('Content-Length does not match the signed one.', status=403)
+    # A PUT replaces the object, as in the bucket
+    if default_storage.exists(policy['key']):
+        default_storage.delete(policy['key'])
+    default_storage.save(policy['key'], ContentFile(body))
+    return HttpResponse(status=200)
+
+
+def _owner_id(request, kind):
+    if kind == 'student':
+        principal = principals.current_student(request, required=False)
+    else:
+        principal = principals.current_staff(request, required=False)
+    return principal.pk if principal is not None else None
+
+
+def _owned_upload(request, upload_id):
+    from staffs.models import DirectUpload
+
+    upload = DirectUpload.objects.filter(pk=upload_id).first()
+    if upload is None or _owner_id(request, upload.owner_type) != upload.owner_id:
+        raise Http404('No such upload.')
+    return upload
+
+
+def _status(upload):
+    return {'id': str(upload.id), 'status': upload.status, 'error': upload.error}
+
+
+def _upload_field(model, target, field_name):
+    names = target.fields or [f.name for f in model._meta.get_fields() if isinstance(f, models.FileField)]
+    if field_name not in names:
+        raise UploadError(f"Files cannot be uploaded to '{field_name}'.")
+    return model._meta.get_field(field_name)
+
+
+# ==========================================
+# PROCESSING (worker)
+# ==========================================
+
+def enqueue(upload):
+    if settings.DIRECT_UPLOAD_JOB_RUNNER != 'thread':
+        return
+    upload_id = upload.pk
+    transaction.on_commit(lambda: _submit(upload_id))
+
+
+def _submit(upload_id):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=settings.DIRECT_UPLOAD_JOB_THREADS, thread_name_prefix='direct-upload',
+            )
+        future = _executor.submit(_run_in_thread, upload_id)
+        _pending.add(future)
+    future.add_done_callback(_pending.discard)
+
+
+def _run_in_thread(upload_id):
+    try:
+        run_job(upload_id)
+    except Exception as e:
+        logger.error(f"Direct upload {upload_id} failed: {e}")
+    finally:
+        connections.close_all()
+
+
+def wait_for_jobs(timeout=None):
+    """Waits for the uploads submitted to this process's pool. Returns False on timeout."""
+    _, not_done = concurrent.futures.wait(list(_pending), timeout=timeout)
+    return not not_done
+
+
+def run_job(upload_id):
+    """Processes an uploaded file. Returns False when it is not ours to process."""
+    if not _claim(upload_id):
+        return False
+    _process(upload_id)
+    return True
+
+
+def run_next_job():
+    """Claims and processes the oldest uploaded file. Returns its id, or None when there is nothing to do."""
+    from staffs.models import DirectUpload
+
+    DirectUpload.objects.filter(
+        status='processing', started_at__lt=_abandoned_before(), attempts__gte=MAX_ATTEMPTS,
+    ).update(status='failed', error='Processing did not finish.', finished_at=timezone.now())
+
+    with transaction.atomic():
+        upload_id = _claimable().order_by('created_at').select_for_update(skip_locked=True).values_list('pk', flat=True).first()
+        if upload_id is None or not _claim(upload_id):
+            return None
+    _process(upload_id)
+    return upload_id
+
+
+def prune():
+    """
+    Deletes uploads that were never completed (and their staging objects) once their URL has
+    been expired for as long again, and finished records after DIRECT_UPLOAD_KEEP_DAYS.
+    Returns the number of records deleted.
+    """
+    from staffs.models import DirectUpload
+
+    now = timezone.now()
+    abandoned = DirectUpload.objects.filter(
+        Q(status='pending', expires_at__lt=now - datetime.timedelta(seconds=settings.DIRECT_UPLOAD_URL_EXPIRY))
+        | Q(status='failed')
+        | Q(status='done', finished_at__lt=now - datetime.timedelta(days=settings.DIRECT_UPLOAD_KEEP_DAYS))
+    )
+    deleted = 0
+    for upload in abandoned.iterator():
+        if upload.status != 'done' and default_storage.exists(upload.key):
+            default_storage.delete(upload.key)
+        deleted += DirectUpload.objects.filter(pk=upload.pk, status=upload.status).delete()[0]
+    return deleted
+
+
+def _abandoned_before():
+    return timezone.now() - datetime.timedelta(seconds=settings.DIRECT_UPLOAD_JOB_TIMEOUT)
+
+
+def _claimable():
+    from staffs.models import DirectUpload
+
+    return DirectUpload.objects.filter(
+        Q(status='uploaded') | Q(status='processing', started_at__lt=_abandoned_before()),
+        attempts__lt=MAX_ATTEMPTS,
+    )
+
+
+def _claim(upload_id):
+    return _claimable().filter(pk=upload_id).update(
+        status='processing', started_at=timezone.now(), attempts=F('attempts') + 1,
+    ) == 1
+
+
+def _process(upload_id):
+    from ssm.validators import compress_file
+    from staffs.models import DirectUpload
+
+    upload = DirectUpload.objects.get(pk=upload_id)
+    try:
+        with default_storage.open(upload.key, 'rb') as staged:
+            content = ContentFile(staged.read(), name=upload.filename)
+        compress_file(content)
+        instance = TARGETS[upload.target].resolve(upload.owner_id, upload.params)
+        field_file = getattr(instance, upload.field)
+        field_file.save(content.name, content, save=False)
+        instance.save(update_fields=[upload.field])
+    except Exception as e:
+        logger.error(f"Direct upload {upload_id} could not be processed: {e}")
+        DirectUpload.objects.filter(pk=upload_id, status='processing').update(
+            status='failed', error=str(e)[:255], finished_at=timezone.now(),
+        )
+        return
+    default_storage.delete(upload.key)
+    DirectUpload.objects.filter(pk=upload_id, status='processing').update(
+        status='done', stored_name=field_file.name, error='', finished_at=timezone.now(),
+    )
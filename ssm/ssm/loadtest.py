@@ -0,0 +1,751 @@
+"""
+Load-test scenarios for our two traffic spikes, and the runner that drives them.
+
+- attendance_rush: every teacher POSTs manage_attendance for their class at the same moment.
+- result_day: every student opens student_dashboard, student_marks and student_attendance.
+- ai_burst: students upload result screenshots and generate resumes, two Gemini-bound views,
+  against a local stand-in for Gemini that answers after a fixed delay (simulated_gemini).
+
+Requests run concurrently either through the Django test client in-process ('client'
+transport: one sync worker thread per unit of concurrency, and it counts SQL queries per
+request), through the ASGI application in-process ('asgi' transport: every request in flight
+on a single event loop, as in one uvicorn worker) or over HTTP against a running server
+('server' transport). The last two read query counts from the Server-Timing header, which the
+'asgi' transport switches on and a server needs SERVER_TIMING_HEADER for. Sessions are created
+up front, so logins are not timed.
+
+db_connection_mode() reruns a client- or asgi-transport scenario with per-request
+connections, persistent connections or a psycopg pool, to show what connection setup costs
+under load. Under ASGI each request's ORM work runs on a thread of its own, so persistent
+connections are not reused there; the pool is the mode to use.
+"""
+import asyncio
+import contextlib
+import datetime
+import functools
+import io
+import json
+import math
+import os
+import platform
+import queue
+import re
+import struct
+import subprocess
+import threading
+import time
+import zlib
+from collections import namedtuple
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.urls import reverse
+
+LoadRequest = namedtuple('LoadRequest', ['label', 'method', 'path', 'data', 'session'])
+# A file field in LoadRequest.data, sent as multipart
+UploadFile = namedtuple('UploadFile', ['name', 'content', 'content_type'])
+
+PERIOD_START_TIMES = {1: '08:30', 2: '09:30', 3: '10:40', 4: '11:40', 5: '13:30', 6: '14:30', 7: '15:30'}
+PERIOD_END_TIMES = {1: '09:30', 2: '10:30', 3: '11:40', 4: '12:40', 5: '14:30', 6: '15:30', 7: '16:30'}
+
+
+# --- Scenarios ---
+
+def attendance_rush(dept, date=None, **options):
+    """One attendance POST per subject, by its teacher, for the subject's first period on date."""
+    from staffs.models import Timetable
+
+    date = date or datetime.date.today()
+    first_period = {}
+    for subject_id, period in Timetable.objects.filter(
+        subject__in=dept.subjects, day=date.strftime('%A')
+    ).order_by('period').values_list('subject_id', 'period'):
+        first_period.setdefault(subject_id, period)
+
+    requests = []
+    for subject in dept.subjects:
+        if not subject.staff_id:
+            continue
+        period = first_period.get(subject.pk, 1)
+        data = {
+            'attendance_date': date.isoformat(),
+            'class_time': PERIOD_START_TIMES[period],
+            'end_time': PERIOD_END_TIMES[period],
+            # Weekend or off-timetable runs still exercise the save path
+            'is_extra_class': 'on',
+        }
+        for n, student in enumerate(dept.students_by_semester.get(subject.semester, [])):
+            data[f'status_{student.roll_number}'] = 'Absent' if n % 12 == 0 else 'Present'
+        requests.append(LoadRequest(
+            'manage_attendance POST', 'POST',
+            reverse('staffs:manage_attendance', args=[subject.pk]),
+            data, {'staff_id': subject.staff_id},
+        ))
+    return requests
+
+
+def result_day(dept, users=None, **options):
+    """Each student (up to users of them) loads the three result-day pages."""
+    students = [s for sem in sorted(dept.students_by_semester) for s in dept.students_by_semester[sem]]
+    if users:
+        step = max(len(students) // users, 1)
+        students = students[::step][:users]
+
+    requests = []
+    for name in ('student_dashboard', 'student_marks', 'student_attendance'):
+        path = reverse(name)
+        requests.extend(
+            LoadRequest(name, 'GET', path, None, {'student_roll_number': s.roll_number}) for s in students
+        )
+    # Interleave so the pages are hit together, as they are on the day
+    requests.sort(key=lambda r: r.session['student_roll_number'])
+    return requests
+
+
+@functools.lru_cache(maxsize=1)
+def _result_screenshot_template():
+    """PNG bytes of a 1080x2400 phone screenshot of a portal result table."""
+    from PIL import Image, ImageDraw
+
+    image = Image.new('RGB', (1080, 2400), 'white')
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, 1080, 160), fill=(0, 102, 102))
+    draw.text((40, 60), 'SEMESTER EXAMINATION RESULTS', fill='white')
+    for row in range(40):
+        y = 220 + row * 52
+        draw.text((40, y), f'CS{301 + row}', fill='black')
+        draw.text((200, y), f'Course {row + 1} Theory and Practice', fill='black')
+        draw.text((860, y), 'SABCDE'[row % 6], fill='black')
+        draw.text((960, y), str(3 + row % 2), fill='black')
+        draw.line((30, y + 36, 1050, y + 36), fill=(210, 210, 210))
+    out = io.BytesIO()
+    image.save(out, 'PNG')
+    return out.getvalue()
+
+
+def result_screenshot(tag):
+    """
+    The template screenshot with tag written into a PNG text chunk: the same picture, but
+    different bytes (and so a different grade cache key) for each tag.
+    """
+    template = _result_screenshot_template()
+    data = b'Comment\x00' + str(tag).encode()
+    chunk = struct.pack('>I', len(data)) + b'tEXt' + data + struct.pack('>I', zlib.crc32(b'tEXt' + data))
+    # The last 12 bytes are the IEND chunk
+    return template[:-12] + chunk + template[-12:]
+
+
+def ai_burst(dept, users=None, run=0, **options):
+    """
+    Each student (up to users of them) uploads their own result screenshot for grade
+    extraction and generates an AI resume; every fourth student submits the screenshot twice,
+    as impatient students do. Screenshots differ per run, so a rerun in the same process is
+    not served from the grade cache. Run inside simulated_gemini(), never against the real API.
+    """
+    students = [s for sem in sorted(dept.students_by_semester) for s in dept.students_by_semester[sem]]
+    if users:
+        step = max(len(students) // users, 1)
+        students = students[::step][:users]
+
+    requests = []
+    for n, student in enumerate(students):
+        session = {'student_roll_number': student.roll_number}
+        upload = LoadRequest(
+            'extract_grades_api', 'POST', reverse('extract_grades_api'),
+            {'result_image': UploadFile('result.png', result_screenshot(f'{student.roll_number}:{run}'), 'image/png')}, session,
+        )
+        requests.extend([upload, upload] if n % 4 == 0 else [upload])
+        requests.append(LoadRequest('ai_generate_resume', 'POST', reverse('ai_generate_resume'), {}, session))
+    return requests
+
+
+SCENARIOS = {
+    'attendance_rush': attendance_rush,
+    'result_day': result_day,
+    'ai_burst': ai_burst,
+}
+# Scenarios whose views call Gemini; the command runs them inside simulated_gemini()
+SIMULATED_UPSTREAM_SCENARIOS = {'ai_burst'}
+
+
+# --- Stand-in upstream ---
+
+SIMULATED_GRADES = {'subjects': [
+    {'code': 'CS301', 'name': 'Database Systems', 'grade': 'A', 'credits': 4},
+    {'code': 'CS302', 'name': 'Operating Systems', 'grade': 'B', 'credits': 3},
+]}
+SIMULATED_RESUME = {
+    'summary': 'Detail-oriented engineering student with a solid foundation in software development.',
+    'projects_enhanced': [{'title': 'Library System', 'role': 'Developer', 'description': '• Built a catalogue service'}],
+    'hard_skills': ['Python', 'SQL'],
+    'soft_skills': ['Problem Solving'],
+    'coursework_highlight': ['Database Systems'],
+}
+
+
+@contextlib.contextmanager
+def simulated_gemini(latency=1.5, limits=None):
+    """
+    Runs a local stand-in for the Gemini API that answers every generateContent call after
+    latency seconds, and points students.ai_utils at it (GEMINI_BASE_URL, placeholder keys
+    where none are set). AI scenarios then measure how a deployment copes with slow upstream
+    calls rather than Google's latency or quota. The outbound gateway's Gemini limits are
+    lifted too, unless limits (ssm.outbound keys) are given. Yields a namespace with the
+    stand-in's base_url and running totals of calls and request bytes_received.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from django.test.utils import override_settings
+
+    stand_in = SimpleNamespace(base_url='', calls=0, bytes_received=0)
+    lock = threading.Lock()
+
+    class GeminiStandIn(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            with lock:
+                stand_in.calls += 1
+                stand_in.bytes_received += len(body)
+            time.sleep(latency)
+            # Grade extraction sends the screenshot inline; resume generation is text only
+            answer = SIMULATED_GRADES if b'inline' in body else SIMULATED_RESUME
+            payload = json.dumps({'candidates': [{
+                'content': {'role': 'model', 'parts': [{'text': json.dumps(answer)}]},
+                'finishReason': 'STOP',
+                'index': 0,
+            }]}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), GeminiStandIn)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    stand_in.base_url = f'http://127.0.0.1:{server.server_port}'
+    placeholders = [key for key in ('GEMINI_API_KEY', 'GEMINI_API_KEY_GPA') if not os.environ.get(key)]
+    for key in placeholders:
+        os.environ[key] = 'loadtest-stand-in'
+    try:
+        gemini_limits = limits or {'concurrency': 1000, 'rate': 1000.0, 'burst': 1000}
+        providers = {**getattr(settings, 'OUTBOUND_PROVIDERS', {}), 'gemini': gemini_limits}
+        with override_settings(GEMINI_BASE_URL=stand_in.base_url, OUTBOUND_PROVIDERS=providers):
+            yield stand_in
+    finally:
+        for key in placeholders:
+            os.environ.pop(key, None)
+        server.shutdown()
+        server.server_close()
+
+
+# --- Transports ---
+
+def create_sessions(requests):
+    """Creates one server-side session per distinct principal; returns {principal key: session key}."""
+    from importlib import import_module
+
+    store_class = import_module(settings.SESSION_ENGINE).SessionStore
+    keys = {}
+    for request in requests:
+        principal = tuple(sorted(request.session.items()))
+        if principal not in keys:
+            store = store_class()
+            store.update(request.session)
+            store.create()
+            keys[principal] = store.session_key
+    return keys
+
+
+def _split_files(data):
+    """Separates the UploadFile values in a request's data from its form fields."""
+    fields, files = {}, {}
+    for key, value in (data or {}).items():
+        (files if isinstance(value, UploadFile) else fields)[key] = value
+    return fields, files
+
+
+def _csrf_cookie_and_header():
+    """A CSRF secret to send both as the cookie and as the X-CSRFToken header."""
+    from django.middleware.csrf import _get_new_csrf_string
+
+    secret = _get_new_csrf_string()
+    return {settings.CSRF_COOKIE_NAME: secret}, {'X-CSRFToken': secret}
+
+
+class ClientTransport:
+    """In-process Django test client; one per worker thread. Counts queries per request."""
+
+    def __init__(self, session_keys, **options):
+        from django.test import Client
+
+        self.client = Client()
+        self.session_keys = session_keys
+
+    def warm_up(self):
+        self.client.get(reverse('staffs:stafflogin'))
+
+    def prepare(self, request):
+        from django.db import connections
+
+        # The test client skips Django's request_started/request_finished connection handling;
+        # run it between requests so CONN_MAX_AGE, health checks and pooling behave as under
+        # gunicorn. Connections inside a transaction (a TestCase) are left alone.
+        for conn in connections.all(initialized_only=True):
+            if not conn.in_atomic_block:
+                conn.close_if_unusable_or_obsolete()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = self.session_keys[tuple(sorted(request.session.items()))]
+
+    def send(self, request):
+        from django.db import connections
+        from .metrics import RequestStats
+
+        stats = RequestStats()
+        with contextlib.ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(stats.db_wrapper))
+            if request.method == 'POST':
+                from django.core.files.uploadedfile import SimpleUploadedFile
+
+                data, files = _split_files(request.data)
+                data.update({key: SimpleUploadedFile(*upload) for key, upload in files.items()})
+                response = self.client.post(request.path, data)
+            else:
+                response = self.client.get(request.path, request.data)
+        return response.status_code, stats.query_count
+
+    def close(self):
+        from django.db import connections
+        connections.close_all()
+
+
+_SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def _server_timing_queries(response):
+    match = _SERVER_TIMING_QUERIES.search(response.headers.get('Server-Timing', ''))
+    return int(match.group(1)) if match else None
+
+
+class ServerTransport:
+    """HTTP client against a running server; query counts come from its Server-Timing header."""
+
+    def __init__(self, session_keys, base_url='http://127.0.0.1:8000', timeout=30, **options):
+        import httpx
+
+        self.client = httpx.Client(base_url=base_url, timeout=timeout, follow_redirects=False)
+        self.session_keys = session_keys
+        self.cookies = {}
+        self.headers = {}
+
+    def warm_up(self):
+        self.client.get(reverse('staffs:stafflogin'))
+
+    def prepare(self, request):
+        self.cookies = {settings.SESSION_COOKIE_NAME: self.session_keys[tuple(sorted(request.session.items()))]}
+        self.headers = {}
+        if request.method == 'POST':
+            # CSRF is enforced over real HTTP
+            csrf_cookie, self.headers = _csrf_cookie_and_header()
+            self.cookies.update(csrf_cookie)
+
+    def send(self, request):
+        if request.method == 'POST':
+            data, files = _split_files(request.data)
+            response = self.client.post(
+                request.path, data=data, files={key: tuple(upload) for key, upload in files.items()} or None,
+                cookies=self.cookies, headers=self.headers,
+            )
+        else:
+            response = self.client.get(request.path, params=request.data, cookies=self.cookies)
+        return response.status_code, _server_timing_queries(response)
+
+    def close(self):
+        self.client.close()
+
+
+class AsgiTransport:
+    """
+    ssm's ASGI application driven in-process, like a single uvicorn worker: run_load keeps
+    concurrency requests in flight on one event loop instead of starting worker threads. Sync
+    views and ORM work still go to threads through sync_to_async, as they would under uvicorn.
+    Query counts come from the Server-Timing header, which this transport switches on.
+    """
+    asynchronous = True
+
+    def __init__(self, session_keys, timeout=120, **options):
+        import httpx
+        from django.core.handlers.asgi import ASGIHandler
+        from django.test.utils import override_settings
+
+        with override_settings(SERVER_TIMING_HEADER=True):
+            application = ASGIHandler()
+        self.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=application), base_url='http://testserver', timeout=timeout,
+        )
+        self.session_keys = session_keys
+
+    async def warm_up(self):
+        await self.client.get(reverse('staffs:stafflogin'))
+
+    async def send(self, request):
+        cookies = {settings.SESSION_COOKIE_NAME: self.session_keys[tuple(sorted(request.session.items()))]}
+        headers = {}
+        if request.method == 'POST':
+            csrf_cookie, headers = _csrf_cookie_and_header()
+            cookies.update(csrf_cookie)
+        # One client serves every in-flight request, so cookies go in a header rather than its jar
+        headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in cookies.items())
+        if request.method == 'POST':
+            data, files = _split_files(request.data)
+            response = await self.client.post(
+                request.path, data=data, files={key: tuple(upload) for key, upload in files.items()} or None,
+                headers=headers,
+            )
+        else:
+            response = await self.client.get(request.path, params=request.data, headers=headers)
+        return response.status_code, _server_timing_queries(response)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+TRANSPORTS = {
+    'client': ClientTransport,
+    'server': ServerTransport,
+    'asgi': AsgiTransport,
+}
+
+
+# --- Database connection modes ---
+
+DB_CONNECTION_MODES = ('settings', 'per-request', 'persistent', 'pool')
+
+
+@contextlib.contextmanager
+def db_connection_mode(mode, pool_max_size=None):
+    """
+    Reconfigures the default database for the connections opened inside the block (the worker
+    threads of a client-transport run): 'per-request' reconnects for every request,
+    'persistent' keeps one health-checked connection per thread, and 'pool' checks connections
+    out of a psycopg pool of pool_max_size. 'settings' leaves the configuration alone.
+    Yields a dict that is filled with connection statistics when the block exits.
+    """
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+
+    stats = {'mode': mode}
+    if mode == 'settings':
+        yield stats
+        return
+
+    db = connections.settings['default']
+    saved = {key: db[key] for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS') if key in db}
+    saved_options = db.setdefault('OPTIONS', {}).copy()
+    connections['default'].close()
+
+    db['OPTIONS'].pop('pool', None)
+    if mode == 'per-request':
+        db.update(CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=False)
+    elif mode == 'persistent':
+        db.update(CONN_MAX_AGE=600, CONN_HEALTH_CHECKS=True)
+    elif mode == 'pool':
+        db.update(CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=False)
+        db['OPTIONS']['pool'] = {
+            'min_size': min(getattr(settings, 'DB_POOL_MIN_SIZE', 2), pool_max_size or 8),
+            'max_size': pool_max_size or getattr(settings, 'DB_POOL_MAX_SIZE', 0) or 8,
+            'timeout': getattr(settings, 'DB_POOL_TIMEOUT', 10),
+        }
+    else:
+        raise ValueError(f'Unknown connection mode {mode!r}; choose from {", ".join(DB_CONNECTION_MODES)}')
+
+    opened = []
+
+    def count_connection(sender, connection, **kwargs):
+        opened.append(connection.alias)
+
+    connection_created.connect(count_connection, dispatch_uid='loadtest_count_connections')
+    try:
+        yield stats
+    finally:
+        connection_created.disconnect(dispatch_uid='loadtest_count_connections')
+        conn = connections['default']
+        if mode == 'pool':
+            pool_stats = conn.pool.get_stats()
+            # connection_created fires on every checkout; the pool knows how many it really opened
+            stats['connections_opened'] = pool_stats.get('connections_num', 0)
+            stats['connect_ms_total'] = pool_stats.get('connections_ms', 0)
+            stats['pool_wait_ms_total'] = pool_stats.get('requests_wait_ms', 0)
+            stats['pool_requests_queued'] = pool_stats.get('requests_queued', 0)
+            conn.close()
+            conn.close_pool()
+        else:
+            stats['connections_opened'] = opened.count('default')
+            conn.close()
+        for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS'):
+            db.pop(key, None)
+        db.update(saved)
+        db['OPTIONS'] = saved_options
+
+
+# --- Runner and reporting ---
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def _summarize(samples, wall_seconds):
+    latencies = sorted(s[1] for s in samples)
+    queries = [s[3] for s in samples if s[3] is not None]
+    summary = {
+        'requests': len(samples),
+        'errors': sum(1 for s in samples if s[2] is None or s[2] >= 400),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        'throughput_rps': round(len(samples) / wall_seconds, 2) if wall_seconds else 0.0,
+    }
+    if queries:
+        summary['queries_mean'] = round(sum(queries) / len(queries), 1)
+        summary['queries_max'] = max(queries)
+    return summary
+
+
+def run_load(requests, transport='client', concurrency=8, rounds=1, warm_up=True, **transport_options):
+    """
+    Sends every request rounds times from concurrency worker threads that start together.
+    With concurrency=1 the requests run on the calling thread (usable inside a TestCase).
+    An asynchronous transport (asgi) instead keeps concurrency requests in flight on one
+    event loop. Returns (summary dict, samples) where samples are (label, seconds, status, queries).
+    """
+    session_keys = create_sessions(requests)
+    transport_class = TRANSPORTS[transport]
+    work = queue.SimpleQueue()
+    for _ in range(rounds):
+        for request in requests:
+            work.put(request)
+
+    samples = []
+    errors = []
+    samples_lock = threading.Lock()
+
+    def drain(sender):
+        local = []
+        while True:
+            try:
+                request = work.get_nowait()
+            except queue.Empty:
+                break
+            start = None
+            try:
+                sender.prepare(request)
+                start = time.perf_counter()
+                status, query_count = sender.send(request)
+            except Exception as exc:
+                status, query_count = None, None
+                if not errors:
+                    errors.append(f'{request.method} {request.path}: {exc!r}')
+            elapsed = time.perf_counter() - start if start is not None else 0.0
+            local.append((request.label, elapsed, status, query_count))
+        with samples_lock:
+            samples.extend(local)
+
+    async def drain_async(sender):
+        while True:
+            try:
+                request = work.get_nowait()
+            except queue.Empty:
+                break
+            start = time.perf_counter()
+            try:
+                status, query_count = await sender.send(request)
+            except Exception as exc:
+                status, query_count = None, None
+                if not errors:
+                    errors.append(f'{request.method} {request.path}: {exc!r}')
+            samples.append((request.label, time.perf_counter() - start, status, query_count))
+
+    async def run_event_loop():
+        sender = transport_class(session_keys, **transport_options)
+        try:
+            if warm_up:
+                await sender.warm_up()
+            start = time.perf_counter()
+            await asyncio.gather(*(drain_async(sender) for _ in range(concurrency)))
+            return time.perf_counter() - start
+        finally:
+            await sender.close()
+
+    if getattr(transport_class, 'asynchronous', False):
+        wall = asyncio.run(run_event_loop())
+    elif concurrency <= 1:
+        sender = transport_class(session_keys, **transport_options)
+        if warm_up:
+            sender.warm_up()
+        start = time.perf_counter()
+        drain(sender)
+        wall = time.perf_counter() - start
+    else:
+        barrier = threading.Barrier(concurrency + 1)
+
+        def worker():
+            sender = None
+            try:
+                sender = transport_class(session_keys, **transport_options)
+                if warm_up:
+                    sender.warm_up()
+            except Exception as exc:
+                errors.append(f'worker start-up: {exc!r}')
+                barrier.abort()
+            try:
+                barrier.wait()
+                drain(sender)
+            except threading.BrokenBarrierError:
+                pass
+            finally:
+                if sender is not None:
+                    sender.close()
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        try:
+            barrier.wait()
+        except threading.BrokenBarrierError:
+            for thread in threads:
+                thread.join()
+            raise RuntimeError(errors[0] if errors else 'A load-test worker failed to start')
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+
+    endpoints = {}
+    for label in sorted({s[0] for s in samples}):
+        endpoints[label] = _summarize([s for s in samples if s[0] == label], wall)
+    result = {
+        'transport': transport,
+        'concurrency': concurrency,
+        # What serves the requests in-process: a thread per request in flight for the test
+        # client, one event loop for asgi; a separate server's workers are not known here
+        'workers': 1 if getattr(transport_class, 'asynchronous', False) else (concurrency if transport == 'client' else None),
+        'rounds': rounds,
+        'wall_seconds': round(wall, 3),
+        'overall': _summarize(samples, wall),
+        'endpoints': endpoints,
+    }
+    if errors:
+        result['first_error'] = errors[0]
+    return result, samples
+
+
+def environment_info():
+    from django import get_version
+    from django.db import connection
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5, cwd=settings.BASE_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ''
+    return {
+        'git_commit': commit,
+        'recorded_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': get_version(),
+        'database': connection.vendor,
+        # DEBUG keeps a log of every query, which inflates latencies; compare like with like
+        'debug': settings.DEBUG,
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare_with_baseline(result, baseline, latency_tolerance=0.25):
+    """
+    Lists regressions against a stored baseline: p95 latency more than latency_tolerance worse,
+    any rise in mean queries, or new errors. Returns a list of human-readable lines.
+    """
+    regressions = []
+    for label, current in result['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(label)
+        if not previous:
+            continue
+        if previous['p95_ms'] and current['p95_ms'] > previous['p95_ms'] * (1 + latency_tolerance):
+            regressions.append(f"{label}: p95 {previous['p95_ms']} ms -> {current['p95_ms']} ms")
+        if 'queries_mean' in current and 'queries_mean' in previous and current['queries_mean'] > previous['queries_mean']:
+            regressions.append(f"{label}: queries/request {previous['queries_mean']} -> {current['queries_mean']}")
+        if current['errors'] > previous['errors']:
+            regressions.append(f"{label}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+def format_report(result, baseline=None):
+    lines = [
+        f"{result.get('scenario', '')} via {result['transport']}: {result['overall']['requests']} requests, "
+        f"concurrency {result['concurrency']}{' on one event loop' if result['transport'] == 'asgi' else ''}, "
+        f"{result['wall_seconds']}s wall, {result['overall']['throughput_rps']} req/s",
+        f"{'endpoint':32s} {'n':>6s} {'err':>4s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'queries':>8s}",
+    ]
+    rows = list(result['endpoints'].items()) + [('overall', result['overall'])]
+    for label, stats in rows:
+        line = (
+            f"{label:32s} {stats['requests']:6d} {stats['errors']:4d} {stats['p50_ms']:9.1f} "
+            f"{stats['p95_ms']:9.1f} {stats['p99_ms']:9.1f} {stats.get('queries_mean', '-'):>8}"
+        )
+        previous = (baseline or {}).get('endpoints', {}).get(label) if label != 'overall' else (baseline or {}).get('overall')
+        if previous:
+            line += f"   (baseline p95 {previous['p95_ms']:.1f}, queries {previous.get('queries_mean', '-')})"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def format_comparison(results):
+    """
+    One line per run of a multi-run comparison (several transports and/or connection modes):
+    latency percentiles, throughput, in-process workers and connections opened.
+    """
+    def label(result):
+        mode = result.get('db_connections', {}).get('mode')
+        return '/'.join(part for part in (result['transport'], mode) if part)
+
+    lines = [
+        f"{'run':22s} {'workers':>7s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'req/s':>8s} {'opened':>7s}  p95 vs first"
+    ]
+    first_p95 = results[0]['overall']['p95_ms'] if results else 0
+    for result in results:
+        stats = result['overall']
+        workers = result.get('workers')
+        delta = f"{stats['p95_ms'] - first_p95:+.1f} ms" if result is not results[0] else ''
+        lines.append(
+            f"{label(result):22s} {workers if workers is not None else '-':>7} {stats['p50_ms']:9.1f} {stats['p95_ms']:9.1f} "
+            f"{stats['p99_ms']:9.1f} {stats['throughput_rps']:8.1f} "
+            f"{result.get('db_connections', {}).get('connections_opened', '-'):>7}  {delta}"
+        )
+    return '\n'.join(lines)
+
+
+def load_baseline(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, result):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as fh:
+        json.dump(result, fh, indent=2, sort_keys=True)
+        fh.write('\n')
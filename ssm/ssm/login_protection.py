@@ -0,0 +1,169 @@
+"""
+Throttling for the staff, student and scholar logins.
+
+Failed attempts are counted in sliding windows, per account and per client IP, in the
+'login_attempts' cache. check() runs before the account is loaded or a password hashed and
+raises LoginRefused when
+
+- the account has failed LOGIN_LOCKOUT_ATTEMPTS times in the window: locked for
+  LOGIN_LOCKOUT_SECONDS after its last failure,
+- the account has failed more than LOGIN_FREE_ATTEMPTS times: each further attempt waits
+  LOGIN_DELAY_BASE seconds after the last failure, doubling per failure up to LOGIN_DELAY_MAX,
+- the IP has failed LOGIN_IP_MAX_FAILURES times in the window.
+
+verify_password() then hashes with at most LOGIN_HASH_CONCURRENCY hashes in flight per
+process, so a credential-stuffing burst cannot take every CPU from the other views.
+
+    try:
+        login_protection.check(request, 'staff', staff_id)
+        ok = staff is not None and login_protection.verify_password(staff, password, 'staff')
+    except login_protection.LoginRefused as e:
+        ...  # render the form with str(e) and status e.status
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+CACHE_ALIAS = 'login_attempts'
+
+
+class LoginRefused(Exception):
+    """An attempt refused without checking the password; reason is 'locked', 'throttled' or 'busy'."""
+
+    def __init__(self, reason, retry_after):
+        self.reason = reason
+        self.retry_after = max(1, int(retry_after + 0.999))
+        self.status = 503 if reason == 'busy' else 429
+        if reason == 'busy':
+            message = 'The server is busy. Please try logging in again in a moment.'
+        elif reason == 'locked':
+            message = f'Too many failed attempts. This account is locked for {self._duration()}.'
+        else:
+            message = f'Too many failed attempts. Please wait {self._duration()} before trying again.'
+        super().__init__(message)
+
+    def _duration(self):
+        if self.retry_after < 60:
+            return f'{self.retry_after} seconds'
+        return f'{(self.retry_after + 59) // 60} minutes'
+
+
+def client_ip(request):
+    """
+    The client's address. With LOGIN_TRUSTED_PROXY_COUNT proxies in front of the app, the
+    address the outermost of them saw, which the client cannot forge.
+    """
+    proxies = settings.LOGIN_TRUSTED_PROXY_COUNT
+    forwarded = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+    if proxies and forwarded:
+        return forwarded[-min(proxies, len(forwarded))]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def check(request, kind, identifier):
+    """Raises LoginRefused if an attempt for this account from this client must not be checked now."""
+    now = time.time()
+    account = _failures(_account_key(kind, identifier), now)
+    if len(account) >= settings.LOGIN_LOCKOUT_ATTEMPTS:
+        _refuse(kind, 'locked', account[-1] + settings.LOGIN_LOCKOUT_SECONDS - now)
+    free = settings.LOGIN_FREE_ATTEMPTS
+    if len(account) > free:
+        delay = min(settings.LOGIN_DELAY_BASE * 2 ** (len(account) - free - 1), settings.LOGIN_DELAY_MAX)
+        if now < account[-1] + delay:
+            _refuse(kind, 'throttled', account[-1] + delay - now)
+
+    client = _failures(_ip_key(request), now)
+    if len(client) >= settings.LOGIN_IP_MAX_FAILURES:
+        # Sliding window: the next attempt is allowed once the oldest counted failure expires
+        _refuse(kind, 'throttled', client[-settings.LOGIN_IP_MAX_FAILURES] + settings.LOGIN_FAILURE_WINDOW - now)
+
+
+def verify_password(user, raw_password, kind):
+    """
+    user.check_password(raw_password) within the per-process hashing budget, timed for
+    /metrics. Raises LoginRefused('busy') when no hashing slot frees up in time.
+    """
+    from ssm.metrics import observe_login_hash
+
+    slots = _hash_slots()
+    if not slots.acquire(timeout=settings.LOGIN_HASH_QUEUE_TIMEOUT):
+        _refuse(kind, 'busy', settings.LOGIN_HASH_QUEUE_TIMEOUT)
+    started = time.monotonic()
+    try:
+        return user.check_password(raw_password)
+    finally:
+        slots.release()
+        observe_login_hash(kind, time.monotonic() - started)
+
+
+def record_failure(request, kind, identifier):
+    from ssm.metrics import observe_login_attempt
+
+    now = time.time()
+    cache = caches[CACHE_ALIAS]
+    timeout = max(settings.LOGIN_FAILURE_WINDOW, settings.LOGIN_LOCKOUT_SECONDS)
+    for key, limit in ((_account_key(kind, identifier), settings.LOGIN_LOCKOUT_ATTEMPTS), (_ip_key(request), settings.LOGIN_IP_MAX_FAILURES)):
+        # Only the newest `limit` failures can affect a decision
+        failures = (_failures(key, now) + [now])[-limit:]
+        cache.set(key, failures, timeout)
+    observe_login_attempt(kind, 'failure')
+
+
+def record_success(request, kind, identifier):
+    """Clears the account's failures; the IP's stay, so one good login cannot reset a spray."""
+    from ssm.metrics import observe_login_attempt
+
+    caches[CACHE_ALIAS].delete(_account_key(kind, identifier))
+    observe_login_attempt(kind, 'success')
+
+
+def _refuse(kind, reason, retry_after):
+    from ssm.metrics import observe_login_attempt
+
+    observe_login_attempt(kind, f'rejected_{reason}')
+    raise LoginRefused(reason, retry_after)
+
+
+def _failures(key, now):
+    """Failure times (oldest first) still inside the window, or the lockout after the last one."""
+    failures = caches[CACHE_ALIAS].get(key) or []
+    horizon = now - settings.LOGIN_FAILURE_WINDOW
+    if len(failures) >= settings.LOGIN_LOCKOUT_ATTEMPTS and key.startswith('acct:'):
+        # A locked account stays locked for the lockout period, even past the window
+        horizon = min(horizon, failures[-1] - settings.LOGIN_LOCKOUT_SECONDS)
+    return [t for t in failures if t > horizon]
+
+
+def _account_key(kind, identifier):
+    # Hashed: identifiers are user input, and some cache backends reject spaces or long keys
+    digest = hashlib.sha256(str(identifier or '').strip().upper().encode()).hexdigest()[:32]
+    return f'acct:{kind}:{digest}'
+
+
+def _ip_key(request):
+    return f"ip:{hashlib.sha256(client_ip(request).encode()).hexdigest()[:32]}"
+
+
+_slots = None
+_slots_lock = threading.Lock()
+
+
+def _hash_slots():
+    global _slots
+    with _slots_lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(settings.LOGIN_HASH_CONCURRENCY)
+        return _slots
+
+
+@receiver(setting_changed)
+def _reset_slots(setting, **kwargs):
+    global _slots
+    if setting == 'LOGIN_HASH_CONCURRENCY':
+        with _slots_lock:
+            _slots = None
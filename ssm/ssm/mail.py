@@ -0,0 +1,61 @@
+"""
+Gmail API email backend that sends through the outbound gateway (ssm.outbound), so a slow
+or failing Gmail is refused quickly instead of holding the request's worker.
+"""
+import logging
+
+import google.oauth2.credentials
+import google_auth_httplib2
+import httplib2
+from gmailapi_backend.mail import GmailBackend as BaseGmailBackend
+
+from ssm import outbound
+
+logger = logging.getLogger(__name__)
+
+
+class GmailBackend(BaseGmailBackend):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        credentials = google.oauth2.credentials.Credentials(
+            "token",
+            refresh_token=self.refresh_token,
+            token_uri="https://oauth2.googleapis.com/token",
+            client_id=self.client_id,
+            client_secret=self.client_secret,
+        )
+        # The base backend's HTTP client waits on Gmail indefinitely
+        self.http = google_auth_httplib2.AuthorizedHttp(
+            credentials, http=httplib2.Http(timeout=outbound.limits('gmail')['timeout']),
+        )
+
+    def send_messages(self, email_messages):
+        """Sends all messages in one batch request, as one gateway call."""
+        if not email_messages:
+            return 0
+        sent = 0
+        errors = []
+
+        def send_callback(request_id, response, exception):
+            nonlocal sent
+            if exception is not None:
+                errors.append(exception)
+            else:
+                sent += 1
+
+        try:
+            with outbound.call('gmail'):
+                batch = self.service.new_batch_http_request(send_callback)
+                for message in email_messages:
+                    request = self.send_message(message)
+                    if request:
+                        batch.add(request)
+                batch.execute(http=self.http)
+                if errors:
+                    # Counted against Gmail's circuit unless it rejected the message itself
+                    raise errors[-1]
+        except Exception as e:
+            if not self.fail_silently:
+                raise
+            logger.error(f"Error sending email via the Gmail API: {e}")
+        return sent
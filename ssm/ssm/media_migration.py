@@ -0,0 +1,285 @@
+"""
+Copies the files under MEDIA_ROOT into a storage (R2 by default) and points the database at
+them; `python manage.py migrate_media` runs it.
+
+1. build_manifest() lists every file a FileField in the database refers to, with the key it
+   gets in the destination: its current name, or with rekey=True the name the field's upload_to
+   gives it now. The manifest is saved in the state directory, so a resumed run uses the same
+   keys (some upload_to paths contain the date).
+2. Files are copied on a thread pool. Large files go to S3-compatible storages in multipart
+   uploads. Each copy is checked against the local file (the ETag for S3, the content for other
+   storages) and then appended to the checkpoint, so a rerun skips what is done.
+3. Rows whose names changed are rewritten with bulk_update, in batches, and only while they
+   still hold the name the manifest saw. Cached staff and student principals are retired
+   after each batch that touches them.
+"""
+import concurrent.futures
+import hashlib
+import json
+import mimetypes
+import os
+import time
+from collections import namedtuple
+
+from django.apps import apps
+from django.core.files import File
+from django.db import models, transaction
+
+from ssm import principals
+
+MANIFEST_NAME = 'manifest.json'
+CHECKPOINT_NAME = 'checkpoint.jsonl'
+MB = 1024 * 1024
+
+# label: model label; name: the field's value, which is also the path under the source root
+Entry = namedtuple('Entry', 'label pk field name key size')
+Copied = namedtuple('Copied', 'key name size mtime etag')
+
+# Labels of the models ssm.principals caches rows of (or, for PersonalInfo, with), by label
+# of the field's model: bulk_update bypasses save(), so their cache is retired by hand
+PRINCIPAL_MODELS = {
+    'staffs.Staff': 'staffs.Staff',
+    'students.Student': 'students.Student',
+    'students.PersonalInfo': 'students.Student',
+}
+
+
+class MigrationError(Exception):
+    """A file that could not be copied or did not verify; the message is reported back."""
+
+
+def file_fields():
+    """(model, [file field names]) for every concrete model with FileFields."""
+    for model in apps.get_models():
+        if model._meta.proxy or not model._meta.managed:
+            continue
+        fields = [f.name for f in model._meta.concrete_fields if isinstance(f, models.FileField)]
+        if fields:
+            yield model, fields
+
+
+def build_manifest(source_root, rekey=False):
+    """Returns (entries, missing): files present under `source_root`, and names that are not."""
+    entries, missing = [], []
+    keys = {}
+    for model, fields in file_fields():
+        rows = model._default_manager.all()
+        if rekey:
+            relations = [f.name for f in model._meta.concrete_fields if f.is_relation]
+            rows = rows.select_related(*relations)
+        for instance in rows.iterator(chunk_size=2000):
+            for field_name in fields:
+                name = getattr(instance, field_name).name
+                if not name:
+                    continue
+                path = os.path.join(source_root, name)
+                if not os.path.isfile(path):
+                    missing.append(name)
+                    continue
+                key = _rekeyed(instance, field_name, name) if rekey else name
+                # Two files cannot share a key; the later one keeps its name
+                if keys.setdefault(key, name) != name:
+                    key = name
+                entries.append(Entry(model._meta.label, instance.pk, field_name, name, key, os.path.getsize(path)))
+    return entries, missing
+
+
+def load_manifest(state_dir):
+    path = os.path.join(state_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        data = json.load(f)
+    return [Entry(*entry) for entry in data['entries']], data['missing']
+
+
+def save_manifest(state_dir, entries, missing):
+    os.makedirs(state_dir, exist_ok=True)
+    path = os.path.join(state_dir, MANIFEST_NAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'created': time.time(), 'entries': entries, 'missing': missing}, f)
+    os.replace(path + '.tmp', path)
+
+
+def load_checkpoint(state_dir):
+    """{key: Copied} for the files already copied and verified."""
+    copied = {}
+    path = os.path.join(state_dir, CHECKPOINT_NAME)
+    if not os.path.exists(path):
+        return copied
+    with open(path) as f:
+        for line in f:
+            try:
+                record = Copied(**json.loads(line))
+            except (ValueError, TypeError):
+                continue  # A line cut short by a crash
+            copied[record.key] = record
+    return copied
+
+
+def pending(entries, copied, source_root):
+    """The (name, key) pairs to copy: each once, skipping those checkpointed and unchanged since."""
+    todo = {}
+    for entry in entries:
+        done = copied.get(entry.key)
+        if done is not None and done.name == entry.name and (done.size, done.mtime) == _stat(source_root, entry.name):
+            continue
+        todo[entry.key] = entry.name
+    return sorted((name, key) for key, name in todo.items())
+
+
+def copy_files(pairs, source_root, destination, state_dir, workers=8, progress=None):
+    """
+    Copies and verifies `pairs` on `workers` threads, checkpointing each one that succeeds.
+    Returns {(name, key): error message} for those that failed.
+    """
+    failed = {}
+    os.makedirs(state_dir, exist_ok=True)
+    with open(os.path.join(state_dir, CHECKPOINT_NAME), 'a') as checkpoint, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='media-migration') as executor:
+        futures = {
+            executor.submit(destination.copy, os.path.join(source_root, name), key): (name, key)
+            for name, key in pairs
+        }
+        for future in concurrent.futures.as_completed(futures):
+            name, key = futures[future]
+            try:
+                etag = future.result()
+            except Exception as e:
+                failed[(name, key)] = str(e)
+            else:
+                size, mtime = _stat(source_root, name)
+                checkpoint.write(json.dumps(Copied(key, name, size, mtime, etag)._asdict()) + '\n')
+                checkpoint.flush()
+            if progress:
+                progress(name, key, failed.get((name, key)))
+    return failed
+
+
+def rewrite_names(entries, copied, batch_size=500, dry_run=False):
+    """
+    Points rows at their new keys, for entries whose file was copied. A row is left alone if its
+    field no longer holds the name in the manifest (the file was replaced meanwhile).
+    Returns the number of rows rewritten (or, dry_run, that would be).
+    """
+    groups = {}
+    for entry in entries:
+        if entry.key != entry.name and (dry_run or entry.key in copied):
+            groups.setdefault((entry.label, entry.field), []).append(entry)
+
+    rewritten = 0
+    for (label, field), group in groups.items():
+        model = apps.get_model(label)
+        for start in range(0, len(group), batch_size):
+            batch = {entry.pk: entry for entry in group[start:start + batch_size]}
+            with transaction.atomic():
+                current = model._default_manager.select_for_update().filter(pk__in=batch).values_list('pk', field)
+                rows = [model(pk=pk, **{field: batch[pk].key}) for pk, name in current if name == batch[pk].name]
+                if rows and not dry_run:
+                    model._default_manager.bulk_update(rows, [field])
+            if rows and not dry_run and label in PRINCIPAL_MODELS:
+                principals.invalidate_principals(apps.get_model(PRINCIPAL_MODELS[label]))
+            rewritten += len(rows)
+    return rewritten
+
+
+# ==========================================
+# DESTINATIONS
+# ==========================================
+
+def destination_for(storage, multipart_threshold=8 * MB, multipart_chunksize=8 * MB):
+    from storages.backends.s3 import S3Storage
+
+    if isinstance(storage, S3Storage):
+        return S3Destination(storage, multipart_threshold, multipart_chunksize)
+    return StorageDestination(storage)
+
+
+def multipart_etag(path, threshold, chunksize):
+    """The ETag S3 gives `path` uploaded with this threshold and part size."""
+    whole = hashlib.md5(usedforsecurity=False)
+    parts = []
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunksize), b''):
+            whole.update(chunk)
+            parts.append(hashlib.md5(chunk, usedforsecurity=False).digest())
+    if os.path.getsize(path) < threshold:
+        return whole.hexdigest()
+    return f"{hashlib.md5(b''.join(parts), usedforsecurity=False).hexdigest()}-{len(parts)}"
+
+
+class S3Destination:
+    """An S3-compatible bucket (R2Storage): boto3's managed transfer, checked by ETag."""
+
+    def __init__(self, storage, multipart_threshold, multipart_chunksize):
+        from boto3.s3.transfer import TransferConfig
+
+        self.storage = storage
+        self.threshold = multipart_threshold
+        self.chunksize = multipart_chunksize
+        # The files are already copied in parallel; a few threads per file for the parts of large ones
+        self.config = TransferConfig(
+            multipart_threshold=multipart_threshold, multipart_chunksize=multipart_chunksize, max_concurrency=4,
+        )
+
+    def copy(self, path, key):
+        from botocore.exceptions import ClientError
+
+        # storage.connection is per thread; boto3 clients are thread safe
+        client = self.storage.connection.meta.client
+        bucket, object_key = self.storage.bucket_name, self.storage._normalize_name(key)
+        expected = multipart_etag(path, self.threshold, self.chunksize)
+        try:
+            head = client.head_object(Bucket=bucket, Key=object_key)
+        except ClientError:
+            head = None
+        if head is None or not self._matches(head, path, expected):
+            params = self.storage.get_object_parameters(key)
+            params.setdefault('ContentType', mimetypes.guess_type(key)[0] or 'application/octet-stream')
+            client.upload_file(path, bucket, object_key, ExtraArgs=params, Config=self.config)
+            head = client.head_object(Bucket=bucket, Key=object_key)
+            if not self._matches(head, path, expected):
+                raise MigrationError(f"Uploaded object does not match: ETag {head.get('ETag')}, expected \"{expected}\"")
+        return expected
+
+    def _matches(self, head, path, expected):
+        return head['ContentLength'] == os.path.getsize(path) and head['ETag'].strip('"') == expected
+
+
+class StorageDestination:
+    """Any other Django storage (FileSystemStorage, LocalBucketStorage), checked by reading it back."""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def copy(self, path, key):
+        expected = _md5(open(path, 'rb'))
+        if self.storage.exists(key):
+            if _md5(self.storage.open(key, 'rb')) == expected:
+                return expected
+            self.storage.delete(key)
+        with open(path, 'rb') as f:
+            stored = self.storage.save(key, File(f, name=key))
+        if stored != key:
+            raise MigrationError(f"Storage saved the file as {stored}")
+        if _md5(self.storage.open(key, 'rb')) != expected:
+            raise MigrationError('Stored file does not match the local one.')
+        return expected
+
+
+def _md5(f):
+    digest = hashlib.md5(usedforsecurity=False)
+    with f:
+        for chunk in iter(lambda: f.read(MB), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stat(source_root, name):
+    stat = os.stat(os.path.join(source_root, name))
+    return stat.st_size, stat.st_mtime
+
+
+def _rekeyed(instance, field_name, name):
+    field = instance._meta.get_field(field_name)
+    return field.generate_filename(instance, os.path.basename(name))
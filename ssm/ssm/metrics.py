@@ -0,0 +1,209 @@
+"""
+Per-request performance metrics: latency, SQL query count, DB time, template render time
+and response size, labelled by URL name and exported for Prometheus on /metrics.
+"""
+import contextvars
+import hmac
+import re
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Gauge, Histogram, generate_latest
+    from prometheus_client import Counter as CounterMetric
+except ImportError:  # Metrics are optional; the middleware still enforces the query budget
+    Histogram = None
+
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (1_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000)
+
+if Histogram is not None:
+    REQUEST_LATENCY = Histogram('ssm_request_latency_seconds', 'Request latency by view', ['view', 'method', 'status'], buckets=LATENCY_BUCKETS)
+    REQUEST_QUERIES = Histogram('ssm_request_db_queries', 'SQL queries per request by view', ['view'], buckets=QUERY_COUNT_BUCKETS)
+    REQUEST_DB_TIME = Histogram('ssm_request_db_seconds', 'Time spent in SQL per request by view', ['view'], buckets=LATENCY_BUCKETS)
+    REQUEST_RENDER_TIME = Histogram('ssm_request_template_render_seconds', 'Template render time per request by view', ['view'], buckets=LATENCY_BUCKETS)
+    RESPONSE_SIZE = Histogram('ssm_response_size_bytes', 'Response body size by view', ['view'], buckets=SIZE_BUCKETS)
+    # Only populated for databases configured with OPTIONS['pool'] (settings.DB_POOL_MAX_SIZE)
+    DB_POOL_CONNECTIONS = Gauge(
+        'ssm_db_pool_connections', 'Connections in the psycopg pool by state (open, idle, in_use, max)',
+        ['alias', 'state'], multiprocess_mode='livesum',
+    )
+    DB_POOL_WAITING = Gauge('ssm_db_pool_requests_waiting', 'Requests queued for a pooled connection', ['alias'], multiprocess_mode='livesum')
+    DB_POOL_SATURATION = Gauge(
+        'ssm_db_pool_saturation_ratio', 'Checked-out connections as a share of the pool maximum', ['alias'], multiprocess_mode='max',
+    )
+    # students.ai_utils grade extraction: hit (served from cache), coalesced (joined an identical call in flight), miss
+    AI_GRADE_EXTRACTIONS = CounterMetric('ssm_ai_grade_extractions', 'Result screenshot extractions by outcome', ['outcome'])
+    # ssm.outbound: calls to Gemini, Gmail and web push, including the ones the gateway refused
+    OUTBOUND_CALLS = CounterMetric(
+        'ssm_outbound_calls', 'External calls by provider and outcome (ok, client_error, error, timeout, cancelled, rejected_*)',
+        ['provider', 'outcome'],
+    )
+    OUTBOUND_LATENCY = Histogram('ssm_outbound_call_seconds', 'External call duration by provider', ['provider'], buckets=LATENCY_BUCKETS)
+    OUTBOUND_IN_FLIGHT = Gauge('ssm_outbound_in_flight', 'External calls in flight by provider', ['provider'], multiprocess_mode='livesum')
+    OUTBOUND_CIRCUIT = Gauge(
+        'ssm_outbound_circuit_state', 'Circuit breaker state by provider: 0 closed, 1 half-open, 2 open', ['provider'], multiprocess_mode='max',
+    )
+    # ssm.login_protection: kind is staff or student
+    LOGIN_ATTEMPTS = CounterMetric(
+        'ssm_login_attempts', 'Login attempts by kind and outcome (success, failure, rejected_locked, rejected_throttled, rejected_busy)',
+        ['kind', 'outcome'],
+    )
+    LOGIN_HASH_TIME = Histogram('ssm_login_password_hash_seconds', 'Time spent checking login passwords', ['kind'], buckets=LATENCY_BUCKETS)
+
+
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SQL_IN_LISTS = re.compile(r"\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)")
+
+
+def sql_shape(sql):
+    """Normalises a SQL statement so queries differing only in parameters compare equal."""
+    shape = _SQL_LITERALS.sub('?', sql)
+    return _SQL_IN_LISTS.sub('(...)', shape)
+
+
+class RequestStats:
+    """Counters collected while a single request is handled."""
+
+    def __init__(self):
+        self.query_count = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.shapes = Counter()
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.query_count += 1
+            self.shapes[sql_shape(sql)] += 1
+
+    def repeated_shapes(self, limit=3):
+        return [(count, shape) for shape, count in self.shapes.most_common(limit) if count > 1]
+
+
+current_request_stats = contextvars.ContextVar('current_request_stats', default=None)
+
+
+def _install_template_timer():
+    """Times every top-level Django template render into the active RequestStats."""
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, '_ssm_timed', False):
+        return
+    original_render = Template.render
+
+    def timed_render(self, context=None, request=None):
+        stats = current_request_stats.get()
+        if stats is None:
+            return original_render(self, context, request)
+        start = time.perf_counter()
+        try:
+            return original_render(self, context, request)
+        finally:
+            stats.render_time += time.perf_counter() - start
+
+    timed_render._ssm_timed = True
+    Template.render = timed_render
+
+
+_install_template_timer()
+
+
+def observe_request(view, method, status, duration, stats, response_size):
+    if Histogram is None:
+        return
+    REQUEST_LATENCY.labels(view, method, str(status)).observe(duration)
+    REQUEST_QUERIES.labels(view).observe(stats.query_count)
+    REQUEST_DB_TIME.labels(view).observe(stats.db_time)
+    REQUEST_RENDER_TIME.labels(view).observe(stats.render_time)
+    if response_size is not None:
+        RESPONSE_SIZE.labels(view).observe(response_size)
+
+
+def observe_grade_extraction(outcome):
+    if Histogram is None:
+        return
+    AI_GRADE_EXTRACTIONS.labels(outcome).inc()
+
+
+def observe_login_attempt(kind, outcome):
+    if Histogram is None:
+        return
+    LOGIN_ATTEMPTS.labels(kind, outcome).inc()
+
+
+def observe_login_hash(kind, duration):
+    if Histogram is None:
+        return
+    LOGIN_HASH_TIME.labels(kind).observe(duration)
+
+
+_CIRCUIT_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+
+def observe_outbound_call(provider, outcome, duration, in_flight, circuit_state):
+    """Records a finished or refused external call (outcome None: one just started)."""
+    if Histogram is None:
+        return
+    if outcome is not None:
+        OUTBOUND_CALLS.labels(provider, outcome).inc()
+    if duration is not None:
+        OUTBOUND_LATENCY.labels(provider).observe(duration)
+    OUTBOUND_IN_FLIGHT.labels(provider).set(in_flight)
+    OUTBOUND_CIRCUIT.labels(provider).set(_CIRCUIT_STATES[circuit_state])
+
+
+def observe_db_pools():
+    """Publishes connection pool usage for every database alias that uses a psycopg pool."""
+    if Histogram is None:
+        return
+    from django.db import connections
+
+    for alias in connections:
+        conn = connections[alias]
+        if not conn.settings_dict.get('OPTIONS', {}).get('pool'):
+            continue
+        pool = getattr(conn, 'pool', None)
+        if pool is None:
+            continue
+        stats = pool.get_stats()
+        size, idle, maximum = stats.get('pool_size', 0), stats.get('pool_available', 0), stats.get('pool_max', 0)
+        DB_POOL_CONNECTIONS.labels(alias, 'open').set(size)
+        DB_POOL_CONNECTIONS.labels(alias, 'idle').set(idle)
+        DB_POOL_CONNECTIONS.labels(alias, 'in_use').set(size - idle)
+        DB_POOL_CONNECTIONS.labels(alias, 'max').set(maximum)
+        DB_POOL_WAITING.labels(alias).set(stats.get('requests_waiting', 0))
+        DB_POOL_SATURATION.labels(alias).set((size - idle) / maximum if maximum else 0)
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. Requires 'Authorization: Bearer <METRICS_TOKEN>' when
+    METRICS_TOKEN is set, otherwise only answers requests from localhost.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(supplied, token):
+            return HttpResponseForbidden('Forbidden')
+    elif request.META.get('REMOTE_ADDR') not in ('127.0.0.1', '::1'):
+        return HttpResponseForbidden('Forbidden')
+
+    if Histogram is None:
+        return HttpResponse('prometheus_client is not installed\n', status=503, content_type='text/plain')
+
+    observe_db_pools()
+    registry = REGISTRY
+    if getattr(settings, 'PROMETHEUS_MULTIPROC_DIR', ''):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
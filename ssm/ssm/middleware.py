@@ -24,9 +24,206 @@ class StaticFilesHeadersMiddleware(MiddlewareMixin):
         return response
 
 
+class RequestMetricsMiddleware:
+    """
+    Records latency, SQL query count, DB time, template render time and response size per view
+    (see ssm.metrics), optionally inside an OpenTelemetry span, and logs the most repeated SQL
+    shapes when a view goes over settings.REQUEST_QUERY_BUDGET queries.
+
+    Works under WSGI and ASGI; keeping it async-capable means async views are not forced back
+    onto a thread for the whole request.
+    """
+    SKIP_PREFIXES = ('/static/', '/media/', '/metrics')
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+        from django.conf import settings
+
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.query_budget = getattr(settings, 'REQUEST_QUERY_BUDGET', 0)
+        self.server_timing = getattr(settings, 'SERVER_TIMING_HEADER', False)
+        self.tracer = None
+        if getattr(settings, 'OTEL_TRACING_ENABLED', False):
+            try:
+                from opentelemetry import trace
+                self.tracer = trace.get_tracer('ssm.requests')
+            except ImportError:
+                self.tracer = None
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if request.path.startswith(self.SKIP_PREFIXES):
+            return self.get_response(request)
+
+        import contextlib
+        import time
+        from .metrics import RequestStats, current_request_stats
+
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                span = stack.enter_context(self.tracer.start_as_current_span(f"{request.method} {request.path}")) if self.tracer else None
+                self._count_queries(stack, stats)
+                response = self.get_response(request)
+                duration = time.perf_counter() - start
+                view = self._view_name(request)
+                self._finish_span(span, request, response, view, stats)
+        finally:
+            current_request_stats.reset(token)
+
+        from .metrics import observe_db_pools
+        # Refreshed per request as well as on scrape, so each gunicorn worker reports its own pool
+        observe_db_pools()
+        return self._record(request, response, view, duration, stats)
+
+    async def __acall__(self, request):
+        if request.path.startswith(self.SKIP_PREFIXES):
+            return await self.get_response(request)
+
+        import contextlib
+        import time
+        from asgiref.sync import sync_to_async
+        from .metrics import RequestStats, current_request_stats, observe_db_pools
+
+        def release(db_stack):
+            db_stack.close()
+            observe_db_pools()
+
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                span = stack.enter_context(self.tracer.start_as_current_span(f"{request.method} {request.path}")) if self.tracer else None
+                # Connections belong to a thread: the request's ORM work runs in its
+                # sync_to_async thread, so the query counter is installed (and removed) there
+                db_stack = contextlib.ExitStack()
+                await sync_to_async(self._count_queries)(db_stack, stats)
+                try:
+                    response = await self.get_response(request)
+                finally:
+                    await sync_to_async(release)(db_stack)
+                duration = time.perf_counter() - start
+                view = self._view_name(request)
+                self._finish_span(span, request, response, view, stats)
+        finally:
+            current_request_stats.reset(token)
+        return self._record(request, response, view, duration, stats)
+
+    @staticmethod
+    def _count_queries(stack, stats):
+        from django.db import connections
+
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(stats.db_wrapper))
+
+    @staticmethod
+    def _finish_span(span, request, response, view, stats):
+        if span is None:
+            return
+        span.update_name(f"{request.method} {view}")
+        span.set_attribute('http.status_code', response.status_code)
+        span.set_attribute('db.query_count', stats.query_count)
+        span.set_attribute('db.time_ms', round(stats.db_time * 1000, 2))
+        span.set_attribute('template.render_ms', round(stats.render_time * 1000, 2))
+
+    def _record(self, request, response, view, duration, stats):
+        from .metrics import observe_request
+        size = None if getattr(response, 'streaming', False) else len(response.content)
+        observe_request(view, request.method, response.status_code, duration, stats, size)
 
+        if self.server_timing:
+            response['Server-Timing'] = (
+                f'db;dur={stats.db_time * 1000:.2f};desc="{stats.query_count} queries", '
+                f'tpl;dur={stats.render_time * 1000:.2f}, app;dur={duration * 1000:.2f}'
+            )
 
+        if self.query_budget and stats.query_count > self.query_budget:
+            import logging
+            shapes = '\n'.join(f"  {count}x {shape[:300]}" for count, shape in stats.repeated_shapes())
+            logging.getLogger(__name__).warning(
+                f"Query budget exceeded for {view}: {stats.query_count} queries "
+                f"(budget {self.query_budget}, {stats.db_time * 1000:.0f} ms in DB). Top repeated queries:\n{shapes or '  none'}"
+            )
+        return response
+
+    @staticmethod
+    def _view_name(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return '<unresolved>'
+        return match.view_name or match._func_path
+
+
+class AuditLogMiddleware:
+    """
+    Collects the audit entries a request makes (staffs.utils.log_audit) and writes them with one
+    bulk_create when the response is ready, or hands them to the background writer when
+    settings.AUDIT_LOG_FLUSH is 'background' (see staffs.audit).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        from staffs import audit
+
+        request._audit_entries = []
+        try:
+            return self.get_response(request)
+        finally:
+            audit.flush(request._audit_entries)
+
+    async def __acall__(self, request):
+        from asgiref.sync import sync_to_async
+        from staffs import audit
+
+        request._audit_entries = []
+        try:
+            return await self.get_response(request)
+        finally:
+            if request._audit_entries:
+                await sync_to_async(audit.flush)(request._audit_entries)
+
+
+class CurrentUserMiddleware:
+    """
+    Sets request.staff and request.student to the logged-in Staff / Student (or None), loaded
+    on first access through ssm.principals' cache, so a request looks its user up at most once.
+    Async views must resolve them with sync_to_async.
+    """
+    sync_capable = True
+    async_capable = True
 
+    def __init__(self, get_response):
+        from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
+    def __call__(self, request):
+        from django.utils.functional import SimpleLazyObject
+        from ssm import principals
 
+        session = request.session
+        request.staff = SimpleLazyObject(lambda: principals.resolve_staff(session.get('staff_id')))
+        request.student = SimpleLazyObject(lambda: principals.resolve_student(session.get('student_roll_number')))
+        return self.get_response(request)
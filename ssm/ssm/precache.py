@@ -0,0 +1,99 @@
+"""
+The service worker's precache list: which static files the PWA stores at install time, under
+their fingerprinted (content-hashed) URLs.
+
+collectstatic writes it (PrecacheManifestStaticFilesStorage) to STATIC_ROOT/precache-manifest.json
+as {"version": ..., "assets": [url, ...]}; /sw.js embeds it. The version is a digest of the asset
+URLs, so any changed file gives a new sw.js, which installs a new cache and evicts the old one.
+In development (DEBUG, or before collectstatic has run) the list is built from the static finders
+instead, with the storage's URLs and a version taken from the file contents.
+"""
+import functools
+import hashlib
+import json
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+MANIFEST_NAME = 'precache-manifest.json'
+
+
+def wanted(name, size):
+    """True for static files the PWA pages use (SW_PRECACHE_PREFIXES), up to SW_PRECACHE_MAX_BYTES."""
+    name = name.replace('\\', '/')
+    return size <= settings.SW_PRECACHE_MAX_BYTES and any(name.startswith(prefix) for prefix in settings.SW_PRECACHE_PREFIXES)
+
+
+def build_manifest(urls, version_source=None):
+    """The manifest for `urls`; the version digests `version_source` (default: the URLs themselves)."""
+    urls = sorted(set(urls))
+    digest = hashlib.sha256()
+    for part in version_source if version_source is not None else urls:
+        digest.update(part if isinstance(part, bytes) else part.encode())
+        digest.update(b'\0')
+    return {'version': digest.hexdigest()[:16], 'assets': urls}
+
+
+class PrecacheManifestStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """WhiteNoise's manifest storage, which also writes the precache manifest after post-processing."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        urls = [
+            self.url(name) for name in paths
+            if name in self.hashed_files and wanted(name, self.size(self.hashed_files[name]))
+        ]
+        with open(self.path(MANIFEST_NAME), 'w') as f:
+            json.dump(build_manifest(urls), f)
+
+
+def load_manifest():
+    """The collected manifest, or in development one built from the finders on every call."""
+    if settings.DEBUG:
+        return _found_manifest()
+    return _deployed_manifest()
+
+
+@functools.lru_cache(maxsize=1)
+def _deployed_manifest():
+    path = os.path.join(settings.STATIC_ROOT, MANIFEST_NAME) if settings.STATIC_ROOT else ''
+    if not os.path.exists(path):
+        return _found_manifest()
+    with open(path) as f:
+        return json.load(f)
+
+
+def _found_manifest():
+    files = {}
+    for finder in finders.get_finders():
+        for name, storage in finder.list(['CVS', '.*', '*~']):
+            if name not in files and wanted(name, storage.size(name)):
+                files[name] = storage
+    names = sorted(files)
+    contents = []
+    for name in names:
+        with files[name].open(name) as f:
+            contents.append(f.read())
+    return build_manifest([staticfiles_storage.url(name) for name in names], version_source=names + contents)
+
+
+def service_worker_view(request):
+    """Serves templates/sw.js with the precache manifest and the runtime caching allowlists."""
+    manifest = load_manifest()
+    body = render_to_string('sw.js', {
+        'precache_version': manifest['version'],
+        'precache_urls': json.dumps(manifest['assets']),
+        'stale_while_revalidate': json.dumps(settings.SW_STALE_WHILE_REVALIDATE),
+        'cache_first_origins': json.dumps(settings.SW_CACHE_FIRST_ORIGINS),
+    }, request=request)
+    response = HttpResponse(body, content_type='application/javascript')
+    # Browsers check for a new worker on navigation; never let an intermediate cache answer that
+    response['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,125 @@
+"""
+The logged-in staff member or student, resolved once per request.
+
+CurrentUserMiddleware (ssm.middleware) sets request.staff and request.student to lazy objects:
+the first access loads the row named by request.session['staff_id'] or
+['student_roll_number'] and later accesses reuse it. Either wraps None when nobody of that
+kind is logged in or the row is gone, so test it with `if request.staff:`, not `is None`.
+Views that used to look the row up themselves call
+
+    staff = principals.current_staff(request)       # raises Staff.DoesNotExist, like Staff.objects.get()
+    student = principals.current_student_or_404(request)
+
+Rows are cached for PRINCIPAL_CACHE_TIMEOUT seconds in the shared (Redis) cache, so most
+requests make no query for them. staffs.signals drops a row's copy when it is saved or
+deleted; code that changes many rows at once with update() or bulk_update() calls
+invalidate_principals(model) instead, which retires every cached copy of that model.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import Http404
+from django.utils.functional import LazyObject, empty
+
+# The Student's personal details are read by most student pages (mobile, photo, Aadhaar)
+SELECT_RELATED = {
+    'staffs.staff': (),
+    'students.student': ('personalinfo',),
+}
+
+
+def current_staff(request, required=True):
+    """The logged-in Staff; raises Staff.DoesNotExist (or returns None if not required) without one."""
+    staff = _principal(request, 'staff', resolve_staff, 'staff_id')
+    if staff is None and required:
+        from staffs.models import Staff
+        raise Staff.DoesNotExist('No staff member is logged in.')
+    return staff
+
+
+def current_student(request, required=True):
+    """The logged-in Student; raises Student.DoesNotExist (or returns None if not required) without one."""
+    student = _principal(request, 'student', resolve_student, 'student_roll_number')
+    if student is None and required:
+        from students.models import Student
+        raise Student.DoesNotExist('No student is logged in.')
+    return student
+
+
+def current_staff_or_404(request):
+    staff = _principal(request, 'staff', resolve_staff, 'staff_id')
+    if staff is None:
+        raise Http404('No Staff matches the given query.')
+    return staff
+
+
+def current_student_or_404(request):
+    student = _principal(request, 'student', resolve_student, 'student_roll_number')
+    if student is None:
+        raise Http404('No Student matches the given query.')
+    return student
+
+
+def resolve_staff(staff_id):
+    from staffs.models import Staff
+    return _resolve(Staff, staff_id)
+
+
+def resolve_student(roll_number):
+    from students.models import Student
+    return _resolve(Student, roll_number)
+
+
+def invalidate_principal(model, pk):
+    """Drops the cached copy of one Staff or Student row."""
+    _cache().delete(_key(model, pk))
+
+
+def invalidate_principals(model):
+    """Retires every cached Staff or Student row, after changes that bypass save()."""
+    cache = _cache()
+    try:
+        cache.incr(_version_key(model))
+    except ValueError:
+        cache.set(_version_key(model), int(time.time()), None)
+
+
+def _resolve(model, pk):
+    if not pk:
+        return None
+    cache = _cache()
+    key = _key(model, pk)
+    instance = cache.get(key)
+    if instance is None:
+        instance = model.objects.select_related(*SELECT_RELATED[model._meta.label_lower]).filter(pk=pk).first()
+        if instance is None:
+            return None
+        cache.set(key, instance, settings.PRINCIPAL_CACHE_TIMEOUT)
+    return instance
+
+
+def _principal(request, attr, resolve, session_key):
+    """The model instance behind request.<attr> (not the lazy wrapper), or None."""
+    value = getattr(request, attr, None)
+    if value is None:
+        # A request that did not pass through CurrentUserMiddleware
+        return resolve(request.session.get(session_key))
+    if isinstance(value, LazyObject):
+        if value._wrapped is empty:
+            value._setup()
+        value = value._wrapped
+    return value
+
+
+def _cache():
+    return caches[settings.PRINCIPAL_CACHE_ALIAS]
+
+
+def _version_key(model):
+    return f"principal:{model._meta.label_lower}:version"
+
+
+def _key(model, pk):
+    version = _cache().get_or_set(_version_key(model), int(time.time()), None)
+    return f"principal:{model._meta.label_lower}:v{version}:{pk}"
@@ -0,0 +1,187 @@
+"""
+Reference data that pages read often and that changes rarely: castes, period times, subjects,
+labs and class mappings. Each is served as a pre-serialized bundle from
+
+    /reference/<name>.<version>.json    the data
+    /reference/<name>.<version>.js      a script setting window.REFERENCE.<name>, for pages that
+                                        need the data before their own scripts run
+
+The version is a digest of the content, so a versioned URL always means the same bytes and is
+served `immutable`: browsers keep it until the data changes and pages link to the new version
+({% load reference_data %}{% reference_url 'castes' %}). /reference/<name>.json answers with
+whatever is current, with a strong ETag, and has to be revalidated.
+
+Every process serializes a bundle once and reuses the bytes until the data changes.
+staffs.signals calls invalidate() when a backing model is saved or deleted; that bumps a
+generation counter in the shared cache, and each process rebuilds on its next request.
+Bundles without models (castes, periods) are built when the staffs app starts.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_safe
+
+FORMATS = {
+    'json': 'application/json',
+    'js': 'application/javascript',
+}
+
+Bundle = namedtuple('Bundle', 'version json js')
+Source = namedtuple('Source', 'build models login_required')
+
+_built = {}
+_lock = threading.Lock()
+
+
+def _castes():
+    from students.caste_data import CASTE_DATA
+    return CASTE_DATA
+
+
+def _periods():
+    from staffs.timetable_utils import PERIOD_TIMES
+    return {str(period): {'start': start, 'end': end} for period, (start, end) in PERIOD_TIMES.items()}
+
+
+def _subjects():
+    """Per semester, what the timetable editors show about each subject (keyed by id)."""
+    from staffs.models import Subject
+
+    semesters = {}
+    for subject in Subject.objects.select_related('staff', 'staff_batch_b', 'lab', 'classroom').order_by('semester', 'code'):
+        target_hours = 3 if subject.subject_type == 'Lab' else subject.credits
+        if target_hours <= 0:
+            target_hours = 3 if subject.subject_type == 'Lab' else 4
+        semesters.setdefault(str(subject.semester), {})[str(subject.id)] = {
+            'id': subject.id,
+            'code': subject.code,
+            'name': subject.name,
+            'type': subject.subject_type,
+            'credits': subject.credits,
+            'target_hours': target_hours,
+            'staff_id': subject.staff.staff_id if subject.staff else None,
+            'staff': subject.staff.name if subject.staff else '—',
+            'staff_b_id': subject.staff_batch_b.staff_id if subject.staff_batch_b else None,
+            'staff_b': subject.staff_batch_b.name if subject.staff_batch_b else '—',
+            'location': subject.get_location_display(),
+        }
+    return semesters
+
+
+def _labs():
+    from staffs.models import Lab
+    return [
+        {
+            'id': lab.id, 'name': lab.name, 'short_name': lab.short_name,
+            'staff_id': lab.staff.staff_id if lab.staff else None, 'staff': lab.staff.name if lab.staff else None,
+            'from_date': lab.from_date, 'to_date': lab.to_date,
+        }
+        for lab in Lab.objects.select_related('staff')
+    ]
+
+
+def _class_mappings():
+    from staffs.models import ClassMapping
+    return list(ClassMapping.objects.values('id', 'class_name', 'room_name', 'semester', 'from_date', 'to_date'))
+
+
+# name -> Source; models are app labels whose saves and deletes change the bundle
+SOURCES = {
+    'castes': Source(_castes, (), login_required=False),
+    'periods': Source(_periods, (), login_required=False),
+    'subjects': Source(_subjects, ('staffs.Subject', 'staffs.Staff', 'staffs.Lab', 'staffs.ClassMapping'), login_required=True),
+    'labs': Source(_labs, ('staffs.Lab', 'staffs.Staff'), login_required=True),
+    'class_mappings': Source(_class_mappings, ('staffs.ClassMapping',), login_required=True),
+}
+
+
+def get_bundle(name):
+    """The current Bundle for `name`, serialized at most once per process per change."""
+    source = SOURCES[name]
+    generation = _generation(name) if source.models else 0
+    built = _built.get(name)
+    if built is not None and built[0] == generation:
+        return built[1]
+    with _lock:
+        built = _built.get(name)
+        if built is None or built[0] != generation:
+            built = (generation, _serialize(name, source.build()))
+            _built[name] = built
+    return built[1]
+
+
+def bundle_url(name, fmt='json'):
+    from django.urls import reverse
+    return reverse('reference_data', kwargs={'name': name, 'version': get_bundle(name).version, 'fmt': fmt})
+
+
+def invalidate(name):
+    """Makes every process rebuild `name` on its next request."""
+    cache = _cache()
+    try:
+        cache.incr(_generation_key(name))
+    except ValueError:
+        cache.set(_generation_key(name), int(time.time()), None)
+
+
+def bundles_for_model(model):
+    """The names of the bundles built from `model`."""
+    return [name for name, source in SOURCES.items() if model._meta.label in source.models]
+
+
+def warm():
+    """Serializes the bundles that do not depend on the database."""
+    for name, source in SOURCES.items():
+        if not source.models:
+            get_bundle(name)
+
+
+@require_safe
+def reference_data_view(request, name, fmt, version=None):
+    source = SOURCES.get(name)
+    if source is None or fmt not in FORMATS:
+        raise Http404('No such reference data.')
+    if source.login_required and not (request.session.get('staff_id') or request.session.get('student_roll_number')):
+        return HttpResponse('Log in to the portal first.', status=403, content_type='text/plain')
+
+    bundle = get_bundle(name)
+    etag = f'"{bundle.version}.{fmt}"'
+    response = HttpResponse(getattr(bundle, fmt), content_type=FORMATS[fmt])
+    response['ETag'] = etag
+    scope = 'private' if source.login_required else 'public'
+    if version == bundle.version:
+        response['Cache-Control'] = f'{scope}, max-age={settings.REFERENCE_DATA_MAX_AGE}, immutable'
+    else:
+        # The unversioned URL, or a version that has since changed: never store it as final
+        response['Cache-Control'] = f'{scope}, no-cache'
+    if source.login_required:
+        response['Vary'] = 'Cookie'
+    return get_conditional_response(request, etag=etag, response=response)
+
+
+def _serialize(name, data):
+    from django.core.serializers.json import DjangoJSONEncoder
+
+    body = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode()
+    version = hashlib.sha256(body).hexdigest()[:16]
+    script = b'window.REFERENCE = window.REFERENCE || {};\nwindow.REFERENCE[' + json.dumps(name).encode() + b'] = ' + body + b';\n'
+    return Bundle(version=version, json=body, js=script)
+
+
+def _cache():
+    return caches[settings.REFERENCE_DATA_CACHE_ALIAS]
+
+
+def _generation(name):
+    return _cache().get_or_set(_generation_key(name), int(time.time()), None)
+
+
+def _generation_key(name):
+    return f"reference:{name}:generation"
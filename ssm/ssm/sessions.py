@@ -0,0 +1,80 @@
+"""
+Session engine (settings.SESSION_ENGINE = 'ssm.sessions').
+
+Django's cached_db store over the 'sessions' cache: requests read their session from Redis and
+only fall back to django_session on a miss, and a request that does not modify its session
+writes nothing. Without REDIS_URL the cache is an in-process fakeredis (local runs and tests),
+which behaves like a cold Redis after every restart.
+
+Saving a session also starts, at most once per SESSION_PURGE_INTERVAL across all processes,
+a background thread that deletes expired django_session rows in chunks, so the table does not
+grow with every login that is never logged out.
+"""
+import logging
+import threading
+
+import redis
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.core.cache import caches
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PURGE_KEY = 'sessions:purge-lock'
+
+
+class FakeRedisConnectionPool(redis.ConnectionPool):
+    """Connection pool for the 'sessions' cache when no REDIS_URL is configured."""
+
+    def __init__(self, **kwargs):
+        import fakeredis
+
+        kwargs['connection_class'] = fakeredis.FakeConnection
+        super().__init__(**kwargs)
+
+
+class SessionStore(CachedDBStore):
+    def save(self, must_create=False):
+        super().save(must_create)
+        schedule_purge()
+
+
+def schedule_purge():
+    interval = settings.SESSION_PURGE_INTERVAL
+    if not interval:
+        return
+    try:
+        # add() is atomic in Redis, so one process per interval wins
+        if not caches[settings.SESSION_CACHE_ALIAS].add(PURGE_KEY, True, interval):
+            return
+    except Exception as e:
+        logger.warning(f"Could not schedule the expired session purge: {e}")
+        return
+    threading.Thread(target=_run_purge, name='session-purge', daemon=True).start()
+
+
+def purge_expired(chunk_size=1000):
+    """Deletes expired django_session rows, chunk_size at a time; returns how many."""
+    from django.contrib.sessions.models import Session
+
+    deleted = 0
+    while True:
+        keys = list(
+            Session.objects.filter(expire_date__lt=timezone.now()).values_list('session_key', flat=True)[:chunk_size]
+        )
+        if not keys:
+            return deleted
+        deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+
+
+def _run_purge():
+    try:
+        deleted = purge_expired()
+        if deleted:
+            logger.info(f"Purged {deleted} expired sessions")
+    except Exception as e:
+        logger.error(f"Expired session purge failed: {e}")
+    finally:
+        connections.close_all()
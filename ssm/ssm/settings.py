@@ -2,6 +2,7 @@
 Django settings for ssm project.
 """
 from pathlib import Path
+import json
 import os
 import dj_database_url
 from dotenv import load_dotenv
@@ -49,6 +50,7 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt',
     'rest_framework_simplejwt.token_blacklist',
     'authentication',
+    'api',
 ]
 
 MIDDLEWARE = [
@@ -61,8 +63,21 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'ssm.middleware.StaticFilesHeadersMiddleware',  # Custom middleware for static file headers
+    'ssm.middleware.RequestMetricsMiddleware',  # Per-view latency / query metrics exported on /metrics
+    'ssm.middleware.AuditLogMiddleware',  # Writes a request's audit entries in one batch (staffs.audit)
+    'ssm.middleware.CurrentUserMiddleware',  # request.staff / request.student, resolved once (ssm.principals)
 ]
 
+# Request instrumentation (ssm.middleware.RequestMetricsMiddleware)
+# Views running more SQL queries than this log their most repeated query shapes; 0 disables the check.
+REQUEST_QUERY_BUDGET = int(os.getenv('REQUEST_QUERY_BUDGET', '100'))
+# When set, /metrics requires "Authorization: Bearer <token>"; otherwise it only answers localhost.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+PROMETHEUS_MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR', '')
+OTEL_TRACING_ENABLED = os.getenv('OTEL_TRACING_ENABLED', 'False').strip().lower() in ['true', '1', 't', 'y', 'yes']
+# Adds a Server-Timing header (db time, app time, query count) so load tests against a running server can read per-request cost.
+SERVER_TIMING_HEADER = os.getenv('SERVER_TIMING_HEADER', 'False').strip().lower() in ['true', '1', 't', 'y', 'yes']
+
 # Security settings that might block static files
 SECURE_CONTENT_TYPE_NOSNIFF = False  # Allow CSS/JS to load properly
 SECURE_BROWSER_XSS_FILTER = False  # Prevent XSS filter from blocking CSS
@@ -119,11 +134,24 @@ WSGI_APPLICATION = 'ssm.wsgi.application'
 # Tries to use DATABASE_URL from environment first (for production/Render)
 # Falls back to local PostgreSQL if not found.
 
+# Connection reuse, configurable for both branches:
+# - DB_CONN_MAX_AGE keeps each worker thread's connection open for that many seconds (0 = reconnect per request).
+# - DB_CONN_HEALTH_CHECKS pings a reused connection once per request before trusting it.
+# - DB_POOL_MAX_SIZE > 0 switches to psycopg's connection pool (needs psycopg[pool]). Django requires
+#   CONN_MAX_AGE=0 with a pool, so DB_CONN_MAX_AGE is ignored then. The pool is opened lazily, so it
+#   is created per gunicorn worker after the fork.
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '600'))
+DB_CONN_HEALTH_CHECKS = os.getenv('DB_CONN_HEALTH_CHECKS', 'True').strip().lower() in ['true', '1', 't', 'y', 'yes']
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '2'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '0'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+
 if os.environ.get("DATABASE_URL"):
     DATABASES = {
         "default": dj_database_url.config(
             default=os.environ.get("DATABASE_URL"),
-            conn_max_age=600,
+            conn_max_age=DB_CONN_MAX_AGE,
+            conn_health_checks=DB_CONN_HEALTH_CHECKS,
             ssl_require=True,
         )
     }
@@ -137,9 +165,19 @@ else:
             "PASSWORD": "dbms",
             "HOST": "localhost",
             "PORT": "5432",
+            "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": DB_CONN_HEALTH_CHECKS,
         }
     }
 
+if DB_POOL_MAX_SIZE:
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"].setdefault("OPTIONS", {})["pool"] = {
+        "min_size": min(DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE),
+        "max_size": DB_POOL_MAX_SIZE,
+        "timeout": DB_POOL_TIMEOUT,
+    }
+
 # --- PASSWORD VALIDATION ---
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -238,7 +276,7 @@ STATICFILES_FINDERS = [
 # Only set storage in production (WhiteNoise)
 # DO NOT set STATICFILES_STORAGE in development - let Django use defaults
 if not DEBUG:
-    STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+    STATICFILES_STORAGE = 'ssm.precache.PrecacheManifestStaticFilesStorage'
 # --- MEDIA FILES (for user-uploaded content) ---
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
@@ -273,7 +311,6 @@ if not AWS_ACCESS_KEY_ID or not AWS_SECRET_ACCESS_KEY or not AWS_STORAGE_BUCKET_
 
 
 from urllib.parse import urlparse
-import os
 
 raw_public_url = os.getenv('R2_PUBLIC_URL')
 
@@ -302,8 +339,14 @@ STORAGES = {
     },
 }
 
+# A stand-in for the bucket in MEDIA_ROOT, presigned uploads included (ssm.direct_uploads);
+# used by default when developing without R2 credentials
+if os.getenv('LOCAL_BUCKET', str(DEBUG and not (AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY and AWS_STORAGE_BUCKET_NAME))) == 'True':
+    STORAGES["default"]["BACKEND"] = "ssm.storage_backends.LocalBucketStorage"
+
 if not DEBUG:
-    STORAGES["staticfiles"]["BACKEND"] = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+    # WhiteNoise's CompressedManifestStaticFilesStorage, also writing the service worker's precache list
+    STORAGES["staticfiles"]["BACKEND"] = "ssm.precache.PrecacheManifestStaticFilesStorage"
 
 
 # --- DEFAULT SETTINGS ---
@@ -322,12 +365,12 @@ CORS_ALLOWED_ORIGINS = ["null"]
 # EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 
 # --- GMAIL API CONFIGURATION ---
-EMAIL_BACKEND = 'gmailapi_backend.mail.GmailBackend'
+# Gmail API backend behind the outbound gateway (ssm.outbound): timeouts, rate limit, circuit breaker
+EMAIL_BACKEND = 'ssm.mail.GmailBackend'
 
 # Load credentials from gmail.json if it exists
 GMAIL_CREDENTIALS_FILE = os.path.join(BASE_DIR, 'gmail.json')
 if os.path.exists(GMAIL_CREDENTIALS_FILE):
-    import json
     with open(GMAIL_CREDENTIALS_FILE, 'r') as f:
         gmail_creds = json.load(f)
         GMAIL_API_CLIENT_ID = gmail_creds.get('client_id')
@@ -430,3 +473,166 @@ WEBPUSH_SETTINGS = {
     "VAPID_ADMIN_EMAIL": "sachinytr@gmail.com"
 }
 
+
+
+# ==========================================
+# GEMINI (students.ai_utils)
+# ==========================================
+# Keys are read from GEMINI_API_KEY / GEMINI_API_KEY_GPA. Setting a base URL sends the calls
+# to a proxy, or to the local stand-in used by `manage.py loadtest ai_burst`.
+GEMINI_BASE_URL = os.getenv('GEMINI_BASE_URL', '')
+# Extracted grades, keyed by screenshot content; shared so every worker serves them
+GRADES_CACHE_ALIAS = 'sessions'
+
+# AI resume jobs (students.resume_jobs). 'thread' runs queued generations on a small pool
+# inside each web process; 'worker' leaves them to `manage.py run_ai_resume_jobs`.
+AI_RESUME_JOB_RUNNER = os.getenv('AI_RESUME_JOB_RUNNER', 'thread')
+AI_RESUME_JOB_THREADS = int(os.getenv('AI_RESUME_JOB_THREADS', '4'))
+# A running job older than this is treated as abandoned (its worker died) and picked up again
+AI_RESUME_JOB_TIMEOUT = int(os.getenv('AI_RESUME_JOB_TIMEOUT', '300'))
+
+# ==========================================
+# OUTBOUND GATEWAY (ssm.outbound)
+# ==========================================
+# Per-provider limits for calls to gemini, gmail and webpush, merged over
+# ssm.outbound.DEFAULT_PROVIDERS. Keys: concurrency, rate, burst, timeout, queue_timeout,
+# failure_threshold, reset_timeout. Example: OUTBOUND_PROVIDERS_JSON={"gemini": {"concurrency": 4}}
+OUTBOUND_PROVIDERS = json.loads(os.getenv('OUTBOUND_PROVIDERS_JSON', '{}'))
+
+# ==========================================
+# AUDIT LOG (staffs.audit)
+# ==========================================
+# 'request' writes a request's entries with one INSERT when it finishes; 'background' hands them
+# to a writer thread that batches entries across requests (up to the interval's worth may be
+# lost if the process is killed).
+AUDIT_LOG_FLUSH = os.getenv('AUDIT_LOG_FLUSH', 'request')
+AUDIT_LOG_BATCH_SIZE = int(os.getenv('AUDIT_LOG_BATCH_SIZE', '500'))
+AUDIT_LOG_FLUSH_INTERVAL = float(os.getenv('AUDIT_LOG_FLUSH_INTERVAL', '2'))
+# `manage.py archive_audit_logs` moves whole months older than this to storage
+AUDIT_LOG_RETENTION_DAYS = int(os.getenv('AUDIT_LOG_RETENTION_DAYS', '180'))
+
+# ==========================================
+# LOGIN PROTECTION (ssm.login_protection)
+# ==========================================
+# Failed login counters live in their own local-memory cache, per process, so a burst of
+# attempts never reaches the database. 'default' is what Django would use anyway.
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'login_attempts': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'login-attempts',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+}
+# Sliding window (seconds) in which failed attempts are counted
+LOGIN_FAILURE_WINDOW = int(os.getenv('LOGIN_FAILURE_WINDOW', '900'))
+# Per account: free attempts, then a delay doubling from LOGIN_DELAY_BASE up to LOGIN_DELAY_MAX,
+# then a lockout after LOGIN_LOCKOUT_ATTEMPTS failures
+LOGIN_FREE_ATTEMPTS = int(os.getenv('LOGIN_FREE_ATTEMPTS', '3'))
+LOGIN_DELAY_BASE = float(os.getenv('LOGIN_DELAY_BASE', '1'))
+LOGIN_DELAY_MAX = float(os.getenv('LOGIN_DELAY_MAX', '60'))
+LOGIN_LOCKOUT_ATTEMPTS = int(os.getenv('LOGIN_LOCKOUT_ATTEMPTS', '10'))
+LOGIN_LOCKOUT_SECONDS = int(os.getenv('LOGIN_LOCKOUT_SECONDS', '900'))
+# Per client IP. Generous: a campus shares a few addresses
+LOGIN_IP_MAX_FAILURES = int(os.getenv('LOGIN_IP_MAX_FAILURES', '100'))
+# Number of reverse proxies that append to X-Forwarded-For (e.g. 1 behind Render's); 0 uses REMOTE_ADDR
+LOGIN_TRUSTED_PROXY_COUNT = int(os.getenv('LOGIN_TRUSTED_PROXY_COUNT', '0'))
+# Password hashes checked at once per process, and how long an attempt waits for a slot
+LOGIN_HASH_CONCURRENCY = int(os.getenv('LOGIN_HASH_CONCURRENCY', str(os.cpu_count() or 2)))
+LOGIN_HASH_QUEUE_TIMEOUT = float(os.getenv('LOGIN_HASH_QUEUE_TIMEOUT', '2'))
+
+# ==========================================
+# SESSIONS (ssm.sessions)
+# ==========================================
+# Sessions are read from Redis and written through to django_session (Django's cached_db
+# engine). Password reset OTPs, the current-user cache and the reference data counters share
+# this cache, so every worker must see the same one: REDIS_URL is required in production. With
+# DEBUG and no REDIS_URL an in-process fakeredis stands in, for local runs and tests.
+REDIS_URL = os.getenv('REDIS_URL', '')
+if not DEBUG and not REDIS_URL:
+    from django.core.exceptions import ImproperlyConfigured
+    raise ImproperlyConfigured(
+        'REDIS_URL must be set when DEBUG is off: sessions, password reset OTPs and the shared '
+        'caches would otherwise live in each worker process.'
+    )
+CACHES['sessions'] = {
+    'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+    'LOCATION': REDIS_URL or 'redis://localhost:6379/0',
+    'KEY_PREFIX': 'ssm',
+    'OPTIONS': {} if REDIS_URL else {'pool_class': 'ssm.sessions.FakeRedisConnectionPool'},
+}
+SESSION_ENGINE = 'ssm.sessions'
+SESSION_CACHE_ALIAS = 'sessions'
+# Expired django_session rows are deleted in the background at most this often (seconds; 0 = never,
+# leaving it to `manage.py clearsessions`)
+SESSION_PURGE_INTERVAL = int(os.getenv('SESSION_PURGE_INTERVAL', '3600'))
+
+# ==========================================
+# CURRENT USER (ssm.principals)
+# ==========================================
+# The logged-in Staff / Student rows are cached here for this many seconds; saves invalidate
+# them at once, so this only bounds how long raw SQL edits take to show
+PRINCIPAL_CACHE_ALIAS = 'sessions'
+PRINCIPAL_CACHE_TIMEOUT = int(os.getenv('PRINCIPAL_CACHE_TIMEOUT', '60'))
+
+# ==========================================
+# MOBILE REST API (api/, mounted at /api/v1/)
+# ==========================================
+# Rows per cursor page; clients may ask for up to API_MAX_PAGE_SIZE with ?page_size=
+API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', '50'))
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', '500'))
+
+# ==========================================
+# OFFLINE ATTENDANCE SYNC (staffs.attendance_sync)
+# ==========================================
+# Sheets accepted per sync request; the browser queue sends larger backlogs in several requests
+ATTENDANCE_SYNC_MAX_SHEETS = int(os.getenv('ATTENDANCE_SYNC_MAX_SHEETS', '50'))
+
+# ==========================================
+# SERVICE WORKER CACHING (ssm.precache, templates/sw.js)
+# ==========================================
+# Static files precached at install and served cache-first (paths relative to STATIC_URL)
+SW_PRECACHE_PREFIXES = ['css/', 'js/', 'imgs/', 'manifest.json']
+SW_PRECACHE_MAX_BYTES = int(os.getenv('SW_PRECACHE_MAX_BYTES', str(512 * 1024)))
+# JSON GETs answered from the device cache while a fresh copy is fetched; nothing else is cached at runtime
+SW_STALE_WHILE_REVALIDATE = ['/api/v1/news/', '/api/v1/student/timetable/', '/api/v1/staff/timetable/']
+# Third-party hosts of fonts, icons and libraries the pages load; cached with the static files
+SW_CACHE_FIRST_ORIGINS = [
+    'https://fonts.googleapis.com', 'https://fonts.gstatic.com', 'https://cdn.jsdelivr.net',
+    'https://code.jquery.com', 'https://unpkg.com', 'https://cdnjs.cloudflare.com', 'https://res.cloudinary.com',
+]
+
+# ==========================================
+# REFERENCE DATA BUNDLES (ssm.reference_data)
+# ==========================================
+# Holds the generation counters that tell every process to rebuild a bundle
+REFERENCE_DATA_CACHE_ALIAS = 'sessions'
+# Browser lifetime of a versioned bundle URL (seconds)
+REFERENCE_DATA_MAX_AGE = int(os.getenv('REFERENCE_DATA_MAX_AGE', str(365 * 24 * 3600)))
+
+# ==========================================
+# DIRECT UPLOADS (ssm.direct_uploads)
+# ==========================================
+# Largest file the browser may send straight to the bucket (bytes)
+DIRECT_UPLOAD_MAX_BYTES = int(os.getenv('DIRECT_UPLOAD_MAX_BYTES', str(10 * 1024 * 1024)))
+# Lifetime of a presigned upload URL (seconds); uploads never completed are pruned as long again after
+DIRECT_UPLOAD_URL_EXPIRY = int(os.getenv('DIRECT_UPLOAD_URL_EXPIRY', '900'))
+# Uploads one student or staff member may have started but not completed
+DIRECT_UPLOAD_MAX_PENDING = int(os.getenv('DIRECT_UPLOAD_MAX_PENDING', '20'))
+# Where files wait in the bucket until they are processed into their field
+DIRECT_UPLOAD_STAGING_PREFIX = 'uploads/staging/'
+# 'thread': process completed uploads in a pool in the web process; anything else leaves them
+# to `python manage.py process_direct_uploads`
+DIRECT_UPLOAD_JOB_RUNNER = os.getenv('DIRECT_UPLOAD_JOB_RUNNER', 'thread')
+DIRECT_UPLOAD_JOB_THREADS = int(os.getenv('DIRECT_UPLOAD_JOB_THREADS', '2'))
+# Seconds after which a processing upload is considered abandoned and claimed again
+DIRECT_UPLOAD_JOB_TIMEOUT = int(os.getenv('DIRECT_UPLOAD_JOB_TIMEOUT', '300'))
+# Days finished uploads are kept for their status page
+DIRECT_UPLOAD_KEEP_DAYS = int(os.getenv('DIRECT_UPLOAD_KEEP_DAYS', '30'))
+
+# ==========================================
+# DEPARTMENT RESEARCH ANALYTICS (staffs.utils)
+# ==========================================
+# Holds the cached summaries and the version counter that portfolio edits bump; it must be
+# shared by every worker, or the others keep serving stale analytics
+RESEARCH_METRICS_CACHE_ALIAS = 'sessions'
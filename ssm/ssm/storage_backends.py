@@ -3,7 +3,12 @@ Cloudflare R2 Storage Backend for Django
 Uses S3-compatible API to store files in Cloudflare R2
 """
 import os
+from django.core.files.storage import FileSystemStorage
 from storages.backends.s3boto3 import S3Boto3Storage
+from storages.utils import clean_name
+
+# Signs the URLs LocalBucketStorage hands out (ssm.direct_uploads.local_bucket_view checks them)
+LOCAL_BUCKET_SALT = 'ssm.storage_backends.LocalBucketStorage'
 
 
 class R2Storage(S3Boto3Storage):
@@ -27,3 +32,39 @@ class R2Storage(S3Boto3Storage):
     def __init__(self, **settings):
         super().__init__(**settings)
 
+    def presigned_upload(self, name, content_type, size, expires_in):
+        """
+        A URL the browser can PUT the object `name` to directly (ssm.direct_uploads).
+        Content-Type and Content-Length are signed, so the bucket refuses any other type or size.
+        R2 has no POST policies (HTML form uploads), hence a presigned PUT.
+        """
+        url = self.connection.meta.client.generate_presigned_url(
+            'put_object',
+            Params={
+                'Bucket': self.bucket_name,
+                'Key': self._normalize_name(clean_name(name)),
+                'ContentType': content_type,
+                'ContentLength': size,
+            },
+            ExpiresIn=expires_in,
+            HttpMethod='PUT',
+        )
+        return {'method': 'PUT', 'url': url, 'headers': {'Content-Type': content_type}}
+
+
+class LocalBucketStorage(FileSystemStorage):
+    """
+    Stand-in for the R2 bucket on the local disk (MEDIA_ROOT), for development and offline use.
+    Its presigned URLs point at ssm.direct_uploads.local_bucket_view, which plays the bucket.
+    """
+
+    def presigned_upload(self, name, content_type, size, expires_in):
+        from django.core import signing
+        from django.urls import reverse
+
+        token = signing.dumps({'key': name, 'content_type': content_type, 'size': size}, salt=LOCAL_BUCKET_SALT)
+        return {
+            'method': 'PUT',
+            'url': reverse('local_bucket_upload', args=[token]),
+            'headers': {'Content-Type': content_type},
+        }
@@ -0,0 +1,42 @@
+"""
+Test helpers for asserting the SQL cost of a request.
+
+Queries are counted with a connection execute_wrapper rather than CaptureQueriesContext,
+whose 9000-entry query log silently stops growing on the very views we want to catch.
+"""
+import contextlib
+
+from django.db import connections
+
+from .metrics import RequestStats
+
+# The same statement shape running more often than this in one request is treated as an N+1:
+# the seeded department has 120+ rows of everything, so a per-row query always exceeds it.
+DEFAULT_MAX_REPEATS = 10
+
+
+class QueryBudgetMixin:
+    """TestCase mixin adding assertQueryBudget."""
+
+    @contextlib.contextmanager
+    def assertQueryBudget(self, max_queries, max_repeats=DEFAULT_MAX_REPEATS, label=''):
+        """
+        Fails if the block runs more than max_queries statements, or any single normalised
+        statement shape more than max_repeats times. Yields the RequestStats being filled.
+        """
+        stats = RequestStats()
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats.db_wrapper))
+            yield stats
+
+        problems = []
+        if stats.query_count > max_queries:
+            problems.append(f'{stats.query_count} queries (budget {max_queries})')
+        worst = stats.repeated_shapes(limit=3)
+        if worst and worst[0][0] > max_repeats:
+            problems.append(f'the same query ran {worst[0][0]} times (limit {max_repeats})')
+        if problems:
+            lines = [f'{label or "Block"}: ' + ', '.join(problems) + '. Most repeated queries:']
+            lines += [f'  {count}x {shape[:300]}' for count, shape in worst]
+            self.fail('\n'.join(lines))
@@ -20,6 +20,10 @@ from django.views.generic import TemplateView
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
+from ssm.metrics import metrics_view
+from ssm.precache import service_worker_view
+from ssm.reference_data import reference_data_view
+from ssm import direct_uploads
 
 # Customize admin site
 admin.site.site_header = "Annamalai University"
@@ -31,10 +35,18 @@ urlpatterns = [
     path('', include('students.urls')),
     path('staffs/', include('staffs.urls')),
     path('api/auth/', include('authentication.urls')),
+    path('api/v1/', include(('api.urls', 'api'), namespace='v1')),  # Mobile REST API (api/views.py)
     path('webpush/', include('webpush.urls')),  # Added webpush URLS
-    path('sw.js', TemplateView.as_view(template_name='sw.js', content_type='application/javascript'), name='sw.js'),
+    path('sw.js', service_worker_view, name='sw.js'),
     path('.well-known/assetlinks.json', TemplateView.as_view(template_name='assetlinks.json', content_type='application/json'), name='assetlinks'),
     path('offline/', TemplateView.as_view(template_name='offline.html'), name='offline_page'),
+    path('metrics', metrics_view, name='metrics'),
+    path('reference/<slug:name>.<str:version>.<slug:fmt>', reference_data_view, name='reference_data'),
+    path('reference/<slug:name>.<slug:fmt>', reference_data_view, name='reference_data_latest'),
+    path('uploads/presign/', direct_uploads.presign_view, name='direct_upload_presign'),
+    path('uploads/<uuid:upload_id>/', direct_uploads.upload_status_view, name='direct_upload_status'),
+    path('uploads/<uuid:upload_id>/complete/', direct_uploads.complete_view, name='direct_upload_complete'),
+    path('uploads/local-bucket/<str:token>/', direct_uploads.local_bucket_view, name='local_bucket_upload'),
 ]
 
 # Serve static files in development
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class StaffsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'staffs'
+
+    def ready(self):
+        import staffs.signals
+        from ssm import reference_data
+        reference_data.warm()
@@ -0,0 +1,232 @@
+"""
+Batch sync for attendance sheets taken offline (static/js/attendance_queue.js).
+
+A sheet is one teacher's marks for one subject, date and class time:
+
+    {"key": "<uuid4>", "subject_id": 12, "date": "2026-10-19", "time": "08:30", "end_time": "09:30",
+     "is_extra_class": false, "marked_at": "2026-10-19T08:41:07Z",
+     "statuses": {"21IT001": "Present", "21IT002": "Absent", "21IT003": null}}
+
+apply_sheets() checks each sheet as manage_attendance checks its form, then applies all the
+accepted ones in one transaction and a fixed number of queries, however many sheets and
+students the batch holds. null clears a student's mark; students left out are not touched.
+
+Conflicts with marks already stored are settled per student by when the marks were taken: a
+sheet replaces a stored mark only if its marked_at is later than the mark's own (marked_at,
+or updated_at for marks saved online). Sheets in a batch are applied in (marked_at, key)
+order, so the outcome does not depend on the order they were queued or sent in.
+
+Each sheet's result is stored under its key (AttendanceSyncReceipt). Sending the key again
+returns that result, with "replayed": true, and changes nothing.
+"""
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime, parse_time
+
+STATUSES = ('Present', 'Absent')
+
+Sheet = namedtuple('Sheet', 'key subject_id date time end_time is_extra_class marked_at statuses')
+
+
+class SheetError(ValueError):
+    """A sheet (or batch) that is malformed; the message is reported back."""
+
+
+class SyncConflict(Exception):
+    """A concurrent sync or save wrote the same sheet or marks; nothing was applied, so the client retries."""
+
+
+def apply_sheets(staff, sheets):
+    """Applies `sheets` (decoded JSON) for `staff`; returns one result dict per sheet, in order."""
+    from .models import AttendanceSyncReceipt
+
+    if not isinstance(sheets, list):
+        raise SheetError('"sheets" must be a list.')
+    if len(sheets) > settings.ATTENDANCE_SYNC_MAX_SHEETS:
+        raise SheetError(f'At most {settings.ATTENDANCE_SYNC_MAX_SHEETS} sheets can be synced at once.')
+
+    now = timezone.now()
+    results = [None] * len(sheets)
+    parsed = {}
+    for index, raw in enumerate(sheets):
+        try:
+            sheet = _parse(raw, now)
+        except SheetError as e:
+            results[index] = _rejected(raw.get('key') if isinstance(raw, dict) else None, str(e))
+            continue
+        if any(other.key == sheet.key for other in parsed.values()):
+            results[index] = _rejected(str(sheet.key), 'The same key was sent twice in this batch.')
+            continue
+        parsed[index] = sheet
+
+    receipts = AttendanceSyncReceipt.objects.in_bulk([sheet.key for sheet in parsed.values()])
+    for index, sheet in list(parsed.items()):
+        receipt = receipts.get(sheet.key)
+        if receipt is None:
+            continue
+        del parsed[index]
+        if receipt.staff_id != staff.pk:
+            results[index] = _rejected(str(sheet.key), 'This key was already used by another account.')
+        else:
+            results[index] = dict(receipt.result, replayed=True)
+
+    accepted = _check(staff, parsed, results, now)
+    try:
+        with transaction.atomic():
+            _apply(accepted, results, now)
+            AttendanceSyncReceipt.objects.bulk_create([
+                AttendanceSyncReceipt(key=sheet.key, staff=staff, subject_id=sheet.subject_id, date=sheet.date, result=results[index])
+                for index, sheet in parsed.items()
+            ])
+    except IntegrityError as e:
+        raise SyncConflict('Another save changed these sheets at the same time. Sync again.') from e
+    return results
+
+
+def _parse(raw, now):
+    if not isinstance(raw, dict):
+        raise SheetError('Each sheet must be an object.')
+    try:
+        key = uuid.UUID(str(raw.get('key')))
+    except ValueError:
+        raise SheetError('The sheet has no valid key.')
+    invalid = SheetError('The sheet has an invalid subject, date, time or marked_at.')
+    try:
+        subject_id = int(raw.get('subject_id'))
+        date = parse_date(str(raw.get('date')))
+        time = parse_time(raw['time']) if raw.get('time') else None
+        end_time = parse_time(raw['end_time']) if raw.get('end_time') else None
+        marked_at = parse_datetime(raw['marked_at']) if raw.get('marked_at') else now
+    except (TypeError, ValueError):
+        raise invalid
+    if None in (date, marked_at) or (raw.get('time') and time is None) or (raw.get('end_time') and end_time is None):
+        raise invalid
+    if timezone.is_naive(marked_at):
+        marked_at = timezone.make_aware(marked_at)
+    statuses = raw.get('statuses')
+    if not isinstance(statuses, dict) or any(status not in STATUSES + (None,) for status in statuses.values()):
+        raise SheetError('"statuses" must map roll numbers to "Present", "Absent" or null.')
+    return Sheet(
+        key=key, subject_id=subject_id, date=date, time=time, end_time=end_time,
+        is_extra_class=bool(raw.get('is_extra_class')),
+        # A clock running ahead must not let a sheet win every later conflict
+        marked_at=min(marked_at, now),
+        statuses=statuses,
+    )
+
+
+def _check(staff, parsed, results, now):
+    """The rules manage_attendance applies to a form post, for every sheet at once (three queries)."""
+    from .models import ClassSubstitutionRequest, Subject, Timetable
+
+    subject_ids = {sheet.subject_id for sheet in parsed.values()}
+    dates = {sheet.date for sheet in parsed.values()}
+    subjects = Subject.objects.in_bulk(subject_ids)
+    substitutions = set(ClassSubstitutionRequest.objects.filter(
+        substitute=staff, status='Approved', subject_id__in=subject_ids, date__in=dates,
+    ).values_list('subject_id', 'date'))
+    scheduled = set(Timetable.objects.filter(subject_id__in=subject_ids).values_list('subject_id', 'semester', 'day'))
+
+    today = timezone.localdate(now)
+    accepted = {}
+    for index, sheet in parsed.items():
+        subject = subjects.get(sheet.subject_id)
+        if subject is None:
+            reason = 'The subject no longer exists.'
+        elif subject.staff_id != staff.pk and (sheet.subject_id, sheet.date) not in substitutions:
+            reason = f'You are not assigned to {subject.code}.'
+        elif sheet.date > today:
+            reason = f"Attendance cannot be marked for future date ({sheet.date:%d-%b-%Y})."
+        elif not sheet.is_extra_class and (subject.id, subject.semester, sheet.date.strftime('%A')) not in scheduled:
+            reason = f"{subject.code} is not scheduled on {sheet.date:%A}s. Mark it as an extra class."
+        else:
+            accepted[index] = (sheet, subject)
+            continue
+        results[index] = _rejected(str(sheet.key), reason)
+    return accepted
+
+
+def _apply(accepted, results, now):
+    """Settles the accepted sheets against the stored marks and writes the outcome (four to six queries)."""
+    from students.models import Student, StudentAttendance
+
+    if not accepted:
+        return
+    semesters = {subject.semester for _, subject in accepted.values()}
+    rolls = {roll for sheet, _ in accepted.values() for roll in sheet.statuses}
+    enrolled = dict(Student.objects.filter(roll_number__in=rolls, current_semester__in=semesters).values_list('roll_number', 'current_semester'))
+
+    # Locked, so a form save cannot change a mark between this read and the writes below
+    stored = {
+        (row.student_id, row.subject_id, row.date, row.time): row
+        for row in StudentAttendance.objects.select_for_update().filter(
+            student_id__in=enrolled,
+            subject_id__in={sheet.subject_id for sheet, _ in accepted.values()},
+            date__in={sheet.date for sheet, _ in accepted.values()},
+        )
+    }
+    # slot -> (status, end_time, marked_at) as the batch leaves it; status None means no mark
+    state = {}
+
+    for index, (sheet, subject) in sorted(accepted.items(), key=lambda item: (item[1][0].marked_at, str(item[1][0].key))):
+        result = {
+            'key': str(sheet.key), 'status': 'applied',
+            'created': 0, 'updated': 0, 'cleared': 0, 'unchanged': 0, 'kept_server': [], 'unknown_students': [],
+        }
+        for roll, status in sorted(sheet.statuses.items()):
+            if enrolled.get(roll) != subject.semester:
+                result['unknown_students'].append(roll)
+                continue
+            slot = (roll, subject.id, sheet.date, sheet.time)
+            if slot in state:
+                current = state[slot]
+            elif slot in stored:
+                row = stored[slot]
+                current = (row.status, row.end_time, row.marked_at or row.updated_at)
+            else:
+                current = (None, None, None)
+            current_status, current_end_time, current_marked_at = current
+
+            if current_status is not None and current_marked_at >= sheet.marked_at:
+                result['kept_server'].append(roll)
+            elif status is None:
+                result['cleared' if current_status is not None else 'unchanged'] += 1
+                state[slot] = (None, None, sheet.marked_at)
+            elif (current_status, current_end_time) == (status, sheet.end_time):
+                result['unchanged'] += 1
+            else:
+                result['updated' if current_status is not None else 'created'] += 1
+                state[slot] = (status, sheet.end_time, sheet.marked_at)
+        results[index] = result
+
+    creates, updates, deletes = [], [], []
+    for slot, (status, end_time, marked_at) in state.items():
+        row = stored.get(slot)
+        if status is None:
+            if row is not None:
+                deletes.append(row.pk)
+        elif row is None:
+            roll, subject_id, date, time = slot
+            creates.append(StudentAttendance(
+                student_id=roll, subject_id=subject_id, date=date, time=time,
+                end_time=end_time, status=status, marked_at=marked_at,
+            ))
+        else:
+            row.status, row.end_time, row.marked_at, row.updated_at = status, end_time, marked_at, now
+            updates.append(row)
+
+    if deletes:
+        StudentAttendance.objects.filter(pk__in=deletes).delete()
+    if updates:
+        # bulk_update does not apply auto_now, hence updated_at above (the mobile API's delta sync reads it)
+        StudentAttendance.objects.bulk_update(updates, ['status', 'end_time', 'marked_at', 'updated_at'], batch_size=1000)
+    if creates:
+        StudentAttendance.objects.bulk_create(creates, batch_size=1000)
+
+
+def _rejected(key, reason):
+    return {'key': key, 'status': 'rejected', 'reason': reason}
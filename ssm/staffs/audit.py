@@ -0,0 +1,88 @@
+"""
+Buffered audit trail writer for staffs.utils.log_audit.
+
+Entries made during a request are collected on the request and written with a single
+bulk_create once the response is ready (ssm.middleware.AuditLogMiddleware). With
+settings.AUDIT_LOG_FLUSH = 'background' the request instead hands them to a writer thread,
+which batches entries from many requests into one INSERT every AUDIT_LOG_FLUSH_INTERVAL
+seconds (or AUDIT_LOG_BATCH_SIZE entries). Entries made outside a request are written at once,
+or queued in background mode.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_queue = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def record(request, entry):
+    """Adds an unsaved AuditLog to the request's buffer, or flushes it when there is none."""
+    buffered = getattr(request, '_audit_entries', None)
+    if buffered is not None:
+        buffered.append(entry)
+    else:
+        flush([entry])
+
+
+def flush(entries):
+    if not entries:
+        return
+    if getattr(settings, 'AUDIT_LOG_FLUSH', 'request') == 'background':
+        _start_writer()
+        for entry in entries:
+            _queue.put(entry)
+    else:
+        write(entries)
+
+
+def write(entries):
+    from .models import AuditLog
+
+    try:
+        AuditLog.objects.bulk_create(entries, batch_size=settings.AUDIT_LOG_BATCH_SIZE)
+    except Exception as e:
+        # A lost audit entry must not fail the action it records
+        logger.error(f"Could not write {len(entries)} audit log entries: {e}")
+
+
+def drain():
+    """Waits until the background writer has written everything queued so far."""
+    if _writer is not None and _writer.is_alive():
+        _queue.join()
+
+
+atexit.register(drain)
+
+
+def _start_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_run_writer, name='audit-log-writer', daemon=True)
+            _writer.start()
+
+
+def _run_writer():
+    while True:
+        batch = [_queue.get()]
+        deadline = time.monotonic() + settings.AUDIT_LOG_FLUSH_INTERVAL
+        while len(batch) < settings.AUDIT_LOG_BATCH_SIZE:
+            try:
+                batch.append(_queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        try:
+            write(batch)
+        finally:
+            connections.close_all()
+            for _ in batch:
+                _queue.task_done()
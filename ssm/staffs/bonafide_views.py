@@ -2,6 +2,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import HttpResponse
+from ssm import principals
 from .models import Staff
 from students.models import BonafideRequest
 
@@ -73,7 +74,7 @@ def hod_bonafide_list(request):
         return redirect('staffs:stafflogin')
 
     try:
-        staff = Staff.objects.get(staff_id=request.session['staff_id'])
+        staff = principals.current_staff(request)
         print(f"DEBUG: Staff found: {staff.name} ({staff.role})")
     except Staff.DoesNotExist:
         print("DEBUG: Staff.DoesNotExist")
@@ -175,7 +176,7 @@ def office_bonafide_list(request):
         return redirect('staffs:stafflogin')
 
     try:
-        staff = Staff.objects.get(staff_id=request.session['staff_id'])
+        staff = principals.current_staff(request)
     except Staff.DoesNotExist:
         return redirect('staffs:stafflogin')
 
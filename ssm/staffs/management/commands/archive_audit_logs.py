@@ -0,0 +1,84 @@
+import datetime
+import gzip
+import json
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from staffs.models import AuditLog, AuditLogRollup
+
+
+class Command(BaseCommand):
+    help = (
+        'Moves audit log entries older than the retention period to storage, one gzipped JSON '
+        'lines file per month, and keeps their monthly counts in AuditLogRollup'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-days', type=int, default=settings.AUDIT_LOG_RETENTION_DAYS,
+            help='Keep entries from the last N days (default AUDIT_LOG_RETENTION_DAYS); only whole months before that are archived',
+        )
+        parser.add_argument('--prefix', default='audit_archive', help='Storage folder for the archive files')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows read and deleted per query (default 5000)')
+        parser.add_argument('--dry-run', action='store_true', help='Show what would be archived without archiving it')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.localtime(timezone.now() - datetime.timedelta(days=options['keep_days']))
+        before = cutoff.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        months = AuditLog.objects.filter(timestamp__lt=before).dates('timestamp', 'month')
+
+        if not months:
+            self.stdout.write(f'No audit log entries before {before:%Y-%m-%d} to archive.')
+            return
+
+        for month in months:
+            start = timezone.make_aware(datetime.datetime(month.year, month.month, 1))
+            end = timezone.make_aware(datetime.datetime(month.year + month.month // 12, month.month % 12 + 1, 1))
+            entries = AuditLog.objects.filter(timestamp__gte=start, timestamp__lt=end)
+            if options['dry_run']:
+                self.stdout.write(self.style.WARNING(f'DRY RUN: Would archive {entries.count()} entries from {month:%Y-%m}'))
+                continue
+
+            path, last_pk, count = self._write_archive(entries, month, options)
+            archived = entries.filter(pk__lte=last_pk)
+            with transaction.atomic():
+                for row in archived.values('action', 'actor_type').annotate(n=Count('pk')).order_by():
+                    rollup, _ = AuditLogRollup.objects.select_for_update().get_or_create(
+                        month=month, action=row['action'], actor_type=row['actor_type'],
+                    )
+                    AuditLogRollup.objects.filter(pk=rollup.pk).update(count=F('count') + row['n'], archive=path)
+                self._delete(archived, options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(f'Archived {count} entries from {month:%Y-%m} to {path}'))
+
+    def _write_archive(self, entries, month, options):
+        """Streams the month's entries into a gzipped JSON lines file and saves it to storage."""
+        count = 0
+        last_pk = 0
+        with tempfile.TemporaryFile() as tmp:
+            with gzip.GzipFile(fileobj=tmp, mode='wb') as gz:
+                for row in entries.order_by('pk').values().iterator(chunk_size=options['chunk_size']):
+                    gz.write(json.dumps(row, cls=DjangoJSONEncoder).encode() + b'\n')
+                    count += 1
+                    last_pk = row['id']
+            tmp.seek(0)
+            # Stamped with the run time: a month archived again (late entries) must not overwrite
+            # its first file, and the R2 storage overwrites existing names
+            name = f"{options['prefix']}/auditlog-{month:%Y-%m}-{timezone.now():%Y%m%d%H%M%S}.jsonl.gz"
+            path = default_storage.save(name, File(tmp))
+        return path, last_pk, count
+
+    @staticmethod
+    def _delete(entries, chunk_size):
+        while True:
+            pks = list(entries.order_by('pk').values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                return
+            AuditLog.objects.filter(pk__in=pks).delete()
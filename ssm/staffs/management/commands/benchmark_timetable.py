@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand
+from staffs.timetable_utils import TIMETABLE_DAYS, TIMETABLE_PERIODS, propagate_lab_blocks, plan_timetable_changes
+
+
+class _Row:
+    """Lightweight stand-in for a Timetable row so the planner can be timed without a database."""
+
+    def __init__(self, day, period, batch, subject=None, staff=None):
+        self.pk = f'{day}-{period}-{batch}'
+        self.day = day
+        self.period = period
+        self.batch = batch
+        self.subject = subject
+        self.staff = staff
+        self.subject_id = getattr(subject, 'pk', None)
+        self.staff_id = getattr(staff, 'pk', None)
+
+
+class _Subject:
+    pk = 1
+    code = 'BENCH'
+    staff = None
+
+
+class Command(BaseCommand):
+    help = 'Time the timetable lab propagation and change planning helpers on a full weekly grid'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=1000,
+            help='Number of times to run each helper (default 1000)',
+        )
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        grid = {day: {p: '' for p in TIMETABLE_PERIODS} for day in TIMETABLE_DAYS}
+        for day in TIMETABLE_DAYS:
+            grid[day][1] = '1'
+            grid[day][5] = 'LAB_SESSION'
+            grid[day][4] = 'PLACEMENT'
+        lab_grid = {(day, 5): ('1', '1') for day in TIMETABLE_DAYS}
+        subjects_by_id = {'1': _Subject()}
+        existing = [_Row(day, p, 'All', subject=_Subject()) for day in TIMETABLE_DAYS for p in TIMETABLE_PERIODS]
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            propagated = propagate_lab_blocks(grid, {'1'})
+        propagate_ms = (time.perf_counter() - start) * 1000 / iterations
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            plan = plan_timetable_changes(existing, propagated, lab_grid, 'All', subjects_by_id, _Row)
+        plan_ms = (time.perf_counter() - start) * 1000 / iterations
+
+        self.stdout.write(f'propagate_lab_blocks: {propagate_ms:.4f} ms/run')
+        self.stdout.write(
+            f'plan_timetable_changes: {plan_ms:.4f} ms/run '
+            f'({len(plan.creates)} creates, {len(plan.updates)} updates, {len(plan.deletes)} deletes)'
+        )
+        self.stdout.write(self.style.SUCCESS(f'Benchmarked {iterations} iteration(s)'))
@@ -31,7 +31,7 @@ class Command(BaseCommand):
             for news in expired_news:
                 self.stdout.write(f'  - {news.content[:50]}... (end date: {news.end_date})')
         else:
-            expired_news.update(is_active=False)
+            expired_news.update(is_active=False, updated_at=timezone.now())
             self.stdout.write(
                 self.style.SUCCESS(f'Successfully disabled {count} expired news item(s)')
             )
@@ -0,0 +1,83 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from staffs.synthetic import delete_department, seed_department
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a synthetic department (staff, subjects, timetables, students with full profiles, multi-year '
+        'marks and attendance, leave/bonafide/scholarship requests, staff portfolios) for load tests'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--semesters', type=int, default=8)
+        parser.add_argument('--students-per-semester', type=int, default=120)
+        parser.add_argument('--subjects', type=int, default=60, help='Total subjects, spread evenly across semesters (default 60)')
+        parser.add_argument('--staff', type=int, default=24, help='Total staff including the HOD and class incharges (default 24)')
+        parser.add_argument('--attendance-days', type=int, default=90, help='Weekdays of attendance history (default 90, one semester)')
+        parser.add_argument('--history-years', type=int, default=1, help='Years of earlier semesters (attendance, marks, GPA) per student (default 1)')
+        parser.add_argument('--scholars', type=int, default=12, help='PhD scholars with supervisors and co-authored papers (default 12)')
+        parser.add_argument(
+            '--scale', type=int, default=1,
+            help='Multiply students, staff and scholars, e.g. --scale 10 for ten times the default department',
+        )
+        parser.add_argument('--no-profiles', action='store_true', help='Skip the one-to-one student profile models')
+        parser.add_argument('--no-workflows', action='store_true', help='Skip leave, bonafide and scholarship requests')
+        parser.add_argument('--no-portfolios', action='store_true', help='Skip staff publications, books and patents')
+        parser.add_argument('--academic-year', default='2026-2027')
+        parser.add_argument('--prefix', default='SYN', help='Prefix for every generated id, used to find or remove the data later')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--replace', action='store_true', help='Delete existing data with the same prefix first')
+        parser.add_argument('--password', default=None, help='Password for every generated account (default: a random one, printed at the end)')
+        parser.add_argument(
+            '--allow-non-debug', action='store_true',
+            help='Run even though DEBUG is off. The generated accounts include a HOD that can log in to the real site',
+        )
+
+    def handle(self, *args, **options):
+        from staffs.models import Staff
+
+        if not settings.DEBUG and not options['allow_non_debug']:
+            raise CommandError(
+                'DEBUG is off, so this may be a production database. Pass --allow-non-debug to seed it anyway.'
+            )
+        prefix = options['prefix']
+        scale = options['scale']
+        if scale < 1:
+            raise CommandError('--scale must be at least 1.')
+        if Staff.objects.filter(staff_id__startswith=prefix).exists():
+            if not options['replace']:
+                raise CommandError(f"Synthetic data with prefix '{prefix}' already exists. Use --replace to regenerate it.")
+            delete_department(prefix)
+            self.stdout.write(f"Removed existing '{prefix}' data")
+
+        start = time.perf_counter()
+        with transaction.atomic():
+            dept = seed_department(
+                semesters=options['semesters'],
+                students_per_semester=options['students_per_semester'] * scale,
+                subjects_total=options['subjects'],
+                staff_count=options['staff'] * scale,
+                attendance_days=options['attendance_days'],
+                academic_year=options['academic_year'],
+                history_years=options['history_years'],
+                scholars=options['scholars'] * scale,
+                with_profiles=not options['no_profiles'],
+                with_workflows=not options['no_workflows'],
+                with_portfolios=not options['no_portfolios'],
+                prefix=prefix,
+                batch_size=options['batch_size'],
+                password=options['password'],
+            )
+        elapsed = time.perf_counter() - start
+
+        for label, rows in dept.counts.items():
+            self.stdout.write(f'  {label:<36}{rows:>12,}')
+        self.stdout.write(f'{sum(dept.counts.values()):,} rows in {elapsed:.1f}s')
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded '{prefix}' department. Log in as {dept.hod.staff_id} or any {prefix}* student with password '{dept.password}'"
+        ))
@@ -0,0 +1,199 @@
+import contextlib
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings
+
+from ssm import loadtest
+
+DEFAULT_BASELINE_DIR = Path(settings.BASE_DIR) / 'benchmarks' / 'baselines'
+
+
+class Command(BaseCommand):
+    help = (
+        'Run a load-test scenario (attendance_rush, result_day, ai_burst) and report p50/p95/p99 latency, '
+        'throughput and queries per request, optionally against the stored baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=sorted(loadtest.SCENARIOS))
+        parser.add_argument(
+            '--concurrency', type=int, default=16,
+            help='Requests in flight (default 16): worker threads for the client and server transports, tasks on one event loop for asgi',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Client transport: cap the worker threads at this many, so --transport client asgi compares '
+                 'N sync workers with one event loop under the same offered load',
+        )
+        parser.add_argument('--rounds', type=int, default=1, help='Times to replay the scenario (default 1)')
+        parser.add_argument('--users', type=int, default=None, help='result_day: number of students (default all)')
+        parser.add_argument('--no-warm-up', action='store_true', help='Include first-connection cost in the timings')
+        parser.add_argument(
+            '--transport', nargs='+', choices=sorted(loadtest.TRANSPORTS), default=['client'],
+            help='client (sync, a thread per request in flight), asgi (one event loop) or server; give several to compare them',
+        )
+        parser.add_argument(
+            '--upstream-latency', type=float, default=1.5,
+            help='ai_burst: seconds the stand-in Gemini takes to answer (default 1.5)',
+        )
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000', help='Server transport: address of the running site')
+        parser.add_argument(
+            '--use-existing', action='store_true',
+            help='Use data from generate_synthetic_data in the configured database instead of a throwaway test database',
+        )
+        parser.add_argument('--prefix', default='SYN')
+        parser.add_argument('--semesters', type=int, default=8)
+        parser.add_argument('--students-per-semester', type=int, default=120)
+        parser.add_argument('--subjects', type=int, default=60)
+        parser.add_argument('--staff', type=int, default=24)
+        parser.add_argument('--attendance-days', type=int, default=90)
+        parser.add_argument(
+            '--db-connections', nargs='+', choices=loadtest.DB_CONNECTION_MODES, default=None,
+            help='Client and asgi transports: connection handling to use (default: settings, or pool for asgi); '
+                 'give several (e.g. per-request persistent pool) to compare them',
+        )
+        parser.add_argument('--baseline-dir', default=str(DEFAULT_BASELINE_DIR))
+        parser.add_argument('--save-baseline', action='store_true', help='Store this run as the new baseline')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed p95 slowdown before flagging (default 0.25)')
+        parser.add_argument('--fail-on-regression', action='store_true', help='Exit non-zero when the run regresses')
+        parser.add_argument('--json', dest='json_path', help='Also write the full result to this file')
+
+    def handle(self, *args, **options):
+        transports = options['transport']
+        if 'server' in transports and not options['use_existing']:
+            raise CommandError('The server transport needs --use-existing: the server must already hold the synthetic data.')
+
+        modes = options['db_connections']
+        if modes and 'server' in transports:
+            raise CommandError('--db-connections does not apply to the server transport; configure a running server through its settings.')
+        if options['save_baseline'] and (len(transports) > 1 or len(modes or []) > 1):
+            raise CommandError('Save a baseline from a single --transport and --db-connections mode.')
+
+        if options['use_existing']:
+            results = self._run(options)
+        else:
+            results = self._run_in_test_database(options)
+
+        if len(results) > 1:
+            for result in results:
+                self.stdout.write(loadtest.format_report(result))
+            self.stdout.write(loadtest.format_comparison(results))
+            if options['json_path']:
+                with open(options['json_path'], 'w') as fh:
+                    json.dump(results, fh, indent=2, sort_keys=True)
+            return
+
+        result = results[0]
+        baseline_path = Path(options['baseline_dir']) / f"{options['scenario']}.json"
+        baseline = loadtest.load_baseline(baseline_path)
+        self.stdout.write(loadtest.format_report(result, baseline))
+        if result.get('first_error'):
+            self.stderr.write(f"First error: {result['first_error']}")
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(result, fh, indent=2, sort_keys=True)
+
+        if options['save_baseline']:
+            loadtest.save_baseline(baseline_path, result)
+            self.stdout.write(self.style.SUCCESS(f'Saved baseline to {baseline_path}'))
+            return
+
+        if baseline:
+            regressions = loadtest.compare_with_baseline(result, baseline, latency_tolerance=options['tolerance'])
+            for line in regressions:
+                self.stdout.write(self.style.WARNING(f'Regression: {line}'))
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS(f"No regressions against baseline {baseline['environment']['git_commit'] or ''}"))
+            elif options['fail_on_regression']:
+                sys.exit(1)
+
+    def _run_in_test_database(self, options):
+        from django.test.utils import setup_databases, teardown_databases
+        from staffs.synthetic import seed_department
+
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'}, serialized_aliases=set())
+        try:
+            start = time.perf_counter()
+            seed_department(
+                semesters=options['semesters'],
+                students_per_semester=options['students_per_semester'],
+                subjects_total=options['subjects'],
+                staff_count=options['staff'],
+                attendance_days=options['attendance_days'],
+                prefix=options['prefix'],
+            )
+            self.stdout.write(f'Seeded test database in {time.perf_counter() - start:.1f}s')
+            return self._run(options)
+        finally:
+            connections.close_all()
+            teardown_databases(old_config, verbosity=0)
+
+    def _run(self, options):
+        from staffs.synthetic import SyntheticDepartment
+        from students import resume_jobs
+
+        transports = options['transport']
+        try:
+            dept = SyntheticDepartment.from_database(options['prefix'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        scenario = loadtest.SCENARIOS[options['scenario']]
+        if not scenario(dept, users=options['users']):
+            raise CommandError('The scenario produced no requests for this data set.')
+
+        # Query counts are in the report; per-request budget warnings would only drown it out
+        middleware_logger = logging.getLogger('ssm.middleware')
+        previous_level = middleware_logger.level
+        middleware_logger.setLevel(logging.ERROR)
+        results = []
+        try:
+            with contextlib.ExitStack() as stack:
+                # A running server calls whatever its own GEMINI_BASE_URL points at
+                if options['scenario'] in loadtest.SIMULATED_UPSTREAM_SCENARIOS and transports != ['server']:
+                    stack.enter_context(loadtest.simulated_gemini(options['upstream_latency']))
+                stack.enter_context(override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']))
+                for transport in transports:
+                    # ASGI runs each request's ORM work on a fresh thread, where only a pool reuses connections
+                    modes = options['db_connections'] or (['pool'] if transport == 'asgi' else ['settings'])
+                    concurrency = options['concurrency']
+                    if transport == 'client' and options['workers']:
+                        concurrency = min(concurrency, options['workers'])
+                    for mode in modes:
+                        requests = scenario(dept, users=options['users'], run=len(results))
+                        with loadtest.db_connection_mode(mode, pool_max_size=concurrency) as connection_stats:
+                            result, _ = loadtest.run_load(
+                                requests,
+                                transport=transport,
+                                concurrency=concurrency,
+                                rounds=options['rounds'],
+                                warm_up=not options['no_warm_up'],
+                                base_url=options['base_url'],
+                            )
+                            if options['scenario'] in loadtest.SIMULATED_UPSTREAM_SCENARIOS:
+                                # Resume generations finish in the background; let them land before the next run
+                                resume_jobs.wait_for_jobs()
+                        if mode != 'settings':
+                            result['db_connections'] = connection_stats
+                        results.append(result)
+        finally:
+            middleware_logger.setLevel(previous_level)
+
+        for result in results:
+            result['scenario'] = options['scenario']
+            result['dataset'] = {
+                'prefix': options['prefix'],
+                'students': sum(len(v) for v in dept.students_by_semester.values()),
+                'subjects': len(dept.subjects),
+                'attendance_days': None if options['use_existing'] else options['attendance_days'],
+            }
+            result['environment'] = loadtest.environment_info()
+        return results
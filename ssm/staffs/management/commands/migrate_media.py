@@ -0,0 +1,94 @@
+import os
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, storages
+from django.core.management.base import BaseCommand, CommandError
+
+from ssm import media_migration
+from ssm.media_migration import MB
+
+
+class Command(BaseCommand):
+    help = (
+        'Copies the files under MEDIA_ROOT that the database refers to into a storage (R2 by default), '
+        'in parallel and verified, and rewrites the rows whose names change. Resumable: a rerun skips '
+        'the files already copied. Replaces migrate_to_r2.py.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--to', default='default', help='STORAGES alias to copy into (default "default")')
+        parser.add_argument('--source', default=None, help='Folder the names are relative to (default MEDIA_ROOT)')
+        parser.add_argument(
+            '--state-dir', default=os.path.join(settings.BASE_DIR, 'media_migration'),
+            help='Where the manifest and checkpoint are kept between runs',
+        )
+        parser.add_argument(
+            '--rekey', action='store_true',
+            help="Store files under the name their field's upload_to gives now, and rewrite the rows",
+        )
+        parser.add_argument('--workers', type=int, default=8, help='Files copied at once (default 8)')
+        parser.add_argument('--multipart-threshold', type=int, default=8, help='S3: files from this many MB upload in parts (default 8)')
+        parser.add_argument('--chunk-size', type=int, default=8, help='S3: part size in MB (default 8)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows rewritten per bulk_update (default 500)')
+        parser.add_argument('--fresh', action='store_true', help='Discard the saved manifest and checkpoint and start over')
+        parser.add_argument('--dry-run', action='store_true', help='Show what would be copied and rewritten without doing it')
+
+    def handle(self, *args, **options):
+        source = options['source'] or settings.MEDIA_ROOT
+        state_dir = options['state_dir']
+        dry_run = options['dry_run']
+        storage = storages[options['to']]
+        if isinstance(storage, FileSystemStorage) and os.path.realpath(storage.location) == os.path.realpath(source):
+            raise CommandError(f'Storage "{options["to"]}" already keeps its files in {source}.')
+
+        if options['fresh'] and not dry_run:
+            for name in (media_migration.MANIFEST_NAME, media_migration.CHECKPOINT_NAME):
+                if os.path.exists(os.path.join(state_dir, name)):
+                    os.remove(os.path.join(state_dir, name))
+        manifest = None if options['fresh'] else media_migration.load_manifest(state_dir)
+        if manifest is None:
+            manifest = media_migration.build_manifest(source, rekey=options['rekey'])
+            if not dry_run:
+                media_migration.save_manifest(state_dir, *manifest)
+        else:
+            self.stdout.write(f'Resuming with the manifest in {state_dir} (--fresh to rebuild it).')
+        entries, missing = manifest
+
+        copied = media_migration.load_checkpoint(state_dir)
+        pairs = media_migration.pending(entries, copied, source)
+        sizes = {entry.name: entry.size for entry in entries}
+        self.stdout.write(
+            f'{len(entries)} file reference(s), {len(missing)} missing locally; '
+            f'{len(pairs)} file(s) to copy ({sum(sizes[name] for name, _ in pairs) / MB:.1f} MB), '
+            f'{len({entry.key for entry in entries}) - len(pairs)} already copied.'
+        )
+        if options['verbosity'] > 1:
+            for name in missing:
+                self.stdout.write(self.style.WARNING(f'  [MISSING] {name}'))
+
+        if dry_run:
+            for name, key in pairs:
+                self.stdout.write(f'  [DRY RUN] {name} -> {key}')
+            rows = media_migration.rewrite_names(entries, copied, options['batch_size'], dry_run=True)
+            self.stdout.write(self.style.SUCCESS(f'Dry run: {len(pairs)} file(s) would be copied and {rows} row(s) rewritten.'))
+            return
+
+        destination = media_migration.destination_for(
+            storage, options['multipart_threshold'] * MB, options['chunk_size'] * MB,
+        )
+        failed = media_migration.copy_files(
+            pairs, source, destination, state_dir, workers=options['workers'],
+            progress=lambda name, key, error: self._progress(name, key, error, options['verbosity']),
+        )
+        rows = media_migration.rewrite_names(entries, media_migration.load_checkpoint(state_dir), options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Copied {len(pairs) - len(failed)} file(s), {len(failed)} failed; rewrote {rows} row(s).'
+        ))
+        if failed:
+            raise CommandError(f'{len(failed)} file(s) were not copied; run the command again to retry them.')
+
+    def _progress(self, name, key, error, verbosity):
+        if error:
+            self.stderr.write(f'  [ERROR] {name} -> {key}: {error}')
+        elif verbosity > 1:
+            self.stdout.write(f'  [COPIED] {name} -> {key}')
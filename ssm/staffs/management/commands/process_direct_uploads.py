@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ssm import direct_uploads
+
+# Seconds between sweeps of expired and finished uploads while polling
+PRUNE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = (
+        'Processes files uploaded straight to the bucket into their fields, and prunes expired '
+        'uploads. Use with DIRECT_UPLOAD_JOB_RUNNER=worker so the web processes only queue them; '
+        'several workers can run side by side.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the uploads waiting now, then exit')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to wait when the queue is empty (default 2)')
+
+    def handle(self, *args, **options):
+        processed = 0
+        pruned_at = None
+        while True:
+            if pruned_at is None or time.monotonic() - pruned_at >= PRUNE_INTERVAL:
+                pruned = direct_uploads.prune()
+                pruned_at = time.monotonic()
+                if pruned:
+                    self.stdout.write(f'Pruned {pruned} expired or finished upload(s)')
+            upload_id = direct_uploads.run_next_job()
+            if upload_id is not None:
+                processed += 1
+                self.stdout.write(f'Processed direct upload {upload_id}')
+                continue
+            if options['once']:
+                break
+            # Like the request cycle: drop connections past CONN_MAX_AGE or broken while idle
+            close_old_connections()
+            time.sleep(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} upload(s).'))
@@ -0,0 +1,118 @@
+# Generated by Django 5.1.7 on 2026-10-19 15:18
+
+import json
+
+from django.db import migrations, models
+
+# Frozen copies of staffs.timetable_utils' snapshot helpers as of this migration, so later
+# changes to them cannot change what it does on a fresh database
+TIMETABLE_DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+
+
+def snapshot_key(day, period, batch):
+    return f"{day}|{period}|{batch}"
+
+
+def _snapshot_sort_key(key):
+    day, period, batch = key.split('|')
+    day_index = TIMETABLE_DAYS.index(day) if day in TIMETABLE_DAYS else len(TIMETABLE_DAYS)
+    return (day_index, int(period), batch)
+
+
+def _cell_label(item):
+    label = item.get('subject_code') or 'Slot'
+    if item.get('staff_name'):
+        label += f" · {item['staff_name']}"
+    return label
+
+
+def diff_timetable_snapshots(previous, current):
+    previous = previous or {}
+    current = current or {}
+    return {
+        'added': [[k, _cell_label(current[k])] for k in sorted(current.keys() - previous.keys(), key=_snapshot_sort_key)],
+        'removed': [[k, _cell_label(previous[k])] for k in sorted(previous.keys() - current.keys(), key=_snapshot_sort_key)],
+        'changed': [
+            [k, _cell_label(previous[k]), _cell_label(current[k])]
+            for k in sorted(current.keys() & previous.keys(), key=_snapshot_sort_key)
+            if current[k] != previous[k]
+        ],
+    }
+
+
+def legacy_snapshot_key(item):
+    """The snapshot key of a legacy entry, or None for one that is not a grid cell."""
+    if not isinstance(item, dict) or item.get('day') not in TIMETABLE_DAYS:
+        return None
+    try:
+        period = int(item.get('period'))
+    except (TypeError, ValueError):
+        return None
+    if not 1 <= period <= 7:
+        return None
+    return snapshot_key(item['day'], period, item.get('batch') or 'All')
+
+
+def convert_legacy_snapshots(apps, schema_editor):
+    """Moves the old list-of-entries JSON text into the keyed snapshot and backfills each version's diff."""
+    PublishedTimetableVersion = apps.get_model('staffs', 'PublishedTimetableVersion')
+    previous_by_semester = {}
+    for ver in PublishedTimetableVersion.objects.order_by('published_at', 'pk'):
+        try:
+            items = json.loads(ver.timetable_data_json or '[]')
+        except ValueError:
+            items = []
+        snapshot = {}
+        for item in items if isinstance(items, list) else []:
+            # Hand-edited or truncated rows are dropped rather than failing the migration
+            key = legacy_snapshot_key(item)
+            if key is None:
+                continue
+            snapshot[key] = {field: item.get(field, '') for field in (
+                'subject_code', 'subject_name', 'subject_type', 'staff_name', 'staff_id', 'location_name'
+            )}
+        group = (ver.academic_year, ver.semester)
+        ver.snapshot = snapshot
+        ver.snapshot_diff = diff_timetable_snapshots(previous_by_semester.get(group, {}), snapshot)
+        ver.save(update_fields=['snapshot', 'snapshot_diff'])
+        previous_by_semester[group] = snapshot
+
+
+def restore_legacy_snapshots(apps, schema_editor):
+    PublishedTimetableVersion = apps.get_model('staffs', 'PublishedTimetableVersion')
+    for ver in PublishedTimetableVersion.objects.all():
+        items = []
+        for key, cell in (ver.snapshot or {}).items():
+            day, period, batch = key.split('|')
+            items.append(dict(cell, day=day, period=int(period), batch=batch))
+        ver.timetable_data_json = json.dumps(items)
+        ver.save(update_fields=['timetable_data_json'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staffs', '0074_bookpublication_students_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='publishedtimetableversion',
+            name='snapshot',
+            field=models.JSONField(blank=True, default=dict, help_text="Saved grid cells keyed by 'Day|Period|Batch'"),
+        ),
+        migrations.AddField(
+            model_name='publishedtimetableversion',
+            name='snapshot_diff',
+            field=models.JSONField(blank=True, default=dict, help_text='Cells added, removed and changed since the previous version'),
+        ),
+        migrations.RunPython(convert_legacy_snapshots, reverse_code=restore_legacy_snapshots),
+        migrations.RemoveField(
+            model_name='publishedtimetableversion',
+            name='timetable_data_json',
+        ),
+        migrations.AddIndex(
+            model_name='publishedtimetableversion',
+            index=models.Index(fields=['academic_year', 'semester', '-published_at'], name='staffs_ttver_year_sem_idx'),
+        ),
+    ]
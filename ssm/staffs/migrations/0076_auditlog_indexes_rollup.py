@@ -0,0 +1,55 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:17
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staffs', '0075_timetable_version_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditLogRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('action', models.CharField(choices=[('login', 'Login'), ('logout', 'Logout'), ('create', 'Create'), ('update', 'Update'), ('delete', 'Delete'), ('view', 'View'), ('other', 'Other')], max_length=20)),
+                ('actor_type', models.CharField(blank=True, choices=[('admin', 'Admin'), ('staff', 'Staff'), ('student', 'Student'), ('system', 'System')], max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('archive', models.CharField(blank=True, help_text='Storage path of the archived entries', max_length=255)),
+            ],
+            options={
+                'verbose_name': 'Audit Log Rollup',
+                'ordering': ['-month', 'action', 'actor_type'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='auditlog',
+            name='action',
+            field=models.CharField(choices=[('login', 'Login'), ('logout', 'Logout'), ('create', 'Create'), ('update', 'Update'), ('delete', 'Delete'), ('view', 'View'), ('other', 'Other')], default='other', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='auditlog',
+            name='timestamp',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['action', '-timestamp'], name='staffs_audit_action_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['actor_type', 'actor_id', '-timestamp'], name='staffs_audit_actor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['object_type', 'object_id', '-timestamp'], name='staffs_audit_object_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='auditlogrollup',
+            unique_together={('month', 'action', 'actor_type')},
+        ),
+    ]
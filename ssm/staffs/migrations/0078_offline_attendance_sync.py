@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staffs', '0077_sync_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceSyncReceipt',
+            fields=[
+                ('key', models.UUIDField(primary_key=True, serialize=False)),
+                ('date', models.DateField(blank=True, null=True)),
+                ('result', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('staff', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_sync_receipts', to='staffs.staff')),
+                ('subject', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='staffs.subject')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
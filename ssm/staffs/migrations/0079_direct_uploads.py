@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-19 18:02
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staffs', '0078_offline_attendance_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirectUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('owner_type', models.CharField(choices=[('student', 'Student'), ('staff', 'Staff')], max_length=10)),
+                ('owner_id', models.CharField(help_text='Roll number or staff ID', max_length=50)),
+                ('target', models.CharField(max_length=40)),
+                ('field', models.CharField(max_length=60)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('key', models.CharField(help_text='Staging object in the bucket', max_length=255)),
+                ('filename', models.CharField(max_length=255)),
+                ('content_type', models.CharField(max_length=100)),
+                ('size', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('pending', 'Waiting for upload'), ('uploaded', 'Uploaded'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('stored_name', models.CharField(blank=True, help_text='Where the processed file was stored', max_length=255)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(help_text='The presigned URL stops working at this time')),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='staffs_upload_queue_idx'), models.Index(fields=['owner_type', 'owner_id', 'status'], name='staffs_upload_owner_idx')],
+            },
+        ),
+    ]
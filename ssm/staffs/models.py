@@ -1,4 +1,7 @@
+import uuid
+
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.hashers import make_password, check_password
 from ssm.validators import validate_file_size
 from ssm.upload_paths import (
@@ -122,6 +125,20 @@ class Staff(models.Model):
     )
 
     def get_roles_list(self):
+        return list(self._parsed_roles()[0])
+
+    def has_role(self, role_name):
+        return role_name in self._parsed_roles()[1]
+
+    def _parsed_roles(self):
+        """
+        The roles as an ordered tuple and a set, parsed once per instance. Re-parsed when one of
+        the fields they come from changes, so an edited instance never reports stale roles.
+        """
+        source = (self.role, self.secondary_roles, self.is_scholarship_officer, self.is_timetable_incharge, self.is_admin)
+        cached = self.__dict__.get('_roles_cache')
+        if cached is not None and cached[0] == source:
+            return cached[1]
         roles = []
         if self.role:
             roles.append(self.role)
@@ -136,10 +153,9 @@ class Staff(models.Model):
             roles.append('Timetable Incharge')
         if self.is_admin and 'Admin' not in roles:
             roles.append('Admin')
-        return roles
-
-    def has_role(self, role_name):
-        return role_name in self.get_roles_list()
+        parsed = (tuple(roles), frozenset(roles))
+        self._roles_cache = (source, parsed)
+        return parsed
 
     @property
     def is_hod(self):
@@ -305,7 +321,12 @@ class Staff(models.Model):
         self.password = make_password(raw_password)
 
     def check_password(self, raw_password):
-        return check_password(raw_password, self.password)
+        # A hash made with an older hasher or fewer iterations is upgraded on a successful check
+        return check_password(raw_password, self.password, setter=self._upgrade_password)
+
+    def _upgrade_password(self, raw_password):
+        self.set_password(raw_password)
+        Staff.objects.filter(pk=self.pk).update(password=self.password)
 
     def __str__(self):
         return f"{self.salutation} {self.name}"
@@ -798,10 +819,14 @@ class PublishedTimetableVersion(models.Model):
     published_by = models.ForeignKey(Staff, on_delete=models.SET_NULL, null=True, blank=True)
     published_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True, help_text="Is current active published version")
-    timetable_data_json = models.TextField(default='{}', help_text="JSON snapshot of saved timetable grid entries")
+    snapshot = models.JSONField(default=dict, blank=True, help_text="Saved grid cells keyed by 'Day|Period|Batch'")
+    snapshot_diff = models.JSONField(default=dict, blank=True, help_text="Cells added, removed and changed since the previous version")
 
     class Meta:
         ordering = ['-published_at']
+        indexes = [
+            models.Index(fields=['academic_year', 'semester', '-published_at'], name='staffs_ttver_year_sem_idx'),
+        ]
 
     def __str__(self):
         return f"Sem {self.semester} ({self.from_date} to {self.to_date}) - {self.version_name}"
@@ -858,6 +883,7 @@ class News(models.Model):
     start_date = models.DateField(null=True, blank=True, help_text="Date when this announcement should start showing")
     end_date = models.DateField(null=True, blank=True, help_text="Date when this announcement should stop showing")
     is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     # Document upload
     document = models.FileField(
@@ -932,8 +958,9 @@ class AuditLog(models.Model):
         ('student', 'Student'),
         ('system', 'System'),
     ]
-    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
-    action = models.CharField(max_length=20, choices=ACTION_CHOICES, default='other', db_index=True)
+    # Set when the entry is made, not when the buffered entry reaches the table (staffs.audit)
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
+    action = models.CharField(max_length=20, choices=ACTION_CHOICES, default='other')
     actor_type = models.CharField(max_length=20, choices=ACTOR_TYPE_CHOICES, blank=True)
     actor_id = models.CharField(max_length=100, blank=True, help_text="Staff ID, roll no, or username")
     actor_name = models.CharField(max_length=255, blank=True)
@@ -948,11 +975,36 @@ class AuditLog(models.Model):
         ordering = ['-timestamp']
         verbose_name = 'Audit Log'
         verbose_name_plural = 'Audits / Logs'
+        # Lookups filter on one column and read the newest rows first, so each index ends in
+        # timestamp. Rows older than AUDIT_LOG_RETENTION_DAYS are archived a month at a time
+        # (archive_audit_logs), which keeps the table, and these indexes, bounded.
+        indexes = [
+            models.Index(fields=['action', '-timestamp'], name='staffs_audit_action_idx'),
+            models.Index(fields=['actor_type', 'actor_id', '-timestamp'], name='staffs_audit_actor_idx'),
+            models.Index(fields=['object_type', 'object_id', '-timestamp'], name='staffs_audit_object_idx'),
+        ]
 
     def __str__(self):
         return f"{self.timestamp} | {self.get_action_display()} | {self.actor_type}:{self.actor_id or '—'} | {self.message[:50] or '—'}"
 
 
+class AuditLogRollup(models.Model):
+    """Monthly audit entry counts, kept after archive_audit_logs moves the entries to storage."""
+    month = models.DateField(help_text="First day of the month")
+    action = models.CharField(max_length=20, choices=AuditLog.ACTION_CHOICES)
+    actor_type = models.CharField(max_length=20, choices=AuditLog.ACTOR_TYPE_CHOICES, blank=True)
+    count = models.PositiveIntegerField(default=0)
+    archive = models.CharField(max_length=255, blank=True, help_text="Storage path of the archived entries")
+
+    class Meta:
+        unique_together = ('month', 'action', 'actor_type')
+        ordering = ['-month', 'action', 'actor_type']
+        verbose_name = 'Audit Log Rollup'
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} | {self.action} | {self.actor_type or '—'}: {self.count}"
+
+
 class ConferenceParticipation(models.Model):
     staff = models.ManyToManyField(Staff, related_name='conferences', blank=True)
     student = models.ForeignKey('students.Student', on_delete=models.SET_NULL, null=True, blank=True, related_name='scholar_conferences')
@@ -1236,6 +1288,74 @@ class ClassSubstitutionRequest(models.Model):
         return f"{self.requester.name} -> {self.substitute.name} on {self.date} (P{self.period})"
 
 
+class AttendanceSyncReceipt(models.Model):
+    """
+    An attendance sheet the offline sync has processed (staffs.attendance_sync), keyed by the
+    idempotency key the browser generated for it. Submitting the key again returns `result`
+    without touching attendance.
+    """
+    key = models.UUIDField(primary_key=True)
+    staff = models.ForeignKey(Staff, on_delete=models.CASCADE, related_name='attendance_sync_receipts')
+    subject = models.ForeignKey(Subject, on_delete=models.SET_NULL, null=True, blank=True)
+    date = models.DateField(null=True, blank=True)
+    result = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.staff_id} {self.subject_id} {self.date} ({self.key})"
+
+
+class DirectUpload(models.Model):
+    """
+    A document the browser uploads straight to the bucket (ssm.direct_uploads): issued with a
+    presigned URL for a staging key, completed once the object is there, then processed by a
+    worker, which compresses it and stores it in `field` of the target's model instance.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Waiting for upload'),
+        ('uploaded', 'Uploaded'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    OWNER_TYPES = [
+        ('student', 'Student'),
+        ('staff', 'Staff'),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner_type = models.CharField(max_length=10, choices=OWNER_TYPES)
+    owner_id = models.CharField(max_length=50, help_text="Roll number or staff ID")
+    target = models.CharField(max_length=40)
+    field = models.CharField(max_length=60)
+    params = models.JSONField(default=dict, blank=True)
+    key = models.CharField(max_length=255, help_text="Staging object in the bucket")
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    stored_name = models.CharField(max_length=255, blank=True, help_text="Where the processed file was stored")
+    error = models.CharField(max_length=255, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(help_text="The presigned URL stops working at this time")
+    completed_at = models.DateTimeField(blank=True, null=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='staffs_upload_queue_idx'),
+            models.Index(fields=['owner_type', 'owner_id', 'status'], name='staffs_upload_owner_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.owner_type} {self.owner_id}: {self.target}.{self.field} ({self.status})"
+
+
 DEFAULT_DEPARTMENT_TASKS = [
     (1, "Department Administration", "Administration"),
     (2, "Board of Studies", "Academic & Governance"),
@@ -0,0 +1,67 @@
+from django.apps import apps
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from ssm import reference_data
+from ssm.principals import invalidate_principal
+from students.models import PersonalInfo, ResearchScholarProfile, Student
+from .models import (
+    Staff, JournalPublication, ConferenceParticipation, BookPublication,
+    StaffPatent, StaffResearchProject, StaffStudentGuided, PublishedTimetableVersion
+)
+from .utils import invalidate_department_research_metrics, invalidate_timetable_version_grid
+
+
+RESEARCH_OUTPUT_MODELS = (
+    Staff, JournalPublication, ConferenceParticipation, BookPublication,
+    StaffPatent, StaffResearchProject, StaffStudentGuided, ResearchScholarProfile,
+)
+
+
+def invalidate_research_metrics_on_change(sender, **kwargs):
+    """Keeps the cached department research analytics in step with portfolio edits."""
+    invalidate_department_research_metrics()
+
+
+for _model in RESEARCH_OUTPUT_MODELS:
+    post_save.connect(invalidate_research_metrics_on_change, sender=_model, dispatch_uid=f'research_metrics_save_{_model._meta.label}')
+    post_delete.connect(invalidate_research_metrics_on_change, sender=_model, dispatch_uid=f'research_metrics_delete_{_model._meta.label}')
+
+
+@receiver(m2m_changed, sender=JournalPublication.staff.through)
+@receiver(m2m_changed, sender=ConferenceParticipation.staff.through)
+@receiver(m2m_changed, sender=BookPublication.staff.through)
+@receiver(m2m_changed, sender=StaffPatent.staff.through)
+def invalidate_research_metrics_on_coauthor_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_department_research_metrics()
+
+
+@receiver(post_save, sender=PublishedTimetableVersion, dispatch_uid='timetable_version_grid_save')
+@receiver(post_delete, sender=PublishedTimetableVersion, dispatch_uid='timetable_version_grid_delete')
+def invalidate_timetable_version_grid_on_change(sender, instance, **kwargs):
+    """Drops the pre-rendered grid when a version is edited (e.g. from the admin) or removed."""
+    invalidate_timetable_version_grid(instance.pk)
+
+
+def invalidate_principal_on_change(sender, instance, **kwargs):
+    """Drops the cached copy of the logged-in user kept by ssm.principals."""
+    # PersonalInfo shares its Student's primary key and is cached along with it
+    invalidate_principal(Student if sender is PersonalInfo else sender, instance.pk)
+
+
+for _model in (Staff, Student, PersonalInfo):
+    post_save.connect(invalidate_principal_on_change, sender=_model, dispatch_uid=f'principal_save_{_model._meta.label}')
+    post_delete.connect(invalidate_principal_on_change, sender=_model, dispatch_uid=f'principal_delete_{_model._meta.label}')
+
+
+def invalidate_reference_data_on_change(sender, **kwargs):
+    """Retires the ssm.reference_data bundles built from the changed model."""
+    for name in reference_data.bundles_for_model(sender):
+        reference_data.invalidate(name)
+
+
+for _label in sorted({label for source in reference_data.SOURCES.values() for label in source.models}):
+    _model = apps.get_model(_label)
+    post_save.connect(invalidate_reference_data_on_change, sender=_model, dispatch_uid=f'reference_data_save_{_label}')
+    post_delete.connect(invalidate_reference_data_on_change, sender=_model, dispatch_uid=f'reference_data_delete_{_label}')
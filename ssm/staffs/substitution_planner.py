@@ -0,0 +1,173 @@
+"""
+Conflict-aware substitute suggestions.
+
+SubstitutionPlanner loads the timetable, substitutions and staff leave for a date range
+once and keeps, per staff member, a 35-bit weekly occupancy bitmap (bit = day * 7 + period - 1)
+plus per-date overrides. Checking whether someone is free is a single bit test, and the
+ranked candidate list for a slot is computed once and reused.
+"""
+import datetime
+
+from django.db.models import Q
+
+from .timetable_utils import TIMETABLE_DAYS
+
+PERIODS_PER_DAY = 7
+FULL_DAY_MASK = (1 << PERIODS_PER_DAY) - 1
+NON_TEACHING_ROLES = ['Office Staff', 'Technical Officer']
+BLOCKING_SUBSTITUTION_STATUSES = ['Approved', 'Pending']
+
+
+def _slot_bit(day_index, period):
+    return 1 << (day_index * PERIODS_PER_DAY + period - 1)
+
+
+def _day_mask(weekly_mask, day_index):
+    return (weekly_mask >> (day_index * PERIODS_PER_DAY)) & FULL_DAY_MASK
+
+
+def _in_effect(start_date, end_date):
+    """Timetable rows whose from_date/to_date window overlaps start_date..end_date."""
+    return (
+        Q(from_date__isnull=True) | Q(from_date__lte=end_date),
+        Q(to_date__isnull=True) | Q(to_date__gte=start_date),
+    )
+
+
+class SubstitutionPlanner:
+    """
+    Free/busy lookups and ranked substitute candidates for start_date..end_date. Requests made
+    by `requester` (a staff_id) do not count: they are the slots being re-planned, so the
+    substitute already asked stays a candidate for them.
+    """
+
+    def __init__(self, start_date, end_date=None, requester=None):
+        from .models import Staff, Subject, Timetable, ClassSubstitutionRequest, StaffLeaveRequest
+
+        self.start_date = start_date
+        self.end_date = end_date or start_date
+
+        self.staff = {
+            s.staff_id: s for s in Staff.objects.filter(is_active=True).exclude(role__in=NON_TEACHING_ROLES).order_by('name')
+        }
+
+        # Weekly occupancy from the timetable rows in effect during the range
+        self.weekly = dict.fromkeys(self.staff, 0)
+        rows = Timetable.objects.filter(is_published=True).filter(
+            *_in_effect(self.start_date, self.end_date)
+        ).values_list('day', 'period', 'staff_id', 'subject__staff_id', 'subject__staff_batch_b_id')
+        for day, period, *owners in rows:
+            if day not in TIMETABLE_DAYS or not 1 <= period <= PERIODS_PER_DAY:
+                continue
+            bit = _slot_bit(TIMETABLE_DAYS.index(day), period)
+            for staff_id in set(filter(None, owners)):
+                if staff_id in self.weekly:
+                    self.weekly[staff_id] |= bit
+
+        # Date-specific occupancy: cover already taken, plus whole days on approved leave
+        self.dated = {}
+        self._ranked = {}
+        taken = ClassSubstitutionRequest.objects.filter(
+            date__range=(self.start_date, self.end_date), status__in=BLOCKING_SUBSTITUTION_STATUSES
+        )
+        if requester is not None:
+            taken = taken.exclude(requester_id=requester)
+        for staff_id, date, period in taken.values_list('substitute_id', 'date', 'period'):
+            self._mark(staff_id, date, 1 << (period - 1))
+
+        for staff_id, leave_start, leave_end in StaffLeaveRequest.objects.filter(
+            status='Approved', start_date__lte=self.end_date, end_date__gte=self.start_date
+        ).values_list('staff_id', 'start_date', 'end_date'):
+            day = max(leave_start, self.start_date)
+            while day <= min(leave_end, self.end_date):
+                self._mark(staff_id, day, FULL_DAY_MASK)
+                day += datetime.timedelta(days=1)
+
+        self.subject_teachers = {}
+        self.semester_teachers = {}
+        for subject_id, staff_id, staff_b_id, semester in Subject.objects.values_list('id', 'staff_id', 'staff_batch_b_id', 'semester'):
+            teachers = {s for s in (staff_id, staff_b_id) if s}
+            self.subject_teachers[subject_id] = teachers
+            self.semester_teachers.setdefault(semester, set()).update(teachers)
+
+    def _mark(self, staff_id, date, mask):
+        key = (staff_id, date)
+        self.dated[key] = self.dated.get(key, 0) | mask
+        for period in range(1, PERIODS_PER_DAY + 1):
+            self._ranked.pop((date, period), None)
+
+    def busy_mask(self, staff_id, date):
+        """The 7-bit mask of periods staff_id is occupied on date."""
+        mask = self.dated.get((staff_id, date), 0)
+        if date.weekday() < len(TIMETABLE_DAYS):
+            mask |= _day_mask(self.weekly.get(staff_id, 0), date.weekday())
+        return mask
+
+    def is_free(self, staff_id, date, period):
+        return not self.busy_mask(staff_id, date) & (1 << (period - 1))
+
+    def day_load(self, staff_id, date):
+        return self.busy_mask(staff_id, date).bit_count()
+
+    def candidates(self, date, period, subject=None, exclude=()):
+        """
+        Free staff for date/period, best first: teachers of the subject, then staff who teach
+        the same semester, then lightest load on that day, then lightest weekly load.
+        """
+        key = (date, period)
+        if key not in self._ranked:
+            free = [sid for sid in self.staff if self.is_free(sid, date, period)]
+            free.sort(key=lambda sid: (self.day_load(sid, date), self.weekly[sid].bit_count()))
+            self._ranked[key] = free
+
+        ranked = [sid for sid in self._ranked[key] if sid not in exclude]
+        if subject is not None:
+            teachers = self.subject_teachers.get(subject.pk, set())
+            class_teachers = self.semester_teachers.get(subject.semester, set())
+            ranked.sort(key=lambda sid: 0 if sid in teachers else 1 if sid in class_teachers else 2)
+        return [self.staff[sid] for sid in ranked]
+
+    def assign(self, staff_id, date, period):
+        """Marks staff_id as covering date/period so later suggestions account for it."""
+        self._mark(staff_id, date, 1 << (period - 1))
+
+    def propose_for_leave(self, leave):
+        """
+        Suggests a substitute for every class the leave's staff member has during the leave,
+        spreading the cover across staff. Returns a list of dicts with date, period, subject,
+        the proposed substitute (or None) and the full ranked candidate list.
+        """
+        from django.db.models import F
+        from .models import Timetable
+
+        start = max(leave.start_date, self.start_date)
+        end = min(leave.end_date, self.end_date)
+        # Oldest first, so where versions or academic years overlap the latest one wins below
+        entries = list(Timetable.objects.filter(
+            *_in_effect(start, end), staff_id=leave.staff_id, is_published=True, subject__isnull=False,
+        ).select_related('subject').order_by('academic_year', F('from_date').asc(nulls_first=True), 'id'))
+
+        proposals = []
+        day = start
+        while day <= end:
+            if day.weekday() < len(TIMETABLE_DAYS):
+                classes = {}
+                for entry in entries:
+                    if (entry.day == TIMETABLE_DAYS[day.weekday()]
+                            and (entry.from_date is None or entry.from_date <= day)
+                            and (entry.to_date is None or entry.to_date >= day)):
+                        classes[entry.period] = entry.subject
+                for period, subject in sorted(classes.items()):
+                    ranked = self.candidates(day, period, subject=subject, exclude={leave.staff_id})
+                    proposed = ranked[0] if ranked else None
+                    if proposed is not None:
+                        self.assign(proposed.staff_id, day, period)
+                    proposals.append({
+                        'date': day,
+                        'period': period,
+                        'subject': subject,
+                        'substitute': proposed,
+                        'candidates': ranked,
+                    })
+            day += datetime.timedelta(days=1)
+        return proposals
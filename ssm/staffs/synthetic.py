@@ -0,0 +1,579 @@
+"""
+Synthetic department data for query-budget tests and benchmarks.
+
+Everything is written with bulk_create in batches, and one password hash (of a random password
+unless one is given) is shared by all generated accounts, so a full department (8 semesters x 120 students with a semester of
+attendance) can be seeded in seconds and a 10x department with history in minutes.
+Values are derived from row indexes rather than random numbers, so two runs with the same
+arguments produce the same data.
+"""
+import datetime
+import itertools
+import secrets
+
+from django.contrib.auth.hashers import make_password
+
+PERIOD_START_TIMES = {
+    1: datetime.time(8, 30),
+    2: datetime.time(9, 30),
+    3: datetime.time(10, 40),
+    4: datetime.time(11, 40),
+    5: datetime.time(13, 30),
+    6: datetime.time(14, 30),
+    7: datetime.time(15, 30),
+}
+GRADE_POINTS = [(90, 10, 'O'), (80, 9, 'A+'), (70, 8, 'A'), (60, 7, 'B+'), (50, 6, 'B'), (0, 0, 'RA')]
+
+
+class SyntheticDepartment:
+    """Handles to the seeded rows that tests and benchmarks need to log in and build URLs."""
+
+    def __init__(self, hod, staff, class_incharges, subjects_by_semester, students_by_semester,
+                 scholars=None, counts=None, password=None):
+        self.hod = hod
+        self.staff = staff
+        self.class_incharges = class_incharges
+        self.subjects_by_semester = subjects_by_semester
+        self.students_by_semester = students_by_semester
+        self.scholars = scholars or []
+        self.counts = counts or {}
+        self.password = password
+
+    @classmethod
+    def from_database(cls, prefix='SYN'):
+        """Rebuilds the handles for a department seeded earlier (e.g. by generate_synthetic_data)."""
+        from staffs.models import Staff, Subject
+        from students.models import Student
+
+        staff = list(Staff.objects.filter(staff_id__startswith=prefix).order_by('staff_id'))
+        hod = next((s for s in staff if s.role == 'HOD'), None)
+        if hod is None:
+            raise ValueError(f"No synthetic department with prefix '{prefix}' found; run generate_synthetic_data first.")
+        subjects_by_semester = {}
+        for subject in Subject.objects.filter(code__startswith=prefix).order_by('semester', 'code'):
+            subjects_by_semester.setdefault(subject.semester, []).append(subject)
+        students_by_semester = {}
+        scholars = []
+        for student in Student.objects.filter(roll_number__startswith=prefix).order_by('roll_number'):
+            if student.program_level == 'PHD':
+                scholars.append(student)
+            else:
+                students_by_semester.setdefault(student.current_semester, []).append(student)
+        return cls(
+            hod=hod,
+            staff=staff,
+            class_incharges={s.assigned_semester: s for s in staff if s.role == 'Class Incharge'},
+            subjects_by_semester=subjects_by_semester,
+            students_by_semester=students_by_semester,
+            scholars=scholars,
+        )
+
+    @property
+    def subjects(self):
+        return list(itertools.chain.from_iterable(self.subjects_by_semester.values()))
+
+    @property
+    def students(self):
+        return list(itertools.chain.from_iterable(self.students_by_semester.values()))
+
+    def teacher_of(self, subject):
+        return next(s for s in self.staff if s.staff_id == subject.staff_id)
+
+
+def _weekdays(start_date, count):
+    day = start_date
+    while count > 0:
+        if day.weekday() < 5:
+            yield day
+            count -= 1
+        day += datetime.timedelta(days=1)
+
+
+def _term(first_year, terms_back):
+    """(academic year, start date) of the term terms_back before the July term of first_year."""
+    if terms_back % 2 == 0:
+        year = first_year - terms_back // 2
+        return f'{year}-{year + 1}', datetime.date(year, 7, 1)
+    year = first_year - (terms_back - 1) // 2
+    return f'{year - 1}-{year}', datetime.date(year, 1, 2)
+
+
+def _grade(percentage):
+    return next((points, grade) for floor, points, grade in GRADE_POINTS if percentage >= floor)
+
+
+def _bulk_insert(model, objects, batch_size):
+    """Writes an iterable of unsaved instances in batch_size chunks; returns the row count."""
+    iterator = iter(objects)
+    count = 0
+    while True:
+        chunk = list(itertools.islice(iterator, batch_size))
+        if not chunk:
+            return count
+        model.objects.bulk_create(chunk, batch_size=batch_size)
+        count += len(chunk)
+
+
+def delete_department(prefix='SYN'):
+    """Removes everything seed_department created with this prefix."""
+    from staffs.models import (
+        BookPublication, ConferenceParticipation, JournalPublication, Staff, StaffPatent, Subject, Timetable,
+    )
+    from students.models import Student
+
+    # Portfolio entries hang off staff through M2M links, which a staff delete would only unlink
+    for model in (JournalPublication, ConferenceParticipation, BookPublication, StaffPatent):
+        model.objects.filter(pk__in=model.objects.filter(staff__staff_id__startswith=prefix).values('pk')).delete()
+    Timetable.objects.filter(subject__code__startswith=prefix).delete()
+    Student.objects.filter(roll_number__startswith=prefix).delete()
+    Subject.objects.filter(code__startswith=prefix).delete()
+    Staff.objects.filter(staff_id__startswith=prefix).delete()
+
+
+def seed_department(semesters=8, students_per_semester=120, subjects_total=60, staff_count=24,
+                    attendance_days=90, academic_year='2026-2027', start_date=None,
+                    with_marks=True, history_years=0, scholars=0, with_profiles=True,
+                    with_workflows=True, with_portfolios=True, prefix='SYN', batch_size=5000, password=None):
+    """
+    Seeds staff, subjects, a published weekly timetable, students, internal marks and attendance
+    for the timetabled periods of the first attendance_days weekdays from start_date.
+
+    history_years adds each student's earlier semesters (two per year): a timetable for every
+    academic year involved, a term of attendance, internal marks and a StudentGPA record.
+    with_profiles fills every one-to-one profile model, with_workflows adds leave, bonafide and
+    scholarship requests in every status, and with_portfolios gives teaching staff journal,
+    conference, book and patent records shared with co-authoring colleagues (and scholars).
+    Every account gets `password`, or a random one returned as the department's password.
+    Returns a SyntheticDepartment whose counts maps model names to rows written.
+    """
+    from ssm import reference_data
+    from ssm.principals import invalidate_principals
+    from staffs.models import Staff, Subject, Timetable
+    from students.models import Student, StudentAttendance, StudentGPA, StudentMarks
+    from .timetable_utils import TIMETABLE_DAYS, TIMETABLE_PERIODS
+
+    plain_password = password or secrets.token_urlsafe(12)
+    password = make_password(plain_password)
+    first_year = int(academic_year[:4])
+    start_date = start_date or datetime.date(first_year, 7, 1)
+    counts = {}
+
+    # Staff: one HOD, a class incharge per semester, the rest course incharges
+    staff = [Staff(
+        staff_id=f'{prefix}HOD', name='Synthetic HOD', email=f'{prefix.lower()}hod@example.com',
+        role='HOD', password=password, is_active=True, is_profile_complete=True,
+    )]
+    for sem in range(1, semesters + 1):
+        staff.append(Staff(
+            staff_id=f'{prefix}CI{sem}', name=f'Class Incharge {sem}', email=f'{prefix.lower()}ci{sem}@example.com',
+            role='Class Incharge', assigned_semester=sem, password=password, is_active=True, is_profile_complete=True,
+        ))
+    for i in range(max(staff_count - len(staff), 0)):
+        staff.append(Staff(
+            staff_id=f'{prefix}ST{i:03d}', name=f'Course Incharge {i:03d}', email=f'{prefix.lower()}st{i:03d}@example.com',
+            role='Course Incharge', password=password, is_active=True, is_profile_complete=True,
+        ))
+    counts['Staff'] = _bulk_insert(Staff, staff, batch_size)
+    teachers = itertools.cycle(staff)
+
+    # Subjects: spread evenly across semesters, the last one of each semester is a lab
+    subjects = []
+    for sem in range(1, semesters + 1):
+        per_semester = max(subjects_total // semesters + (1 if sem <= subjects_total % semesters else 0), 1)
+        for n in range(per_semester):
+            is_lab = n == per_semester - 1
+            subjects.append(Subject(
+                code=f'{prefix}{sem}{n:02d}{"L" if is_lab else ""}', name=f'Subject {sem}.{n}', semester=sem,
+                subject_type='Lab' if is_lab else 'Theory', credits=2 if is_lab else 4, staff=next(teachers),
+            ))
+    counts['Subject'] = _bulk_insert(Subject, subjects, batch_size)
+    subjects_by_semester = {}
+    for subject in subjects:
+        subjects_by_semester.setdefault(subject.semester, []).append(subject)
+
+    # Weekly timetable: cycle each semester's subjects through the 35 slots
+    slots_by_semester = {}
+    for sem, sem_subjects in subjects_by_semester.items():
+        cycle = itertools.cycle(sem_subjects)
+        for day in TIMETABLE_DAYS:
+            for period in TIMETABLE_PERIODS:
+                slots_by_semester.setdefault(sem, {}).setdefault(day, []).append((period, next(cycle)))
+
+    # Earlier terms each current student sat through, as (terms back, semester then)
+    history_terms = [
+        (k, sem - k)
+        for sem in range(1, semesters + 1)
+        for k in range(1, min(2 * history_years, sem - 1) + 1)
+    ]
+    timetable_years = {(academic_year, sem) for sem in subjects_by_semester}
+    timetable_years.update((_term(first_year, k)[0], past_sem) for k, past_sem in history_terms)
+    counts['Timetable'] = _bulk_insert(Timetable, (
+        Timetable(
+            academic_year=year, semester=sem, day=day, period=period,
+            subject=subject, staff_id=subject.staff_id, is_published=True,
+        )
+        for year, sem in sorted(timetable_years)
+        for day, slots in slots_by_semester.get(sem, {}).items()
+        for period, subject in slots
+    ), batch_size)
+
+    # Students; every tenth student from the third semester on joined through lateral entry
+    students = []
+    for sem in range(1, semesters + 1):
+        joining_year = first_year - (sem - 1) // 2
+        for i in range(students_per_semester):
+            roll = f'{prefix}{sem}{i:04d}'
+            students.append(Student(
+                roll_number=roll, student_name=f'Student {sem}-{i:04d}', student_email=f'{roll.lower()}@example.com',
+                password=password, program_level='UG', ug_entry_type='Lateral' if sem >= 3 and i % 10 == 9 else 'Regular',
+                current_semester=sem, joining_year=joining_year, ending_year=joining_year + 4,
+                lab_batch='A' if i % 2 == 0 else 'B', is_profile_complete=True, is_password_changed=True,
+            ))
+    scholar_rows = [
+        Student(
+            roll_number=f'{prefix}PHD{i:03d}', student_name=f'Scholar {i:03d}', student_email=f'{prefix.lower()}phd{i:03d}@example.com',
+            password=password, program_level='PHD', current_semester=1, joining_year=first_year - i % 4,
+            is_profile_complete=True, is_password_changed=True,
+        )
+        for i in range(scholars)
+    ]
+    counts['Student'] = _bulk_insert(Student, students + scholar_rows, batch_size)
+    students_by_semester = {}
+    for student in students:
+        students_by_semester.setdefault(student.current_semester, []).append(student)
+
+    def terms_of(sem, sem_students):
+        """(academic year, start date, semester, students) for the current term and any history."""
+        yield academic_year, start_date, sem, sem_students
+        for k in range(1, min(2 * history_years, sem - 1) + 1):
+            year, term_start = _term(first_year, k)
+            past_sem = sem - k
+            # Lateral entries joined in the third semester
+            present = [s for s in sem_students if past_sem >= 3 or s.ug_entry_type != 'Lateral']
+            yield year, term_start, past_sem, present
+
+    # Internal marks for every term; a few students fall below the pass mark
+    internals = {}
+    if with_marks:
+        def marks():
+            for sem, sem_students in students_by_semester.items():
+                for _, _, term_sem, term_students in terms_of(sem, sem_students):
+                    for s_index, subject in enumerate(subjects_by_semester.get(term_sem, [])):
+                        for n, student in enumerate(term_students):
+                            test1 = 18 + (n * 7 + s_index * 11) % 33
+                            test2 = 18 + (n * 5 + s_index * 13) % 33
+                            internal = (test1 + test2) // 2
+                            if term_sem != sem:
+                                internals[(student.roll_number, subject.pk)] = internal
+                            yield StudentMarks(
+                                student_id=student.roll_number, subject_id=subject.pk,
+                                test1_marks=test1, test2_marks=test2, internal_marks=internal,
+                            )
+        counts['StudentMarks'] = _bulk_insert(StudentMarks, marks(), batch_size)
+
+    # Attendance for each timetabled period of every term; roughly one absence in twelve
+    absences = {}  # (roll, subject) -> (held, missed) for archived terms
+
+    def attendance():
+        for sem, sem_students in students_by_semester.items():
+            for _, term_start, term_sem, term_students in terms_of(sem, sem_students):
+                slots = slots_by_semester.get(term_sem, {})
+                archived = term_sem != sem
+                for day_index, date in enumerate(_weekdays(term_start, attendance_days)):
+                    for period, subject in slots.get(TIMETABLE_DAYS[date.weekday()], []):
+                        for n, student in enumerate(term_students):
+                            absent = (n + period + day_index) % 12 == 0
+                            if archived:
+                                key = (student.roll_number, subject.pk)
+                                held, missed = absences.get(key, (0, 0))
+                                absences[key] = (held + 1, missed + absent)
+                            yield StudentAttendance(
+                                student_id=student.roll_number, subject_id=subject.pk, date=date,
+                                time=PERIOD_START_TIMES[period], status='Absent' if absent else 'Present',
+                            )
+    counts['StudentAttendance'] = _bulk_insert(StudentAttendance, attendance(), batch_size)
+
+    # Archived results for completed semesters, in the shape archive_semester_results writes
+    if history_years and with_marks:
+        def gpa_records():
+            for sem, sem_students in students_by_semester.items():
+                for _, _, term_sem, term_students in terms_of(sem, sem_students):
+                    if term_sem == sem:
+                        continue
+                    for student in term_students:
+                        subject_data, points_total, credits_total = [], 0, 0
+                        for subject in subjects_by_semester.get(term_sem, []):
+                            internal = internals.get((student.roll_number, subject.pk), 0)
+                            held, missed = absences.get((student.roll_number, subject.pk), (0, 0))
+                            points, grade = _grade(internal * 2)
+                            subject_data.append({
+                                'code': subject.code, 'name': subject.name, 'credits': subject.credits,
+                                'internal_marks': internal,
+                                'attendance_percentage': round((held - missed) / held * 100, 1) if held else 0.0,
+                                'points': points, 'grade': grade,
+                            })
+                            points_total += points * subject.credits
+                            credits_total += subject.credits
+                        yield StudentGPA(
+                            student_id=student.roll_number, semester=term_sem, subject_data=subject_data,
+                            gpa=round(points_total / credits_total, 2) if credits_total else 0.0,
+                            total_credits=credits_total,
+                        )
+        counts['StudentGPA'] = _bulk_insert(StudentGPA, gpa_records(), batch_size)
+    internals.clear()
+    absences.clear()
+
+    teaching_staff = [s for s in staff if s.role != 'HOD'] or staff
+    if with_profiles:
+        counts.update(_seed_profiles(students, scholar_rows, teaching_staff, batch_size))
+    if with_workflows:
+        counts.update(_seed_workflows(students, staff, start_date, academic_year, batch_size))
+    if with_portfolios:
+        counts.update(_seed_portfolios(teaching_staff, scholar_rows, first_year, batch_size))
+
+    # Rows were written with bulk_create, which sends no signals; drop any cached copies of
+    # rows that existed under the same ids before
+    invalidate_principals(Staff)
+    invalidate_principals(Student)
+    for name, source in reference_data.SOURCES.items():
+        if source.models:
+            reference_data.invalidate(name)
+
+    hod = staff[0]
+    return SyntheticDepartment(
+        hod=hod,
+        staff=staff,
+        class_incharges={s.assigned_semester: s for s in staff if s.role == 'Class Incharge'},
+        subjects_by_semester=subjects_by_semester,
+        students_by_semester=students_by_semester,
+        scholars=scholar_rows,
+        counts=counts,
+        password=plain_password,
+    )
+
+
+def _seed_profiles(students, scholars, supervisors, batch_size):
+    """Fills the one-to-one profile models for every student, plus scholar records for PhD students."""
+    from students.models import (
+        BLOOD_GROUP_CHOICES, COMMUNITY_CHOICES, RELIGION_CHOICES,
+        AcademicHistory, BankDetails, DiplomaDetails, OtherDetails, PersonalInfo, PGDetails, PhDDetails,
+        PhDProgress, ResearchScholarProfile, ScholarshipInfo, StudentDocuments, UGDetails,
+    )
+
+    everyone = students + scholars
+    counts = {}
+    counts['PersonalInfo'] = _bulk_insert(PersonalInfo, (
+        PersonalInfo(
+            student_id=s.roll_number,
+            umis_id=f'UMIS{n:08d}', emis_id=f'EMIS{n:08d}', abc_id=f'ABC{n:09d}',
+            date_of_birth=datetime.date((s.joining_year or 2026) - 18, n % 12 + 1, n % 28 + 1),
+            gender=('Male', 'Female')[n % 2],
+            blood_group=BLOOD_GROUP_CHOICES[n % len(BLOOD_GROUP_CHOICES)][0],
+            community=COMMUNITY_CHOICES[n % len(COMMUNITY_CHOICES)][0],
+            religion=RELIGION_CHOICES[n % len(RELIGION_CHOICES)][0],
+            aadhaar_number=f'{900000000000 + n}',
+            permanent_address=f'{n % 200 + 1}, Main Road, Chennai', present_address=f'{n % 200 + 1}, Main Road, Chennai',
+            student_mobile=f'9{n:09d}', parent_email=f'parent.{s.roll_number.lower()}@example.com',
+            father_name=f'Father of {s.student_name}', father_occupation='Farmer', father_mobile=f'8{n:09d}',
+            mother_name=f'Mother of {s.student_name}', mother_occupation='Teacher', mother_mobile=f'7{n:09d}',
+            parent_annual_income=60000 + n * 7919 % 540000,
+            has_scholarship=n % 4 == 0, is_hosteler=n % 3 == 0,
+        )
+        for n, s in enumerate(everyone)
+    ), batch_size)
+    counts['BankDetails'] = _bulk_insert(BankDetails, (
+        BankDetails(
+            student_id=s.roll_number, account_holder_name=s.student_name, account_number=f'{30000000000 + n}',
+            bank_name='State Bank of India', branch_name='Guindy', ifsc_code='SBIN0001234',
+        )
+        for n, s in enumerate(everyone)
+    ), batch_size)
+    counts['AcademicHistory'] = _bulk_insert(AcademicHistory, (
+        AcademicHistory(
+            student_id=s.roll_number,
+            sslc_register_number=f'SSLC{n:08d}', sslc_percentage=60 + n % 40, sslc_year_of_passing=str((s.joining_year or 2026) - 2),
+            sslc_school_name='Government Higher Secondary School', sslc_board='State Board',
+            hsc_register_number=f'HSC{n:08d}', hsc_percentage=55 + n % 45, hsc_year_of_passing=str(s.joining_year or 2026),
+            hsc_school_name='Government Higher Secondary School', hsc_board='State Board',
+        )
+        for n, s in enumerate(everyone)
+    ), batch_size)
+    counts['DiplomaDetails'] = _bulk_insert(DiplomaDetails, (
+        DiplomaDetails(
+            student_id=s.roll_number, diploma_register_number=f'DIP{n:08d}', diploma_percentage=70 + n % 30,
+            diploma_year_of_passing=str((s.joining_year or 2026) + 1), diploma_college_name='Government Polytechnic College',
+        )
+        for n, s in enumerate(students) if s.ug_entry_type == 'Lateral'
+    ), batch_size)
+    counts['ScholarshipInfo'] = _bulk_insert(ScholarshipInfo, (
+        ScholarshipInfo(
+            student_id=s.roll_number, is_first_graduate=n % 4 == 0, sch_bcmbc=n % 6 in (1, 2),
+            sch_postmetric=n % 6 in (3, 4), sch_pudhumai=n % 2 == 1 and n % 5 == 0, is_7_5_reservation=n % 9 == 0,
+        )
+        for n, s in enumerate(everyone)
+    ), batch_size)
+    counts['StudentDocuments'] = _bulk_insert(StudentDocuments, (StudentDocuments(student_id=s.roll_number) for s in everyone), batch_size)
+    counts['OtherDetails'] = _bulk_insert(OtherDetails, (
+        OtherDetails(student_id=s.roll_number, ambition='Software Engineer', role_model='A. P. J. Abdul Kalam', hobbies='Reading, Cricket')
+        for s in everyone
+    ), batch_size)
+
+    if scholars:
+        counts['UGDetails'] = _bulk_insert(UGDetails, (
+            UGDetails(student_id=s.roll_number, ug_course='B.Tech IT', ug_university='Anna University', ug_ogpa=7 + n % 3,
+                      ug_year_of_passing=str(s.joining_year - 4))
+            for n, s in enumerate(scholars)
+        ), batch_size)
+        counts['PGDetails'] = _bulk_insert(PGDetails, (
+            PGDetails(student_id=s.roll_number, pg_course='M.E. CSE', pg_university='Anna University', pg_ogpa=7 + n % 3,
+                      pg_year_of_passing=str(s.joining_year - 1))
+            for n, s in enumerate(scholars)
+        ), batch_size)
+        counts['PhDDetails'] = _bulk_insert(PhDDetails, (
+            PhDDetails(student_id=s.roll_number, phd_specialization='Machine Learning', phd_university='Anna University',
+                       phd_year_of_joining=str(s.joining_year))
+            for s in scholars
+        ), batch_size)
+        counts['ResearchScholarProfile'] = _bulk_insert(ResearchScholarProfile, (
+            ResearchScholarProfile(
+                student_id=s.roll_number, scholar_type=ResearchScholarProfile.SCHOLAR_TYPE_CHOICES[n % 3][0],
+                admission_date=datetime.date(s.joining_year, 8, 1), supervisor_id=supervisors[n % len(supervisors)].staff_id,
+            )
+            for n, s in enumerate(scholars)
+        ), batch_size)
+        counts['PhDProgress'] = _bulk_insert(PhDProgress, (PhDProgress(scholar_id=s.roll_number) for s in scholars), batch_size)
+    return counts
+
+
+def _seed_workflows(students, staff, start_date, academic_year, batch_size):
+    """Leave, bonafide and scholarship requests spread across every status of their workflows."""
+    from django.utils import timezone
+    from staffs.models import StaffLeaveRequest
+    from students.models import SCHOLARSHIP_STATUS_CHOICES, SCHOLARSHIP_TYPE_CHOICES, BonafideRequest, LeaveRequest, ScholarshipApplication
+
+    leave_types = [code for code, _ in LeaveRequest.LEAVE_TYPES]
+    leave_statuses = [code for code, _ in LeaveRequest.STATUS_CHOICES if code != 'Pending Guide']
+    bonafide_statuses = ['Pending Office Approval', 'Waiting for HOD Sign', 'Signed', 'Collected', 'Unclaimed', 'Rejected']
+    now = timezone.now()
+    counts = {}
+
+    def leave_requests():
+        for n, student in enumerate(students[::5]):
+            start = start_date + datetime.timedelta(days=7 + n % 60)
+            status = leave_statuses[n % len(leave_statuses)]
+            yield LeaveRequest(
+                student_id=student.roll_number, leave_type=leave_types[n % len(leave_types)],
+                start_date=start, end_date=start + datetime.timedelta(days=n % 3), reason='Family function',
+                status=status, rejection_reason='Insufficient documents' if status == 'Rejected' else None,
+                rejected_by='Class Incharge' if status == 'Rejected' else None,
+            )
+    counts['LeaveRequest'] = _bulk_insert(LeaveRequest, leave_requests(), batch_size)
+
+    counts['BonafideRequest'] = _bulk_insert(BonafideRequest, (
+        BonafideRequest(
+            student_id=student.roll_number, reason='Bank loan application',
+            status=bonafide_statuses[n % len(bonafide_statuses)],
+            rejection_reason='Duplicate request' if bonafide_statuses[n % len(bonafide_statuses)] == 'Rejected' else None,
+        )
+        for n, student in enumerate(students[3::7])
+    ), batch_size)
+
+    def scholarship_applications():
+        for n, student in enumerate(students[::4]):
+            status = SCHOLARSHIP_STATUS_CHOICES[n % len(SCHOLARSHIP_STATUS_CHOICES)][0]
+            verified = status != 'Pending Office Verification'
+            yield ScholarshipApplication(
+                student_id=student.roll_number, scholarship_type=SCHOLARSHIP_TYPE_CHOICES[n % len(SCHOLARSHIP_TYPE_CHOICES)][0],
+                application_no=f'APP{n:08d}', academic_year=academic_year, annual_income=60000 + n * 7919 % 240000,
+                income_certificate_no=f'INC{n:08d}', bank_account_no=f'{30000000000 + n}', bank_ifsc='SBIN0001234',
+                status=status, rejection_reason='Income above limit' if status.startswith('Rejected') else '',
+                verified_at=now if verified else None,
+                disbursed_at=now if status.startswith('Govt Sanctioned') else None,
+            )
+    counts['ScholarshipApplication'] = _bulk_insert(ScholarshipApplication, scholarship_applications(), batch_size)
+
+    staff_leave_types = [code for code, _ in StaffLeaveRequest.LEAVE_TYPES]
+    staff_statuses = [code for code, _ in StaffLeaveRequest.STATUS_CHOICES]
+    counts['StaffLeaveRequest'] = _bulk_insert(StaffLeaveRequest, (
+        StaffLeaveRequest(
+            staff_id=member.staff_id, leave_type=staff_leave_types[n % len(staff_leave_types)],
+            start_date=start_date + datetime.timedelta(days=10 + n % 50), end_date=start_date + datetime.timedelta(days=11 + n % 50),
+            reason='Personal work', status=staff_statuses[n % len(staff_statuses)],
+        )
+        for n, member in enumerate(staff[1:])
+    ), batch_size)
+    return counts
+
+
+def _seed_portfolios(teaching_staff, scholars, first_year, batch_size):
+    """
+    Journal, conference, book and patent records for teaching staff, each shared with the next one
+    or two colleagues through the staff M2M, and with a supervised scholar where there is one.
+    """
+    from staffs.models import BookPublication, ConferenceParticipation, JournalPublication, StaffPatent
+    from .utils import invalidate_department_research_metrics
+
+    scholar_of = {}
+    for n, scholar in enumerate(scholars):
+        scholar_of.setdefault(teaching_staff[n % len(teaching_staff)].staff_id, scholar)
+    counts = {}
+
+    def coauthors(index, n):
+        return [teaching_staff[(index + offset) % len(teaching_staff)] for offset in range(1 + n % 3)]
+
+    def link(model, records, authors):
+        """bulk_create skips m2m_changed, so the through rows are written directly."""
+        staff_through = model.staff.through
+        student_through = model.students.through
+        fk = model._meta.model_name + '_id'
+        staff_links, student_links = [], []
+        for record, (members, scholar) in zip(records, authors):
+            staff_links.extend(staff_through(**{fk: record.pk, 'staff_id': m.staff_id}) for m in dict.fromkeys(members))
+            if scholar is not None:
+                student_links.append(student_through(**{fk: record.pk, 'student_id': scholar.roll_number}))
+        counts[f'{model.__name__}.staff'] = _bulk_insert(staff_through, staff_links, batch_size)
+        counts[f'{model.__name__}.students'] = _bulk_insert(student_through, student_links, batch_size)
+
+    journals, conferences, books, patents = [], [], [], []
+    for index, member in enumerate(teaching_staff):
+        scholar = scholar_of.get(member.staff_id)
+        for n in range(3):
+            members = coauthors(index, n)
+            journals.append((JournalPublication(
+                student=scholar, author_name=', '.join(m.name for m in members),
+                title_of_paper=f'Scalable methods for problem {index}.{n}', journal_name='Journal of Synthetic Computing',
+                national_international=('National', 'International')[n % 2], published_month='March',
+                published_year=str(first_year - n), volume_number=str(10 + n), issue_number=str(n + 1),
+                page_numbers_from=str(10 * n + 1), page_numbers_to=str(10 * n + 9),
+                is_scopus=n % 2 == 0, is_wos=n % 3 == 0, is_ugc=True,
+            ), (members, scholar)))
+        for n in range(2):
+            members = coauthors(index, n + 1)
+            conferences.append((ConferenceParticipation(
+                student=scholar, author_name=', '.join(m.name for m in members),
+                title_of_paper=f'Case study {index}.{n}', title_of_proceedings='Proceedings of the Synthetic Conference',
+                national_international=('National', 'International')[n], year_of_publication=str(first_year - n),
+                date_from=datetime.date(first_year - n, 2, 10), date_to=datetime.date(first_year - n, 2, 11), location='Chennai',
+            ), (members, scholar)))
+        if index % 3 == 0:
+            members = coauthors(index, 1)
+            books.append((BookPublication(
+                author_name=', '.join(m.name for m in members), title_of_book=f'Foundations of Topic {index}',
+                publisher_name='Synthetic Press', isbn_issn_number=f'978-0-{index:05d}-000-0', year_of_publication=str(first_year - 1),
+            ), (members, None)))
+        if index % 4 == 0:
+            members = coauthors(index, 2)
+            patents.append((StaffPatent(
+                title=f'Apparatus for process {index}', application_number=f'2026{index:08d}',
+                status=StaffPatent.STATUS_CHOICES[index % 3][0], application_year=str(first_year - 1),
+                inventors=', '.join(m.name for m in members),
+            ), (members, scholar)))
+
+    for model, rows in ((JournalPublication, journals), (ConferenceParticipation, conferences),
+                        (BookPublication, books), (StaffPatent, patents)):
+        records = [record for record, _ in rows]
+        counts[model.__name__] = _bulk_insert(model, records, batch_size)
+        link(model, records, [authors for _, authors in rows])
+
+    invalidate_department_research_metrics()
+    return counts
@@ -0,0 +1,11 @@
+from django import template
+
+from ssm import reference_data
+
+register = template.Library()
+
+
+@register.simple_tag
+def reference_url(name, fmt='json'):
+    """The versioned (browser-cacheable) URL of an ssm.reference_data bundle."""
+    return reference_data.bundle_url(name, fmt)
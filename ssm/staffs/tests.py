@@ -1,7 +1,9 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from django.core.exceptions import ValidationError
 from django.urls import reverse
 from staffs.models import Staff, AdminSettings, Lab, ClassMapping, Subject, PublishedTimetableVersion, Timetable
+from students.models import Student
+from ssm.testing import QueryBudgetMixin
 
 class AdminSettingsTestCase(TestCase):
     def setUp(self):
@@ -497,6 +499,31 @@ class BatchAndRepresentativeTestCase(TestCase):
         self.assertTrue(Timetable.objects.filter(semester=5, day='Monday', period=1, batch='A', subject=override_subject).exists())
         self.assertTrue(Timetable.objects.filter(semester=5, day='Monday', period=1, batch='B', subject=self.subject).exists())
 
+    def test_timetable_saved_meanwhile_by_someone_else(self):
+        from unittest import mock
+        from staffs import timetable_utils
+        from staffs.models import Timetable
+
+        session = self.client.session
+        session['staff_id'] = self.hod.staff_id
+        session.save()
+
+        plan_changes = timetable_utils.plan_timetable_changes
+
+        def plan_then_concurrent_save(*args):
+            plan = plan_changes(*args)
+            Timetable.objects.create(academic_year='2026-2027', semester=5, day='Monday', period=1, batch='All', subject=self.subject, staff=self.hod)
+            return plan
+
+        with mock.patch.object(timetable_utils, 'plan_timetable_changes', plan_then_concurrent_save):
+            response = self.client.post(reverse('staffs:edit_timetable', args=[5]), {
+                'current_batch': 'All', 'subject_Monday_1': str(self.subject.id), 'subject_Monday_2': str(self.subject.id),
+            }, follow=True)
+        self.assertRedirects(response, '/staffs/hod/published-timetables/?semester=5&academic_year=2026-2027&tab=edit')
+        self.assertIn('changed by someone else', str(list(response.context['messages'])[0]))
+        # Nothing of the refused save was applied
+        self.assertFalse(Timetable.objects.filter(semester=5, period=2).exists())
+
 
 class AdditionalRolesTestCase(TestCase):
     def setUp(self):
@@ -949,3 +976,1610 @@ class ClassInchargeBatchTestCase(TestCase):
         )
         with self.assertRaises(ValidationError):
             ci_all.clean()
+
+
+class DepartmentResearchAnalyticsTestCase(TestCase):
+    def setUp(self):
+        from staffs.models import JournalPublication, StaffPatent
+        self.hod = Staff.objects.create(
+            staff_id="HOD_RA", name="Research HOD", email="hodra@example.com",
+            role="HOD", is_profile_complete=True
+        )
+        self.faculty = Staff.objects.create(
+            staff_id="FAC_RA", name="Research Faculty", email="facra@example.com",
+            role="Course Incharge", is_profile_complete=True
+        )
+        shared = JournalPublication.objects.create(
+            author_name="A, B", title_of_paper="Shared Paper", journal_name="J1",
+            published_year="2025", is_scopus=True
+        )
+        shared.staff.add(self.hod, self.faculty)
+        solo = JournalPublication.objects.create(
+            author_name="B", title_of_paper="Solo Paper", journal_name="J2",
+            published_year="2023", is_ugc=True
+        )
+        solo.staff.add(self.faculty)
+        patent = StaffPatent.objects.create(title="Gadget", status='Granted', application_year="2025")
+        patent.staff.add(self.faculty)
+
+    def test_bulk_metrics_group_coauthors(self):
+        from staffs.utils import compute_department_research_metrics
+        with self.assertNumQueries(12):
+            metrics = compute_department_research_metrics()
+        rows = {r['staff_id']: r for r in metrics['staff']}
+        self.assertEqual(rows['FAC_RA']['journals'], 2)
+        self.assertEqual(rows['FAC_RA']['scopus'], 1)
+        self.assertEqual(rows['FAC_RA']['ugc'], 1)
+        self.assertEqual(rows['FAC_RA']['patents_granted'], 1)
+        self.assertEqual(rows['HOD_RA']['journals'], 1)
+        # Co-authored paper is counted once for the department
+        self.assertEqual(metrics['totals']['journals'], 2)
+
+        by_year = compute_department_research_metrics('2025-2026')
+        rows = {r['staff_id']: r for r in by_year['staff']}
+        self.assertEqual(rows['FAC_RA']['journals'], 1)
+        self.assertEqual(by_year['totals']['journals'], 1)
+
+    def test_cached_metrics_invalidated_on_coauthor_change(self):
+        from staffs.models import JournalPublication
+        from staffs.utils import get_department_research_metrics
+        self.assertEqual(get_department_research_metrics()['totals']['journals'], 2)
+        with self.assertNumQueries(0):
+            get_department_research_metrics()
+
+        extra = JournalPublication.objects.create(author_name="C", title_of_paper="New", journal_name="J3")
+        extra.staff.add(self.hod)
+        self.assertEqual(get_department_research_metrics()['totals']['journals'], 3)
+
+    def test_analytics_views_restricted_to_hod(self):
+        session = self.client.session
+        session['staff_id'] = self.faculty.staff_id
+        session.save()
+        response = self.client.get(reverse('staffs:department_research_analytics'))
+        self.assertRedirects(response, reverse('staffs:staff_dashboard'), fetch_redirect_response=False)
+        self.assertEqual(self.client.get(reverse('staffs:department_research_analytics_data')).status_code, 403)
+
+        session['staff_id'] = self.hod.staff_id
+        session.save()
+        response = self.client.get(reverse('staffs:department_research_analytics'))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('staffs:department_research_analytics_data') + '?academic_year=2025-2026')
+        self.assertEqual(response.json()['totals']['journals'], 1)
+        response = self.client.get(reverse('staffs:export_department_research_csv'))
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+
+
+class TimetableBulkSaveTestCase(TestCase):
+    def setUp(self):
+        self.hod = Staff.objects.create(
+            staff_id="HOD_TT", name="Timetable HOD", email="hodtt@example.com", role="HOD"
+        )
+        self.faculty = Staff.objects.create(
+            staff_id="FAC_TT", name="Timetable Faculty", email="factt@example.com", role="Course Incharge"
+        )
+        self.theory = Subject.objects.create(code='CS401', name='Compilers', semester=4, subject_type='Theory', staff=self.faculty)
+        self.lab = Subject.objects.create(code='CS401L', name='Compilers Lab', semester=4, subject_type='Lab', staff=self.hod)
+        session = self.client.session
+        session['staff_id'] = self.hod.staff_id
+        session.save()
+
+    def test_propagate_lab_blocks_returns_copy(self):
+        from staffs.timetable_utils import propagate_lab_blocks
+        grid = {'Monday': {1: '', 2: 'LAB_SESSION', 3: '', 4: '', 5: '9', 6: 'X', 7: ''}}
+        result = propagate_lab_blocks(grid, {'9'})
+        self.assertEqual([result['Monday'][p] for p in range(1, 8)], ['', 'LAB_SESSION', 'LAB_SESSION', 'LAB_SESSION', '9', 'X', '9'])
+        self.assertEqual(grid['Monday'][3], '')
+
+    def test_planner_only_touches_changed_cells(self):
+        from staffs.timetable_utils import plan_timetable_changes
+        kept = Timetable.objects.create(academic_year='2026-2027', semester=4, day='Monday', period=1, subject=self.theory, staff=self.faculty)
+        dropped = Timetable.objects.create(academic_year='2026-2027', semester=4, day='Tuesday', period=2, subject=self.theory, staff=self.faculty)
+        grid = {'Monday': {1: str(self.theory.id), 2: 'LIBRARY'}}
+        plan = plan_timetable_changes(
+            Timetable.objects.filter(semester=4).select_related('subject', 'staff'), grid, {}, 'All',
+            {str(self.theory.id): self.theory}, lambda *args: Timetable(day=args[0], period=args[1], batch=args[2], subject=args[3], staff=args[4])
+        )
+        self.assertEqual(plan.updates, [])
+        self.assertEqual([e.pk for e in plan.deletes], [dropped.pk])
+        self.assertEqual([(e.day, e.period, e.subject) for e in plan.creates], [('Monday', 2, None)])
+        self.assertIn('FAC_TT', plan.notifications)
+        self.assertNotIn(kept.pk, [e.pk for e in plan.deletes])
+
+    def test_save_uses_bounded_queries(self):
+        post_data = {'academic_year': '2026-2027', 'current_batch': 'All'}
+        for day in ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']:
+            post_data[f'subject_{day}_1'] = str(self.lab.id)
+            post_data[f'subject_{day}_4'] = str(self.theory.id)
+            post_data[f'subject_{day}_5'] = 'LAB_SESSION'
+            post_data[f'lab_a_{day}_5'] = str(self.lab.id)
+            post_data[f'lab_b_{day}_5'] = str(self.theory.id)
+        self.client.post(reverse('staffs:edit_timetable', args=[4]), post_data)
+        self.assertEqual(Timetable.objects.filter(semester=4).count(), 5 * (4 + 6))
+        self.assertEqual(Timetable.objects.filter(semester=4, day='Friday', period=7, batch='B').get().subject, self.theory)
+
+        # Re-saving an unchanged grid issues no writes, so the cost no longer scales with the 35 cells
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(reverse('staffs:edit_timetable', args=[4]), post_data)
+        timetable_writes = [
+            q for q in ctx.captured_queries
+            if q['sql'].startswith(('INSERT INTO "staffs_timetable"', 'DELETE FROM "staffs_timetable"', 'UPDATE "staffs_timetable" SET "subject_id"'))
+        ]
+        self.assertEqual(timetable_writes, [])
+        self.assertLess(len(ctx.captured_queries), 25)
+
+
+class TimetableVersionSnapshotTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.hod = Staff.objects.create(staff_id="HOD_VS", name="Snapshot HOD", email="hodvs@example.com", role="HOD")
+        self.algo = Subject.objects.create(code='CS601', name='Algorithms', semester=6, subject_type='Theory')
+        self.nets = Subject.objects.create(code='CS602', name='Networks', semester=6, subject_type='Theory')
+        self.slot = Timetable.objects.create(academic_year='2026-2027', semester=6, day='Monday', period=1, subject=self.algo, staff=self.hod)
+
+    def test_snapshot_diff_against_previous_version(self):
+        from staffs.views import create_timetable_version_snapshot
+        first = create_timetable_version_snapshot('2026-2027', 6, self.hod)
+        self.assertEqual(first.snapshot['Monday|1|All']['subject_code'], 'CS601')
+        self.assertEqual(first.snapshot_diff['added'], [['Monday|1|All', 'CS601 · Snapshot HOD']])
+
+        self.slot.subject = self.nets
+        self.slot.save()
+        Timetable.objects.create(academic_year='2026-2027', semester=6, day='Tuesday', period=2, batch='A', subject=self.algo)
+        second = create_timetable_version_snapshot('2026-2027', 6, self.hod)
+        self.assertEqual(second.snapshot_diff['added'], [['Tuesday|2|A', 'CS601']])
+        self.assertEqual(second.snapshot_diff['changed'], [['Monday|1|All', 'CS601 · Snapshot HOD', 'CS602 · Snapshot HOD']])
+        self.assertEqual(second.snapshot_diff['removed'], [])
+
+    def test_legacy_migration_skips_malformed_entries(self):
+        import json
+        from importlib import import_module
+        from types import SimpleNamespace
+
+        migration = import_module('staffs.migrations.0075_timetable_version_snapshot')
+        legacy = [
+            {'day': 'Monday', 'period': '1', 'subject_code': 'CS601'},
+            {'day': 'Monday', 'period': None, 'subject_code': 'CS602'},
+            {'day': 'Sunday', 'period': 2},
+            {'day': 'Friday', 'period': 9},
+            'Monday|3|All',
+            None,
+        ]
+        version = SimpleNamespace(
+            academic_year='2025-2026', semester=6, timetable_data_json=json.dumps(legacy), save=lambda **kwargs: None,
+        )
+        model = SimpleNamespace(objects=SimpleNamespace(order_by=lambda *fields: [version]))
+        migration.convert_legacy_snapshots(SimpleNamespace(get_model=lambda *args: model), None)
+        self.assertEqual(list(version.snapshot), ['Monday|1|All'])
+        self.assertEqual(version.snapshot_diff['added'], [['Monday|1|All', 'CS601']])
+
+    def test_version_history_grid_is_cached(self):
+        from staffs.views import create_timetable_version_snapshot
+        from staffs.utils import get_timetable_version_history
+        for _ in range(3):
+            create_timetable_version_snapshot('2026-2027', 6, self.hod)
+        qs = PublishedTimetableVersion.objects.filter(semester=6)
+
+        with self.assertNumQueries(2):
+            versions = get_timetable_version_history(qs)
+        self.assertEqual(versions[0].grid_rows[0][0], 'Monday')
+        self.assertEqual(versions[0].grid_rows[0][1][0]['subject_code'], 'CS601')
+        self.assertEqual(versions[0].change_count, 0)
+        self.assertEqual(versions[-1].change_count, 1)
+
+        # Second render reads every grid from the cache and never loads the snapshots
+        with self.assertNumQueries(1):
+            get_timetable_version_history(qs)
+
+
+class TimetableOverviewTestCase(TestCase):
+    def setUp(self):
+        self.hod = Staff.objects.create(staff_id="HOD_OV", name="Overview HOD", email="hodov@example.com", role="HOD")
+        self.other = Staff.objects.create(staff_id="FAC_OV", name="Overview Faculty", email="facov@example.com", role="Course Incharge")
+        subj = Subject.objects.create(code='CS301', name='DBMS', semester=3, subject_type='Theory')
+        Subject.objects.create(code='CS302', name='OS', semester=3, subject_type='Theory')
+        for period, staff in ((1, self.hod), (2, self.hod), (3, self.other), (4, None)):
+            Timetable.objects.create(academic_year='2026-2027', semester=3, day='Monday', period=period, subject=subj, staff=staff)
+        Timetable.objects.create(academic_year='2026-2027', semester=4, day='Monday', period=1, subject=subj, is_published=False)
+
+    def test_overview_uses_two_grouped_queries(self):
+        from staffs.utils import get_timetable_overview
+        with self.assertNumQueries(2):
+            overview = get_timetable_overview('2026-2027', 3)
+        self.assertEqual(len(overview), 8)
+        sem3, sem4 = overview[2], overview[3]
+        self.assertEqual((sem3['total_slots'], sem3['assigned_faculty_count'], sem3['subject_count']), (4, 2, 2))
+        self.assertTrue(sem3['is_published'] and sem3['is_selected'])
+        self.assertEqual(sem4['total_slots'], 1)
+        self.assertFalse(sem4['is_published'])
+        self.assertEqual(overview[0]['total_slots'], 0)
+
+    def test_batch_assignment_writes_only_changed_students(self):
+        from students.models import Student
+        from staffs.utils import save_lab_batch_assignments
+        for i in range(3):
+            Student.objects.create(roll_number=f"OV{i}", student_name=f"Student {i}", student_email=f"ov{i}@example.com", current_semester=3)
+        Student.objects.filter(roll_number="OV0").update(lab_batch='A')
+        students = list(Student.objects.filter(roll_number__startswith="OV").order_by('roll_number'))
+        data = {'batch_OV0': 'A', 'batch_OV1': 'B', 'rep_OV1': 'true', 'batch_OV2': 'A'}
+        with self.assertNumQueries(1):
+            changed = save_lab_batch_assignments(students, data)
+        self.assertEqual(changed, 2)
+        self.assertTrue(Student.objects.get(roll_number="OV1").is_class_representative)
+        self.assertEqual(Student.objects.get(roll_number="OV2").lab_batch, 'A')
+
+
+class SubstitutionPlannerTestCase(TestCase):
+    def setUp(self):
+        import datetime
+        from staffs.models import StaffLeaveRequest
+        self.monday = datetime.date(2026, 10, 19)
+        self.requester = Staff.objects.create(staff_id="SUB_REQ", name="Requester", email="subreq@example.com", role="Course Incharge")
+        self.busy = Staff.objects.create(staff_id="SUB_BUSY", name="Busy", email="subbusy@example.com", role="Course Incharge")
+        self.peer = Staff.objects.create(staff_id="SUB_PEER", name="Peer", email="subpeer@example.com", role="Course Incharge")
+        self.light = Staff.objects.create(staff_id="SUB_LIGHT", name="Light", email="sublight@example.com", role="Course Incharge")
+        self.away = Staff.objects.create(staff_id="SUB_AWAY", name="Away", email="subaway@example.com", role="Course Incharge")
+        Staff.objects.create(staff_id="SUB_OFFICE", name="Office", email="suboffice@example.com", role="Office Staff")
+
+        self.subject = Subject.objects.create(code='CS501', name='AI', semester=5, subject_type='Theory', staff=self.requester)
+        peer_subject = Subject.objects.create(code='CS502', name='ML', semester=5, subject_type='Theory', staff=self.peer)
+        other = Subject.objects.create(code='CS301', name='DBMS', semester=3, subject_type='Theory')
+        Timetable.objects.create(academic_year='2026-2027', semester=5, day='Monday', period=1, subject=self.subject, staff=self.requester)
+        Timetable.objects.create(academic_year='2026-2027', semester=5, day='Monday', period=2, subject=self.subject, staff=self.requester)
+        Timetable.objects.create(academic_year='2026-2027', semester=3, day='Monday', period=1, subject=other, staff=self.busy)
+        Timetable.objects.create(academic_year='2026-2027', semester=5, day='Monday', period=3, subject=peer_subject, staff=self.peer)
+        StaffLeaveRequest.objects.create(staff=self.away, leave_type='CL', start_date=self.monday, end_date=self.monday, reason='x', status='Approved')
+        self.leave = StaffLeaveRequest.objects.create(staff=self.requester, leave_type='CL', start_date=self.monday, end_date=self.monday, reason='y', status='Approved')
+
+    def test_candidates_skip_busy_staff_and_rank_subject_teachers_first(self):
+        from staffs.substitution_planner import SubstitutionPlanner
+        planner = SubstitutionPlanner(self.monday)
+        self.assertFalse(planner.is_free('SUB_BUSY', self.monday, 1))
+        self.assertFalse(planner.is_free('SUB_AWAY', self.monday, 5))
+
+        ranked = [s.staff_id for s in planner.candidates(self.monday, 1, subject=self.subject, exclude={'SUB_REQ'})]
+        # Peer teaches the same class so leads despite a heavier day; office staff never appear
+        self.assertEqual(ranked, ['SUB_PEER', 'SUB_LIGHT'])
+        ranked = [s.staff_id for s in planner.candidates(self.monday, 1, exclude={'SUB_REQ'})]
+        self.assertEqual(ranked, ['SUB_LIGHT', 'SUB_PEER'])
+
+    def test_leave_proposals_cover_every_period(self):
+        from staffs.substitution_planner import SubstitutionPlanner
+        planner = SubstitutionPlanner(self.leave.start_date, self.leave.end_date)
+        proposals = planner.propose_for_leave(self.leave)
+        self.assertEqual([(p['period'], p['substitute'].staff_id) for p in proposals], [(1, 'SUB_PEER'), (2, 'SUB_PEER')])
+        self.assertFalse(planner.is_free('SUB_PEER', self.monday, 2))
+
+    def test_leave_proposals_skip_expired_timetable_versions(self):
+        import datetime
+        from staffs.substitution_planner import SubstitutionPlanner
+
+        expired = self.monday - datetime.timedelta(days=30)
+        Timetable.objects.create(
+            academic_year='2025-2026', semester=5, day='Monday', period=4, subject=self.subject, staff=self.requester,
+            from_date=expired - datetime.timedelta(days=90), to_date=expired,
+        )
+        proposals = SubstitutionPlanner(self.monday).propose_for_leave(self.leave)
+        self.assertEqual([p['period'] for p in proposals], [1, 2])
+
+    def test_batch_requests_and_conflict_check(self):
+        from staffs.models import ClassSubstitutionRequest
+        session = self.client.session
+        session['staff_id'] = self.requester.staff_id
+        session.save()
+
+        url = reverse('staffs:plan_leave_substitutions', args=[self.leave.id])
+        response = self.client.get(url)
+        self.assertEqual(response.context['pending_count'], 2)
+        response = self.client.post(url, {'substitute_2026-10-19_1': 'SUB_LIGHT', 'substitute_2026-10-19_2': 'SUB_BUSY'})
+        self.assertRedirects(response, url)
+        # SUB_BUSY only teaches in P1, so is a valid alternate for P2
+        self.assertEqual(ClassSubstitutionRequest.objects.filter(leave_request=self.leave).count(), 2)
+
+        response = self.client.post(reverse('staffs:manage_substitutions') + '?date=2026-10-19', {
+            'action': 'request_substitute', 'period': '1', 'substitute_id': 'SUB_BUSY', 'subject_id': self.subject.id,
+        })
+        self.assertFalse(ClassSubstitutionRequest.objects.filter(substitute=self.busy, period=1).exists())
+
+        # Free in every period, but inactive: never a candidate, so never accepted
+        Staff.objects.create(staff_id="SUB_GONE", name="Gone", email="subgone@example.com", role="Course Incharge", is_active=False)
+        self.client.post(reverse('staffs:manage_substitutions') + '?date=2026-10-19', {
+            'action': 'request_substitute', 'period': '2', 'substitute_id': 'SUB_GONE', 'subject_id': self.subject.id,
+        })
+        self.assertFalse(ClassSubstitutionRequest.objects.filter(substitute_id='SUB_GONE').exists())
+
+    def test_request_can_be_sent_again_to_the_current_substitute(self):
+        from staffs.models import ClassSubstitutionRequest
+        session = self.client.session
+        session['staff_id'] = self.requester.staff_id
+        session.save()
+
+        url = reverse('staffs:manage_substitutions') + '?date=2026-10-19'
+        data = {'action': 'request_substitute', 'period': '1', 'substitute_id': 'SUB_LIGHT', 'subject_id': self.subject.id}
+        self.client.post(url, data)
+        ClassSubstitutionRequest.objects.update(status='Approved')
+
+        # Their own request does not make SUB_LIGHT busy for the requester's slot
+        response = self.client.get(url)
+        item = next(i for i in response.context['classes_data'] if i['period'] == 1)
+        self.assertIn('SUB_LIGHT', [c.staff_id for c in item['candidates']])
+        response = self.client.post(url, data, follow=True)
+        self.assertIn('Alternate request sent to Light.', [str(m) for m in response.context['messages']])
+        request = ClassSubstitutionRequest.objects.get(requester=self.requester)
+        self.assertEqual((request.substitute_id, request.status), ('SUB_LIGHT', 'Pending'))
+
+        # It still does for everyone else
+        from staffs.substitution_planner import SubstitutionPlanner
+        self.assertFalse(SubstitutionPlanner(self.monday).is_free('SUB_LIGHT', self.monday, 1))
+
+
+class RequestMetricsTestCase(TestCase):
+    def setUp(self):
+        self.hod = Staff.objects.create(staff_id="HOD_MX", name="Metrics HOD", email="hodmx@example.com", role="HOD")
+        for i in range(3):
+            Subject.objects.create(code=f'MX10{i}', name=f'Metrics {i}', semester=1, subject_type='Theory', staff=self.hod)
+
+    def test_sql_shape_collapses_parameters(self):
+        from ssm.metrics import sql_shape
+        self.assertEqual(
+            sql_shape("SELECT * FROM t WHERE id = 42 AND name = 'O''Brien' AND x IN (%s, %s, %s)"),
+            sql_shape("SELECT * FROM t WHERE id = 7 AND name = 'Ann' AND x IN (%s, %s)"),
+        )
+
+    def test_metrics_endpoint_reports_view_stats(self):
+        self.client.get(reverse('staffs:stafflogin'))
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('ssm_request_latency_seconds_count{method="GET",status="200",view="staffs:stafflogin"}', body)
+        self.assertIn('ssm_request_db_queries_bucket', body)
+
+        response = self.client.get('/metrics', REMOTE_ADDR='10.0.0.5')
+        self.assertEqual(response.status_code, 403)
+
+    def test_query_budget_logs_repeated_queries(self):
+        from django.test import override_settings
+        from django.http import HttpResponse
+        from ssm.middleware import RequestMetricsMiddleware
+
+        def view(request):
+            for subject in Subject.objects.filter(code__startswith='MX'):
+                Staff.objects.get(staff_id=subject.staff_id)
+            return HttpResponse('ok')
+
+        with override_settings(REQUEST_QUERY_BUDGET=2):
+            middleware = RequestMetricsMiddleware(view)
+        request = self.client.get(reverse('staffs:stafflogin')).wsgi_request
+        with self.assertLogs('ssm.middleware', 'WARNING') as logs:
+            middleware(request)
+        self.assertIn('4 queries', logs.output[0])
+        self.assertIn('3x SELECT', logs.output[0])
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    """
+    Hits the major pages as each role against a department-sized dataset (8 semesters x 120
+    students, 60 subjects) and fails on query-count regressions or per-row queries.
+    The attendance history defaults to two weeks to keep the suite fast; set
+    QUERY_BUDGET_ATTENDANCE_DAYS=90 to run against a full semester.
+    """
+
+    # (url name, needs subject id / roll number, max queries)
+    STAFF_VIEWS = {
+        'hod': [
+            ('staffs:staff_dashboard', None, 60),
+            ('staffs:staff_profile', None, 60),
+            ('staffs:student_list', None, 5),
+            ('staffs:student_detail', 'roll', 20),
+            ('staffs:manage_subjects', None, 8),
+            ('staffs:staff_list', None, 5),
+            ('staffs:hod_published_timetables', None, 40),
+            ('staffs:edit_timetable', 'semester', 8),
+            ('staffs:manage_substitutions', None, 15),
+            ('staffs:risk_students', None, 8),
+            ('staffs:remark_student_list', None, 5),
+            ('staffs:hod_leave_dashboard', None, 5),
+            ('staffs:attendance_report', 'subject', 10),
+        ],
+        'class_incharge': [
+            ('staffs:staff_dashboard', None, 60),
+            ('staffs:student_list', None, 5),
+            ('staffs:timetable', None, 5),
+            ('staffs:risk_students', None, 8),
+            ('staffs:attendance_deficit_list', None, 5),
+            ('staffs:remark_student_list', None, 5),
+            ('staffs:view_leave_requests', None, 5),
+            ('staffs:manage_semesters', None, 5),
+        ],
+        'course_incharge': [
+            ('staffs:staff_dashboard', None, 60),
+            ('staffs:my_timetable', None, 5),
+            ('staffs:risk_students', None, 8),
+            ('staffs:manage_marks', 'subject', 10),
+            ('staffs:manage_attendance', 'subject', 12),
+            ('staffs:attendance_calendar', 'subject', 10),
+            ('staffs:attendance_report', 'subject', 10),
+        ],
+    }
+    STUDENT_VIEWS = [
+        ('student_dashboard', 50),
+        ('student_profile', 12),
+        ('student_attendance', 10),
+        ('student_marks', 15),
+        ('class_timetable', 5),
+        ('leave_history', 8),
+        ('bonafide_list', 8),
+    ]
+    SEMESTER = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        import os
+        from staffs.synthetic import seed_department
+        cls.dept = seed_department(attendance_days=int(os.getenv('QUERY_BUDGET_ATTENDANCE_DAYS', '10')))
+        cls.subject = next(
+            s for s in cls.dept.subjects_by_semester[cls.SEMESTER] if cls.dept.teacher_of(s).role == 'Course Incharge'
+        )
+        cls.student = cls.dept.students_by_semester[cls.SEMESTER][0]
+        cls.staff_by_role = {
+            'hod': cls.dept.hod,
+            'class_incharge': cls.dept.class_incharges[cls.SEMESTER],
+            'course_incharge': cls.dept.teacher_of(cls.subject),
+        }
+
+    def _url(self, name, arg):
+        args = {
+            None: [],
+            'subject': [self.subject.pk],
+            'roll': [self.student.roll_number],
+            'semester': [self.SEMESTER],
+        }[arg]
+        return reverse(name, args=args)
+
+    def _check_staff_views(self, role):
+        session = self.client.session
+        session['staff_id'] = self.staff_by_role[role].staff_id
+        session.save()
+        for name, arg, budget in self.STAFF_VIEWS[role]:
+            with self.subTest(role=role, view=name):
+                with self.assertQueryBudget(budget, label=f'{role} {name}'):
+                    response = self.client.get(self._url(name, arg))
+                self.assertEqual(response.status_code, 200)
+
+    def test_hod_views(self):
+        self._check_staff_views('hod')
+
+    def test_class_incharge_views(self):
+        self._check_staff_views('class_incharge')
+
+    def test_course_incharge_views(self):
+        self._check_staff_views('course_incharge')
+
+    def test_student_views(self):
+        session = self.client.session
+        session['student_roll_number'] = self.student.roll_number
+        session.save()
+        for name, budget in self.STUDENT_VIEWS:
+            with self.subTest(role='student', view=name):
+                with self.assertQueryBudget(budget, label=f'student {name}'):
+                    response = self.client.get(reverse(name))
+                self.assertEqual(response.status_code, 200)
+
+    def test_budget_reports_repeated_queries(self):
+        with self.assertRaises(AssertionError) as ctx:
+            with self.assertQueryBudget(1000, label='per-row loop'):
+                for student in Student.objects.filter(current_semester=self.SEMESTER):
+                    Student.objects.filter(pk=student.pk).exists()
+        self.assertIn('ran 120 times (limit 10)', str(ctx.exception))
+        self.assertIn('120x SELECT', str(ctx.exception))
+
+
+class LoadTestScenarioTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from staffs.synthetic import seed_department
+        cls.dept = seed_department(semesters=2, students_per_semester=6, subjects_total=4, staff_count=5, attendance_days=3, prefix='LT')
+
+    def test_attendance_rush_saves_every_sheet(self):
+        import datetime
+        from ssm.loadtest import attendance_rush, run_load
+        from students.models import StudentAttendance
+
+        date = datetime.date(2026, 10, 19)
+        requests = attendance_rush(self.dept, date=date)
+        self.assertEqual(len(requests), 4)
+
+        result, samples = run_load(requests, concurrency=1)
+        self.assertEqual(result['overall']['requests'], 4)
+        self.assertEqual(result['overall']['errors'], 0)
+        self.assertTrue(all(status == 302 for _, _, status, _ in samples))
+        self.assertGreater(result['endpoints']['manage_attendance POST']['queries_mean'], 0)
+        self.assertEqual(StudentAttendance.objects.filter(date=date).count(), 4 * 6)
+
+        overall = result['overall']
+        self.assertLessEqual(overall['p50_ms'], overall['p95_ms'])
+        self.assertLessEqual(overall['p95_ms'], overall['p99_ms'])
+
+    def test_result_day_and_baseline_comparison(self):
+        from ssm.loadtest import compare_with_baseline, result_day, run_load
+
+        requests = result_day(self.dept, users=4)
+        self.assertEqual(len(requests), 12)
+        result, _ = run_load(requests, concurrency=1)
+        self.assertEqual(set(result['endpoints']), {'student_dashboard', 'student_marks', 'student_attendance'})
+        self.assertEqual(result['overall']['errors'], 0)
+
+        self.assertEqual(compare_with_baseline(result, result), [])
+        slower = {'endpoints': {
+            label: dict(stats, p95_ms=stats['p95_ms'] / 2, queries_mean=stats['queries_mean'] - 1)
+            for label, stats in result['endpoints'].items()
+        }}
+        regressions = compare_with_baseline(result, slower)
+        self.assertTrue(any('student_marks: p95' in line for line in regressions))
+        self.assertTrue(any('student_marks: queries/request' in line for line in regressions))
+
+
+class SyntheticDataTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from staffs.synthetic import seed_department
+        cls.dept = seed_department(
+            semesters=4, students_per_semester=10, subjects_total=8, staff_count=8, attendance_days=5,
+            history_years=1, scholars=2, prefix='SD',
+        )
+
+    def test_history_covers_earlier_semesters(self):
+        from staffs.models import Timetable
+        from students.models import StudentAttendance, StudentGPA
+
+        student = self.dept.students_by_semester[3][0]
+        self.assertEqual(
+            sorted(StudentGPA.objects.filter(student=student).values_list('semester', flat=True)), [1, 2],
+        )
+        gpa = StudentGPA.objects.get(student=student, semester=2)
+        self.assertEqual({entry['code'] for entry in gpa.subject_data}, {s.code for s in self.dept.subjects_by_semester[2]})
+        self.assertTrue(StudentAttendance.objects.filter(student=student, subject__semester=1, date__year=2025).exists())
+        self.assertEqual(
+            set(Timetable.objects.filter(subject__code__startswith='SD').values_list('academic_year', flat=True)),
+            {'2025-2026', '2026-2027'},
+        )
+
+        # Lateral entries joined in the third semester, so they have no first-year history
+        lateral = self.dept.students_by_semester[4][9]
+        self.assertEqual(lateral.ug_entry_type, 'Lateral')
+        self.assertEqual(list(StudentGPA.objects.filter(student=lateral).values_list('semester', flat=True)), [3])
+
+    def test_profiles_workflows_and_coauthors(self):
+        from staffs.models import JournalPublication
+        from students.models import BonafideRequest, LeaveRequest, PersonalInfo, ResearchScholarProfile, StudentDocuments
+
+        self.assertEqual(PersonalInfo.objects.filter(student__roll_number__startswith='SD').count(), 42)
+        self.assertEqual(StudentDocuments.objects.filter(student__roll_number__startswith='SD').count(), 42)
+        self.assertEqual(ResearchScholarProfile.objects.filter(student__in=self.dept.scholars).count(), 2)
+        self.assertGreater(LeaveRequest.objects.filter(student__roll_number__startswith='SD').values('status').distinct().count(), 1)
+        self.assertTrue(BonafideRequest.objects.filter(student__roll_number__startswith='SD').exists())
+
+        journals = JournalPublication.objects.filter(staff__staff_id__startswith='SD').distinct()
+        self.assertTrue(any(j.staff.count() > 1 for j in journals))
+        self.assertTrue(JournalPublication.objects.filter(students__in=self.dept.scholars).exists())
+
+    def test_accounts_get_a_random_password_and_production_is_refused(self):
+        from django.contrib.auth.hashers import check_password
+        from django.core.management import CommandError, call_command
+        from django.test import override_settings
+
+        self.assertNotEqual(self.dept.password, 'password123')
+        self.assertTrue(check_password(self.dept.password, self.dept.hod.password))
+        with override_settings(DEBUG=False), self.assertRaisesMessage(CommandError, '--allow-non-debug'):
+            call_command('generate_synthetic_data', prefix='NODEBUG')
+        self.assertFalse(Staff.objects.filter(staff_id__startswith='NODEBUG').exists())
+
+    def test_delete_department_removes_everything(self):
+        from staffs.models import JournalPublication, Staff, Timetable
+        from staffs.synthetic import delete_department
+        from students.models import Student
+
+        delete_department('SD')
+        self.assertFalse(Staff.objects.filter(staff_id__startswith='SD').exists())
+        self.assertFalse(Student.objects.filter(roll_number__startswith='SD').exists())
+        self.assertFalse(Timetable.objects.filter(academic_year='2025-2026').exists())
+        self.assertFalse(JournalPublication.objects.exists())
+
+
+class DatabaseConnectionModeTestCase(TransactionTestCase):
+    """Runs outside a test transaction so the load-test workers really open and close connections."""
+
+    def setUp(self):
+        from staffs.synthetic import seed_department
+        self.dept = seed_department(
+            semesters=1, students_per_semester=4, subjects_total=2, staff_count=3, attendance_days=2,
+            with_profiles=False, with_workflows=False, with_portfolios=False, prefix='DC',
+        )
+
+    def test_per_request_connections_reconnect_and_persistent_reuse(self):
+        from ssm.loadtest import db_connection_mode, result_day, run_load
+
+        requests = result_day(self.dept)
+        with db_connection_mode('per-request') as per_request:
+            result, _ = run_load(requests, concurrency=2)
+        self.assertEqual(result['overall']['errors'], 0)
+        self.assertGreaterEqual(per_request['connections_opened'], len(requests))
+
+        with db_connection_mode('persistent') as persistent:
+            result, _ = run_load(requests, concurrency=2)
+        self.assertEqual(result['overall']['errors'], 0)
+        self.assertLessEqual(persistent['connections_opened'], 3)
+
+    def test_pool_mode_reports_saturation_gauge(self):
+        from prometheus_client import REGISTRY
+        from ssm.loadtest import db_connection_mode, result_day, run_load
+
+        with db_connection_mode('pool', pool_max_size=2) as pool:
+            result, _ = run_load(result_day(self.dept), concurrency=2)
+            self.assertEqual(result['overall']['errors'], 0)
+            self.assertEqual(REGISTRY.get_sample_value('ssm_db_pool_connections', {'alias': 'default', 'state': 'max'}), 2)
+            self.assertIsNotNone(REGISTRY.get_sample_value('ssm_db_pool_saturation_ratio', {'alias': 'default'}))
+        self.assertLessEqual(pool['connections_opened'], 2)
+
+        from django.db import connections
+        self.assertNotIn('pool', connections.settings['default']['OPTIONS'])
+
+    def test_asgi_transport_overlaps_upstream_calls(self):
+        from ssm.loadtest import ai_burst, db_connection_mode, run_load, simulated_gemini
+        from students.models import AIResumeJob
+        from students.resume_jobs import wait_for_jobs
+
+        requests = ai_burst(self.dept)
+        self.assertEqual(len(requests), 9)
+        with simulated_gemini(latency=0.3) as gemini, db_connection_mode('pool', pool_max_size=4):
+            result, _ = run_load(requests, transport='asgi', concurrency=9)
+            self.assertTrue(wait_for_jobs(timeout=10))
+        self.assertEqual(result['overall']['errors'], 0, result.get('first_error'))
+        self.assertEqual(result['workers'], 1)
+        # The double submission shares its twin's call: 4 extractions, and 4 resumes on the job pool
+        self.assertEqual(gemini.calls, 8)
+        self.assertEqual(AIResumeJob.objects.filter(status='done').count(), 4)
+        # Upstream calls in flight together on one event loop, not one after another
+        self.assertLess(result['wall_seconds'], 8 * 0.3)
+        self.assertGreater(result['endpoints']['ai_generate_resume']['queries_mean'], 0)
+
+
+class AsyncViewTestCase(TestCase):
+    """The Gemini-bound student views run as async views; simulated_gemini stands in for the API."""
+
+    def setUp(self):
+        from importlib import import_module
+        from django.conf import settings
+
+        from django.core.cache import cache, caches
+        cache.clear()
+        caches[settings.GRADES_CACHE_ALIAS].clear()
+        self.student = Student.objects.create(
+            roll_number='AS001', student_name='Async Student', student_email='as001@example.com', current_semester=3,
+        )
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session['student_roll_number'] = self.student.roll_number
+        session.create()
+        self.async_client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+
+    async def test_login_required_on_async_view(self):
+        from django.test import AsyncClient
+
+        response = await AsyncClient().post(reverse('extract_grades_api'))
+        self.assertRedirects(response, reverse('student_login'), fetch_redirect_response=False)
+
+    async def test_extract_grades_and_resume(self):
+        from asgiref.sync import sync_to_async
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from ssm.loadtest import SIMULATED_GRADES, result_screenshot, simulated_gemini
+        from students import resume_jobs
+
+        with simulated_gemini(latency=0):
+            response = await self.async_client.post(
+                reverse('extract_grades_api'),
+                {'result_image': SimpleUploadedFile('result.png', result_screenshot('AS001'), 'image/png')},
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), SIMULATED_GRADES)
+
+            # Queued, then run by a worker (the test transaction hides it from the thread pool)
+            response = await self.async_client.post(reverse('ai_generate_resume'))
+            self.assertEqual(response.status_code, 202, response.content)
+            status_url = response.json()['status_url']
+            self.assertEqual((await self.async_client.get(status_url)).json()['job']['status'], 'queued')
+            self.assertIsNotNone(await sync_to_async(resume_jobs.run_next_job)())
+
+        status = (await self.async_client.get(status_url)).json()
+        self.assertEqual(status['job']['status'], 'done')
+        self.assertTrue(status['exists'])
+        self.assertEqual(status['preview']['skill_count'], 2)
+
+    async def test_unchanged_profile_reuses_stored_resume(self):
+        import io
+        from asgiref.sync import sync_to_async
+        from django.core.management import call_command
+        from ssm.loadtest import simulated_gemini
+        from students.models import AIResumeJob, StudentSkill
+
+        with simulated_gemini(latency=0) as gemini:
+            first = await self.async_client.post(reverse('ai_generate_resume'))
+            self.assertEqual((await self.async_client.post(reverse('ai_generate_resume'))).json()['job_id'], first.json()['job_id'])
+            await sync_to_async(call_command)('run_ai_resume_jobs', '--once', stdout=io.StringIO())
+
+            response = await self.async_client.post(reverse('ai_generate_resume'))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['data']['skill_count'], 2)
+            self.assertEqual(gemini.calls, 1)
+
+            # A changed profile is a new job
+            await StudentSkill.objects.acreate(student=self.student, skill_name='Django')
+            self.assertEqual((await self.async_client.post(reverse('ai_generate_resume'))).status_code, 202)
+            self.assertEqual(await AIResumeJob.objects.filter(student=self.student).acount(), 2)
+
+        # Results live in the database, not the session
+        session = await self.async_client.asession()
+        self.assertNotIn('ai_resume_data', await session.akeys())
+
+        response = await self.async_client.post(reverse('clear_ai_resume'))
+        self.assertTrue(response.json()['success'])
+        self.assertFalse((await self.async_client.get(reverse('ai_resume_status'))).json()['exists'])
+
+    async def test_metrics_middleware_counts_queries_of_async_views(self):
+        from django.test import override_settings
+        from ssm.loadtest import simulated_gemini
+
+        with override_settings(SERVER_TIMING_HEADER=True), simulated_gemini(latency=0):
+            response = await self.async_client.post(reverse('ai_generate_resume'))
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries"')
+
+
+    async def test_test_notification_without_subscriptions(self):
+        from staffs.utils import asend_group_notification
+
+        self.assertEqual(await asend_group_notification('student_AS001', {'head': 'Hi'}), 0)
+        response = await self.async_client.post(reverse('send_test_notification'), {'message': 'Hello'})
+        self.assertEqual(response.json()['status'], 'success')
+
+    async def test_identical_screenshots_share_one_gemini_call(self):
+        import asyncio
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from ssm.loadtest import result_screenshot, simulated_gemini
+
+        screenshot = result_screenshot('AS001')
+
+        def upload():
+            return self.async_client.post(
+                reverse('extract_grades_api'), {'result_image': SimpleUploadedFile('result.png', screenshot, 'image/png')},
+            )
+
+        with simulated_gemini(latency=0.3) as gemini:
+            responses = await asyncio.gather(*(upload() for _ in range(3)))
+            self.assertEqual({r.status_code for r in responses}, {200})
+            self.assertEqual(gemini.calls, 1)
+
+            # Later uploads of the same bytes come from the cache
+            response = await upload()
+            self.assertEqual(response.json(), responses[0].json())
+            self.assertEqual(gemini.calls, 1)
+
+            response = self.async_client.post(
+                reverse('extract_grades_api'),
+                {'result_image': SimpleUploadedFile('result.png', result_screenshot('AS002'), 'image/png')},
+            )
+            self.assertEqual((await response).status_code, 200)
+            self.assertEqual(gemini.calls, 2)
+
+    def test_identical_screenshots_share_one_call_across_wsgi_requests(self):
+        import threading
+        from django.conf import settings
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.test import Client
+        from ssm.loadtest import SIMULATED_GRADES, result_screenshot, simulated_gemini
+
+        screenshot = result_screenshot('AS001')
+        session_key = self.async_client.cookies[settings.SESSION_COOKIE_NAME].value
+        responses = []
+
+        # Each thread is a WSGI request, running the async view in an event loop of its own
+        def upload():
+            client = Client()
+            client.cookies[settings.SESSION_COOKIE_NAME] = session_key
+            responses.append(client.post(
+                reverse('extract_grades_api'), {'result_image': SimpleUploadedFile('result.png', screenshot, 'image/png')},
+            ))
+
+        with simulated_gemini(latency=0.3) as gemini:
+            threads = [threading.Thread(target=upload) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual([r.status_code for r in responses], [200] * 3)
+        self.assertEqual([r.json() for r in responses], [SIMULATED_GRADES] * 3)
+        self.assertEqual(gemini.calls, 1)
+
+    def test_screenshot_is_downscaled_before_upload(self):
+        import io
+        from PIL import Image
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from ssm.loadtest import result_screenshot, simulated_gemini
+        from students.ai_utils import GRADES_IMAGE_MAX_SIDE, _shrink_image, extract_grades_from_image
+
+        screenshot = result_screenshot('AS001')
+        shrunk, content_type = _shrink_image(screenshot, 'image/png')
+        self.assertLess(len(shrunk), len(screenshot))
+        self.assertEqual(max(Image.open(io.BytesIO(shrunk)).size), GRADES_IMAGE_MAX_SIDE)
+        with self.assertLogs('students.ai_utils', 'WARNING'):
+            self.assertEqual(_shrink_image(b'not an image', 'image/png'), (b'not an image', 'image/png'))
+
+        with simulated_gemini(latency=0) as gemini:
+            for _ in range(2):
+                grades = extract_grades_from_image(SimpleUploadedFile('result.png', screenshot, content_type))
+                self.assertIn('subjects', grades)
+        self.assertEqual(gemini.calls, 1)
+        # The request carries the shrunk image (base64 inside JSON), not the upload
+        self.assertLess(gemini.bytes_received, len(shrunk) * 4 / 3 + 4096)
+
+
+
+class OutboundGatewayTestCase(TestCase):
+    """ssm.outbound: limits and the circuit breaker for calls to Gemini, Gmail and web push."""
+
+    def _fail(self, provider, error):
+        from ssm import outbound
+
+        with self.assertRaises(type(error)):
+            with outbound.call(provider):
+                raise error
+
+    def test_circuit_opens_then_probe_closes_it(self):
+        import time
+        from django.test import override_settings
+        from prometheus_client import REGISTRY
+        from ssm import outbound
+
+        refused = {'provider': 'gemini', 'outcome': 'rejected_circuit_open'}
+        before = REGISTRY.get_sample_value('ssm_outbound_calls_total', refused) or 0
+        with override_settings(OUTBOUND_PROVIDERS={'gemini': {'failure_threshold': 2, 'reset_timeout': 0.05}}):
+            self._fail('gemini', ConnectionError('upstream down'))
+            with self.assertLogs('ssm.outbound', 'WARNING'):
+                self._fail('gemini', TimeoutError('read timed out'))
+            with self.assertRaises(outbound.OutboundUnavailable) as refusal:
+                with outbound.call('gemini'):
+                    self.fail('An open circuit lets no call through')
+            self.assertEqual(refusal.exception.reason, 'circuit_open')
+
+            time.sleep(0.06)
+            with outbound.call('gemini'):
+                # Only the probe goes through while the circuit is half-open
+                with self.assertRaises(outbound.OutboundUnavailable):
+                    with outbound.call('gemini'):
+                        pass
+            self.assertEqual(outbound.gate('gemini').breaker.state, outbound.CLOSED)
+        self.assertEqual(REGISTRY.get_sample_value('ssm_outbound_calls_total', refused), before + 2)
+
+    def test_client_errors_do_not_open_the_circuit(self):
+        from types import SimpleNamespace
+        from django.test import override_settings
+        from pywebpush import WebPushException
+        from ssm import outbound
+
+        with override_settings(OUTBOUND_PROVIDERS={'webpush': {'failure_threshold': 2}}):
+            for _ in range(3):
+                self._fail('webpush', WebPushException('Gone', response=SimpleNamespace(status_code=410)))
+            self.assertEqual(outbound.gate('webpush').breaker.state, outbound.CLOSED)
+
+    def test_rate_and_concurrency_limits_refuse_instead_of_queueing(self):
+        from django.test import override_settings
+        from ssm import outbound
+
+        with override_settings(OUTBOUND_PROVIDERS={'gmail': {'rate': 0.1, 'burst': 2, 'queue_timeout': 0}}):
+            for _ in range(2):
+                with outbound.call('gmail'):
+                    pass
+            with self.assertRaisesMessage(outbound.OutboundUnavailable, 'rate limited'):
+                with outbound.call('gmail'):
+                    pass
+
+        with override_settings(OUTBOUND_PROVIDERS={'gmail': {'concurrency': 1, 'queue_timeout': 0.01}}):
+            with outbound.call('gmail'):
+                with self.assertRaisesMessage(outbound.OutboundUnavailable, 'busy'):
+                    with outbound.call('gmail'):
+                        pass
+            self.assertEqual(outbound.gate('gmail').in_flight, 0)
+
+    async def test_async_calls_are_cut_off_at_the_timeout(self):
+        import asyncio
+        from django.test import override_settings
+        from ssm import outbound
+
+        with override_settings(OUTBOUND_PROVIDERS={'webpush': {'timeout': 0.05, 'failure_threshold': 1}}):
+            with self.assertRaises(TimeoutError), self.assertLogs('ssm.outbound', 'WARNING'):
+                async with outbound.acall('webpush'):
+                    await asyncio.sleep(1)
+            self.assertEqual(outbound.gate('webpush').breaker.state, outbound.OPEN)
+
+    def test_open_gemini_circuit_fails_fast_without_calling_gemini(self):
+        from ssm import outbound
+        from ssm.loadtest import simulated_gemini
+        from students.ai_utils import generate_resume_content
+
+        with simulated_gemini(latency=0, limits={'failure_threshold': 1, 'reset_timeout': 60}) as gemini:
+            with self.assertLogs('ssm.outbound', 'WARNING'):
+                self._fail('gemini', ConnectionError('upstream down'))
+            with self.assertLogs('students.ai_utils', 'WARNING'):
+                result = generate_resume_content({'name': 'A', 'department': 'CSE', 'skills': [], 'projects': []})
+        self.assertIn('busy', result['error'])
+        self.assertEqual(gemini.calls, 0)
+
+
+class AuditLogPipelineTestCase(TestCase):
+    def _request(self):
+        from django.test import RequestFactory
+        return RequestFactory().post('/staffs/', REMOTE_ADDR='10.0.0.1', HTTP_USER_AGENT='x' * 600)
+
+    def test_request_entries_are_written_together_after_the_view(self):
+        from django.http import HttpResponse
+        from ssm.middleware import AuditLogMiddleware
+        from staffs.models import AuditLog
+        from staffs.utils import log_audit
+
+        def view(request):
+            for i in range(3):
+                log_audit(request, 'update', 'staff', 'S1', object_type='Mark', object_id=str(i))
+            self.assertEqual(AuditLog.objects.count(), 0)
+            return HttpResponse('ok')
+
+        with self.assertNumQueries(2):
+            AuditLogMiddleware(view)(self._request())
+        self.assertEqual(AuditLog.objects.count(), 3)
+        self.assertEqual(len(AuditLog.objects.first().user_agent), 500)
+
+    def test_entries_outside_a_request_cycle_are_written_at_once(self):
+        from staffs.models import AuditLog
+        from staffs.utils import log_audit
+
+        log_audit(self._request(), 'login', 'staff', 'S1')
+        self.assertTrue(AuditLog.objects.filter(action='login', actor_id='S1').exists())
+
+    def test_archive_moves_old_months_to_storage_and_keeps_counts(self):
+        import datetime
+        import gzip
+        from io import StringIO
+        from django.core.files.storage import default_storage
+        from django.core.management import call_command
+        from django.test import override_settings
+        from django.utils import timezone
+        from staffs.models import AuditLog, AuditLogRollup
+
+        now = timezone.now()
+        old = now - datetime.timedelta(days=400)
+        older = old - datetime.timedelta(days=31)
+        AuditLog.objects.bulk_create(
+            [AuditLog(action='login', actor_type='staff', timestamp=old) for _ in range(3)]
+            + [AuditLog(action='delete', actor_type='admin', timestamp=older)]
+            + [AuditLog(action='login', actor_type='staff', timestamp=now)]
+        )
+
+        storages = {
+            'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        }
+        with override_settings(STORAGES=storages):
+            out = StringIO()
+            call_command('archive_audit_logs', keep_days=180, stdout=out)
+            _, files = default_storage.listdir('audit_archive')
+            lines = sum(len(gzip.decompress(default_storage.open(f'audit_archive/{name}').read()).splitlines()) for name in files)
+
+        self.assertEqual(len(files), 2)
+        self.assertEqual(lines, 4)
+        self.assertEqual(list(AuditLog.objects.values_list('timestamp', flat=True)), [now])
+        self.assertEqual(AuditLogRollup.objects.get(action='login', actor_type='staff').count, 3)
+        self.assertEqual(AuditLogRollup.objects.get(action='delete', actor_type='admin').count, 1)
+
+
+class AuditLogBackgroundWriterTestCase(TransactionTestCase):
+    def test_background_writer_batches_entries_from_many_requests(self):
+        from django.test import override_settings
+        from staffs import audit
+        from staffs.models import AuditLog
+
+        with override_settings(AUDIT_LOG_FLUSH='background', AUDIT_LOG_FLUSH_INTERVAL=0.05):
+            for i in range(4):
+                audit.flush([AuditLog(action='update', actor_type='staff', actor_id=str(i))])
+            audit.drain()
+        self.assertEqual(AuditLog.objects.count(), 4)
+
+
+class LoginProtectionTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import caches
+        self.cache = caches['login_attempts']
+        self.cache.clear()
+        self.addCleanup(self.cache.clear)
+        self.staff = Staff.objects.create(staff_id="LOGIN01", name="Login Staff", email="login01@example.com")
+        self.staff.set_password('right-password')
+        self.staff.save()
+        self.url = reverse('staffs:stafflogin')
+
+    def _login(self, password, staff_id='LOGIN01'):
+        return self.client.post(self.url, {'staff_id': staff_id, 'password': password})
+
+    def test_account_is_locked_without_hashing_after_repeated_failures(self):
+        from unittest import mock
+        from django.test import override_settings
+
+        with override_settings(LOGIN_DELAY_BASE=0, LOGIN_LOCKOUT_ATTEMPTS=4):
+            for _ in range(4):
+                self.assertEqual(self._login('wrong').status_code, 200)
+            with mock.patch.object(Staff, 'check_password') as check:
+                response = self._login('right-password')
+            check.assert_not_called()
+        self.assertEqual(response.status_code, 429)
+        self.assertContains(response, 'locked', status_code=429)
+        self.assertNotIn('staff_id', self.client.session)
+
+    def test_failures_past_the_free_attempts_are_delayed_progressively(self):
+        from django.test import override_settings
+
+        with override_settings(LOGIN_FREE_ATTEMPTS=1, LOGIN_DELAY_BASE=30):
+            self._login('wrong')
+            self._login('wrong')
+            response = self._login('right-password')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        # A success clears the account's failures
+        self.cache.clear()
+        self.assertRedirects(self._login('right-password'), reverse('staffs:staff_register'), fetch_redirect_response=False)
+
+    def test_failures_across_accounts_are_limited_per_ip(self):
+        from django.test import override_settings
+
+        with override_settings(LOGIN_IP_MAX_FAILURES=3):
+            for i in range(3):
+                self._login('wrong', staff_id=f'NOBODY{i}')
+            self.assertEqual(self._login('right-password').status_code, 429)
+            other_client = self.client.post(self.url, {'staff_id': 'LOGIN01', 'password': 'right-password'}, REMOTE_ADDR='10.1.1.1')
+        self.assertEqual(other_client.status_code, 302)
+
+    def test_attempts_beyond_the_hashing_budget_are_refused(self):
+        from django.test import override_settings
+        from ssm import login_protection
+
+        with override_settings(LOGIN_HASH_CONCURRENCY=1, LOGIN_HASH_QUEUE_TIMEOUT=0):
+            slots = login_protection._hash_slots()
+            slots.acquire()
+            try:
+                response = self._login('right-password')
+            finally:
+                slots.release()
+        self.assertEqual(response.status_code, 503)
+
+    def test_login_upgrades_an_outdated_password_hash(self):
+        from django.contrib.auth.hashers import make_password
+        from django.test import override_settings
+
+        hashers = ['django.contrib.auth.hashers.PBKDF2PasswordHasher', 'django.contrib.auth.hashers.MD5PasswordHasher']
+        with override_settings(PASSWORD_HASHERS=hashers):
+            Staff.objects.filter(pk='LOGIN01').update(password=make_password('right-password', hasher='md5'))
+            self.assertEqual(self._login('right-password').status_code, 302)
+        self.staff.refresh_from_db()
+        self.assertTrue(self.staff.password.startswith('pbkdf2_sha256$'))
+
+
+class SessionStoreTestCase(TestCase):
+    def setUp(self):
+        self.staff = Staff.objects.create(staff_id="SESS01", name="Session Staff", email="sess01@example.com", is_profile_complete=True)
+        self.staff.set_password('pw')
+        self.staff.save()
+
+    def test_authenticated_request_does_not_touch_the_session_table(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.client.post(reverse('staffs:stafflogin'), {'staff_id': 'SESS01', 'password': 'pw'})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('staffs:staff_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q['sql'] for q in queries if 'django_session' in q['sql']])
+
+    def test_password_reset_otp_is_kept_in_the_cache_not_the_session(self):
+        from staffs.utils import get_password_reset_otp, set_password_reset_otp
+
+        session = self.client.session
+        session['reset_staff_pk'] = self.staff.pk
+        session.save()
+        set_password_reset_otp('staff', self.staff.pk, '123456')
+        url = reverse('staffs:password_reset_otp_verify')
+
+        self.assertEqual(self.client.post(url, {'otp': '000000'}).status_code, 200)
+        self.assertEqual(get_password_reset_otp('staff', self.staff.pk), '123456')
+        self.assertRedirects(self.client.post(url, {'otp': '123456'}), reverse('staffs:password_reset_confirm'), fetch_redirect_response=False)
+        self.assertIsNone(get_password_reset_otp('staff', self.staff.pk))
+        self.assertTrue(self.client.session['staff_reset_verified'])
+        self.assertNotIn('staff_reset_otp', self.client.session)
+
+    def test_purge_deletes_only_expired_sessions(self):
+        import datetime
+        from django.contrib.sessions.models import Session
+        from django.utils import timezone
+        from ssm.sessions import purge_expired
+
+        now = timezone.now()
+        for i in range(3):
+            Session.objects.create(session_key=f'expired{i}', session_data='', expire_date=now - datetime.timedelta(days=1))
+        Session.objects.create(session_key='current', session_data='', expire_date=now + datetime.timedelta(days=1))
+        self.assertEqual(purge_expired(chunk_size=2), 3)
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['current'])
+
+
+class CurrentUserTestCase(TestCase):
+    def setUp(self):
+        self.staff = Staff.objects.create(
+            staff_id="CUR01", name="Current Staff", email="cur01@example.com",
+            role='Course Incharge', secondary_roles='Office Staff, Bonafide Issuing', is_profile_complete=True,
+        )
+        self.student = Student.objects.create(roll_number="CURSTU01", student_name="Current Student", student_email="curstu@example.com")
+
+    def test_principal_is_cached_until_its_row_is_saved(self):
+        from ssm.principals import resolve_staff
+
+        with self.assertNumQueries(1):
+            resolve_staff('CUR01')
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_staff('CUR01').name, 'Current Staff')
+
+        self.staff.name = 'Renamed Staff'
+        self.staff.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(resolve_staff('CUR01').name, 'Renamed Staff')
+
+    def test_bulk_changes_retire_cached_students(self):
+        from django.db.models import F
+        from ssm.principals import invalidate_principals, resolve_student
+
+        resolve_student('CURSTU01')
+        Student.objects.filter(pk='CURSTU01').update(current_semester=F('current_semester') + 1)
+        invalidate_principals(Student)
+        with self.assertNumQueries(1):
+            self.assertEqual(resolve_student('CURSTU01').current_semester, self.student.current_semester + 1)
+
+    def test_request_resolves_the_logged_in_user_once(self):
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from ssm import principals
+        from ssm.middleware import CurrentUserMiddleware
+
+        request = RequestFactory().get('/')
+        request.session = {'staff_id': 'CUR01'}
+        seen = []
+
+        def view(request):
+            seen.extend([principals.current_staff(request), principals.current_staff(request), bool(request.student)])
+            return HttpResponse()
+
+        principals.invalidate_principal(Staff, 'CUR01')
+        with self.assertNumQueries(1):
+            CurrentUserMiddleware(view)(request)
+        self.assertIs(seen[0], seen[1])
+        self.assertIsInstance(seen[0], Staff)
+        self.assertFalse(seen[2])
+        with self.assertRaises(Student.DoesNotExist):
+            principals.current_student(request)
+
+    def test_roles_are_parsed_once_and_follow_edits(self):
+        self.assertEqual(self.staff.get_roles_list(), ['Course Incharge', 'Office Staff', 'Bonafide Issuing'])
+        self.assertTrue(self.staff.can_manage_bonafide)
+        self.staff.secondary_roles = ''
+        self.assertFalse(self.staff.has_role('Office Staff'))
+        self.assertFalse(self.staff.can_manage_bonafide)
+
+
+class OfflineAttendanceSyncTestCase(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        import datetime
+        self.staff = Staff.objects.create(staff_id="OFF01", name="Offline Staff", email="off01@example.com", is_profile_complete=True)
+        self.other = Staff.objects.create(staff_id="OFF02", name="Other Staff", email="off02@example.com", is_profile_complete=True)
+        self.subject = Subject.objects.create(code='IT305', name='Compilers', semester=3, staff=self.staff)
+        self.date = datetime.date.today() - datetime.timedelta(days=7)
+        Timetable.objects.create(semester=3, day=self.date.strftime('%A'), period=1, subject=self.subject, staff=self.staff)
+        self.students = [
+            Student.objects.create(roll_number=f"OFFSTU0{i}", student_name=f"Offline {i}", student_email=f"offstu{i}@example.com", current_semester=3)
+            for i in range(3)
+        ]
+
+    def _sheet(self, statuses, marked_at='2026-01-01T09:00:00Z', **extra):
+        import uuid
+        sheet = {
+            'key': str(uuid.uuid4()), 'subject_id': self.subject.id, 'date': self.date.isoformat(),
+            'time': '08:30', 'end_time': '09:30', 'marked_at': marked_at, 'statuses': statuses,
+        }
+        sheet.update(extra)
+        return sheet
+
+    def test_sheet_is_applied_once_and_replays_change_nothing(self):
+        import json
+        from students.models import StudentAttendance
+
+        sheet = self._sheet({'OFFSTU00': 'Present', 'OFFSTU01': 'Absent', 'OFFSTU02': None, 'NOBODY': 'Present'})
+        session = self.client.session
+        session['staff_id'] = self.staff.staff_id
+        session.save()
+        url = reverse('staffs:sync_offline_attendance')
+
+        result = self.client.post(url, json.dumps({'sheets': [sheet]}), content_type='application/json').json()['results'][0]
+        self.assertEqual((result['status'], result['created'], result['unchanged']), ('applied', 2, 1))
+        self.assertEqual(result['unknown_students'], ['NOBODY'])
+        self.assertEqual(StudentAttendance.objects.filter(subject=self.subject, date=self.date).count(), 2)
+
+        StudentAttendance.objects.filter(student_id='OFFSTU00').update(status='Absent')
+        replay = self.client.post(url, json.dumps({'sheets': [sheet]}), content_type='application/json').json()['results'][0]
+        self.assertEqual(replay, dict(result, replayed=True))
+        self.assertEqual(StudentAttendance.objects.get(student_id='OFFSTU00').status, 'Absent')
+
+        self.assertEqual(self.client.post(url, 'not json', content_type='application/json').status_code, 400)
+
+    def test_later_mark_wins_whichever_order_sheets_arrive_in(self):
+        import datetime
+        from django.utils import timezone
+        from staffs.attendance_sync import apply_sheets
+        from students.models import StudentAttendance
+
+        StudentAttendance.objects.create(
+            student=self.students[0], subject=self.subject, date=self.date, time=datetime.time(8, 30),
+            status='Present', marked_at=timezone.now() - datetime.timedelta(days=1),
+        )
+        late = self._sheet({'OFFSTU01': 'Present'}, marked_at='2026-01-01T10:00:00Z')
+        early = self._sheet({'OFFSTU00': 'Absent', 'OFFSTU01': 'Absent'})
+        results = apply_sheets(self.staff, [late, early])
+
+        self.assertEqual(results[1]['kept_server'], ['OFFSTU00'])
+        self.assertEqual((results[0]['updated'], results[1]['created']), (1, 1))
+        self.assertEqual(
+            dict(StudentAttendance.objects.values_list('student_id', 'status')),
+            {'OFFSTU00': 'Present', 'OFFSTU01': 'Present'},
+        )
+
+    def test_sheets_the_form_would_refuse_are_rejected(self):
+        import datetime
+        from staffs.attendance_sync import SheetError, apply_sheets
+
+        tomorrow = (datetime.date.today() + datetime.timedelta(days=1)).isoformat()
+        unscheduled = (self.date + datetime.timedelta(days=1)).isoformat()
+        results = apply_sheets(self.other, [self._sheet({'OFFSTU00': 'Present'})])
+        self.assertIn('not assigned', results[0]['reason'])
+
+        results = apply_sheets(self.staff, [
+            self._sheet({'OFFSTU00': 'Present'}, date=tomorrow),
+            self._sheet({'OFFSTU00': 'Present'}, date=unscheduled),
+            self._sheet({'OFFSTU00': 'Present'}, date=unscheduled, is_extra_class=True),
+            self._sheet({'OFFSTU00': 'Late'}),
+        ])
+        self.assertEqual([r['status'] for r in results], ['rejected', 'rejected', 'applied', 'rejected'])
+        with self.assertRaises(SheetError):
+            apply_sheets(self.staff, {'key': 'x'})
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        from staffs.attendance_sync import apply_sheets
+
+        statuses = {s.roll_number: 'Present' for s in self.students}
+        with self.assertQueryBudget(12, max_repeats=1, label='one sheet') as one:
+            apply_sheets(self.staff, [self._sheet(statuses)])
+        sheets = [self._sheet(statuses, time=f'1{i}:00', marked_at=f'2026-01-01T1{i}:00:00Z') for i in range(5)]
+        with self.assertQueryBudget(one.query_count, max_repeats=1, label='five sheets'):
+            apply_sheets(self.staff, sheets)
+
+
+class ServiceWorkerPrecacheTestCase(TestCase):
+    def tearDown(self):
+        from ssm.precache import _deployed_manifest
+        _deployed_manifest.cache_clear()
+
+    def test_service_worker_precaches_the_pages_static_files(self):
+        import json
+        import re
+
+        response = self.client.get('/sw.js')
+        self.assertEqual(response['Content-Type'], 'application/javascript')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        body = response.content.decode()
+        urls = json.loads(re.search(r'const PRECACHE_URLS = (.*);', body).group(1))
+        self.assertIn('/static/css/student_style.css', urls)
+        self.assertIn('/static/js/attendance_queue.js', urls)
+        self.assertFalse([url for url in urls if url.startswith(('/static/vendor/', '/static/admin/'))])
+        self.assertRegex(body, r"const PRECACHE_VERSION = '[0-9a-f]{16}';")
+
+    def test_collectstatic_writes_a_manifest_of_fingerprinted_urls(self):
+        import json
+        import os
+        import tempfile
+        from django.core.management import call_command
+        from django.test import override_settings
+        from ssm.precache import MANIFEST_NAME, _deployed_manifest, load_manifest
+
+        with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(source, 'css'))
+            os.makedirs(os.path.join(source, 'vendor'))
+            for name, content in [('css/site.css', 'body{}'), ('css/huge.css', 'x' * 2048), ('vendor/lib.js', 'var a;')]:
+                with open(os.path.join(source, name), 'w') as f:
+                    f.write(content)
+
+            storages = {
+                'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+                'staticfiles': {'BACKEND': 'ssm.precache.PrecacheManifestStaticFilesStorage'},
+            }
+            with override_settings(
+                STORAGES=storages, STATIC_ROOT=root, STATICFILES_DIRS=[source],
+                STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'], SW_PRECACHE_MAX_BYTES=1024,
+            ):
+                call_command('collectstatic', interactive=False, verbosity=0)
+                with open(os.path.join(root, MANIFEST_NAME)) as f:
+                    manifest = json.load(f)
+                _deployed_manifest.cache_clear()
+                self.assertEqual(load_manifest(), manifest)
+
+        self.assertEqual(len(manifest['assets']), 1)
+        self.assertRegex(manifest['assets'][0], r'^/static/css/site\.[0-9a-f]{12}\.css$')
+
+
+class ReferenceDataTestCase(TestCase):
+    def test_versioned_bundle_is_immutable_and_revalidates_by_etag(self):
+        from ssm.reference_data import bundle_url
+
+        url = bundle_url('castes')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('public', response['Cache-Control'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        # The old endpoint and the unversioned URL serve the same bytes, to be revalidated
+        legacy = self.client.get(reverse('api_get_castes'))
+        self.assertEqual(legacy.content, response.content)
+        self.assertEqual(legacy['Cache-Control'], 'public, no-cache')
+        self.assertEqual(self.client.get('/reference/periods.json').json()['1'], {'start': '08:30', 'end': '09:30'})
+        self.assertEqual(self.client.get('/reference/nothing.json').status_code, 404)
+
+    def test_subjects_bundle_follows_model_changes(self):
+        from ssm.reference_data import bundle_url, get_bundle
+
+        staff = Staff.objects.create(staff_id="REF01", name="Ref Staff", email="ref01@example.com", is_profile_complete=True)
+        subject = Subject.objects.create(code='IT401', name='Data Mining', semester=4, staff=staff)
+        url = bundle_url('subjects', 'js')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        session = self.client.session
+        session['staff_id'] = staff.staff_id
+        session.save()
+        response = self.client.get(url)
+        self.assertIn(b'"IT401"', response.content)
+        self.assertIn('private', response['Cache-Control'])
+        with self.assertNumQueries(0):
+            get_bundle('subjects')
+
+        staff.name = 'Renamed Staff'
+        staff.save()
+        self.assertNotEqual(bundle_url('subjects', 'js'), url)
+        self.assertIn('no-cache', self.client.get(url)['Cache-Control'])
+        self.assertEqual(
+            self.client.get(bundle_url('subjects')).json()['4'][str(subject.id)]['staff'], 'Renamed Staff',
+        )
+
+
+class DirectUploadTestCase(TestCase):
+    pdf = b'%PDF-1.4\n' + b'0' * 2048 + b'\n%%EOF\n'
+
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        from django.test import override_settings
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        storages = override_settings(
+            MEDIA_ROOT=media_root,
+            DIRECT_UPLOAD_JOB_RUNNER='worker',
+            STORAGES={
+                'default': {'BACKEND': 'ssm.storage_backends.LocalBucketStorage'},
+                'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+            },
+        )
+        storages.enable()
+        self.addCleanup(storages.disable)
+
+        self.student = Student.objects.create(
+            roll_number="UPL01", student_name="Upload Student", student_email="upl01@example.com",
+            current_semester=3, is_profile_complete=True,
+        )
+        session = self.client.session
+        session['student_roll_number'] = self.student.roll_number
+        session.save()
+
+    def presign(self, **overrides):
+        body = dict(
+            target='fee_challan', field='tuition_fee_challan', params={'academic_year': 2},
+            filename='challan.pdf', content_type='application/pdf', size=len(self.pdf),
+        )
+        body.update(overrides)
+        return self.client.post(reverse('direct_upload_presign'), body, content_type='application/json')
+
+    def test_file_goes_to_the_bucket_and_is_stored_on_completion(self):
+        from django.core.files.storage import default_storage
+        from ssm import direct_uploads
+        from staffs.models import DirectUpload
+        from students.models import FeeChallanRecord
+
+        grant = self.presign().json()
+        self.assertEqual(grant['method'], 'PUT')
+        upload = DirectUpload.objects.get(pk=grant['id'])
+
+        # Completing before the file arrived is refused, and the upload stays open
+        self.assertEqual(self.client.post(reverse('direct_upload_complete', args=[upload.pk])).status_code, 409)
+        # The signed type and size are enforced by the bucket
+        self.assertEqual(self.client.generic('PUT', grant['url'], self.pdf, content_type='image/png').status_code, 403)
+        self.assertEqual(self.client.generic('PUT', grant['url'], self.pdf[:-1], content_type='application/pdf').status_code, 403)
+        self.assertEqual(self.client.generic('PUT', grant['url'], self.pdf, content_type='application/pdf').status_code, 200)
+
+        response = self.client.post(reverse('direct_upload_complete', args=[upload.pk]))
+        self.assertEqual(response.json()['status'], 'uploaded')
+        self.assertEqual(direct_uploads.run_next_job(), upload.pk)
+        self.assertIsNone(direct_uploads.run_next_job())
+
+        upload.refresh_from_db()
+        record = FeeChallanRecord.objects.get(student=self.student, academic_year=2)
+        self.assertEqual(upload.status, 'done')
+        self.assertEqual(record.tuition_fee_challan.name, upload.stored_name)
+        self.assertTrue(default_storage.exists(upload.stored_name))
+        self.assertFalse(default_storage.exists(upload.key))
+        self.assertEqual(self.client.get(reverse('direct_upload_status', args=[upload.pk])).json()['status'], 'done')
+
+    def test_refuses_other_types_sizes_fields_and_owners(self):
+        from staffs.models import DirectUpload
+
+        self.assertEqual(self.presign(content_type='text/html').status_code, 400)
+        self.assertEqual(self.presign(size=100 * 1024 * 1024).status_code, 400)
+        self.assertEqual(self.presign(field='student').status_code, 400)
+        self.assertEqual(self.presign(params={'academic_year': 9}).status_code, 400)
+        self.assertEqual(self.presign(target='staff_documents', field='photo', content_type='image/png').status_code, 403)
+        self.assertFalse(DirectUpload.objects.exists())
+
+        upload_id = self.presign().json()['id']
+        other = Student.objects.create(roll_number="UPL02", student_name="Other", student_email="upl02@example.com", current_semester=3)
+        session = self.client.session
+        session['student_roll_number'] = other.roll_number
+        session.save()
+        self.assertEqual(self.client.get(reverse('direct_upload_status', args=[upload_id])).status_code, 404)
+        self.assertEqual(self.client.post(reverse('direct_upload_complete', args=[upload_id])).status_code, 404)
+
+    def test_profile_forms_send_files_direct_and_keep_stored_ones(self):
+        from ssm import principals
+
+        self.assertContains(self.client.get(reverse('student_editprofile')), 'data-direct-upload="student_documents"')
+
+        staff = Staff.objects.create(staff_id="UPL_ST", name="Upload Staff", email="uplst@example.com")
+        session = self.client.session
+        session['staff_id'] = staff.staff_id
+        session.save()
+        response = self.client.get(reverse('staffs:staff_edit_profile'))
+        self.assertContains(response, 'data-direct-upload="staff_documents"')
+        self.assertContains(response, 'data-upload-field="photo"')
+
+        # A worker stores the photo after this request loaded the staff member
+        principals.resolve_staff(staff.pk)
+        Staff.objects.filter(pk=staff.pk).update(photo='staff/UPL_ST/profile_photo.png')
+        self.client.post(reverse('staffs:staff_edit_profile'), {'address': 'New address'})
+        staff.refresh_from_db()
+        self.assertEqual((staff.address, staff.photo.name), ('New address', 'staff/UPL_ST/profile_photo.png'))
+
+
+class MediaMigrationTestCase(TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        from django.test import override_settings
+
+        self.media_root, self.bucket, self.state_dir = (tempfile.mkdtemp() for _ in range(3))
+        for path in (self.media_root, self.bucket, self.state_dir):
+            self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+        target = override_settings(
+            MEDIA_ROOT=self.media_root,
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+                'bucket': {'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': self.bucket}},
+            },
+        )
+        target.enable()
+        self.addCleanup(target.disable)
+
+        from students.models import StudentDocuments
+
+        student = Student.objects.create(roll_number="MIG01", student_name="Migrated", student_email="mig01@example.com", current_semester=1)
+        self.write('old/photo.png', b'\x89PNG' + b'1' * 100)
+        self.write('old/sslc.pdf', b'%PDF' + b'2' * 100)
+        self.documents = StudentDocuments.objects.create(
+            student=student, student_photo='old/photo.png', sslc_marksheet='old/sslc.pdf', aadhaar_card='gone/aadhaar.pdf',
+        )
+
+    def write(self, name, content):
+        import os
+
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+
+    def migrate(self, *args):
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command('migrate_media', '--to', 'bucket', '--state-dir', self.state_dir, *args, stdout=out)
+        return out.getvalue()
+
+    def test_copies_verifies_and_resumes(self):
+        import os
+
+        out = self.migrate('--dry-run')
+        self.assertIn('2 file(s) would be copied', out)
+        self.assertFalse(os.listdir(self.bucket))
+        self.assertFalse(os.listdir(self.state_dir))
+
+        out = self.migrate()
+        self.assertIn('Copied 2 file(s), 0 failed; rewrote 0 row(s)', out)
+        with open(os.path.join(self.bucket, 'old', 'sslc.pdf'), 'rb') as f:
+            self.assertEqual(f.read(), b'%PDF' + b'2' * 100)
+
+        # A rerun copies only what changed since
+        self.write('old/sslc.pdf', b'%PDF' + b'3' * 200)
+        out = self.migrate()
+        self.assertIn('1 file(s) to copy', out)
+        with open(os.path.join(self.bucket, 'old', 'sslc.pdf'), 'rb') as f:
+            self.assertEqual(f.read(), b'%PDF' + b'3' * 200)
+        self.assertIn('0 file(s) to copy', self.migrate())
+
+    def test_rekey_rewrites_only_rows_still_pointing_at_the_old_name(self):
+        import os
+
+        from ssm.media_migration import build_manifest, rewrite_names
+        from students.models import StudentDocuments
+
+        entries, missing = build_manifest(self.media_root, rekey=True)
+        self.assertEqual(missing, ['gone/aadhaar.pdf'])
+        # Replaced after the manifest was built: the new file must keep its row
+        StudentDocuments.objects.filter(pk=self.documents.pk).update(sslc_marksheet='replaced.pdf')
+        self.assertEqual(rewrite_names(entries, {entry.key: None for entry in entries}, dry_run=True), 1)
+        StudentDocuments.objects.filter(pk=self.documents.pk).update(sslc_marksheet='old/sslc.pdf')
+
+        self.assertIn('rewrote 2 row(s)', self.migrate('--rekey'))
+        self.documents.refresh_from_db()
+        self.assertEqual(self.documents.student_photo.name, 'students/MIG01/profile_photo.png')
+        self.assertEqual(self.documents.sslc_marksheet.name, 'students/MIG01/sslc_marksheet.pdf')
+        self.assertTrue(os.path.exists(os.path.join(self.bucket, 'students', 'MIG01', 'profile_photo.png')))
+
+    def test_rekey_retires_cached_principals(self):
+        from ssm import principals
+
+        self.write('old/staff.png', b'\x89PNG' + b'4' * 100)
+        staff = Staff.objects.create(staff_id="MIG_ST", name="Migrated Staff", email="migst@example.com", photo='old/staff.png')
+        self.assertEqual(principals.resolve_staff(staff.pk).photo.name, 'old/staff.png')
+
+        self.migrate('--rekey')
+        staff.refresh_from_db()
+        self.assertNotEqual(staff.photo.name, 'old/staff.png')
+        self.assertEqual(principals.resolve_staff(staff.pk).photo.name, staff.photo.name)
+
+    def test_multipart_etag_matches_s3(self):
+        import hashlib
+        import os
+        from ssm.media_migration import multipart_etag
+
+        self.write('big.bin', b'a' * 10 + b'b' * 10 + b'c' * 5)
+        path = os.path.join(self.media_root, 'big.bin')
+        parts = b''.join(hashlib.md5(part).digest() for part in (b'a' * 10, b'b' * 10, b'c' * 5))
+        self.assertEqual(multipart_etag(path, threshold=20, chunksize=10), hashlib.md5(parts).hexdigest() + '-3')
+        self.assertEqual(multipart_etag(path, threshold=100, chunksize=10), hashlib.md5(open(path, 'rb').read()).hexdigest())
@@ -0,0 +1,301 @@
+"""
+Pure helpers for the weekly timetable editor.
+
+Nothing in this module touches the database: callers load the current rows once,
+ask for a change plan, and then apply it with bulk operations.
+"""
+
+TIMETABLE_DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+TIMETABLE_PERIODS = range(1, 8)
+# Start and end of each period, as on the official department timetable
+PERIOD_TIMES = {
+    1: ('08:30', '09:30'),
+    2: ('09:30', '10:30'),
+    3: ('10:40', '11:40'),
+    4: ('11:40', '12:40'),
+    5: ('13:30', '14:30'),
+    6: ('14:30', '15:30'),
+    7: ('15:30', '16:30'),
+}
+
+VIRTUAL_SLOTS = ('LAB_SESSION', 'PLACEMENT', 'LIBRARY')
+MORNING_LAB_BLOCKS = ((1, 2, 3), (2, 3, 4))
+AFTERNOON_LAB_BLOCK = (5, 6, 7)
+
+
+def is_3hr_lab(value, lab_subject_ids):
+    """A slot value starts a 3-hour block when it is a LAB_SESSION or a Lab-type subject id."""
+    if not value:
+        return False
+    return value == 'LAB_SESSION' or value in lab_subject_ids
+
+
+def propagate_lab_blocks(grid, lab_subject_ids):
+    """
+    Spreads 3-hour labs across their block and returns a new grid.
+
+    grid is {day: {period: value}}; a lab chosen in P1 fills P2-P3, in P2 fills
+    P3-P4, and in P5 fills P6-P7. Cells that already hold a different non-lab
+    value are left alone. The input grid is not modified.
+    """
+    result = {day: dict(cells) for day, cells in grid.items()}
+    for day, cells in result.items():
+        def spread(start, targets):
+            for p in targets:
+                if not cells.get(p) or is_3hr_lab(cells.get(p), lab_subject_ids):
+                    cells[p] = cells[start]
+
+        if is_3hr_lab(cells.get(1), lab_subject_ids):
+            spread(1, (2, 3))
+        elif is_3hr_lab(cells.get(2), lab_subject_ids):
+            spread(2, (3, 4))
+
+        if is_3hr_lab(cells.get(5), lab_subject_ids):
+            spread(5, (6, 7))
+    return result
+
+
+def lab_block_for_period(period):
+    for block in MORNING_LAB_BLOCKS + (AFTERNOON_LAB_BLOCK,):
+        if period in block:
+            return block
+    return ()
+
+
+def resolve_lab_batches(lab_grid, day, period):
+    """
+    Returns the (batch A, batch B) subject ids for a LAB_SESSION cell, falling back
+    to the other periods of the same lab block when the cell itself was left empty.
+    """
+    lab_a, lab_b = lab_grid.get((day, period), (None, None))
+    if not lab_a or not lab_b:
+        for p in lab_block_for_period(period):
+            other_a, other_b = lab_grid.get((day, p), (None, None))
+            lab_a = lab_a or other_a
+            lab_b = lab_b or other_b
+    return lab_a, lab_b
+
+
+class TimetableChangePlan:
+    """Rows to create, update and delete, plus the staff whose slots changed."""
+
+    def __init__(self):
+        self.creates = []
+        self.updates = []
+        self.deletes = []
+        self.notifications = {}
+
+    def notify(self, staff, message):
+        if staff is None:
+            return
+        entry = self.notifications.setdefault(staff.staff_id, {'staff': staff, 'changes': []})
+        entry['changes'].append(message)
+
+    @property
+    def has_changes(self):
+        return bool(self.creates or self.updates or self.deletes)
+
+
+def plan_timetable_changes(existing_entries, post_grid, lab_grid, current_batch, subjects_by_id, build_entry):
+    """
+    Diffs the posted grid against the current Timetable rows and returns a TimetableChangePlan.
+
+    existing_entries: Timetable rows for one academic year and semester, loaded once.
+    post_grid: {day: {period: value}} after propagate_lab_blocks.
+    lab_grid: {(day, period): (batch_a_subject_id, batch_b_subject_id)}.
+    subjects_by_id: {str(subject.id): Subject} for every id referenced in the post.
+    build_entry: callable(day, period, batch, subject, staff) returning an unsaved row.
+    """
+    plan = TimetableChangePlan()
+    by_cell = {}
+    for entry in existing_entries:
+        by_cell.setdefault((entry.day, entry.period), []).append(entry)
+
+    def remove(entry, label):
+        plan.deletes.append(entry)
+        plan.notify(entry.staff, f"removed from {label}")
+
+    def put(entries, day, period, batch, subject_id, virtual=False):
+        entry = next((e for e in entries if e.batch == batch), None)
+        subject = None if virtual else subjects_by_id.get(str(subject_id)) if subject_id else None
+        staff = subject.staff if subject else None
+        label = f"{day} P{period}" + (f" (Batch {batch})" if batch != 'All' else '')
+
+        if subject is None and not virtual:
+            if entry is not None:
+                remove(entry, label)
+            return
+
+        code = subject.code if subject else 'a class'
+        if entry is None:
+            plan.creates.append(build_entry(day, period, batch, subject, staff))
+            plan.notify(staff, f"assigned {code} on {label}")
+            return
+
+        if entry.subject_id != (subject.pk if subject else None) or entry.staff_id != (staff.pk if staff else None):
+            old_staff = entry.staff
+            entry.subject = subject
+            entry.staff = staff
+            plan.updates.append(entry)
+            if staff and old_staff != staff:
+                plan.notify(staff, f"assigned {code} on {label}")
+            if old_staff and old_staff != staff:
+                plan.notify(old_staff, f"no longer assigned to {label}")
+
+    for day in TIMETABLE_DAYS:
+        for period in TIMETABLE_PERIODS:
+            value = post_grid.get(day, {}).get(period, '')
+            entries = by_cell.get((day, period), [])
+
+            if current_batch == 'All':
+                if value == 'LAB_SESSION':
+                    lab_a, lab_b = resolve_lab_batches(lab_grid, day, period)
+                    if not lab_a and not lab_b and any(e.batch in ('A', 'B') for e in entries):
+                        continue
+                    for entry in entries:
+                        if entry.batch == 'All':
+                            remove(entry, f"{day} P{period}")
+                    put(entries, day, period, 'A', lab_a)
+                    put(entries, day, period, 'B', lab_b)
+                else:
+                    for entry in entries:
+                        if entry.batch in ('A', 'B'):
+                            remove(entry, f"{day} P{period} (Batch {entry.batch})")
+                    if not value:
+                        for entry in entries:
+                            if entry.batch == 'All':
+                                remove(entry, f"{day} P{period}")
+                    else:
+                        virtual = value in VIRTUAL_SLOTS
+                        put(entries, day, period, 'All', None if virtual else value, virtual=virtual)
+            else:
+                if not value:
+                    for entry in entries:
+                        if entry.batch == current_batch:
+                            remove(entry, f"{day} P{period} (Batch {current_batch})")
+                    continue
+
+                # Splitting a whole-class slot: the other batch keeps the old 'All' assignment.
+                all_entry = next((e for e in entries if e.batch == 'All'), None)
+                if all_entry is not None:
+                    other_batch = 'B' if current_batch == 'A' else 'A'
+                    if not any(e.batch == other_batch for e in entries):
+                        plan.creates.append(build_entry(day, period, other_batch, all_entry.subject, all_entry.staff))
+                    plan.deletes.append(all_entry)
+
+                virtual = value in VIRTUAL_SLOTS
+                subject = None if virtual else subjects_by_id.get(value)
+                entry = next((e for e in entries if e.batch == current_batch), None)
+                staff = subject.staff if subject else None
+                if entry is None:
+                    plan.creates.append(build_entry(day, period, current_batch, subject, staff))
+                elif entry.subject_id != (subject.pk if subject else None) or entry.staff_id != (staff.pk if staff else None):
+                    entry.subject = subject
+                    entry.staff = staff
+                    plan.updates.append(entry)
+
+    return plan
+
+
+def summarize_timetable_changes(changes, limit=3):
+    """Builds the single push-notification body sent to a staff member for a timetable save."""
+    shown = '; '.join(changes[:limit])
+    if len(changes) > limit:
+        shown += f" and {len(changes) - limit} more change(s)"
+    return f"Your timetable was updated: {shown}."
+
+
+def snapshot_key(day, period, batch):
+    return f"{day}|{period}|{batch}"
+
+
+def _snapshot_sort_key(key):
+    day, period, batch = key.split('|')
+    day_index = TIMETABLE_DAYS.index(day) if day in TIMETABLE_DAYS else len(TIMETABLE_DAYS)
+    return (day_index, int(period), batch)
+
+
+def _snapshot_label(key):
+    day, period, batch = key.split('|')
+    return f"{day} P{period}" + (f" (Batch {batch})" if batch != 'All' else '')
+
+
+def build_timetable_snapshot(entries):
+    """
+    Converts Timetable rows (with subject and staff loaded) into the compact snapshot stored
+    on PublishedTimetableVersion: {'Day|Period|Batch': {subject_code, subject_name, ...}}.
+    """
+    snapshot = {}
+    for e in entries:
+        subject = e.subject
+        snapshot[snapshot_key(e.day, e.period, e.batch)] = {
+            'subject_code': subject.code if subject else '',
+            'subject_name': subject.name if subject else '',
+            'subject_type': subject.subject_type if subject else '',
+            'staff_name': e.staff.name if e.staff else '',
+            'staff_id': e.staff.staff_id if e.staff else '',
+            'location_name': subject.get_location_display() if (subject and hasattr(subject, 'get_location_display')) else '',
+        }
+    return snapshot
+
+
+def _cell_label(item):
+    label = item.get('subject_code') or 'Slot'
+    if item.get('staff_name'):
+        label += f" · {item['staff_name']}"
+    return label
+
+
+def diff_timetable_snapshots(previous, current):
+    """
+    Compares two snapshots cell by cell. The result carries the before/after labels so
+    the version history can describe a change without loading the previous snapshot:
+    {'added': [[key, label]], 'removed': [[key, label]], 'changed': [[key, old, new]]}.
+    """
+    previous = previous or {}
+    current = current or {}
+    return {
+        'added': [[k, _cell_label(current[k])] for k in sorted(current.keys() - previous.keys(), key=_snapshot_sort_key)],
+        'removed': [[k, _cell_label(previous[k])] for k in sorted(previous.keys() - current.keys(), key=_snapshot_sort_key)],
+        'changed': [
+            [k, _cell_label(previous[k]), _cell_label(current[k])]
+            for k in sorted(current.keys() & previous.keys(), key=_snapshot_sort_key)
+            if current[k] != previous[k]
+        ],
+    }
+
+
+def describe_snapshot_diff(diff, limit=10):
+    """Turns a stored snapshot diff into short lines for the version history page."""
+    lines = [f"{_snapshot_label(key)}: added {label}" for key, label in diff.get('added', [])]
+    lines += [f"{_snapshot_label(key)}: removed {label}" for key, label in diff.get('removed', [])]
+    lines += [f"{_snapshot_label(key)}: {old} → {new}" for key, old, new in diff.get('changed', [])]
+    if len(lines) > limit:
+        return lines[:limit] + [f"…and {len(lines) - limit} more"]
+    return lines
+
+
+def snapshot_grid_rows(snapshot):
+    """
+    Lays a snapshot out as 5-day x 7-period rows for template rendering. Split A/B cells
+    become {'is_batch': True, 'A': ..., 'B': ...}; whole-class cells are the item itself.
+    """
+    grid = {day: [None] * 7 for day in TIMETABLE_DAYS}
+    for key, item in (snapshot or {}).items():
+        try:
+            day, period, batch = key.split('|')
+            period = int(period)
+        except ValueError:
+            continue
+        if day not in grid or not 1 <= period <= 7:
+            continue
+        item = dict(item, day=day, period=period, batch=batch)
+        curr = grid[day][period - 1]
+        if batch in ('A', 'B'):
+            if not (isinstance(curr, dict) and curr.get('is_batch')):
+                curr = {'is_batch': True, 'A': None, 'B': None}
+                grid[day][period - 1] = curr
+            curr[batch] = item
+        elif curr is None:
+            grid[day][period - 1] = item
+    return [(day, grid[day]) for day in TIMETABLE_DAYS]
@@ -69,6 +69,7 @@ urlpatterns = [
     path('subjects/<int:subject_id>/attendance/calendar/', views.attendance_calendar, name='attendance_calendar'),
     path('attendance/overall-calendar/', views.overall_attendance_calendar, name='overall_attendance_calendar'),
     path('subjects/<int:subject_id>/attendance/report/', views.attendance_report, name='attendance_report'),
+    path('attendance/sync/', views.sync_offline_attendance, name='sync_offline_attendance'),
     path('staff/list/', views.staff_list, name='staff_list'),
     path('staff/<str:staff_id>/profile/', views.view_faculty_profile, name='view_faculty_profile'),
     
@@ -76,6 +77,7 @@ urlpatterns = [
     path('substitutions/manage/', views.manage_substitutions, name='manage_substitutions'),
     path('substitutions/incoming/', views.incoming_substitutions, name='incoming_substitutions'),
     path('substitutions/assigned/', views.assigned_substitutions, name='assigned_substitutions'),
+    path('substitutions/leave/<int:leave_id>/', views.plan_leave_substitutions, name='plan_leave_substitutions'),
     
     # Passed Out Students
     path('assign-batches/', views.assign_lab_batches, name='assign_lab_batches'),
@@ -158,6 +160,11 @@ urlpatterns = [
     path('department-tasks/export-staff/', views.export_staff_tasks_csv, name='export_staff_tasks_csv'),
     path('department-tasks/export-matrix/', views.export_task_matrix_csv, name='export_task_matrix_csv'),
 
+    # Department Research Analytics (HOD)
+    path('hod/research-analytics/', views.department_research_analytics, name='department_research_analytics'),
+    path('hod/research-analytics/data/', views.department_research_analytics_data, name='department_research_analytics_data'),
+    path('hod/research-analytics/export/', views.export_department_research_csv, name='export_department_research_csv'),
+
     # Web Push
     path('webpush/', include('webpush.urls')),
     path('send-notification/', views.send_custom_notification, name='send_custom_notification'),
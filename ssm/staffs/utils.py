@@ -7,8 +7,10 @@ from django.core.mail import send_mail
 
 def log_audit(request, action, actor_type, actor_id, actor_name=None, object_type=None, object_id=None, message=None):
     """
-    Logs an audit trail entry.
+    Logs an audit trail entry. The entry is buffered and written when the request finishes
+    (see staffs.audit), so logging costs the action no query of its own.
     """
+    from .audit import record
     from .models import AuditLog
 
     # Get Client IP
@@ -21,7 +23,7 @@ def log_audit(request, action, actor_type, actor_id, actor_name=None, object_typ
     # Get User Agent
     user_agent = request.META.get('HTTP_USER_AGENT', '')
 
-    AuditLog.objects.create(
+    record(request, AuditLog(
         action=action,
         actor_type=actor_type,
         actor_id=actor_id or '',
@@ -29,10 +31,10 @@ def log_audit(request, action, actor_type, actor_id, actor_name=None, object_typ
         object_type=object_type or '',
         object_id=object_id or '',
         ip_address=ip_address,
-        user_agent=user_agent,
+        user_agent=user_agent[:500],
         message=message or '',
         timestamp=timezone.now()
-    )
+    ))
 
 
 def send_parent_notification_email(student, remark_types, staff_name):
@@ -186,8 +188,6 @@ def send_push_notification(student, title, body, url=None):
     Sends a web push notification to a specific student using their roll number group.
     """
     try:
-        from webpush import send_group_notification
-        
         group_name = f"student_{student.roll_number}"
         payload = {
             "head": title,
@@ -209,8 +209,6 @@ def send_staff_notification(staff, title, body, url=None):
     Sends a web push notification to a specific staff member.
     """
     try:
-        from webpush import send_group_notification
-        
         group_name = f"staff_{staff.staff_id}"
         payload = {
             "head": title,
@@ -226,57 +224,587 @@ def send_staff_notification(staff, title, body, url=None):
         print(f"Push Notification Failed for Staff {staff.staff_id}: {e}")
         return False
 
+def send_group_notification(group_name, payload, ttl=0):
+    """
+    Replacement for webpush.send_group_notification that sends through the outbound gateway.
+    Returns the number of pushes sent.
+    """
+    from webpush.models import PushInformation
+
+    return _send_pushes(PushInformation.objects.filter(group__name=group_name), payload, ttl)
+
+
+def send_user_notification(user, payload, ttl=0):
+    """Replacement for webpush.send_user_notification that sends through the outbound gateway."""
+    return _send_pushes(user.webpush_info.all(), payload, ttl)
+
+
+def _send_pushes(push_infos, payload, ttl):
+    """
+    Sends payload to each subscription in push_infos, each push one call through the outbound
+    gateway (ssm.outbound), and deletes expired (410) subscriptions as django-webpush does. A
+    failing device does not stop the others; a refusal from the gateway stops the rest.
+    """
+    import json
+    import logging
+    from pywebpush import WebPushException, webpush
+    from webpush.utils import _process_subscription_info
+    from ssm import outbound
+
+    logger = logging.getLogger(__name__)
+    data = json.dumps(payload)
+    sent = 0
+    for info in push_infos.select_related('subscription'):
+        subscription = info.subscription
+        try:
+            with outbound.call('webpush') as timeout:
+                webpush(
+                    subscription_info=_process_subscription_info(subscription), data=data, ttl=ttl,
+                    timeout=timeout, **_vapid_options(),
+                )
+            sent += 1
+        except outbound.OutboundUnavailable as e:
+            logger.warning(str(e))
+            break
+        except WebPushException as e:
+            if e.response is not None and e.response.status_code == 410:
+                subscription.delete()
+            else:
+                logger.warning(f"Push to subscription {subscription.pk} failed: {e}")
+        except Exception as e:
+            logger.warning(f"Push to subscription {subscription.pk} failed: {e}")
+    return sent
+
+
+def _vapid_options():
+    # A fresh dict per push: pywebpush fills in the claims (aud, exp) for each endpoint
+    webpush_settings = getattr(settings, 'WEBPUSH_SETTINGS', {})
+    if not webpush_settings.get('VAPID_PRIVATE_KEY'):
+        return {}
+    return {
+        'vapid_private_key': webpush_settings['VAPID_PRIVATE_KEY'],
+        'vapid_claims': {'sub': f"mailto:{webpush_settings.get('VAPID_ADMIN_EMAIL')}"},
+    }
+
+
+async def asend_group_notification(group_name, payload, ttl=0):
+    """
+    Async counterpart of send_group_notification, for async views: the subscriptions are read
+    through the async ORM and every push is sent concurrently with pywebpush's aiohttp sender
+    instead of blocking a thread per request. Returns the number of pushes sent.
+    """
+    import asyncio
+    import json
+    import logging
+    import aiohttp
+    from pywebpush import WebPushException, webpush_async
+    from webpush.models import PushInformation
+    from webpush.utils import _process_subscription_info
+    from ssm import outbound
+
+    subscriptions = [
+        info.subscription
+        async for info in PushInformation.objects.filter(group__name=group_name).select_related('subscription')
+    ]
+    if not subscriptions:
+        return 0
+
+    data = json.dumps(payload)
+
+    async def send(session, subscription):
+        try:
+            async with outbound.acall('webpush') as timeout:
+                await webpush_async(
+                    subscription_info=_process_subscription_info(subscription), data=data, ttl=ttl,
+                    timeout=timeout, aiohttp_session=session, **_vapid_options(),
+                )
+            return True
+        except WebPushException as e:
+            if e.response is not None and e.response.status == 410:
+                await subscription.adelete()
+                return False
+            raise
+
+    async with aiohttp.ClientSession() as session:
+        sent = await asyncio.gather(*(send(session, sub) for sub in subscriptions), return_exceptions=True)
+    for result in sent:
+        if isinstance(result, Exception):
+            logging.getLogger(__name__).warning(f"Push to group {group_name} failed: {result}")
+    return sum(result is True for result in sent)
+
+def run_in_background(func, *args, **kwargs):
+    """
+    Runs func(*args, **kwargs) on a daemon thread once the current transaction commits,
+    so slow side effects (push notifications, emails) never hold up the request.
+    """
+    import logging
+    import threading
+    from django.db import connections, transaction
+
+    logger = logging.getLogger(__name__)
+
+    def _target():
+        try:
+            func(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Background task {getattr(func, '__name__', func)} failed: {e}")
+        finally:
+            connections.close_all()
+
+    def _start():
+        threading.Thread(target=_target, daemon=True).start()
+
+    transaction.on_commit(_start)
+
+def notify_substitution_requests(requester_name, requests):
+    """Sends each substitute a single push listing the periods they have been asked to cover."""
+    by_substitute = {}
+    for req in requests:
+        by_substitute.setdefault(req.substitute.staff_id, (req.substitute, []))[1].append(f"{req.date:%d %b} P{req.period}")
+
+    for substitute, slots in by_substitute.values():
+        send_staff_notification(
+            substitute,
+            "📅 Alternate Request",
+            f"{requester_name} requested you to act as alternate for {', '.join(slots)}.",
+            url="/staffs/substitutions/incoming/"
+        )
+
+def notify_timetable_changes(notifications):
+    """Sends one summary push notification per staff member affected by a timetable save."""
+    from .timetable_utils import summarize_timetable_changes
+
+    for item in notifications.values():
+        send_staff_notification(
+            item['staff'],
+            "📅 Timetable Updated",
+            summarize_timetable_changes(item['changes']),
+            url="/staffs/my-timetable/"
+        )
+
 def get_risk_metrics(subject):
     """
     Returns a list of students considered 'at risk' for a given subject.
     Risk factors include Low Attendance (<75%) and Low Internal Marks (<25).
     """
+    return get_risk_metrics_for_subjects([subject]).get(subject.pk, [])
+
+
+def get_risk_metrics_for_subjects(subjects):
+    """
+    get_risk_metrics for many subjects at once: {subject_id: risk list}.
+    Students, attendance totals and marks are each loaded in a single query.
+    """
+    from django.db.models import Count, Q
     from students.models import Student, StudentAttendance, StudentMarks
 
-    # Get students in the current semester for the subject
-    students = Student.objects.filter(current_semester=subject.semester)
-    risk_list = []
+    subjects = list(subjects)
+    if not subjects:
+        return {}
+    subject_ids = [s.pk for s in subjects]
 
-    for student in students:
-        risk_factors = []
-        
-        # Calculate Attendance
-        attendances = StudentAttendance.objects.filter(student=student, subject=subject)
-        total_classes = attendances.count()
-        if total_classes > 0:
-            presents = attendances.filter(status='Present').count()
-            attendance_percentage = round((presents / total_classes) * 100, 2)
-        else:
-            attendance_percentage = 100.0  # Safe default if no classes held
-
-        if attendance_percentage < 75.0 and total_classes > 0:
-            risk_factors.append("Low Attendance (<75%)")
-
-        # Check Marks
-        internal_marks = "N/A"
-        marks_obj = StudentMarks.objects.filter(student=student, subject=subject).first()
-        if marks_obj:
-            if marks_obj.internal_marks is not None:
-                internal_marks = marks_obj.internal_marks
-                # Flag if internals are low (e.g. < 25)
-                if marks_obj.internal_marks < 25:
-                    risk_factors.append("Low Internal Marks")
+    students_by_semester = {}
+    for student in Student.objects.filter(current_semester__in={s.semester for s in subjects}).order_by('roll_number'):
+        students_by_semester.setdefault(student.current_semester, []).append(student)
+
+    attendance = {
+        (row['student_id'], row['subject_id']): (row['total'], row['present'])
+        for row in StudentAttendance.objects.filter(subject_id__in=subject_ids).values('student_id', 'subject_id').annotate(
+            total=Count('id'), present=Count('id', filter=Q(status='Present'))
+        )
+    }
+    marks = {
+        (m.student_id, m.subject_id): m
+        for m in StudentMarks.objects.filter(subject_id__in=subject_ids).only(
+            'student_id', 'subject_id', 'test1_marks', 'test2_marks', 'internal_marks'
+        )
+    }
+
+    risks_by_subject = {}
+    for subject in subjects:
+        risk_list = []
+        for student in students_by_semester.get(subject.semester, []):
+            risk_factors = []
+
+            # Calculate Attendance
+            total_classes, presents = attendance.get((student.roll_number, subject.pk), (0, 0))
+            if total_classes > 0:
+                attendance_percentage = round((presents / total_classes) * 100, 2)
             else:
-                # Check mid-term tests as indicators if internals aren't finalized
-                if marks_obj.test1_marks is not None and marks_obj.test1_marks < 25:
-                    risk_factors.append("Low Test 1 Marks")
-                if marks_obj.test2_marks is not None and marks_obj.test2_marks < 25:
-                    risk_factors.append("Low Test 2 Marks")
-
-        # If any risk factors are found, add to the risk list
-        if risk_factors:
-            risk_list.append({
-                'name': student.student_name,
-                'roll_number': student.roll_number,
-                'current_semester': student.current_semester,
-                'attendance_percentage': attendance_percentage,
-                'internal_marks': internal_marks,
-                'risk_factors': risk_factors
-            })
-
-    return risk_list
+                attendance_percentage = 100.0  # Safe default if no classes held
+
+            if attendance_percentage < 75.0 and total_classes > 0:
+                risk_factors.append("Low Attendance (<75%)")
+
+            # Check Marks
+            internal_marks = "N/A"
+            marks_obj = marks.get((student.roll_number, subject.pk))
+            if marks_obj:
+                if marks_obj.internal_marks is not None:
+                    internal_marks = marks_obj.internal_marks
+                    # Flag if internals are low (e.g. < 25)
+                    if marks_obj.internal_marks < 25:
+                        risk_factors.append("Low Internal Marks")
+                else:
+                    # Check mid-term tests as indicators if internals aren't finalized
+                    if marks_obj.test1_marks is not None and marks_obj.test1_marks < 25:
+                        risk_factors.append("Low Test 1 Marks")
+                    if marks_obj.test2_marks is not None and marks_obj.test2_marks < 25:
+                        risk_factors.append("Low Test 2 Marks")
+
+            # If any risk factors are found, add to the risk list
+            if risk_factors:
+                risk_list.append({
+                    'name': student.student_name,
+                    'roll_number': student.roll_number,
+                    'current_semester': student.current_semester,
+                    'attendance_percentage': attendance_percentage,
+                    'internal_marks': internal_marks,
+                    'risk_factors': risk_factors
+                })
+        risks_by_subject[subject.pk] = risk_list
+
+    return risks_by_subject
+
+
+# --- Department Research Analytics ---
+RESEARCH_METRICS_CACHE_TIMEOUT = 60 * 30  # 30 minutes
+RESEARCH_METRICS_VERSION_KEY = 'dept_research_metrics:version'
+
+
+def _academic_year_start(academic_year):
+    """Returns the starting calendar year ('2025') of an academic year like '2025-2026'."""
+    if not academic_year:
+        return None
+    try:
+        return str(int(str(academic_year).split('-')[0].strip()))
+    except ValueError:
+        return None
+
+
+def _research_metrics_cache():
+    # Shared by every worker, so an edit handled by one retires the summaries all of them serve
+    from django.conf import settings
+    from django.core.cache import caches
+    return caches[settings.RESEARCH_METRICS_CACHE_ALIAS]
+
+
+def _research_metrics_cache_key(academic_year):
+    import time
+
+    version = _research_metrics_cache().get_or_set(RESEARCH_METRICS_VERSION_KEY, int(time.time()), None)
+    return f"dept_research_metrics:v{version}:{academic_year or 'all'}"
+
+
+def invalidate_department_research_metrics():
+    """
+    Drops every cached department research summary by bumping the cache version.
+    Called from staffs.signals whenever a portfolio record changes.
+    """
+    import time
+
+    cache = _research_metrics_cache()
+    try:
+        cache.incr(RESEARCH_METRICS_VERSION_KEY)
+    except ValueError:
+        cache.set(RESEARCH_METRICS_VERSION_KEY, int(time.time()), None)
+
+
+def compute_department_research_metrics(academic_year=None):
+    """
+    Computes research output counts for every active staff member in one pass.
+
+    Each output type is grouped over its staff M2M (or FK) table with a single
+    aggregate query, so the cost does not grow with the number of staff.
+    When an academic year such as '2025-2026' is given, journals, conferences,
+    books, patents and projects are limited to its starting calendar year.
+    Department totals count co-authored items once.
+    """
+    from django.db.models import Count, Q
+    from .models import (
+        Staff, JournalPublication, ConferenceParticipation, BookPublication,
+        StaffPatent, StaffResearchProject, StaffStudentGuided
+    )
+    from students.models import ResearchScholarProfile
+
+    year = _academic_year_start(academic_year)
+
+    def grouped(queryset, key, **aggregates):
+        return {row.pop(key): row for row in queryset.values(key).annotate(**aggregates)}
+
+    def distinct_totals(model, m2m_filter, **aggregates):
+        ids = model.staff.through.objects.filter(**m2m_filter).values(f'{model._meta.model_name}_id')
+        return model.objects.filter(pk__in=ids).aggregate(**aggregates)
+
+    staff_members = list(
+        Staff.objects.filter(is_active=True)
+        .exclude(role__in=['Office Staff', 'Technical Officer'])
+        .order_by('name')
+        .values('staff_id', 'salutation', 'name', 'designation', 'role')
+    )
+
+    # Journals (grouped across JournalPublication.staff)
+    journal_filter = {'staff__is_active': True}
+    if year:
+        journal_filter['journalpublication__published_year__contains'] = year
+    journal_aggs = {
+        'journals': Count('journalpublication_id'),
+        'scopus': Count('journalpublication_id', filter=Q(journalpublication__is_scopus=True)),
+        'wos': Count('journalpublication_id', filter=Q(journalpublication__is_wos=True)),
+        'sci': Count('journalpublication_id', filter=Q(journalpublication__is_sci=True)),
+        'scie': Count('journalpublication_id', filter=Q(journalpublication__is_scie=True)),
+        'ugc': Count('journalpublication_id', filter=Q(journalpublication__is_ugc=True)),
+    }
+    journals = grouped(
+        JournalPublication.staff.through.objects.filter(**journal_filter), 'staff_id', **journal_aggs
+    )
+    journal_totals = distinct_totals(
+        JournalPublication, journal_filter,
+        journals=Count('id'),
+        scopus=Count('id', filter=Q(is_scopus=True)),
+        wos=Count('id', filter=Q(is_wos=True)),
+        sci=Count('id', filter=Q(is_sci=True)),
+        scie=Count('id', filter=Q(is_scie=True)),
+        ugc=Count('id', filter=Q(is_ugc=True)),
+    )
+
+    # Conferences
+    conference_filter = {'staff__is_active': True}
+    if year:
+        conference_filter['conferenceparticipation__year_of_publication__contains'] = year
+    conferences = grouped(
+        ConferenceParticipation.staff.through.objects.filter(**conference_filter), 'staff_id',
+        conferences=Count('conferenceparticipation_id'),
+        conferences_presented=Count('conferenceparticipation_id', filter=Q(conferenceparticipation__participation_type='Presented')),
+        conferences_attended=Count('conferenceparticipation_id', filter=Q(conferenceparticipation__participation_type='Attended')),
+    )
+    conference_totals = distinct_totals(
+        ConferenceParticipation, conference_filter,
+        conferences=Count('id'),
+        conferences_presented=Count('id', filter=Q(participation_type='Presented')),
+        conferences_attended=Count('id', filter=Q(participation_type='Attended')),
+    )
+
+    # Books
+    book_filter = {'staff__is_active': True}
+    if year:
+        book_filter['bookpublication__year_of_publication__contains'] = year
+    books = grouped(
+        BookPublication.staff.through.objects.filter(**book_filter), 'staff_id',
+        books=Count('bookpublication_id'),
+    )
+    book_totals = distinct_totals(BookPublication, book_filter, books=Count('id'))
+
+    # Patents
+    patent_filter = {'staff__is_active': True}
+    if year:
+        patent_filter['staffpatent__application_year__contains'] = year
+    patents = grouped(
+        StaffPatent.staff.through.objects.filter(**patent_filter), 'staff_id',
+        patents=Count('staffpatent_id'),
+        patents_granted=Count('staffpatent_id', filter=Q(staffpatent__status='Granted')),
+    )
+    patent_totals = distinct_totals(
+        StaffPatent, patent_filter,
+        patents=Count('id'),
+        patents_granted=Count('id', filter=Q(status='Granted')),
+    )
+
+    # Research projects (single owner FK)
+    project_qs = StaffResearchProject.objects.filter(staff__is_active=True)
+    if year:
+        project_qs = project_qs.filter(start_date__year=int(year))
+    projects = grouped(
+        project_qs, 'staff_id',
+        projects=Count('id'),
+        projects_ongoing=Count('id', filter=Q(status='Ongoing')),
+    )
+
+    # Guided scholars: manual entries plus live PhD supervision (as in the portfolio summary)
+    guided = grouped(
+        StaffStudentGuided.objects.filter(staff__is_active=True), 'staff_id',
+        pg_guided=Count('id', filter=Q(degree_type='PG')),
+        phd_guided_entries=Count('id', filter=Q(degree_type='PhD')),
+    )
+    supervised = grouped(
+        ResearchScholarProfile.objects.filter(supervisor__is_active=True, status='Ongoing'), 'supervisor_id',
+        phd_supervising=Count('pk'),
+    )
+
+    metric_fields = [
+        'journals', 'scopus', 'wos', 'sci', 'scie', 'ugc',
+        'conferences', 'conferences_presented', 'conferences_attended',
+        'books', 'patents', 'patents_granted', 'projects', 'projects_ongoing',
+        'pg_guided', 'phd_guided', 'scholars_guided',
+    ]
+    rows = []
+    for member in staff_members:
+        sid = member['staff_id']
+        row = dict(member)
+        for source in (journals, conferences, books, patents, projects, guided, supervised):
+            row.update(source.get(sid, {}))
+        row['phd_guided'] = row.pop('phd_guided_entries', 0) + row.pop('phd_supervising', 0)
+        for field in metric_fields:
+            row.setdefault(field, 0)
+        row['scholars_guided'] = row['pg_guided'] + row['phd_guided']
+        row['total_publications'] = row['journals'] + row['conferences_presented'] + row['books']
+        rows.append(row)
+
+    totals = {field: sum(r[field] for r in rows) for field in ('projects', 'projects_ongoing', 'pg_guided', 'phd_guided', 'scholars_guided')}
+    for part in (journal_totals, conference_totals, book_totals, patent_totals):
+        totals.update(part)
+    totals['total_publications'] = totals['journals'] + totals['conferences_presented'] + totals['books']
+    totals['staff_count'] = len(rows)
+
+    return {
+        'academic_year': academic_year or '',
+        'generated_at': timezone.now().isoformat(),
+        'staff': rows,
+        'totals': totals,
+    }
+
+
+def get_department_research_metrics(academic_year=None):
+    """Cached wrapper around compute_department_research_metrics, keyed by academic year."""
+    cache = _research_metrics_cache()
+    key = _research_metrics_cache_key(academic_year)
+    metrics = cache.get(key)
+    if metrics is None:
+        metrics = compute_department_research_metrics(academic_year)
+        cache.set(key, metrics, RESEARCH_METRICS_CACHE_TIMEOUT)
+    return metrics
+
+
+TIMETABLE_VERSION_GRID_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _timetable_version_grid_cache_key(version_pk):
+    return f"timetable_version_grid:{version_pk}"
+
+
+def invalidate_timetable_version_grid(version_pk):
+    from django.core.cache import cache
+
+    cache.delete(_timetable_version_grid_cache_key(version_pk))
+
+
+def get_timetable_version_history(versions_qs):
+    """
+    Returns the versions in versions_qs with grid_rows, change_lines and change_count attached.
+
+    Pre-rendered grids are cached per version, so snapshots are only loaded from the
+    database (in one query) for versions that are not cached yet.
+    """
+    from django.core.cache import cache
+    from .timetable_utils import snapshot_grid_rows, describe_snapshot_diff
+
+    versions = list(versions_qs.defer('snapshot'))
+    keys = {v.pk: _timetable_version_grid_cache_key(v.pk) for v in versions}
+    cached = cache.get_many(list(keys.values()))
+
+    missing = [pk for pk, key in keys.items() if key not in cached]
+    if missing:
+        snapshots = dict(versions_qs.model.objects.filter(pk__in=missing).values_list('pk', 'snapshot'))
+        fresh = {keys[pk]: snapshot_grid_rows(snapshot) for pk, snapshot in snapshots.items()}
+        cache.set_many(fresh, TIMETABLE_VERSION_GRID_CACHE_TIMEOUT)
+        cached.update(fresh)
+
+    for ver in versions:
+        diff = ver.snapshot_diff or {}
+        ver.grid_rows = cached.get(keys[ver.pk], [])
+        ver.change_lines = describe_snapshot_diff(diff)
+        ver.change_count = sum(len(diff.get(k, [])) for k in ('added', 'removed', 'changed'))
+    return versions
+
+
+def get_timetable_overview(academic_year, selected_semester=None):
+    """
+    Per-semester summary cards (slot count, published flag, distinct faculty, subject count)
+    for semesters 1-8, built from one grouped query on Timetable and one on Subject.
+    """
+    from django.db.models import Count, Q
+    from .models import Timetable, Subject
+
+    slot_stats = {
+        row['semester']: row
+        for row in Timetable.objects.filter(academic_year=academic_year).values('semester').annotate(
+            total_slots=Count('id'),
+            published_slots=Count('id', filter=Q(is_published=True)),
+            assigned_faculty_count=Count('staff', distinct=True),
+        ).order_by()
+    }
+    subject_counts = dict(
+        Subject.objects.values('semester').annotate(n=Count('id')).order_by().values_list('semester', 'n')
+    )
+
+    overview = []
+    for sem in range(1, 9):
+        stats = slot_stats.get(sem, {})
+        overview.append({
+            'semester': sem,
+            'total_slots': stats.get('total_slots', 0),
+            'is_published': stats.get('published_slots', 0) > 0,
+            'assigned_faculty_count': stats.get('assigned_faculty_count', 0),
+            'subject_count': subject_counts.get(sem, 0),
+            'is_selected': (sem == selected_semester),
+        })
+    return overview
+
+
+def save_lab_batch_assignments(students, data):
+    """
+    Applies the batch_<roll> / rep_<roll> form values to students and writes only the
+    students whose batch or representative flag changed, in a single bulk_update.
+    """
+    from ssm.principals import invalidate_principals
+    from students.models import Student
+
+    changed = []
+    for student in students:
+        batch_val = data.get(f'batch_{student.roll_number}', '').strip() or None
+        is_rep = data.get(f'rep_{student.roll_number}') == 'true'
+        if student.lab_batch != batch_val or student.is_class_representative != is_rep:
+            student.lab_batch = batch_val
+            student.is_class_representative = is_rep
+            changed.append(student)
+
+    Student.objects.bulk_update(changed, ['lab_batch', 'is_class_representative'], batch_size=500)
+    if changed:
+        invalidate_principals(Student)
+    return len(changed)
+
+
+# --- Password reset OTPs ---
+PASSWORD_RESET_OTP_TIMEOUT = 60 * 10  # 10 minutes
+
+
+def _password_reset_otp_key(kind, pk):
+    return f"password_reset_otp:{kind}:{pk}"
+
+
+def set_password_reset_otp(kind, pk, otp):
+    """
+    Keeps a password reset OTP for a 'staff' or 'student' account in the shared sessions
+    cache, which expires it, instead of in the session.
+    """
+    from django.conf import settings
+    from django.core.cache import caches
+
+    caches[settings.SESSION_CACHE_ALIAS].set(_password_reset_otp_key(kind, pk), otp, PASSWORD_RESET_OTP_TIMEOUT)
+
+
+def get_password_reset_otp(kind, pk):
+    """The OTP last sent to the account, or None once it expired or was used."""
+    from django.conf import settings
+    from django.core.cache import caches
+
+    if pk is None:
+        return None
+    return caches[settings.SESSION_CACHE_ALIAS].get(_password_reset_otp_key(kind, pk))
+
+
+def clear_password_reset_otp(kind, pk):
+    from django.conf import settings
+    from django.core.cache import caches
+
+    caches[settings.SESSION_CACHE_ALIAS].delete(_password_reset_otp_key(kind, pk))
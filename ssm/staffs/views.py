@@ -6,8 +6,10 @@ import string
 
 from .models import Staff, Subject, ExamSchedule, Timetable, StaffPublication, StaffAwardHonour, StaffSeminar, StaffStudentGuided, AuditLog, Lab, AdminSettings, ClassMapping
 from students.models import Student, ResearchScholarProfile, ScholarAttendance
-from django.db.models import Q, Case, When
-from django.db import transaction
+from django.db.models import Q, Case, When, Count
+from django.db import IntegrityError, transaction
+from ssm import login_protection
+from ssm import principals
 
 def stafflogin(request):
     """Handles staff login."""
@@ -20,8 +22,11 @@ def stafflogin(request):
         if staff_id:
             staff_id = staff_id.strip().upper()
         try:
+            # Throttled attempts are refused before the account is loaded or a hash computed
+            login_protection.check(request, 'staff', staff_id)
             staff = Staff.objects.get(staff_id=staff_id)
-            if staff.check_password(password):
+            if login_protection.verify_password(staff, password, 'staff'):
+                login_protection.record_success(request, 'staff', staff_id)
                 # Clear any existing student session to prevent dual login
                 if 'student_roll_number' in request.session:
                     del request.session['student_roll_number']
@@ -37,9 +42,16 @@ def stafflogin(request):
                     return redirect('staffs:staff_register')
                 return redirect('staffs:staff_dashboard')
             else:
+                login_protection.record_failure(request, 'staff', staff_id)
                 messages.error(request, 'Invalid Staff ID or Password.')
         except Staff.DoesNotExist:
+            login_protection.record_failure(request, 'staff', staff_id)
             messages.error(request, 'Invalid Staff ID or Password.')
+        except login_protection.LoginRefused as e:
+            messages.error(request, str(e))
+            response = render(request, 'staff/stafflogin.html', status=e.status)
+            response['Retry-After'] = str(e.retry_after)
+            return response
             
     return render(request, 'staff/stafflogin.html')
 
@@ -50,7 +62,7 @@ def staff_dashboard(request):
         return redirect('staffs:stafflogin')
     
     try:
-        staff = Staff.objects.get(staff_id=request.session['staff_id'])
+        staff = principals.current_staff(request)
     except Staff.DoesNotExist:
         request.session.flush()
         return redirect('staffs:stafflogin')
@@ -60,7 +72,9 @@ def staff_dashboard(request):
     req_active_role = request.GET.get('active_role')
     if req_active_role and req_active_role in all_assigned_roles:
         active_role = req_active_role
-        request.session['active_role'] = active_role
+        # Only written when it changes, so revisiting a role's dashboard does not save the session
+        if request.session.get('active_role') != active_role:
+            request.session['active_role'] = active_role
     else:
         active_role = request.session.get('active_role')
         if not active_role or active_role not in all_assigned_roles:
@@ -270,16 +284,7 @@ def staff_dashboard(request):
         for rec in attendance_records:
             attendance_set.add((rec['subject_id'], rec['time']))
 
-        # Define period time slots matching official system timetable
-        PERIOD_TIMES = {
-            1: ('08:30', '09:30'),
-            2: ('09:30', '10:30'),
-            3: ('10:40', '11:40'),
-            4: ('11:40', '12:40'),
-            5: ('13:30', '14:30'),
-            6: ('14:30', '15:30'),
-            7: ('15:30', '16:30'),
-        }
+        from .timetable_utils import PERIOD_TIMES
         now_time = timezone.now().time()
         seen_periods = set()
         for entry in today_tt_entries:
@@ -523,7 +528,7 @@ def staff_logout(request):
     staff_name = ''
     if staff_id:
         try:
-            s = Staff.objects.get(staff_id=staff_id)
+            s = principals.current_staff(request)
             staff_name = s.name
         except Staff.DoesNotExist:
             pass
@@ -815,11 +820,13 @@ def student_list(request):
     start_roll = request.GET.get('start_roll')
     end_roll = request.GET.get('end_roll')
     
-    students = Student.objects.all().select_related('studentdocuments')
+    students = Student.objects.all().select_related(
+        'personalinfo', 'bankdetails', 'academichistory', 'diplomadetails', 'ugdetails', 'pgdetails', 'studentdocuments'
+    )
 
     # Restrict view for Class Incharge
     try:
-        current_staff = Staff.objects.get(staff_id=request.session['staff_id'])
+        current_staff = principals.current_staff(request)
         if current_staff.has_role('Class Incharge') and current_staff.assigned_semester:
             students = students.filter(current_semester=current_staff.assigned_semester)
             if current_staff.assigned_batch in ['A', 'B']:
@@ -1058,6 +1065,7 @@ def manage_semesters(request):
             elif action == 'demote':
                 # Only demote if current_semester > 1.
                 Student.objects.filter(roll_number__in=student_ids, current_semester__gt=1).update(current_semester=F('current_semester') - 1)
+                principals.invalidate_principals(Student)
                 messages.success(request, f"Successfully demoted selected students.")
                 
             return redirect(f"{request.path}?semester={selected_semester}") # Stay on same page
@@ -1074,7 +1082,7 @@ def manage_subjects(request):
     
     # Check if HOD
     try:
-        current_staff = Staff.objects.get(staff_id=request.session['staff_id'])
+        current_staff = principals.current_staff(request)
         if not current_staff.is_staff_admin:
              messages.error(request, "Access Denied: Only HOD can manage courses.")
              return redirect('staffs:staff_dashboard')
@@ -1208,7 +1216,7 @@ def hod_live_class_visualisation(request):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
     try:
-        staff = Staff.objects.get(staff_id=request.session['staff_id'])
+        staff = principals.current_staff(request)
     except Staff.DoesNotExist:
         return redirect('staffs:stafflogin')
 
@@ -1450,7 +1458,7 @@ def manage_marks(request, subject_id):
 
 
     subject = get_object_or_404(Subject, id=subject_id)
-    current_staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+    current_staff = principals.current_staff_or_404(request)
 
     # Access Control: HOD or Assigned Staff
     if not current_staff.is_staff_admin and subject.staff != current_staff:
@@ -1503,7 +1511,7 @@ def manage_marks(request, subject_id):
     student_marks_map = {}
     marks_entries = StudentMarks.objects.filter(subject=subject, student__in=students)
     for entry in marks_entries:
-        student_marks_map[entry.student.roll_number] = entry
+        student_marks_map[entry.student_id] = entry
 
     # Correlation Logic: Fetch Claimed Grades from StudentGPA
     from students.models import StudentGPA
@@ -1521,7 +1529,7 @@ def manage_marks(request, subject_id):
                     grade = sub_data.get('grade', '-')
                     code = sub_data.get('code', '')
                     if grade:
-                        claimed_grades_map[record.student.roll_number] = {
+                        claimed_grades_map[record.student_id] = {
                             'grade': grade,
                             'code': code
                         }
@@ -1546,7 +1554,7 @@ def manage_attendance(request, subject_id):
     from django.urls import reverse
 
     subject = get_object_or_404(Subject, id=subject_id)
-    current_staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+    current_staff = principals.current_staff_or_404(request)
 
     # --- Date Handling (Current Selected Date) ---
     date_str = request.GET.get('date')
@@ -1688,15 +1696,7 @@ def manage_attendance(request, subject_id):
 
     # Determine Timetable period for this subject on date_obj's weekday
     day_name = date_obj.strftime('%A')
-    PERIOD_TIMES = {
-        1: ('08:30', '09:30'),
-        2: ('09:30', '10:30'),
-        3: ('10:40', '11:40'),
-        4: ('11:40', '12:40'),
-        5: ('13:30', '14:30'),
-        6: ('14:30', '15:30'),
-        7: ('15:30', '16:30'),
-    }
+    from .timetable_utils import PERIOD_TIMES
     tt_entries = Timetable.objects.filter(subject=subject, day=day_name).order_by('period')
     today_periods = []
     current_period = None
@@ -1809,6 +1809,33 @@ def manage_attendance(request, subject_id):
     })
 
 
+def sync_offline_attendance(request):
+    """
+    Applies attendance sheets the PWA queued while offline (staffs.attendance_sync).
+    POST {"sheets": [...]}; answers {"results": [...]}, one result per sheet, in order.
+    """
+    from django.http import JsonResponse
+    from .attendance_sync import SheetError, SyncConflict, apply_sheets
+
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    staff = principals.current_staff(request, required=False)
+    if staff is None:
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+    try:
+        sheets = _json_module.loads(request.body)['sheets']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected a JSON object with a "sheets" list.'}, status=400)
+
+    try:
+        results = apply_sheets(staff, sheets)
+    except SheetError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except SyncConflict as e:
+        return JsonResponse({'error': str(e)}, status=409)
+    return JsonResponse({'results': results})
+
+
 def attendance_calendar(request, subject_id):
     """Separate dedicated view for the Monthly Attendance Calendar."""
     if 'staff_id' not in request.session:
@@ -1821,7 +1848,7 @@ def attendance_calendar(request, subject_id):
     from django.urls import reverse
 
     subject = get_object_or_404(Subject, id=subject_id)
-    current_staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+    current_staff = principals.current_staff_or_404(request)
 
     # Access Control
     is_substitute = ClassSubstitutionRequest.objects.filter(
@@ -1851,15 +1878,7 @@ def attendance_calendar(request, subject_id):
     cal = calendar.Calendar(firstweekday=0) # 0 = Monday
     month_days = cal.monthdatescalendar(cal_year, cal_month)
     
-    PERIOD_TIMES = {
-        1: ('08:30', '09:30'),
-        2: ('09:30', '10:30'),
-        3: ('10:40', '11:40'),
-        4: ('11:40', '12:40'),
-        5: ('13:30', '14:30'),
-        6: ('14:30', '15:30'),
-        7: ('15:30', '16:30'),
-    }
+    from .timetable_utils import PERIOD_TIMES
 
     timetable_entries = Timetable.objects.filter(subject=subject).order_by('period')
     timetable_map = {}
@@ -1982,7 +2001,7 @@ def overall_attendance_calendar(request):
     import calendar
     from django.urls import reverse
 
-    current_staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+    current_staff = principals.current_staff_or_404(request)
     assigned_subjects = current_staff.get_teaching_subjects()
 
     selected_subject_id = request.GET.get('subject_id')
@@ -2014,15 +2033,7 @@ def overall_attendance_calendar(request):
     cal = calendar.Calendar(firstweekday=0) # 0 = Monday
     month_days = cal.monthdatescalendar(cal_year, cal_month)
 
-    PERIOD_TIMES = {
-        1: ('08:30', '09:30'),
-        2: ('09:30', '10:30'),
-        3: ('10:40', '11:40'),
-        4: ('11:40', '12:40'),
-        5: ('13:30', '14:30'),
-        6: ('14:30', '15:30'),
-        7: ('15:30', '16:30'),
-    }
+    from .timetable_utils import PERIOD_TIMES
 
     timetable_entries = Timetable.objects.filter(subject__in=subjects_to_include).select_related('subject').order_by('day', 'period')
     timetable_map = {}
@@ -2162,7 +2173,7 @@ def attendance_report(request, subject_id):
     import calendar
 
     subject = get_object_or_404(Subject, id=subject_id)
-    current_staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+    current_staff = principals.current_staff_or_404(request)
 
     # Access Control
     if not current_staff.is_staff_admin and subject.staff != current_staff:
@@ -2204,10 +2215,19 @@ def attendance_report(request, subject_id):
     
     class_total_students = Student.objects.filter(current_semester=subject.semester).count()
 
+    # Present/absent totals for every student in one grouped query
+    status_counts = {
+        row['student_id']: row
+        for row in attendance_qs.values('student_id').annotate(
+            present=Count('id', filter=Q(status='Present')),
+            absent=Count('id', filter=Q(status='Absent')),
+        )
+    }
+
     for student in students:
-        student_attendance = attendance_qs.filter(student=student)
-        present_count = student_attendance.filter(status='Present').count()
-        absent_count = student_attendance.filter(status='Absent').count()
+        counts = status_counts.get(student.roll_number, {})
+        present_count = counts.get('present', 0)
+        absent_count = counts.get('absent', 0)
         
         percentage = (present_count / total_dates * 100) if total_dates > 0 else 0
         total_percentage_sum += percentage
@@ -2389,7 +2409,7 @@ def staff_list(request):
     if department:
         staff_members = staff_members.filter(department__icontains=department)
 
-    logged_in_staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+    logged_in_staff = principals.current_staff_or_404(request)
     return render(request, 'staff/stafflist.html', {
         'staff_members': staff_members,
         'query': query,
@@ -2401,7 +2421,7 @@ def passed_out_batches(request):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
         
-    staff = Staff.objects.get(staff_id=request.session['staff_id'])
+    staff = principals.current_staff(request)
     
     # Simple access check: Only HOD should ideally access this, but can be open to staff
     if not staff.is_staff_admin:
@@ -2420,7 +2440,7 @@ def batch_students(request, year):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
     
-    staff = Staff.objects.get(staff_id=request.session['staff_id'])
+    staff = principals.current_staff(request)
     
     students = Student.objects.filter(ending_year=year).order_by('roll_number')
     
@@ -2436,7 +2456,7 @@ def exam_schedule(request):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
         
-    staff = Staff.objects.get(staff_id=request.session['staff_id'])
+    staff = principals.current_staff(request)
     
     # Get semester from GET request or default to 1
     selected_semester = request.GET.get('semester', 1)
@@ -2458,7 +2478,7 @@ def timetable(request):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
         
-    staff = Staff.objects.get(staff_id=request.session['staff_id'])
+    staff = principals.current_staff(request)
     if staff.is_staff_admin or staff.is_timetable_incharge:
         return hod_published_timetables(request)
     
@@ -2476,7 +2496,7 @@ def timetable(request):
         selected_academic_year = '2026-2027'
 
     # Fetch timetable entries for selected semester & academic year
-    entries = Timetable.objects.filter(academic_year=selected_academic_year, semester=selected_semester)
+    entries = Timetable.objects.filter(academic_year=selected_academic_year, semester=selected_semester).select_related('subject', 'staff')
     
     # Structure data for the template: { 'Day': { periods... } }
     # Or just pass entries and let template handle filtering, but structured is better
@@ -2536,7 +2556,7 @@ def assign_lab_batches(request):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
         
-    staff = Staff.objects.get(staff_id=request.session['staff_id'])
+    staff = principals.current_staff(request)
     
     if not staff.is_staff_admin and not staff.is_timetable_incharge:
         messages.error(request, "Access Denied: Only HOD or Timetable Incharge can assign batches.")
@@ -2572,13 +2592,8 @@ def assign_lab_batches(request):
             messages.error(request, "Error: Batch A or B cannot have more than 2 Class Representatives.")
             return redirect(f'/staffs/assign-batches/?semester={selected_semester}')
 
-        with transaction.atomic():
-            for student in students:
-                batch_val = request.POST.get(f'batch_{student.roll_number}', '').strip() or None
-                is_rep = request.POST.get(f'rep_{student.roll_number}') == 'true'
-                student.lab_batch = batch_val
-                student.is_class_representative = is_rep
-                student.save(update_fields=['lab_batch', 'is_class_representative'])
+        from .utils import save_lab_batch_assignments
+        save_lab_batch_assignments(students, request.POST)
 
         messages.success(request, f'Lab batches & Representatives updated successfully for Semester {selected_semester}.')
         return redirect(f'/staffs/assign-batches/?semester={selected_semester}')
@@ -2606,7 +2621,7 @@ def edit_timetable(request, semester):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
         
-    staff = Staff.objects.get(staff_id=request.session['staff_id'])
+    staff = principals.current_staff(request)
     
     if not staff.is_staff_admin and not staff.is_timetable_incharge:
         messages.error(request, 'Access Denied: Only HOD or Timetable Incharge can edit the timetable.')
@@ -2617,7 +2632,7 @@ def edit_timetable(request, semester):
     
     from .models import Subject
     # Get all subjects for this semester to populate dropdowns
-    subjects = Subject.objects.filter(semester=semester)
+    subjects = Subject.objects.filter(semester=semester).select_related('staff')
     # Get all active staff to populate dropdowns
     all_staff = Staff.objects.filter(is_active=True).order_by('name')
     
@@ -2637,189 +2652,50 @@ def edit_timetable(request, semester):
         current_batch = 'All'
         
     if request.method == 'POST':
-        from .utils import send_staff_notification
-        from django.db import transaction
-        VIRTUAL_SLOTS = ['LAB_SESSION', 'PLACEMENT', 'LIBRARY']
-        MORNING_LAB_BLOCKS = [(1, 2, 3), (2, 3, 4)]
-        AFTERNOON_LAB_BLOCK = (5, 6, 7)
-        
-        lab_subject_ids = set(str(sid) for sid in Subject.objects.filter(semester=semester, subject_type='Lab').values_list('id', flat=True))
+        from .utils import run_in_background, notify_timetable_changes
+        from .timetable_utils import propagate_lab_blocks, plan_timetable_changes
 
-        def is_3hr_lab(val):
-            if not val:
-                return False
-            return val == 'LAB_SESSION' or val in lab_subject_ids
+        lab_subject_ids = set(str(sid) for sid in Subject.objects.filter(semester=semester, subject_type='Lab').values_list('id', flat=True))
 
         # Pre-parse form input into a grid dictionary
         post_grid = {}
+        lab_grid = {}
         for day in days:
             post_grid[day] = {}
             for period in periods:
                 post_grid[day][period] = (request.POST.get(f'subject_{day}_{period}') or '').strip()
+                lab_grid[(day, period)] = (request.POST.get(f'lab_a_{day}_{period}'), request.POST.get(f'lab_b_{day}_{period}'))
 
         # Apply 3-hour propagation for 3-hour labs (explicit Lab subject or LAB_SESSION)
-        for day in days:
-            # Morning Lab Block 1: P1 -> P1, P2, P3
-            if is_3hr_lab(post_grid[day][1]):
-                if not post_grid[day][2] or is_3hr_lab(post_grid[day][2]):
-                    post_grid[day][2] = post_grid[day][1]
-                if not post_grid[day][3] or is_3hr_lab(post_grid[day][3]):
-                    post_grid[day][3] = post_grid[day][1]
-
-            # Morning Lab Block 2: P2 -> P2, P3, P4
-            elif is_3hr_lab(post_grid[day][2]):
-                if not post_grid[day][3] or is_3hr_lab(post_grid[day][3]):
-                    post_grid[day][3] = post_grid[day][2]
-                if not post_grid[day][4] or is_3hr_lab(post_grid[day][4]):
-                    post_grid[day][4] = post_grid[day][2]
-
-            # Afternoon Lab Block: P5 -> P5, P6, P7
-            if is_3hr_lab(post_grid[day][5]):
-                if not post_grid[day][6] or is_3hr_lab(post_grid[day][6]):
-                    post_grid[day][6] = post_grid[day][5]
-                if not post_grid[day][7] or is_3hr_lab(post_grid[day][7]):
-                    post_grid[day][7] = post_grid[day][5]
+        post_grid = propagate_lab_blocks(post_grid, lab_subject_ids)
 
-        with transaction.atomic():
-            for day in days:
-                for period in periods:
-                    sub_val = post_grid[day][period]
-                    lab_a_val = request.POST.get(f'lab_a_{day}_{period}')
-                    lab_b_val = request.POST.get(f'lab_b_{day}_{period}')
-                    
-                    if sub_val == 'LAB_SESSION' and (not lab_a_val or not lab_b_val):
-                        related_periods = []
-                        for block in MORNING_LAB_BLOCKS + [AFTERNOON_LAB_BLOCK]:
-                            if period in block:
-                                related_periods = block
-                                break
-                        for p in related_periods:
-                            if not lab_a_val:
-                                lab_a_val = request.POST.get(f'lab_a_{day}_{p}') or lab_a_val
-                            if not lab_b_val:
-                                lab_b_val = request.POST.get(f'lab_b_{day}_{p}') or lab_b_val
-                    
-                    # Fetch existing entries for all batches for this academic year
-                    entries = list(Timetable.objects.filter(academic_year=selected_academic_year, semester=semester, day=day, period=period))
-                    
-                    # Helper to manage creation/update of a batch entry
-                    def handle_batch_entry(batch_val, subj_id, virtual_sub=None):
-                        batch_entry = next((e for e in entries if e.batch == batch_val), None)
-                        
-                        if virtual_sub:
-                            b_subject = None
-                            b_staff = None
-                        else:
-                            b_subject = Subject.objects.filter(id=subj_id).first() if subj_id else None
-                            b_staff = b_subject.staff if b_subject else None
-
-                        if not b_subject and not virtual_sub:
-                            if batch_entry and batch_entry.pk is not None:
-                                if batch_entry.staff:
-                                    send_staff_notification(batch_entry.staff, "📅 Timetable Updated", f"You have been removed from {day} Period {period}.", url="/staffs/my-timetable/")
-                                batch_entry.delete()
-                            return
-                        
-                        if batch_entry:
-                            changed = False
-                            old_staff = batch_entry.staff
-                            if batch_entry.subject != b_subject:
-                                batch_entry.subject = b_subject
-                                changed = True
-                            if batch_entry.staff != b_staff:
-                                batch_entry.staff = b_staff
-                                changed = True
-                            
-                            if changed:
-                                batch_entry.save()
-                                if b_staff and old_staff != b_staff:
-                                    send_staff_notification(b_staff, "📅 Timetable Updated", f"You've been assigned {b_subject.code if b_subject else 'a class'} on {day} Period {period} (Batch {batch_val}).", url="/staffs/my-timetable/")
-                                if old_staff and old_staff != b_staff:
-                                    send_staff_notification(old_staff, "📅 Timetable Updated", f"You are no longer assigned to {day} Period {period} (Batch {batch_val}).", url="/staffs/my-timetable/")
-                        else:
-                            try:
-                                new_entry = Timetable.objects.create(
-                                    academic_year=selected_academic_year,
-                                    semester=semester,
-                                    day=day,
-                                    period=period,
-                                    subject=b_subject,
-                                    staff=b_staff,
-                                    batch=batch_val
-                                )
-                                if b_staff:
-                                    send_staff_notification(b_staff, "📅 Timetable Assigned", f"You have been assigned {b_subject.code if b_subject else 'a class'} on {day} Period {period} (Batch {batch_val}).", url="/staffs/my-timetable/")
-                            except IntegrityError:
-                                pass
-
-                    if current_batch == 'All':
-                        if sub_val == 'LAB_SESSION':
-                            if not lab_a_val and not lab_b_val and any(e.batch in ['A', 'B'] for e in entries):
-                                continue
+        # Load every referenced subject and the current rows once, then diff in memory
+        referenced_ids = {v for cells in post_grid.values() for v in cells.values() if v and v.isdigit()}
+        referenced_ids.update(v for pair in lab_grid.values() for v in pair if v and v.isdigit())
+        subjects_by_id = {str(s.id): s for s in Subject.objects.filter(id__in=referenced_ids).select_related('staff')}
+        existing_entries = Timetable.objects.filter(academic_year=selected_academic_year, semester=semester).select_related('subject', 'staff')
+
+        def build_entry(day, period, batch, subject, staff_member):
+            return Timetable(academic_year=selected_academic_year, semester=semester, day=day, period=period, batch=batch, subject=subject, staff=staff_member)
+
+        plan = plan_timetable_changes(existing_entries, post_grid, lab_grid, current_batch, subjects_by_id, build_entry)
+
+        edit_url = f'/staffs/hod/published-timetables/?semester={semester}&academic_year={selected_academic_year}&tab=edit'
+        try:
+            with transaction.atomic():
+                if plan.deletes:
+                    Timetable.objects.filter(pk__in={e.pk for e in plan.deletes}).delete()
+                if plan.updates:
+                    Timetable.objects.bulk_update(plan.updates, ['subject', 'staff'])
+                if plan.creates:
+                    Timetable.objects.bulk_create(plan.creates)
+                if plan.notifications:
+                    run_in_background(notify_timetable_changes, plan.notifications)
+        except IntegrityError:
+            # Another editor saved a slot this plan creates after it was computed
+            messages.error(request, 'The timetable was changed by someone else while you were editing it. Reload it and make your changes again.')
+            return redirect(edit_url)
 
-                            for entry in entries:
-                                if entry.batch == 'All' and entry.pk is not None:
-                                    if entry.staff:
-                                        send_staff_notification(entry.staff, "📅 Timetable Updated", f"You have been removed from {day} Period {period}.", url="/staffs/my-timetable/")
-                                    entry.delete()
-                            
-                            handle_batch_entry('A', lab_a_val)
-                            handle_batch_entry('B', lab_b_val)
-                        else:
-                            for entry in entries:
-                                if entry.batch in ['A', 'B'] and entry.pk is not None:
-                                    if entry.staff:
-                                        send_staff_notification(entry.staff, "📅 Timetable Updated", f"You have been removed from {day} Period {period} (Batch {entry.batch}).", url="/staffs/my-timetable/")
-                                    entry.delete()
-                            
-                            if not sub_val:
-                                for entry in entries:
-                                    if entry.pk is not None:
-                                        if entry.staff:
-                                            send_staff_notification(entry.staff, "📅 Timetable Updated", f"You have been removed from {day} Period {period}.", url="/staffs/my-timetable/")
-                                        entry.delete()
-                            else:
-                                virt_lbl = sub_val if sub_val in VIRTUAL_SLOTS else None
-                                subj_id_to_use = None if virt_lbl else sub_val
-                                handle_batch_entry('All', subj_id_to_use, virtual_sub=virt_lbl)
-                                
-                    else:
-                        if not sub_val:
-                            for entry in entries:
-                                if entry.batch == current_batch and entry.pk is not None:
-                                    if entry.staff:
-                                        send_staff_notification(entry.staff, "📅 Timetable Updated", f"You have been removed from {day} Period {period} (Batch {current_batch}).", url="/staffs/my-timetable/")
-                                    entry.delete()
-                        else:
-                            virt_lbl = sub_val if sub_val in VIRTUAL_SLOTS else None
-                            subj_id_to_use = None if virt_lbl else sub_val
-                            
-                            b_subject = Subject.objects.filter(id=subj_id_to_use).first() if subj_id_to_use else None
-                            b_staff = b_subject.staff if b_subject else None
-                            
-                            all_entry = next((e for e in entries if e.batch == 'All'), None)
-                            if all_entry:
-                                other_batch = 'B' if current_batch == 'A' else 'A'
-                                Timetable.objects.create(
-                                    academic_year=selected_academic_year,
-                                    semester=semester,
-                                    day=day,
-                                    period=period,
-                                    subject=all_entry.subject,
-                                    staff=all_entry.staff,
-                                    batch=other_batch
-                                )
-                                all_entry.delete()
-                                
-                            Timetable.objects.update_or_create(
-                                academic_year=selected_academic_year,
-                                semester=semester,
-                                day=day,
-                                period=period,
-                                batch=current_batch,
-                                defaults={'subject': b_subject, 'staff': b_staff}
-                            )
-                                
         # Create/update version snapshot for historical archive
         create_timetable_version_snapshot(
             academic_year=selected_academic_year,
@@ -2829,10 +2705,10 @@ def edit_timetable(request, semester):
         )
 
         messages.success(request, f'Timetable for Academic Year {selected_academic_year} Semester {semester} updated successfully.')
-        return redirect(f'/staffs/hod/published-timetables/?semester={semester}&academic_year={selected_academic_year}&tab=edit')
+        return redirect(edit_url)
         
     # GET Request: Fetch timetable entries for selected semester & academic year
-    entries = Timetable.objects.filter(academic_year=selected_academic_year, semester=semester).select_related('subject', 'staff')
+    entries = Timetable.objects.filter(academic_year=selected_academic_year, semester=semester).select_related('subject', 'subject__staff', 'staff')
     timetable_data = {day: [None]*7 for day in days}
     
     class BatchBlock:
@@ -2907,32 +2783,11 @@ def edit_timetable(request, semester):
                 'batch': entry.batch
             })
 
-    subject_staff_map = {}
-    for subj in subjects:
-        target_hours = 3 if subj.subject_type == 'Lab' else getattr(subj, 'credits', 3)
-        if target_hours <= 0:
-            target_hours = 3 if subj.subject_type == 'Lab' else 4
-
-        subject_staff_map[str(subj.id)] = {
-            'id': subj.id,
-            'code': subj.code,
-            'name': subj.name,
-            'type': subj.subject_type,
-            'credits': getattr(subj, 'credits', 3),
-            'target_hours': target_hours,
-            'staff_id': subj.staff.staff_id if subj.staff else None,
-            'staff': subj.staff.name if subj.staff else '—',
-            'staff_b_id': subj.staff_batch_b.staff_id if subj.staff_batch_b else None,
-            'staff_b': subj.staff_batch_b.name if subj.staff_batch_b else '—',
-            'location': subj.get_location_display() if hasattr(subj, 'get_location_display') else ''
-        }
-    
     return render(request, 'staff/edit_timetable.html', {
         'staff': staff,
         'semester': semester,
         'timetable_rows': timetable_rows,
         'subjects': subjects,
-        'subject_staff_map_json': _json.dumps(subject_staff_map),
         'faculty_occupancy_json': _json.dumps(faculty_occupancy),
         'current_batch': current_batch,
         'selected_academic_year': selected_academic_year,
@@ -2946,8 +2801,8 @@ def create_timetable_version_snapshot(academic_year, semester, staff_user, from_
     Saves a published/updated timetable snapshot forever in PublishedTimetableVersion.
     """
     from .models import Timetable, PublishedTimetableVersion
+    from .timetable_utils import build_timetable_snapshot, diff_timetable_snapshots
     import datetime
-    from django.core.serializers.json import DjangoJSONEncoder
 
     entries = Timetable.objects.filter(academic_year=academic_year, semester=semester).select_related('subject', 'staff')
     if not entries.exists():
@@ -2967,21 +2822,9 @@ def create_timetable_version_snapshot(academic_year, semester, staff_user, from_
 
     version_name_final = str(version_name_to_use or "Published Version")
 
-    snapshot_list = []
-    for e in entries:
-        snapshot_list.append({
-            'day': e.day,
-            'period': e.period,
-            'batch': e.batch,
-            'subject_code': e.subject.code if e.subject else '',
-            'subject_name': e.subject.name if e.subject else '',
-            'subject_type': e.subject.subject_type if e.subject else '',
-            'staff_name': e.staff.name if e.staff else '',
-            'staff_id': e.staff.staff_id if e.staff else '',
-            'location_name': e.subject.get_location_display() if (e.subject and hasattr(e.subject, 'get_location_display')) else ''
-        })
-
-    json_payload = _json_module.dumps(snapshot_list, cls=DjangoJSONEncoder)
+    snapshot = build_timetable_snapshot(entries)
+    previous_version = PublishedTimetableVersion.objects.filter(academic_year=academic_year, semester=semester).only('snapshot').first()
+    snapshot_diff = diff_timetable_snapshots(previous_version.snapshot if previous_version else {}, snapshot)
 
     PublishedTimetableVersion.objects.filter(academic_year=academic_year, semester=semester).update(is_active=False)
     entries.update(from_date=from_date_val, to_date=to_date_val)
@@ -2994,54 +2837,12 @@ def create_timetable_version_snapshot(academic_year, semester, staff_user, from_
         to_date=to_date_val,
         published_by=staff_user,
         is_active=True,
-        timetable_data_json=json_payload
+        snapshot=snapshot,
+        snapshot_diff=snapshot_diff
     )
     return ver_obj
 
 
-def parse_snapshot_grid(snapshot_json):
-    """
-    Parses a snapshot JSON into 5-day x 7-period rows for template rendering, supporting split batches (A/B).
-    """
-    days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
-    grid = {day: [None]*7 for day in days}
-    try:
-        data = _json_module.loads(snapshot_json)
-        for item in data:
-            d = item.get('day')
-            p = item.get('period')
-            if d in grid and 1 <= p <= 7:
-                curr = grid[d][p - 1]
-                batch = item.get('batch', 'All')
-
-                if curr is None:
-                    if batch in ['A', 'B']:
-                        grid[d][p - 1] = {
-                            'is_batch': True,
-                            'A': item if batch == 'A' else None,
-                            'B': item if batch == 'B' else None
-                        }
-                    else:
-                        grid[d][p - 1] = item
-                elif isinstance(curr, dict) and curr.get('is_batch'):
-                    if batch == 'A':
-                        curr['A'] = item
-                    elif batch == 'B':
-                        curr['B'] = item
-                elif isinstance(curr, dict) and curr.get('batch') in ['A', 'B'] and batch in ['A', 'B'] and curr.get('batch') != batch:
-                    old_item = curr
-                    grid[d][p - 1] = {
-                        'is_batch': True,
-                        'A': old_item if old_item.get('batch') == 'A' else item,
-                        'B': item if batch == 'B' else old_item
-                    }
-                else:
-                    grid[d][p - 1] = item
-    except Exception:
-        pass
-    return [(d, grid[d]) for d in days]
-
-
 def hod_published_timetables(request):
     """
     Dedicated view for HOD & Timetable Incharges to view all saved and published timetables
@@ -3051,7 +2852,7 @@ def hod_published_timetables(request):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
         
-    staff = Staff.objects.get(staff_id=request.session['staff_id'])
+    staff = principals.current_staff(request)
     
     if not staff.is_staff_admin and not staff.is_timetable_incharge:
         messages.error(request, "Access Denied: Only HOD or Timetable Incharge can view Master Published Timetables.")
@@ -3115,7 +2916,6 @@ def hod_published_timetables(request):
 
         elif action == 'assign_batches':
             from students.models import Student
-            from django.db import transaction
             
             students = list(Student.objects.filter(current_semester=selected_semester).exclude(program_level='PHD'))
             rep_a_count = 0
@@ -3137,38 +2937,19 @@ def hod_published_timetables(request):
                 messages.error(request, "Error: Batch A or B cannot have more than 2 Class Representatives.")
                 return redirect(f'/staffs/hod/published-timetables/?academic_year={selected_academic_year}&semester={selected_semester}&tab=batches')
 
-            with transaction.atomic():
-                for student in students:
-                    batch_val = request.POST.get(f'batch_{student.roll_number}', '').strip() or None
-                    is_rep = request.POST.get(f'rep_{student.roll_number}') == 'true'
-                    student.lab_batch = batch_val
-                    student.is_class_representative = is_rep
-                    student.save(update_fields=['lab_batch', 'is_class_representative'])
+            from .utils import save_lab_batch_assignments
+            save_lab_batch_assignments(students, request.POST)
 
             messages.success(request, f'Lab batches & Representatives updated successfully for Semester {selected_semester}.')
             return redirect(f'/staffs/hod/published-timetables/?academic_year={selected_academic_year}&semester={selected_semester}&tab=batches')
 
     # Semester Summary Cards for selected academic year (Sem 1 to 8)
-    semesters_summary = []
-    for sem in range(1, 9):
-        sem_entries = Timetable.objects.filter(academic_year=selected_academic_year, semester=sem)
-        total_slots = sem_entries.count()
-        is_pub = sem_entries.filter(is_published=True).exists() if total_slots > 0 else False
-        assigned_faculty_count = sem_entries.filter(staff__isnull=False).values('staff').distinct().count()
-        subject_count = Subject.objects.filter(semester=sem).count()
-        
-        semesters_summary.append({
-            'semester': sem,
-            'total_slots': total_slots,
-            'is_published': is_pub,
-            'assigned_faculty_count': assigned_faculty_count,
-            'subject_count': subject_count,
-            'is_selected': (sem == selected_semester)
-        })
+    from .utils import get_timetable_overview
+    semesters_summary = get_timetable_overview(selected_academic_year, selected_semester)
 
     # Fetch entries for selected academic year and semester
-    entries = Timetable.objects.filter(academic_year=selected_academic_year, semester=selected_semester).select_related('subject', 'staff')
-    semester_is_published = entries.filter(is_published=True).exists() if entries.exists() else False
+    entries = Timetable.objects.filter(academic_year=selected_academic_year, semester=selected_semester).select_related('subject', 'subject__staff', 'staff')
+    semester_is_published = semesters_summary[selected_semester - 1]['is_published']
 
     # Fetch previous timetable versions saved forever
     previous_versions_qs = PublishedTimetableVersion.objects.filter(
@@ -3176,10 +2957,8 @@ def hod_published_timetables(request):
         semester=selected_semester
     ).select_related('published_by').order_by('-published_at')
 
-    previous_timetable_versions = []
-    for ver in previous_versions_qs:
-        ver.grid_rows = parse_snapshot_grid(ver.timetable_data_json)
-        previous_timetable_versions.append(ver)
+    from .utils import get_timetable_version_history
+    previous_timetable_versions = get_timetable_version_history(previous_versions_qs)
 
     active_ver = previous_versions_qs.filter(is_active=True).first() or previous_versions_qs.first()
     current_from_date = active_ver.from_date if (active_ver and active_ver.from_date) else datetime.date.today()
@@ -3304,7 +3083,7 @@ def hod_published_timetables(request):
         })
 
     # Build context for Tab 2: Interactive Editor
-    subjects_list = list(Subject.objects.filter(semester=selected_semester).order_by('code'))
+    subjects_list = list(Subject.objects.filter(semester=selected_semester).select_related('staff', 'staff_batch_b').order_by('code'))
     all_staff = Staff.objects.filter(is_active=True).order_by('name')
 
     # Build faculty occupancy map for conflict detection across ALL semesters for the selected academic year
@@ -3335,26 +3114,6 @@ def hod_published_timetables(request):
                 'batch': entry.batch
             })
 
-    subject_staff_map = {}
-    for subj in subjects_list:
-        target_hours = 3 if subj.subject_type == 'Lab' else getattr(subj, 'credits', 3)
-        if target_hours <= 0:
-            target_hours = 3 if subj.subject_type == 'Lab' else 4
-
-        subject_staff_map[str(subj.id)] = {
-            'id': subj.id,
-            'code': subj.code,
-            'name': subj.name,
-            'type': subj.subject_type,
-            'credits': getattr(subj, 'credits', 3),
-            'target_hours': target_hours,
-            'staff_id': subj.staff.staff_id if subj.staff else None,
-            'staff': subj.staff.name if subj.staff else '—',
-            'staff_b_id': subj.staff_batch_b.staff_id if subj.staff_batch_b else None,
-            'staff_b': subj.staff_batch_b.name if subj.staff_batch_b else '—',
-            'location': subj.get_location_display() if hasattr(subj, 'get_location_display') else ''
-        }
-
     edit_timetable_data = {day: [None]*7 for day in days}
     for entry in entries:
         if 1 <= entry.period <= 7:
@@ -3388,7 +3147,6 @@ def hod_published_timetables(request):
         'active_tab': active_tab,
         'subjects_list': subjects_list,
         'all_staff': all_staff,
-        'subject_staff_map_json': _json_module.dumps(subject_staff_map),
         'faculty_occupancy_json': _json_module.dumps(faculty_occupancy),
         'edit_timetable_rows': edit_timetable_rows,
         'students_list': students_list,
@@ -3402,7 +3160,7 @@ def toggle_publish_timetable(request, semester):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
         
-    staff = Staff.objects.get(staff_id=request.session['staff_id'])
+    staff = principals.current_staff(request)
     
     if not staff.is_staff_admin and not staff.is_timetable_incharge:
         messages.error(request, "Access Denied: Only HOD or Timetable Incharge can publish/unpublish timetables.")
@@ -3443,7 +3201,7 @@ def my_timetable(request):
 
     import datetime
 
-    staff = Staff.objects.get(staff_id=request.session['staff_id'])
+    staff = principals.current_staff(request)
 
     # Only fetch entries assigned to this staff member
     entries = Timetable.objects.filter(staff=staff).select_related('subject')
@@ -3479,10 +3237,10 @@ def risk_students(request):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
     
-    staff = Staff.objects.get(staff_id=request.session['staff_id'])
+    staff = principals.current_staff(request)
     
     # Imports
-    from .utils import get_risk_metrics
+    from .utils import get_risk_metrics_for_subjects
     from .models import Subject
     
     risk_insights = []
@@ -3494,17 +3252,19 @@ def risk_students(request):
     
     elif staff.role == 'Class Incharge' and staff.assigned_semester:
         # Class Incharge sees subjects they teach + ALL subjects in their assigned semester
-        teaching_subjects = staff.get_teaching_subjects()
-        semester_subjects = Subject.objects.filter(semester=staff.assigned_semester)
-        subjects_to_analyze = (teaching_subjects | semester_subjects).distinct().order_by('semester', 'code')
+        subjects_to_analyze = Subject.objects.filter(
+            Q(staff=staff) | Q(staff_batch_b=staff) | Q(semester=staff.assigned_semester)
+        ).distinct().order_by('semester', 'code')
         
     else:
         # Regular Staff / Course Incharge
         subjects_to_analyze = staff.get_teaching_subjects().order_by('semester', 'code')
 
     # Process Risk Metrics
+    subjects_to_analyze = list(subjects_to_analyze)
+    risks_by_subject = get_risk_metrics_for_subjects(subjects_to_analyze)
     for subject in subjects_to_analyze:
-        risks = get_risk_metrics(subject)
+        risks = risks_by_subject[subject.pk]
         if risks:
             risk_insights.append({
                 'subject': subject,
@@ -3529,7 +3289,7 @@ def export_risk_list(request, subject_id):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
 
-    staff = Staff.objects.get(staff_id=request.session['staff_id'])
+    staff = principals.current_staff(request)
     subject = get_object_or_404(Subject, id=subject_id)
 
     # Access Control Check (Basic) - Reusing logic:
@@ -3591,7 +3351,7 @@ def view_leave_requests(request):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
         
-    staff = Staff.objects.get(staff_id=request.session['staff_id'])
+    staff = principals.current_staff(request)
     from students.models import LeaveRequest
     
     # Filter requests based on role
@@ -3603,12 +3363,12 @@ def view_leave_requests(request):
         )
         if staff.assigned_batch in ['A', 'B']:
             leave_qs = leave_qs.filter(student__lab_batch=staff.assigned_batch)
-        leave_requests = leave_qs.order_by('created_at')
+        leave_requests = leave_qs.select_related('student').order_by('created_at')
     elif staff.is_staff_admin:
         # HOD sees 'Pending HOD' (approved by Class Incharge)
         leave_requests = LeaveRequest.objects.filter(
             status='Pending HOD'
-        ).order_by('created_at')
+        ).select_related('student').order_by('created_at')
     else:
         leave_requests = LeaveRequest.objects.none()
 
@@ -3629,7 +3389,7 @@ def update_leave_status(request, request_id):
         action = request.POST.get('action')
         reason = request.POST.get('rejection_reason', '')
         
-        staff = Staff.objects.get(staff_id=request.session['staff_id'])
+        staff = principals.current_staff(request)
         
         if action == 'approve':
             if staff.role == 'Class Incharge':
@@ -3727,7 +3487,7 @@ def staff_apply_leave(request):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
     
-    staff = Staff.objects.get(staff_id=request.session['staff_id'])
+    staff = principals.current_staff(request)
     from .forms import StaffLeaveRequestForm
     from .models import StaffLeaveRequest
     
@@ -3786,7 +3546,7 @@ def staff_leave_history(request):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
         
-    staff = Staff.objects.get(staff_id=request.session['staff_id'])
+    staff = principals.current_staff(request)
     from .models import StaffLeaveRequest
     
     leaves = StaffLeaveRequest.objects.filter(staff=staff).order_by('-created_at')
@@ -3798,7 +3558,7 @@ def hod_leave_dashboard(request):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
         
-    current_staff = Staff.objects.get(staff_id=request.session['staff_id'])
+    current_staff = principals.current_staff(request)
     
     # Strictly for HOD
     if not current_staff.is_staff_admin:
@@ -3808,7 +3568,7 @@ def hod_leave_dashboard(request):
     from .models import StaffLeaveRequest
     
     # pending requests
-    pending_leaves = StaffLeaveRequest.objects.filter(status='Pending').order_by('created_at')
+    pending_leaves = StaffLeaveRequest.objects.filter(status='Pending').select_related('staff').order_by('created_at')
     
     return render(request, 'staff/hod_leave_dashboard.html', {
         'staff': current_staff,
@@ -3825,7 +3585,7 @@ def hod_update_leave_status(request, request_id):
         leave_request = get_object_or_404(StaffLeaveRequest, id=request_id)
         
         # Verify HOD access again for security
-        current_staff = Staff.objects.get(staff_id=request.session['staff_id'])
+        current_staff = principals.current_staff(request)
         if not current_staff.is_staff_admin:
              messages.error(request, "Unauthorized action.")
              return redirect('staffs:staff_dashboard')
@@ -3858,7 +3618,7 @@ def admin_portal_login(request):
         return redirect('staffs:stafflogin')
 
     try:
-        staff = Staff.objects.get(staff_id=request.session['staff_id'])
+        staff = principals.current_staff(request)
     except Staff.DoesNotExist:
         return redirect('staffs:stafflogin')
 
@@ -3901,7 +3661,7 @@ def create_superuser(request):
         return redirect('staffs:stafflogin')
         
     try:
-        staff = Staff.objects.get(staff_id=request.session['staff_id'])
+        staff = principals.current_staff(request)
     except Staff.DoesNotExist:
         return redirect('staffs:stafflogin')
 
@@ -3933,7 +3693,7 @@ def scholarship_manager(request):
         return redirect('staffs:stafflogin')
         
     try:
-        staff = Staff.objects.get(staff_id=request.session['staff_id'])
+        staff = principals.current_staff(request)
     except Staff.DoesNotExist:
         return redirect('staffs:stafflogin')
         
@@ -4148,7 +3908,7 @@ def manage_substitutions(request):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
     
-    staff = Staff.objects.get(staff_id=request.session['staff_id'])
+    staff = principals.current_staff(request)
     from .models import Timetable, ClassSubstitutionRequest, Subject
     import datetime
     
@@ -4167,16 +3927,18 @@ def manage_substitutions(request):
     existing_requests = ClassSubstitutionRequest.objects.filter(requester=staff, date=selected_date)
     existing_requests_dict = {req.period: req for req in existing_requests}
     
-    # Combine data
+    # Combine data; candidates are only staff free in that period, best match first. The
+    # current substitute of a slot stays one, so a request can be sent to them again
+    from .substitution_planner import SubstitutionPlanner
+    planner = SubstitutionPlanner(selected_date, requester=staff.staff_id)
     classes_data = []
     for entry in my_timetable:
         classes_data.append({
             'period': entry.period,
             'subject': entry.subject,
-            'request': existing_requests_dict.get(entry.period)
+            'request': existing_requests_dict.get(entry.period),
+            'candidates': planner.candidates(selected_date, entry.period, subject=entry.subject, exclude={staff.staff_id})
         })
-        
-    other_staff = Staff.objects.filter(is_active=True).exclude(staff_id=staff.staff_id).order_by('name')
     
     if request.method == 'POST':
         action = request.POST.get('action')
@@ -4185,8 +3947,14 @@ def manage_substitutions(request):
             substitute_id = request.POST.get('substitute_id')
             subject_id = request.POST.get('subject_id')
             
-            substitute = get_object_or_404(Staff, staff_id=substitute_id)
             subject = get_object_or_404(Subject, id=subject_id)
+
+            # Only the slot's candidates: active teaching staff who are free in that period
+            candidates = next((item['candidates'] for item in classes_data if item['period'] == period), [])
+            substitute = next((c for c in candidates if c.staff_id == substitute_id), None)
+            if substitute is None:
+                messages.error(request, f"That staff member is not free in Period {period} on {selected_date}. Please pick another alternate.")
+                return redirect(f'/staffs/substitutions/manage/?date={selected_date}')
             
             # Create or update request
             ClassSubstitutionRequest.objects.update_or_create(
@@ -4225,8 +3993,7 @@ def manage_substitutions(request):
     return render(request, 'staff/manage_substitutions.html', {
         'staff': staff,
         'selected_date': selected_date,
-        'classes_data': classes_data,
-        'other_staff': other_staff
+        'classes_data': classes_data
     })
 
 def incoming_substitutions(request):
@@ -4234,7 +4001,7 @@ def incoming_substitutions(request):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
         
-    staff = Staff.objects.get(staff_id=request.session['staff_id'])
+    staff = principals.current_staff(request)
     from .models import ClassSubstitutionRequest
     
     incoming_requests = ClassSubstitutionRequest.objects.filter(substitute=staff, status='Pending').order_by('date', 'period')
@@ -4284,6 +4051,78 @@ def incoming_substitutions(request):
         'history': history
     })
 
+def plan_leave_substitutions(request, leave_id):
+    """Proposes alternates for every class during an approved leave and sends the requests in one go."""
+    if 'staff_id' not in request.session:
+        return redirect('staffs:stafflogin')
+
+    staff = principals.current_staff(request)
+    from .models import StaffLeaveRequest, ClassSubstitutionRequest
+    from .substitution_planner import SubstitutionPlanner
+
+    leave = get_object_or_404(StaffLeaveRequest, id=leave_id, status='Approved')
+    if leave.staff_id != staff.staff_id and not staff.is_staff_admin:
+        messages.error(request, "Access Denied: You can only plan alternates for your own leave.")
+        return redirect('staffs:staff_dashboard')
+
+    planner = SubstitutionPlanner(leave.start_date, leave.end_date)
+    proposals = planner.propose_for_leave(leave)
+    existing = {
+        (req.date, req.period): req
+        for req in ClassSubstitutionRequest.objects.filter(
+            requester_id=leave.staff_id, date__range=(leave.start_date, leave.end_date)
+        ).select_related('substitute')
+    }
+    for item in proposals:
+        item['request'] = existing.get((item['date'], item['period']))
+        item['field_name'] = f"substitute_{item['date']:%Y-%m-%d}_{item['period']}"
+
+    if request.method == 'POST':
+        new_requests = []
+        for item in proposals:
+            if item['request']:
+                continue
+            chosen_id = request.POST.get(item['field_name'])
+            substitute = next((c for c in item['candidates'] if c.staff_id == chosen_id), None)
+            if substitute is None:
+                continue
+            new_requests.append(ClassSubstitutionRequest(
+                requester_id=leave.staff_id,
+                substitute=substitute,
+                date=item['date'],
+                period=item['period'],
+                subject=item['subject'],
+                leave_request=leave,
+                status='Pending'
+            ))
+
+        with transaction.atomic():
+            slots = ClassSubstitutionRequest.objects.filter(
+                requester_id=leave.staff_id, date__range=(leave.start_date, leave.end_date)
+            )
+            taken = set(slots.values_list('date', 'period'))
+            ClassSubstitutionRequest.objects.bulk_create(new_requests, ignore_conflicts=True)
+            # ignore_conflicts skips slots requested meanwhile; report and notify only what was inserted
+            inserted = {
+                (date, period, substitute_id)
+                for date, period, substitute_id in slots.values_list('date', 'period', 'substitute_id')
+                if (date, period) not in taken
+            }
+            sent = [r for r in new_requests if (r.date, r.period, r.substitute.staff_id) in inserted]
+            if sent:
+                from .utils import run_in_background, notify_substitution_requests
+                run_in_background(notify_substitution_requests, leave.staff.name, sent)
+
+        messages.success(request, f"{len(sent)} alternate request(s) sent for your leave.")
+        return redirect('staffs:plan_leave_substitutions', leave_id=leave.id)
+
+    return render(request, 'staff/plan_leave_substitutions.html', {
+        'staff': staff,
+        'leave': leave,
+        'proposals': proposals,
+        'pending_count': sum(1 for item in proposals if not item['request'])
+    })
+
 def assigned_substitutions(request):
     """View assigned substitution classes for the logged-in staff."""
     import datetime
@@ -4291,7 +4130,7 @@ def assigned_substitutions(request):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
 
-    staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+    staff = principals.current_staff_or_404(request)
     
     today = datetime.date.today()
     # Get all approved requests where this staff is the substitute
@@ -4453,7 +4292,7 @@ def staff_profile(request):
         return redirect('staffs:stafflogin')
 
     try:
-        staff = Staff.objects.get(staff_id=request.session['staff_id'])
+        staff = principals.current_staff(request)
     except Staff.DoesNotExist:
         return redirect('staffs:stafflogin')
 
@@ -4467,7 +4306,7 @@ def view_faculty_profile(request, staff_id):
         return redirect('staffs:stafflogin')
 
     try:
-        viewer = Staff.objects.get(staff_id=request.session['staff_id'])
+        viewer = principals.current_staff(request)
     except Staff.DoesNotExist:
         return redirect('staffs:stafflogin')
 
@@ -4482,12 +4321,21 @@ def view_faculty_profile(request, staff_id):
     return render(request, 'staff/profile.html', ctx)
 
 
+STAFF_PROFILE_FIELDS = [
+    'address', 'mobile_number', 'blood_group', 'gender', 'date_of_birth', 'date_of_joining', 'specialization',
+    'research_interests', 'google_scholar_link', 'linkedin_link', 'orcid_link', 'research_gate_link',
+]
+STAFF_PROFILE_FILES = [
+    'photo', 'joining_order', 'appointment_order', 'board_order', 'joining_letter', 'sslc_marksheet', 'hsc_marksheet',
+]
+
+
 def staff_edit_profile(request):
     """View to edit staff professional profile."""
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
 
-    staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+    staff = principals.current_staff_or_404(request)
 
     if request.method == 'POST':
         staff.address = request.POST.get('address', '')
@@ -4553,7 +4401,12 @@ def staff_edit_profile(request):
         staff.orcid_link = request.POST.get('orcid_link', '') or None
         staff.research_gate_link = request.POST.get('research_gate_link', '') or None
 
-        staff.save()
+        # Files sent straight to the bucket (static/js/direct_upload.js) are stored by a worker;
+        # saving every field would put back the names this (possibly cached) instance holds
+        staff.save(update_fields=STAFF_PROFILE_FIELDS + [
+            name for name in STAFF_PROFILE_FILES
+            if name in request.FILES or (name == 'photo' and clear_photo)
+        ])
         from .utils import log_audit
         log_audit(request, 'update', actor_type='staff', actor_id=staff.staff_id, actor_name=staff.name, object_type='Staff', object_id=staff.staff_id, message='Updated profile details')
         messages.success(request, "Profile updated successfully.")
@@ -4566,7 +4419,7 @@ def _get_staff_for_portfolio(request):
     if 'staff_id' not in request.session:
         return None
     try:
-        return get_object_or_404(Staff, staff_id=request.session['staff_id'])
+        return principals.current_staff_or_404(request)
     except Exception:
         return None
 
@@ -4719,7 +4572,7 @@ def generate_biodata_pdf(request):
         if target_staff_id:
             staff = Staff.objects.get(staff_id=target_staff_id)
         else:
-            staff = Staff.objects.get(staff_id=request.session['staff_id'])
+            staff = principals.current_staff(request)
     except Staff.DoesNotExist:
         return redirect('staffs:stafflogin')
 
@@ -6077,6 +5930,7 @@ def manage_semesters(request):
             elif action == 'demote':
                 # Only demote if current_semester > 1.
                 Student.objects.filter(roll_number__in=student_ids, current_semester__gt=1).update(current_semester=F('current_semester') - 1)
+                principals.invalidate_principals(Student)
                 messages.success(request, f"Successfully demoted selected students.")
                 
             return redirect(f"{request.path}?semester={selected_semester}") # Stay on same page
@@ -6088,7 +5942,7 @@ def manage_semesters(request):
 
     # Restrict for Class Incharge
     try:
-        current_staff = Staff.objects.get(staff_id=request.session['staff_id'])
+        current_staff = principals.current_staff(request)
         if current_staff.has_role('Class Incharge') and current_staff.assigned_semester:
             selected_semester = str(current_staff.assigned_semester)
             display_semester_selector = False
@@ -6149,14 +6003,12 @@ def staff_password_reset_verify(request):
                 
                 # Generate OTP
                 import random
-                from django.utils import timezone
-                import datetime
+                from .utils import set_password_reset_otp
                 
                 otp = str(random.randint(100000, 999999))
                 
-                # Store in session with expiry
-                request.session['staff_reset_otp'] = otp
-                request.session['staff_reset_otp_expiry'] = (timezone.now() + datetime.timedelta(minutes=10)).isoformat()
+                # Store in the cache, which expires it
+                set_password_reset_otp('staff', staff.pk, otp)
                 
                 # Send Email
                 from django.core.mail import send_mail
@@ -6198,33 +6050,25 @@ def staff_password_reset_verify(request):
 def staff_password_reset_otp_verify(request):
     """Step 2.5: Verify the entered OTP."""
     if request.method == 'POST':
+        from .utils import get_password_reset_otp, clear_password_reset_otp
+
         entered_otp = request.POST.get('otp')
-        session_otp = request.session.get('staff_reset_otp')
-        expiry_str = request.session.get('staff_reset_otp_expiry')
+        staff_pk = request.session.get('reset_staff_pk')
+        # None once the 10 minutes are up
+        sent_otp = get_password_reset_otp('staff', staff_pk)
         
-        if not session_otp or not expiry_str:
-            messages.error(request, 'No OTP found or session expired. Please request a new one.')
+        if not sent_otp:
+            messages.error(request, 'No OTP found or OTP expired. Please request a new one.')
             return redirect('staffs:password_reset_verify') 
 
-        # Check expiry
-        from django.utils import timezone
-        import datetime
-        expiry_time = datetime.datetime.fromisoformat(expiry_str)       
-        if timezone.now() > expiry_time:
-            messages.error(request, 'OTP has expired. Please request a new one.')
-            return redirect('staffs:password_reset_identify')
-
-        if entered_otp == session_otp:
+        if entered_otp == sent_otp:
             # Success
             request.session['staff_reset_verified'] = True
-            # clear OTP session
-            del request.session['staff_reset_otp']
-            del request.session['staff_reset_otp_expiry']
+            clear_password_reset_otp('staff', staff_pk)
             return redirect('staffs:password_reset_confirm')
         else:
             messages.error(request, 'Invalid OTP. Please try again.')
             # Re-render the OTP page
-            staff_pk = request.session.get('reset_staff_pk')
             staff = Staff.objects.get(pk=staff_pk)
             return render(request, 'staff/password_reset/p2_otp.html', {
                  'email_mask': staff.email
@@ -6257,7 +6101,7 @@ def staff_password_reset_confirm(request):
         staff.save()
 
         # Cleanup Session
-        keys_to_delete = ['reset_staff_pk', 'staff_reset_verified', 'staff_reset_otp', 'staff_reset_otp_expiry']
+        keys_to_delete = ['reset_staff_pk', 'staff_reset_verified']
         for key in keys_to_delete:
             if key in request.session:
                 del request.session[key]
@@ -6441,7 +6285,7 @@ def hod_manage_bonafide(request):
         return redirect('staffs:stafflogin')
     
     try:
-        staff = Staff.objects.get(staff_id=request.session['staff_id'])
+        staff = principals.current_staff(request)
         # STRICT ROLE CHECK DISABLED to prevent lockout for non-exact 'HOD' roles
         # if staff.role.strip() != 'HOD':
         #     messages.error(request, "Access Denied.")
@@ -6498,7 +6342,7 @@ def office_manage_bonafide(request):
         return redirect('staffs:stafflogin')
     
     try:
-        staff = Staff.objects.get(staff_id=request.session['staff_id'])
+        staff = principals.current_staff(request)
         if staff.role.strip() != 'Office Staff':
             messages.error(request, "Access Denied: You are not authorized as Office Staff.")
             return redirect('staffs:staff_dashboard')
@@ -6566,7 +6410,7 @@ def remark_student_list(request):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
     
-    staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+    staff = principals.current_staff_or_404(request)
     
     # Security: Ensure only Class Incharge (or HOD/authorized roles) triggers this
     # For now, we assume Class Incharge logic as per request.
@@ -6585,6 +6429,7 @@ def remark_student_list(request):
         # HOD can see all? Or filter by sem? Let's show all for now or maybe a filter
         students = Student.objects.all().order_by('roll_number')
 
+    students = students.annotate(remark_count=Count('remarks'))
     return render(request, 'staff/remark_student_list.html', {'staff': staff, 'students': students})
 
 def remark_history(request, roll_number):
@@ -6592,7 +6437,7 @@ def remark_history(request, roll_number):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
 
-    staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+    staff = principals.current_staff_or_404(request)
     student = get_object_or_404(Student, roll_number=roll_number)
     
     from students.models import StudentRemark
@@ -6663,7 +6508,7 @@ def attendance_deficit_list(request):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
         
-    staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+    staff = principals.current_staff_or_404(request)
     
     # Access Control: Class Incharge Only
     if not staff.has_role('Class Incharge') or not staff.assigned_semester:
@@ -6777,7 +6622,7 @@ def send_deficit_email(request):
         student_roll = request.POST.get('student_roll')
         month_offset = request.POST.get('month_offset')
         
-        staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+        staff = principals.current_staff_or_404(request)
         student = get_object_or_404(Student, roll_number=student_roll)
         
         # Re-calculate to get data for email (Hours based)
@@ -6837,14 +6682,14 @@ def send_deficit_email(request):
     return redirect('staffs:attendance_deficit_list')
 
 # --- Notification Tool ---
-from webpush import send_group_notification
+from .utils import send_group_notification
 
 def send_custom_notification(request):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
     
     try:
-        staff = Staff.objects.get(staff_id=request.session['staff_id'])
+        staff = principals.current_staff(request)
     except Staff.DoesNotExist:
         return redirect('staffs:stafflogin')
 
@@ -6883,12 +6728,9 @@ def send_custom_notification(request):
                      "icon": "/static/images/logo.png",
                      "url": request.build_absolute_uri('/students/dashboard/') 
                  }
-                 try:
-                     send_group_notification(group_name=group_name, payload=payload, ttl=1000)
+                 # Students without a subscription yet are sent nothing
+                 if send_group_notification(group_name=group_name, payload=payload, ttl=1000):
                      success_count += 1
-                 except Exception:
-                     # Failures might happen if group doesn't exist (no subscription yet)
-                     pass 
                  count += 1
             
              # If HOD or Office Staff, also send to ALL Staff
@@ -6921,7 +6763,7 @@ def manage_scholar_attendance(request):
     if not staff_id:
         return redirect('stafflogin')
         
-    staff = get_object_or_404(Staff, staff_id=staff_id)
+    staff = principals.current_staff_or_404(request)
     
     # Scholars assigned to this staff
     assigned_scholars = ResearchScholarProfile.objects.filter(supervisor=staff).values_list('student', flat=True)
@@ -6942,7 +6784,7 @@ def update_scholar_attendance(request, attendance_id):
     if not staff_id:
         return redirect('stafflogin')
         
-    staff = get_object_or_404(Staff, staff_id=staff_id)
+    staff = principals.current_staff_or_404(request)
     attendance = get_object_or_404(ScholarAttendance, id=attendance_id)
     
     # Verify ownership
@@ -6986,7 +6828,7 @@ def manage_scholar_leave(request):
     if not staff_id:
         return redirect('staffs:stafflogin')
 
-    staff = get_object_or_404(Staff, staff_id=staff_id)
+    staff = principals.current_staff_or_404(request)
     from students.models import LeaveRequest, ResearchScholarProfile
 
     # Scholars supervised by this staff member
@@ -7020,7 +6862,7 @@ def update_scholar_leave_status(request, leave_id):
     if request.method == 'POST':
         from students.models import LeaveRequest
         leave = get_object_or_404(LeaveRequest, id=leave_id)
-        staff = get_object_or_404(Staff, staff_id=staff_id)
+        staff = principals.current_staff_or_404(request)
 
         # Security: only the assigned supervisor may act
         profile = getattr(leave.student, 'scholar_profile', None)
@@ -7070,7 +6912,7 @@ def staff_view_scholar_profile(request, roll_number):
         return redirect('staffs:stafflogin')
 
     student = get_object_or_404(Student, roll_number=roll_number, program_level='PHD')
-    staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+    staff = principals.current_staff_or_404(request)
     
     # helper to get object or None
     def get_or_none(model, **kwargs):
@@ -7114,7 +6956,7 @@ def staff_view_scholar_profile(request, roll_number):
 def hod_portfolio_approvals(request):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
-    staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+    staff = principals.current_staff_or_404(request)
     if not staff.is_staff_admin:
         messages.error(request, "Access Denied: HOD / Admin only.")
         return redirect('staffs:staff_dashboard')
@@ -7134,7 +6976,7 @@ def hod_portfolio_approvals(request):
 def approve_qualification(request, pk):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
-    staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+    staff = principals.current_staff_or_404(request)
     if not staff.is_staff_admin:
         messages.error(request, "Access Denied: HOD / Admin only.")
         return redirect('staffs:staff_dashboard')
@@ -7149,7 +6991,7 @@ def approve_qualification(request, pk):
 def reject_qualification(request, pk):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
-    staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+    staff = principals.current_staff_or_404(request)
     if not staff.is_staff_admin:
         messages.error(request, "Access Denied: HOD / Admin only.")
         return redirect('staffs:staff_dashboard')
@@ -7164,7 +7006,7 @@ def reject_qualification(request, pk):
 def approve_designation(request, pk):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
-    staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+    staff = principals.current_staff_or_404(request)
     if not staff.is_staff_admin:
         messages.error(request, "Access Denied: HOD / Admin only.")
         return redirect('staffs:staff_dashboard')
@@ -7183,7 +7025,7 @@ def approve_designation(request, pk):
 def reject_designation(request, pk):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
-    staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+    staff = principals.current_staff_or_404(request)
     if not staff.is_staff_admin:
         messages.error(request, "Access Denied: HOD / Admin only.")
         return redirect('staffs:staff_dashboard')
@@ -7209,7 +7051,7 @@ def hod_manage_labs(request):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
     try:
-        staff = Staff.objects.get(staff_id=request.session['staff_id'])
+        staff = principals.current_staff(request)
     except Staff.DoesNotExist:
         return redirect('staffs:stafflogin')
         
@@ -7344,7 +7186,7 @@ def hod_delete_lab(request, lab_id):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
     try:
-        staff = Staff.objects.get(staff_id=request.session['staff_id'])
+        staff = principals.current_staff(request)
     except Staff.DoesNotExist:
         return redirect('staffs:stafflogin')
         
@@ -7369,7 +7211,7 @@ def hod_delete_class_mapping(request, class_id):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
     try:
-        staff = Staff.objects.get(staff_id=request.session['staff_id'])
+        staff = principals.current_staff(request)
     except Staff.DoesNotExist:
         return redirect('staffs:stafflogin')
         
@@ -7396,7 +7238,7 @@ def manage_phd_stages(request):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
         
-    staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+    staff = principals.current_staff_or_404(request)
     
     from students.models import Student, PhDProgress, ResearchScholarProfile
     from django.db.models import Q
@@ -7556,7 +7398,7 @@ def assign_phd_guide(request):
     """HOD-only: Assign or change the guide (supervisor) for a PhD scholar."""
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
-    hod = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+    hod = principals.current_staff_or_404(request)
     if not hod.is_staff_admin:
         messages.error(request, 'Only HOD or Admin can assign guides.')
         return redirect('staffs:manage_phd_stages')
@@ -7604,7 +7446,7 @@ def manage_department_tasks(request):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
 
-    staff = Staff.objects.filter(staff_id=request.session['staff_id']).first()
+    staff = principals.current_staff(request, required=False)
     if not staff or (staff.role != 'HOD' and not staff.is_admin):
         messages.error(request, "Access Denied: Only HOD or Admin can manage department tasks and roles.")
         return redirect('staffs:staff_dashboard')
@@ -7643,7 +7485,7 @@ def export_staff_tasks_csv(request):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
 
-    staff = Staff.objects.filter(staff_id=request.session['staff_id']).first()
+    staff = principals.current_staff(request, required=False)
     if not staff or (staff.role != 'HOD' and not staff.is_admin):
         messages.error(request, "Access Denied.")
         return redirect('staffs:staff_dashboard')
@@ -7686,7 +7528,7 @@ def export_task_matrix_csv(request):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
 
-    staff = Staff.objects.filter(staff_id=request.session['staff_id']).first()
+    staff = principals.current_staff(request, required=False)
     if not staff or (staff.role != 'HOD' and not staff.is_admin):
         messages.error(request, "Access Denied.")
         return redirect('staffs:staff_dashboard')
@@ -7721,6 +7563,101 @@ def export_task_matrix_csv(request):
     return response
 
 
+RESEARCH_ANALYTICS_COLUMNS = [
+    ('journals', 'Journals'), ('scopus', 'SCOPUS'), ('wos', 'WOS'), ('sci', 'SCI'), ('scie', 'SCIE'), ('ugc', 'UGC'),
+    ('conferences_presented', 'Conf. Presented'), ('conferences_attended', 'Conf. Attended'),
+    ('books', 'Books'), ('patents', 'Patents'), ('patents_granted', 'Patents Granted'),
+    ('projects', 'Projects'), ('projects_ongoing', 'Projects Ongoing'),
+    ('pg_guided', 'PG Guided'), ('phd_guided', 'PhD Guided'), ('total_publications', 'Total Publications'),
+]
+
+
+def _get_research_analytics_request(request):
+    """Shared access check and academic year selection for the research analytics views."""
+    if 'staff_id' not in request.session:
+        return None, None
+
+    staff = principals.current_staff(request, required=False)
+    if not staff or not staff.is_staff_admin:
+        return staff, None
+
+    academic_year = request.GET.get('academic_year', '').strip()
+    if academic_year and not academic_year.split('-')[0].isdigit():
+        academic_year = ''
+    return staff, academic_year
+
+
+def department_research_analytics(request):
+    """Department-wide research output summary (journals, conferences, books, patents, projects, guidance) for the HOD."""
+    staff, academic_year = _get_research_analytics_request(request)
+    if staff is None:
+        return redirect('staffs:stafflogin')
+    if academic_year is None:
+        messages.error(request, "Access Denied: Only HOD or Admin can view department research analytics.")
+        return redirect('staffs:staff_dashboard')
+
+    from .utils import get_department_research_metrics
+    metrics = get_department_research_metrics(academic_year or None)
+
+    current_year = timezone.now().year
+    available_academic_years = [f"{y}-{y + 1}" for y in range(current_year, current_year - 6, -1)]
+
+    context = {
+        'staff': staff,
+        'metrics': metrics,
+        'rows': metrics['staff'],
+        'totals': metrics['totals'],
+        'columns': RESEARCH_ANALYTICS_COLUMNS,
+        'selected_academic_year': academic_year,
+        'available_academic_years': available_academic_years,
+    }
+    return render(request, 'staff/department_research_analytics.html', context)
+
+
+def department_research_analytics_data(request):
+    """JSON variant of department_research_analytics for dashboards and report tooling."""
+    from django.http import JsonResponse
+
+    staff, academic_year = _get_research_analytics_request(request)
+    if staff is None or academic_year is None:
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+
+    from .utils import get_department_research_metrics
+    return JsonResponse(get_department_research_metrics(academic_year or None))
+
+
+def export_department_research_csv(request):
+    """Downloadable CSV of the department research summary (NAAC/NBA report preparation)."""
+    staff, academic_year = _get_research_analytics_request(request)
+    if staff is None:
+        return redirect('staffs:stafflogin')
+    if academic_year is None:
+        messages.error(request, "Access Denied.")
+        return redirect('staffs:staff_dashboard')
+
+    import csv
+    from django.http import HttpResponse
+    from .utils import get_department_research_metrics
+
+    metrics = get_department_research_metrics(academic_year or None)
+    suffix = academic_year or 'all_years'
+
+    response = HttpResponse(content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="department_research_summary_{suffix}.csv"'
+    response.write('\ufeff')
+
+    writer = csv.writer(response)
+    writer.writerow(['Staff ID', 'Name', 'Designation'] + [label for _, label in RESEARCH_ANALYTICS_COLUMNS])
+    for row in metrics['staff']:
+        writer.writerow(
+            [row['staff_id'], f"{row['salutation'] or ''} {row['name']}".strip(), row['designation'] or '']
+            + [row[key] for key, _ in RESEARCH_ANALYTICS_COLUMNS]
+        )
+    writer.writerow(['', 'Department Total (co-authored items counted once)', '']
+                    + [metrics['totals'].get(key, '') for key, _ in RESEARCH_ANALYTICS_COLUMNS])
+    return response
+
+
 def office_manage_document_requests(request):
     """
     Office Staff view to manage student original document / marksheet requests (X, XII, TC, etc.).
@@ -7729,7 +7666,7 @@ def office_manage_document_requests(request):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
 
-    staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+    staff = principals.current_staff_or_404(request)
 
     # Allow Office Staff, HOD, and Admin
     if staff.role not in ['Office Staff', 'HOD'] and not staff.is_admin:
@@ -7874,7 +7811,7 @@ def update_staff_roles(request, staff_id):
     if 'staff_id' not in request.session:
         return redirect('staffs:stafflogin')
 
-    current_staff = Staff.objects.filter(staff_id=request.session['staff_id']).first()
+    current_staff = principals.current_staff(request, required=False)
     if not current_staff or (current_staff.role != 'HOD' and not current_staff.is_admin):
         messages.error(request, "Access Denied: Only HOD or Admin can manage staff roles.")
         return redirect('staffs:staff_list')
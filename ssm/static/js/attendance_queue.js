@@ -0,0 +1,87 @@
+/*
+ * Attendance sheets saved while offline, kept in IndexedDB until they reach the server.
+ *
+ * Loaded by the attendance console and by the service worker (importScripts), so it only uses
+ * what both have: indexedDB, fetch and self. Each sheet carries a random key; the server
+ * stores the outcome under it, so a sheet sent twice (a retry after a lost response, the page
+ * and the service worker flushing together) is applied once. See staffs/attendance_sync.py.
+ */
+(function (scope) {
+    const DB_NAME = 'au-attendance';
+    const STORE = 'sheets';
+    const SYNC_URL = '/staffs/attendance/sync/';
+    // Matches ATTENDANCE_SYNC_MAX_SHEETS' default; longer queues go in several requests
+    const BATCH_SIZE = 50;
+
+    function openDb() {
+        return new Promise((resolve, reject) => {
+            const request = indexedDB.open(DB_NAME, 1);
+            request.onupgradeneeded = () => request.result.createObjectStore(STORE, { keyPath: 'key' });
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        });
+    }
+
+    function withStore(mode, action) {
+        return openDb().then((db) => new Promise((resolve, reject) => {
+            const tx = db.transaction(STORE, mode);
+            const request = action(tx.objectStore(STORE));
+            tx.oncomplete = () => { db.close(); resolve(request && request.result); };
+            tx.onerror = () => { db.close(); reject(tx.error); };
+        }));
+    }
+
+    // The service worker cannot read cookies, so each sheet is queued with the page's token
+    function csrfToken(records) {
+        if (typeof document !== 'undefined') {
+            const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+            if (match) return decodeURIComponent(match[1]);
+        }
+        return records.length ? records[records.length - 1].csrfToken : '';
+    }
+
+    const AttendanceQueue = {
+        add(sheet, token) {
+            return withStore('readwrite', (store) => store.put({ key: sheet.key, sheet: sheet, csrfToken: token }));
+        },
+
+        async all() {
+            const records = await withStore('readonly', (store) => store.getAll());
+            return records.map((record) => record.sheet);
+        },
+
+        remove(key) {
+            return withStore('readwrite', (store) => store.delete(key));
+        },
+
+        /*
+         * Sends every queued sheet. Resolves to the server's results; sheets it applied or
+         * rejected leave the queue, the rest (offline, logged out, a conflict) stay for the
+         * next try. Rejects if nothing could be sent, so a background sync is retried.
+         */
+        async flush() {
+            const records = await withStore('readonly', (store) => store.getAll());
+            const sheets = records.map((record) => record.sheet);
+            const results = [];
+            for (let start = 0; start < sheets.length; start += BATCH_SIZE) {
+                const response = await fetch(SYNC_URL, {
+                    method: 'POST',
+                    credentials: 'same-origin',
+                    headers: { 'Content-Type': 'application/json', 'X-CSRFToken': csrfToken(records) },
+                    body: JSON.stringify({ sheets: sheets.slice(start, start + BATCH_SIZE) }),
+                });
+                if (!response.ok) {
+                    throw new Error('Attendance sync failed with status ' + response.status);
+                }
+                const body = await response.json();
+                for (const result of body.results) {
+                    if (result.key) await this.remove(result.key);
+                    results.push(result);
+                }
+            }
+            return results;
+        },
+    };
+
+    scope.AttendanceQueue = AttendanceQueue;
+})(self);
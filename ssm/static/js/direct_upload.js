@@ -0,0 +1,102 @@
+/*
+ * Sends a form's files straight to the bucket instead of through the server (ssm/direct_uploads.py).
+ *
+ *   <form data-direct-upload="fee_challan" data-upload-params="academic_year" ...>
+ *       <input type="file" name="tuition_fee_challan" data-upload-field="tuition_fee_challan">
+ *
+ * On submit, each chosen file is presigned (target, field, the named form values as params),
+ * PUT to the returned URL and completed; its input is then disabled so the form posts
+ * everything else without it. A file that cannot go direct (storage without presigned
+ * uploads, network error on the way) stays in the form and is posted as before, as do files
+ * whose type is not in the form's data-upload-types, when it has one. Files the server
+ * refuses (type, size) stop the submit with its message.
+ */
+(function () {
+    const PRESIGN_URL = '/uploads/presign/';
+
+    class Refused extends Error {}
+
+    function csrfToken(form) {
+        const field = form.querySelector('input[name="csrfmiddlewaretoken"]');
+        return field ? field.value : '';
+    }
+
+    function params(form) {
+        const values = {};
+        const data = new FormData(form);
+        for (const name of (form.dataset.uploadParams || '').split(/\s+/).filter(Boolean)) {
+            values[name] = data.get(name);
+        }
+        return values;
+    }
+
+    async function postJson(url, token, body) {
+        const response = await fetch(url, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: { 'Content-Type': 'application/json', 'X-CSRFToken': token },
+            body: body === undefined ? undefined : JSON.stringify(body),
+        });
+        const payload = await response.json().catch(() => ({}));
+        if (response.status === 400 || response.status === 403 || response.status === 429) {
+            throw new Refused(payload.error || 'The file was refused.');
+        }
+        if (!response.ok) {
+            throw new Error('Request failed with status ' + response.status);
+        }
+        return payload;
+    }
+
+    async function upload(form, input) {
+        const file = input.files[0];
+        const token = csrfToken(form);
+        const grant = await postJson(PRESIGN_URL, token, {
+            target: form.dataset.directUpload,
+            field: input.dataset.uploadField,
+            params: params(form),
+            filename: file.name,
+            content_type: file.type,
+            size: file.size,
+        });
+        const response = await fetch(grant.url, { method: grant.method, headers: grant.headers, body: file });
+        if (!response.ok) {
+            throw new Error('Upload failed with status ' + response.status);
+        }
+        await postJson('/uploads/' + grant.id + '/complete/', token);
+    }
+
+    function goesDirect(form, input) {
+        const types = (form.dataset.uploadTypes || '').split(/\s+/).filter(Boolean);
+        return !input.disabled && input.files.length && (!types.length || types.includes(input.files[0].type));
+    }
+
+    async function submit(event) {
+        const form = event.target;
+        const inputs = Array.from(form.querySelectorAll('input[type="file"][data-upload-field]'))
+            .filter((input) => goesDirect(form, input));
+        if (!inputs.length) return;
+
+        event.preventDefault();
+        const button = form.querySelector('[type="submit"]');
+        if (button) button.disabled = true;
+        for (const input of inputs) {
+            try {
+                await upload(form, input);
+                input.disabled = true;
+            } catch (error) {
+                if (error instanceof Refused) {
+                    alert(input.files[0].name + ': ' + error.message);
+                    if (button) button.disabled = false;
+                    return;
+                }
+                // Not uploaded: leave it in the form, to go with the post
+                console.warn('Direct upload failed, posting the file instead', error);
+            }
+        }
+        form.submit();
+    }
+
+    document.addEventListener('submit', (event) => {
+        if (event.target.matches && event.target.matches('form[data-direct-upload]')) submit(event);
+    });
+})();
@@ -104,7 +104,9 @@ class StudentAdmin(admin.ModelAdmin):
     @admin.action(description='Promote selected students to next semester')
     def promote_students(self, request, queryset):
         from django.db.models import F
+        from ssm.principals import invalidate_principals
         updated_count = queryset.filter(current_semester__lte=8).update(current_semester=F('current_semester') + 1)
+        invalidate_principals(Student)
         self.message_user(request, f"{updated_count} students were successfully promoted.")
 
     # Removed get_urls and generate_students_view from here to move to StudentGeneratorAdmin
@@ -1,9 +1,18 @@
+from asgiref.sync import async_to_sync
 from google import genai
 from django.conf import settings
+from django.core.cache import caches
 from google.genai import types
+from ssm import outbound
+import asyncio
+import concurrent.futures
+import functools
+import hashlib
+import io
 import json
 import logging
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -14,6 +23,38 @@ if os.path.exists(env_path):
 
 logger = logging.getLogger(__name__)
 
+RESUME_MODEL = 'gemini-2.5-flash'
+GRADES_MODEL = 'gemini-2.5-flash'
+
+
+def _client(api_key):
+    """
+    Shared Gemini client for api_key. settings.GEMINI_BASE_URL, when set, sends requests to a
+    proxy or to a local stand-in (the loadtest ai_burst scenario) instead of Google. Calls time
+    out after the gateway's Gemini timeout (ssm.outbound).
+    """
+    timeout_ms = int(outbound.limits('gemini')['timeout'] * 1000)
+    return _shared_client(api_key, getattr(settings, 'GEMINI_BASE_URL', ''), timeout_ms)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _shared_client(api_key, base_url, timeout_ms):
+    # Building a client costs ~50 ms (SSL contexts), so one is kept per key. Its .aio side keeps
+    # an HTTP session per event loop, so sharing it between threads and loops is safe.
+    # Built under a lock and never evicted: a client that is dropped (a duplicate from two
+    # threads missing at once, or an evicted one) closes its HTTP sessions from __del__, under
+    # any request still using them.
+    key = (api_key, base_url, timeout_ms)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            http_options = types.HttpOptions(base_url=base_url or None, timeout=timeout_ms)
+            client = _clients[key] = genai.Client(api_key=api_key, http_options=http_options)
+        return client
+
 
 def generate_resume_content(student_data):
     """
@@ -25,33 +66,15 @@ def generate_resume_content(student_data):
         logger.error("GEMINI_API_KEY is not set in environment.")
         return {"error": "API Key not configured. Please contact administrator."}
 
-    client = genai.Client(api_key=api_key)
-
-    # Enhanced data assessment
-    has_projects = bool(student_data.get('projects'))
-    has_skills = bool(student_data.get('skills'))
-    project_count = len(student_data.get('projects', []))
-    skill_count = len(student_data.get('skills', []))
-    
-    # Determine optimal strategy
-    # If student has ANY projects, use enhancement mode to respect their input
-    is_fresher_mode = not has_projects
-    
-    if is_fresher_mode:
-        prompt = _build_fresher_prompt(student_data)
-    else:
-        prompt = _build_enhancement_prompt(student_data)
+    client = _client(api_key)
 
     try:
-        response = client.models.generate_content(
-            model='gemini-2.5-flash',  
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json",
-                temperature=0.7,
-                max_output_tokens=8192,
+        with outbound.call('gemini'):
+            response = client.models.generate_content(
+                model=RESUME_MODEL,
+                contents=_resume_prompt(student_data),
+                config=_resume_config(),
             )
-        )
         
         # Robust JSON parsing
         parsed_data = _parse_ai_response(response.text)
@@ -61,11 +84,29 @@ def generate_resume_content(student_data):
         
         return validated_data
 
+    except outbound.OutboundUnavailable as e:
+        logger.warning(str(e))
+        return {"error": "The AI service is busy. Please try again in a few minutes."}
     except Exception as e:
         logger.error(f"Error calling Gemini API: {str(e)}")
         return _handle_api_error(e, client)
 
 
+def _resume_prompt(student_data):
+    # If student has ANY projects, use enhancement mode to respect their input
+    if student_data.get('projects'):
+        return _build_enhancement_prompt(student_data)
+    return _build_fresher_prompt(student_data)
+
+
+def _resume_config():
+    return types.GenerateContentConfig(
+        response_mime_type="application/json",
+        temperature=0.7,
+        max_output_tokens=8192,
+    )
+
+
 def _build_fresher_prompt(student_data):
     """Builds prompt for students with minimal project/skill data."""
     return f"""
@@ -322,23 +363,7 @@ def _handle_api_error(error, client):
         return {"error": f"AI service error: {error_msg[:200]}"}
 
 
-def extract_grades_from_image(image_file, api_key=None):
-    """
-    Extracts grade data from a result screenshot using Gemini Pro Vision (or Flash).
-    """
-    try:
-        if not api_key:
-            api_key = os.getenv("GEMINI_API_KEY_GPA")
-            
-        if not api_key:
-            return {"error": "API Key is not configured on the server."}
-
-        client = genai.Client(api_key=api_key)
-        
-        # Read image bytes
-        image_bytes = image_file.read()
-        
-        prompt = """
+GRADES_PROMPT = """
         Analyze this academic result screenshot. Extract the data into a JSON structure.
         
         I need a list of subjects with the following fields:
@@ -360,17 +385,144 @@ def extract_grades_from_image(image_file, api_key=None):
         Output ONLY valid JSON.
         """
 
-        response = client.models.generate_content(
-            model='gemini-2.5-flash', 
-            contents=[prompt, types.Part.from_bytes(data=image_bytes, mime_type=image_file.content_type)],
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json",
-                temperature=0.1
-            )
-        )
-        
-        return _parse_ai_response(response.text)
 
+# Part of the cache key: bump it whenever GRADES_PROMPT or the parsing changes, so results
+# extracted under the old prompt are no longer served
+GRADES_PROMPT_VERSION = 1
+GRADES_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+# Screenshots are downscaled to this longest side and re-encoded before upload; portal
+# result tables stay legible well below it
+GRADES_IMAGE_MAX_SIDE = 1600
+GRADES_IMAGE_QUALITY = 85
+# Uploads within the size limit and smaller than this are sent untouched
+GRADES_IMAGE_SEND_AS_IS_BYTES = 256 * 1024
+
+# Grade extractions running right now, a Future per cache key, so identical uploads share one call
+_grades_inflight = {}
+_grades_inflight_lock = threading.Lock()
+
+
+def _grades_cache():
+    # Shared by every worker, so a screenshot extracted by one is served from the cache by all
+    return caches[settings.GRADES_CACHE_ALIAS]
+
+
+def _grades_cache_key(image_bytes):
+    """Content address of a screenshot: SHA-256 of the uploaded bytes, prompt version and model."""
+    digest = hashlib.sha256(image_bytes).hexdigest()
+    return f"ai_grades:v{GRADES_PROMPT_VERSION}:{GRADES_MODEL}:{digest}"
+
+
+def _shrink_image(image_bytes, content_type):
+    """
+    Downscales a screenshot to GRADES_IMAGE_MAX_SIDE and re-encodes it as JPEG. Returns
+    (bytes, content type): the upload itself when it is already small enough, when the JPEG
+    would not be smaller, or when Pillow cannot read it (Gemini then gets to try).
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as original:
+            if max(original.size) <= GRADES_IMAGE_MAX_SIDE and len(image_bytes) <= GRADES_IMAGE_SEND_AS_IS_BYTES:
+                return image_bytes, content_type
+            # JPEG uploads (phone photos) are decoded straight at a reduced scale
+            original.draft('RGB', (GRADES_IMAGE_MAX_SIDE, GRADES_IMAGE_MAX_SIDE))
+            image = ImageOps.exif_transpose(original)
+            if image.mode != 'RGB':
+                # Flatten transparency onto white rather than black
+                rgba = image.convert('RGBA')
+                image = Image.new('RGB', rgba.size, 'white')
+                image.paste(rgba, mask=rgba.getchannel('A'))
+            image.thumbnail((GRADES_IMAGE_MAX_SIDE, GRADES_IMAGE_MAX_SIDE), reducing_gap=2.0)
+            out = io.BytesIO()
+            image.save(out, 'JPEG', quality=GRADES_IMAGE_QUALITY, optimize=True)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning(f"Sending result screenshot as uploaded; could not re-encode it: {e}")
+        return image_bytes, content_type
+    shrunk = out.getvalue()
+    if len(shrunk) >= len(image_bytes):
+        return image_bytes, content_type
+    return shrunk, 'image/jpeg'
+
+
+def _grades_request(image_bytes, content_type):
+    """generate_content arguments for a (shrunk) result screenshot."""
+    return dict(
+        model=GRADES_MODEL,
+        contents=[GRADES_PROMPT, types.Part.from_bytes(data=image_bytes, mime_type=content_type)],
+        config=types.GenerateContentConfig(
+            response_mime_type="application/json",
+            temperature=0.1
+        ),
+    )
+
+
+def _observe_grades(outcome):
+    from ssm.metrics import observe_grade_extraction
+    observe_grade_extraction(outcome)
+
+
+def extract_grades_from_image(image_file, api_key=None):
+    """Sync entry point to aextract_grades_from_image, for code outside async views."""
+    return async_to_sync(aextract_grades_from_image)(image_file, api_key)
+
+
+async def aextract_grades_from_image(image_file, api_key=None):
+    """
+    Extracts grade data from a result screenshot using Gemini Pro Vision (or Flash).
+    Parsed results are cached by image content, and identical uploads arriving together
+    share one Gemini call.
+    """
+    api_key = api_key or os.getenv("GEMINI_API_KEY_GPA")
+    if not api_key:
+        return {"error": "API Key is not configured on the server."}
+
+    image_bytes = image_file.read()
+    key = _grades_cache_key(image_bytes)
+    grades = await _grades_cache().aget(key)
+    if grades is not None:
+        _observe_grades('hit')
+        return grades
+
+    # The first upload of a screenshot makes the call; identical ones wait on its Future, from
+    # whichever thread or event loop they run in (under WSGI each request gets its own loop)
+    with _grades_inflight_lock:
+        future = _grades_inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _grades_inflight[key] = concurrent.futures.Future()
+    if leader:
+        _observe_grades('miss')
+        task = asyncio.get_running_loop().create_task(
+            _aextract_grades(image_bytes, image_file.content_type, api_key, key)
+        )
+        task.add_done_callback(functools.partial(_settle_grades, key, future))
+    else:
+        _observe_grades('coalesced')
+    try:
+        # Shielded, so a client disconnecting does not cancel the call for everyone else
+        return await asyncio.shield(asyncio.wrap_future(future))
     except Exception as e:
         logger.error(f"Error extracting grades: {str(e)}")
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
+
+
+def _settle_grades(key, future, task):
+    with _grades_inflight_lock:
+        _grades_inflight.pop(key, None)
+    if task.cancelled():
+        future.set_exception(RuntimeError("Grade extraction was cancelled."))
+    elif task.exception() is not None:
+        future.set_exception(task.exception())
+    else:
+        future.set_result(task.result())
+
+
+async def _aextract_grades(image_bytes, content_type, api_key, key):
+    # Decoding and re-encoding the image is CPU work; keep it off the event loop
+    request = _grades_request(*await asyncio.to_thread(_shrink_image, image_bytes, content_type))
+    async with outbound.acall('gemini'):
+        response = await _client(api_key).aio.models.generate_content(**request)
+    grades = _parse_ai_response(response.text)
+    await _grades_cache().aset(key, grades, GRADES_CACHE_TIMEOUT)
+    return grades
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from students import resume_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs queued AI resume generations. Use with AI_RESUME_JOB_RUNNER=worker so the web '
+        'processes only queue jobs; several workers can run side by side.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the jobs queued now, then exit')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to wait when the queue is empty (default 2)')
+
+    def handle(self, *args, **options):
+        processed = 0
+        while True:
+            job_id = resume_jobs.run_next_job()
+            if job_id is not None:
+                processed += 1
+                self.stdout.write(f'Finished AI resume job {job_id}')
+                continue
+            if options['once']:
+                break
+            # Like the request cycle: drop connections past CONN_MAX_AGE or broken while idle
+            close_old_connections()
+            time.sleep(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} job(s).'))
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0058_airesumejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentattendance',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='studentmarks',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='studentattendance',
+            index=models.Index(fields=['student', 'updated_at'], name='students_attn_std_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentmarks',
+            index=models.Index(fields=['student', 'updated_at'], name='students_marks_std_upd_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0059_sync_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentattendance',
+            name='marked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
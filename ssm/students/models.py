@@ -2,6 +2,7 @@ from django.db import models
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.contrib.auth.hashers import make_password, check_password
 import datetime
+from django.utils import timezone
 from ssm.validators import validate_file_size
 from ssm.upload_paths import (
     student_photo_path, student_id_card_path, community_certificate_path,
@@ -141,8 +142,16 @@ class Student(models.Model):
         self.save()
 
     def check_password(self, raw_password):
-        """Checks if the raw password matches the hashed one."""
-        return check_password(raw_password, self.password)
+        """
+        Checks if the raw password matches the hashed one. A hash made with an older hasher or
+        fewer iterations is upgraded on a successful check.
+        """
+        return check_password(raw_password, self.password, setter=self._upgrade_password)
+
+    def _upgrade_password(self, raw_password):
+        # Only the password column: set_password() saves every field
+        self.password = make_password(raw_password)
+        Student.objects.filter(pk=self.pk).update(password=self.password)
 
     def __str__(self):
         return f"{self.student_name} ({self.roll_number})"
@@ -429,9 +438,13 @@ class StudentMarks(models.Model):
     test1_marks = models.IntegerField(null=True, blank=True)
     test2_marks = models.IntegerField(null=True, blank=True)
     internal_marks = models.IntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('student', 'subject')
+        indexes = [
+            models.Index(fields=['student', 'updated_at'], name='students_marks_std_upd_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student.student_name} - {self.subject.code}"
@@ -443,9 +456,16 @@ class StudentAttendance(models.Model):
     time = models.TimeField(null=True, blank=True)
     end_time = models.TimeField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=[('Present', 'Present'), ('Absent', 'Absent')], default='Present')
+    updated_at = models.DateTimeField(auto_now=True)
+    # When the teacher took the mark, for sheets synced after being captured offline; the
+    # offline sync compares it (or updated_at) to decide which of two marks is newer
+    marked_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         unique_together = ('student', 'subject', 'date', 'time')
+        indexes = [
+            models.Index(fields=['student', 'updated_at'], name='students_attn_std_upd_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student.student_name} - {self.subject.code} - {self.date}"
@@ -540,6 +560,40 @@ class ResultScreenshot(models.Model):
     def __str__(self):
         return f"Result: {self.student.student_name} - {self.subject.code}"
 
+
+class AIResumeJob(models.Model):
+    """
+    One AI resume generation, keyed by the hash of the profile data sent to Gemini: asking
+    again with an unchanged profile reuses the stored result instead of calling the model.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='ai_resume_jobs')
+    input_hash = models.CharField(max_length=64)
+    student_data = models.JSONField(help_text="Profile data sent to the model")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    result = models.JSONField(blank=True, null=True)
+    error = models.CharField(max_length=255, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    requested_at = models.DateTimeField(default=timezone.now, help_text="Last time the student asked for this result")
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        unique_together = ('student', 'input_hash')
+        ordering = ['-requested_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='students_airesume_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"AI resume: {self.student.student_name} ({self.status})"
+
 class BonafideRequest(models.Model):
     STATUS_CHOICES = [
         ('Pending Office Approval', 'Pending Office Approval'), # Renamed from Pending HOD
@@ -0,0 +1,177 @@
+"""
+Job queue for AI resume generation. The view records a job and returns at once; a worker (a
+small thread pool in the web process, or `manage.py run_ai_resume_jobs`) makes the Gemini call
+through the shared client and stores the result on the job, which the status endpoint polls.
+Jobs are keyed by student and a hash of the profile data, so an unchanged profile reuses its
+stored result instead of calling the model again.
+"""
+import concurrent.futures
+import datetime
+import hashlib
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from students import ai_utils
+from students.models import AIResumeJob
+
+logger = logging.getLogger(__name__)
+
+# Bump when the resume prompts change, so stored results are generated afresh
+RESUME_PROMPT_VERSION = 1
+RESUME_FORMAT_VERSION = '2.0'
+# Profiles whose results are kept per student; older ones are deleted as new ones are queued
+JOBS_KEPT_PER_STUDENT = 5
+MAX_ATTEMPTS = 3
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+
+def resume_input_hash(student_data):
+    payload = json.dumps(
+        {'data': student_data, 'model': ai_utils.RESUME_MODEL, 'prompt': RESUME_PROMPT_VERSION},
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def request_resume(student, student_data):
+    """
+    Returns the job for this profile. A new profile, or one whose last attempt failed or was
+    abandoned, is queued; a finished or in-progress job is returned as it is.
+    """
+    now = timezone.now()
+    job, created = AIResumeJob.objects.get_or_create(
+        student=student, input_hash=resume_input_hash(student_data),
+        defaults={'student_data': student_data, 'requested_at': now},
+    )
+    if created:
+        _prune(student)
+        enqueue(job)
+        return job
+
+    fields = {'requested_at': now}
+    if job.status == 'failed' or (job.status == 'running' and job.started_at < _abandoned_before()):
+        fields.update(status='queued', error='', attempts=0, started_at=None, finished_at=None)
+    AIResumeJob.objects.filter(pk=job.pk).update(**fields)
+    for name, value in fields.items():
+        setattr(job, name, value)
+    if job.status == 'queued':
+        # Also revives a job whose in-process worker went away with a restart; the claim
+        # in run_job keeps it from running twice
+        enqueue(job)
+    return job
+
+
+def current_result(roll_number):
+    """The most recently requested finished resume of a student, or None."""
+    return AIResumeJob.objects.filter(
+        student_id=roll_number, status='done',
+    ).values_list('result', flat=True).first()
+
+
+def enqueue(job):
+    if settings.AI_RESUME_JOB_RUNNER != 'thread':
+        return
+    job_id = job.pk
+    transaction.on_commit(lambda: _submit(job_id))
+
+
+def _submit(job_id):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=settings.AI_RESUME_JOB_THREADS, thread_name_prefix='ai-resume',
+            )
+        future = _executor.submit(_run_in_thread, job_id)
+        _pending.add(future)
+    future.add_done_callback(_pending.discard)
+
+
+def _run_in_thread(job_id):
+    try:
+        run_job(job_id)
+    except Exception as e:
+        logger.error(f"AI resume job {job_id} failed: {e}")
+    finally:
+        connections.close_all()
+
+
+def wait_for_jobs(timeout=None):
+    """Waits for the jobs submitted to this process's pool. Returns False on timeout."""
+    _, not_done = concurrent.futures.wait(list(_pending), timeout=timeout)
+    return not not_done
+
+
+def run_job(job_id):
+    """Generates the resume for a queued job. Returns False when it is not ours to run."""
+    if not _claim(job_id):
+        return False
+    _generate(job_id)
+    return True
+
+
+def run_next_job():
+    """Claims and runs the oldest queued job. Returns its id, or None when there is nothing to do."""
+    AIResumeJob.objects.filter(
+        status='running', started_at__lt=_abandoned_before(), attempts__gte=MAX_ATTEMPTS,
+    ).update(status='failed', error='Generation did not finish. Please try again.', finished_at=timezone.now())
+
+    with transaction.atomic():
+        job_id = _claimable().order_by('created_at').select_for_update(skip_locked=True).values_list('pk', flat=True).first()
+        if job_id is None or not _claim(job_id):
+            return None
+    _generate(job_id)
+    return job_id
+
+
+def _abandoned_before():
+    return timezone.now() - datetime.timedelta(seconds=settings.AI_RESUME_JOB_TIMEOUT)
+
+
+def _claimable():
+    return AIResumeJob.objects.filter(
+        Q(status='queued') | Q(status='running', started_at__lt=_abandoned_before()),
+        attempts__lt=MAX_ATTEMPTS,
+    )
+
+
+def _claim(job_id):
+    return _claimable().filter(pk=job_id).update(
+        status='running', started_at=timezone.now(), attempts=F('attempts') + 1,
+    ) == 1
+
+
+def _generate(job_id):
+    student_data = AIResumeJob.objects.values_list('student_data', flat=True).get(pk=job_id)
+    result = ai_utils.generate_resume_content(student_data)
+    finished = timezone.now()
+    if 'error' in result:
+        logger.error(f"AI generation failed for job {job_id}: {result['error']}")
+        fields = {'status': 'failed', 'error': result['error'][:255]}
+    else:
+        fields = {'status': 'done', 'error': '', 'result': {
+            **result,
+            'generated_at': str(finished),
+            'student_name': student_data.get('name'),
+            'version': RESUME_FORMAT_VERSION,
+        }}
+    # A job the student cleared while it ran stays deleted
+    AIResumeJob.objects.filter(pk=job_id, status='running').update(finished_at=finished, **fields)
+
+
+def _prune(student):
+    stale = list(
+        AIResumeJob.objects.filter(student=student).exclude(status='running')
+        .values_list('pk', flat=True)[JOBS_KEPT_PER_STUDENT:]
+    )
+    if stale:
+        AIResumeJob.objects.filter(pk__in=stale).delete()
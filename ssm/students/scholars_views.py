@@ -10,20 +10,30 @@ from students.models import (
 )
 from students.forms import LeaveRequestForm
 from staffs.models import Staff
+from ssm import login_protection, principals
 
 def scholar_login(request):
     if request.method == 'POST':
         roll_number = request.POST.get('roll_number')
         password = request.POST.get('password')
         try:
+            # Scholars are student accounts, so they share the student counters
+            login_protection.check(request, 'student', roll_number)
             student = Student.objects.get(roll_number=roll_number, program_level='PHD')
-            if student.check_password(password):
+            if login_protection.verify_password(student, password, 'student'):
+                login_protection.record_success(request, 'student', roll_number)
                 request.session['student_roll_number'] = student.roll_number
                 return redirect('scholar_dashboard')
             else:
+                login_protection.record_failure(request, 'student', roll_number)
                 return render(request, 'scholars/scholar_login.html', {'error': 'Invalid credentials'})
         except Student.DoesNotExist:
+            login_protection.record_failure(request, 'student', roll_number)
             return render(request, 'scholars/scholar_login.html', {'error': 'Scholar not found'})
+        except login_protection.LoginRefused as e:
+            response = render(request, 'scholars/scholar_login.html', {'error': str(e)}, status=e.status)
+            response['Retry-After'] = str(e.retry_after)
+            return response
     return render(request, 'scholars/scholar_login.html')
 
 def scholar_register_step1(request):
@@ -185,7 +195,7 @@ def scholar_dashboard(request):
     if not roll_number:
         return redirect('scholar_login')
     
-    student = get_object_or_404(Student, roll_number=roll_number)
+    student = principals.current_student_or_404(request)
     if student.program_level != 'PHD':
         return redirect('student_dashboard')
     profile = getattr(student, 'scholar_profile', None)
@@ -276,7 +286,7 @@ def scholar_phd_tracker(request):
     if not roll_number:
         return redirect('scholar_login')
         
-    student = get_object_or_404(Student, roll_number=roll_number)
+    student = principals.current_student_or_404(request)
     if student.program_level != 'PHD':
         return redirect('student_dashboard')
         
@@ -301,7 +311,7 @@ def scholar_add_rac(request):
     if not roll_number:
         return redirect('scholar_login')
     
-    student = get_object_or_404(Student, roll_number=roll_number)
+    student = principals.current_student_or_404(request)
     member_type = request.POST.get('member_type') # Internal or External
     
     if member_type == 'Internal':
@@ -330,7 +340,7 @@ def scholar_update_zeroth(request):
     if not roll_number:
         return redirect('scholar_login')
     
-    student = get_object_or_404(Student, roll_number=roll_number)
+    student = principals.current_student_or_404(request)
     zeroth, _ = ZerothReview.objects.get_or_create(scholar=student)
     
     zeroth.tentative_title = request.POST.get('tentative_title', zeroth.tentative_title)
@@ -354,7 +364,7 @@ def scholar_add_rcw(request):
     if not roll_number:
         return redirect('scholar_login')
         
-    student = get_object_or_404(Student, roll_number=roll_number)
+    student = principals.current_student_or_404(request)
     
     # Check if a final review already exists
     if RCWReview.objects.filter(scholar=student, is_final=True).exists():
@@ -404,7 +414,7 @@ def scholar_upload_stage_docs(request):
     if not roll_number:
         return redirect('scholar_login')
         
-    student = get_object_or_404(Student, roll_number=roll_number)
+    student = principals.current_student_or_404(request)
     progress_obj, _ = PhDProgress.objects.get_or_create(scholar=student)
     
     stage = progress_obj.current_stage
@@ -466,7 +476,7 @@ def scholar_profile(request):
     if not roll_number:
         return redirect('scholar_login')
     
-    student = get_object_or_404(Student, roll_number=roll_number)
+    student = principals.current_student_or_404(request)
     if student.program_level != 'PHD':
         return redirect('student_profile')
 
@@ -508,7 +518,7 @@ def scholar_edit_profile(request):
     if not roll_number:
         return redirect('scholar_login')
 
-    student = get_object_or_404(Student, roll_number=roll_number)
+    student = principals.current_student_or_404(request)
     if student.program_level != 'PHD':
         return redirect('student_editprofile')
     
@@ -1,7 +1,7 @@
 from django.db.models.signals import pre_save, post_save
 from django.dispatch import receiver
 from .models import BonafideRequest, LeaveRequest
-from webpush import send_user_notification
+from staffs.utils import send_user_notification
 
 @receiver(pre_save, sender=BonafideRequest)
 def store_previous_status_bonafide(sender, instance, **kwargs):
@@ -106,7 +106,8 @@ def auto_compress_all_uploaded_files(sender, instance, **kwargs):
         for field in instance._meta.get_fields():
             if isinstance(field, FileField):
                 file_attr = getattr(instance, field.name)
-                # Check if it's a new upload (isinstance of UploadedFile)
-                if file_attr and hasattr(file_attr, 'file') and isinstance(file_attr.file, UploadedFile):
+                # Check if it's a new upload (isinstance of UploadedFile). _file rather than file:
+                # .file opens stored files from the bucket, on every save of the instance
+                if file_attr and isinstance(getattr(file_attr, '_file', None), UploadedFile):
                     compress_file(file_attr)
 
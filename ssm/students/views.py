@@ -1,5 +1,6 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import JsonResponse, HttpResponse
+from django.urls import reverse
 from django.utils import timezone
 from django.contrib import messages
 from django.db.models import Q, Count, F
@@ -8,6 +9,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.cache import never_cache
 from django.contrib.auth.decorators import login_required
 from functools import wraps
+from asgiref.sync import iscoroutinefunction, sync_to_async
 import datetime
 import csv
 import json
@@ -19,13 +21,15 @@ logger = logging.getLogger(__name__)
 from .models import (
     Student, PersonalInfo, BankDetails, AcademicHistory, DiplomaDetails, UGDetails, PGDetails, PhDDetails,
     ScholarshipInfo, StudentDocuments, OtherDetails, Caste, StudentMarks, StudentAttendance,
-    StudentSkill, StudentProject, LeaveRequest, StudentGPA, BonafideRequest, DocumentRequest, ScholarshipApplication
+    StudentSkill, StudentProject, LeaveRequest, StudentGPA, BonafideRequest, DocumentRequest, ScholarshipApplication,
+    AIResumeJob
 )
-from . import ai_utils
+from . import ai_utils, resume_jobs
+from ssm import login_protection, principals
 from django.template.loader import get_template
 from xhtml2pdf import pisa
-# Import the caste data for the API
-from .caste_data import CASTE_DATA
+# Serves the caste data for the API (ssm.reference_data)
+from ssm.reference_data import reference_data_view
 from .forms import (
     StudentForm, PersonalInfoForm, BankDetailsForm, AcademicHistoryForm,
     DiplomaDetailsForm, UGDetailsForm, PGDetailsForm, PhDDetailsForm,
@@ -42,8 +46,16 @@ import os
 def student_login_required(view_func):
     """
     Custom decorator to check if a student is logged in via session.
-    If not, redirects to the login page.
+    If not, redirects to the login page. Works on async views too.
     """
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def _wrapped_async_view(request, *args, **kwargs):
+            if not await request.session.ahas_key('student_roll_number'):
+                return redirect('student_login')
+            return await view_func(request, *args, **kwargs)
+        return _wrapped_async_view
+
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
         if 'student_roll_number' not in request.session:
@@ -66,7 +78,8 @@ def prevhome(request):
 
     # --- Mobile App Redirection Logic ---
     # 1. Detect if coming from TWA (Mobile App)
-    if request.GET.get('source') == 'twa':
+    if request.GET.get('source') == 'twa' and not request.session.get('is_mobile_app'):
+        # The app opens with ?source=twa every time; only the first visit needs a session write
         request.session['is_mobile_app'] = True
 
     # 2. If valid mobile app session AND not explicitly asking for landing page
@@ -105,7 +118,7 @@ def exam_timetable(request):
     if 'student_roll_number' not in request.session:
         return redirect('student_login')
     
-    student = Student.objects.get(roll_number=request.session['student_roll_number'])
+    student = principals.current_student(request)
     schedule = ExamSchedule.objects.filter(semester=student.current_semester).order_by('date', 'session')
     
     return render(request, 'student_exam_schedule.html', {
@@ -117,7 +130,7 @@ def class_timetable(request):
     if 'student_roll_number' not in request.session:
         return redirect('student_login')
         
-    student = Student.objects.get(roll_number=request.session['student_roll_number'])
+    student = principals.current_student(request)
     entries = Timetable.objects.filter(semester=student.current_semester).select_related('subject', 'staff')
     
     days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
@@ -205,8 +218,8 @@ def service_unavailable(request):
 
 # --- API Views ---
 def get_caste_data_api(request):
-    """API to provide the initial caste data to the registration form."""
-    return JsonResponse(CASTE_DATA)
+    """API to provide the initial caste data to the registration form (the castes reference bundle)."""
+    return reference_data_view(request, 'castes', fmt='json')
 
 @csrf_exempt
 def register_student(request):
@@ -220,7 +233,7 @@ def register_student(request):
 
     try:
         roll_number = request.session['student_roll_number']
-        student = Student.objects.get(roll_number=roll_number)
+        student = principals.current_student(request)
         
         data = request.POST
         files = request.FILES
@@ -367,9 +380,12 @@ def stdlogin(request):
         roll_number = request.POST.get('roll_number')
         password_from_form = request.POST.get('password')
         try:
+            # Throttled attempts are refused before the account is loaded or a hash computed
+            login_protection.check(request, 'student', roll_number)
             student = Student.objects.get(roll_number=roll_number)
-            # Use the secure check_password method from your model
-            if student.check_password(password_from_form):
+            # Use the secure check_password method from your model, within the hashing budget
+            if login_protection.verify_password(student, password_from_form, 'student'):
+                login_protection.record_success(request, 'student', roll_number)
                 # Clear any existing staff session to prevent dual login
                 if 'staff_id' in request.session:
                     del request.session['staff_id']
@@ -384,9 +400,15 @@ def stdlogin(request):
                 log_audit(request, 'login', actor_type='student', actor_id=student.roll_number, actor_name=student.student_name, message='Student logged in')
                 return redirect('student_dashboard')
             else:
+                login_protection.record_failure(request, 'student', roll_number)
                 error = "Invalid credentials."
         except Student.DoesNotExist:
+            login_protection.record_failure(request, 'student', roll_number)
             error = "Invalid credentials."
+        except login_protection.LoginRefused as e:
+            response = render(request, 'stdlogin.html', {'error': str(e)}, status=e.status)
+            response['Retry-After'] = str(e.retry_after)
+            return response
         return render(request, 'stdlogin.html', {'error': error})
     return render(request, 'stdlogin.html')
 
@@ -394,7 +416,7 @@ def stdlogin(request):
 def stdregister(request): 
     # This is now the "Complete Profile" page
     roll_number = request.session.get('student_roll_number')
-    student = get_object_or_404(Student, roll_number=roll_number)
+    student = principals.current_student_or_404(request)
     
     # Helper to safely get related objects
     def get_related_or_none(model_class, student_obj):
@@ -428,7 +450,7 @@ from django.contrib.auth.decorators import login_required
 def student_dashboard(request):
     roll_number = request.session.get('student_roll_number')
     try:
-        student = Student.objects.get(roll_number=roll_number)
+        student = principals.current_student(request)
     except Student.DoesNotExist:
         # Session could be stale or invalid
         request.session.flush()
@@ -691,11 +713,10 @@ def get_profile_completion_data(student):
     check_fields(student, ['student_name', 'student_email', 'register_number', 'program_level', 'current_semester'])
 
     # 2. Personal Info
-    from students.models import PersonalInfo, BankDetails, AcademicHistory, DiplomaDetails, UGDetails, PGDetails, StudentDocuments
+    # Reverse one-to-one access caches misses too, so each profile costs at most one query
+    # (none when the caller used select_related)
     try:
         p_info = getattr(student, 'personalinfo', None)
-        if not p_info:
-            p_info = PersonalInfo.objects.filter(student=student).first()
         check_fields(p_info, [
             'date_of_birth', 'gender', 'blood_group', 'community', 'religion', 'aadhaar_number',
             'permanent_address', 'present_address', 'student_mobile', 'father_name', 'father_occupation',
@@ -711,8 +732,6 @@ def get_profile_completion_data(student):
     # 3. Bank Details
     try:
         bank = getattr(student, 'bankdetails', None)
-        if not bank:
-            bank = BankDetails.objects.filter(student=student).first()
         check_fields(bank, ['account_holder_name', 'account_number', 'bank_name', 'branch_name', 'ifsc_code'])
     except Exception:
         check_fields(None, ['account_holder_name', 'account_number', 'bank_name', 'branch_name', 'ifsc_code'])
@@ -720,8 +739,6 @@ def get_profile_completion_data(student):
     # 4. Academic Details (SSLC required for all)
     try:
         acad = getattr(student, 'academichistory', None)
-        if not acad:
-            acad = AcademicHistory.objects.filter(student=student).first()
         check_fields(acad, ['sslc_register_number', 'sslc_percentage', 'sslc_year_of_passing', 'sslc_school_name', 'sslc_school_address'])
     except Exception:
         check_fields(None, ['sslc_register_number', 'sslc_percentage', 'sslc_year_of_passing', 'sslc_school_name', 'sslc_school_address'])
@@ -731,16 +748,12 @@ def get_profile_completion_data(student):
     if is_lateral:
         try:
             diploma = getattr(student, 'diplomadetails', None)
-            if not diploma:
-                diploma = DiplomaDetails.objects.filter(student=student).first()
             check_fields(diploma, ['diploma_register_number', 'diploma_percentage', 'diploma_year_of_passing', 'diploma_college_name', 'diploma_college_address'])
         except Exception:
             check_fields(None, ['diploma_register_number', 'diploma_percentage', 'diploma_year_of_passing', 'diploma_college_name', 'diploma_college_address'])
     else:
         try:
             acad = getattr(student, 'academichistory', None)
-            if not acad:
-                acad = AcademicHistory.objects.filter(student=student).first()
             check_fields(acad, ['hsc_register_number', 'hsc_percentage', 'hsc_year_of_passing', 'hsc_school_name', 'hsc_school_address'])
         except Exception:
             check_fields(None, ['hsc_register_number', 'hsc_percentage', 'hsc_year_of_passing', 'hsc_school_name', 'hsc_school_address'])
@@ -750,8 +763,6 @@ def get_profile_completion_data(student):
     if is_pg_or_phd:
         try:
             ug = getattr(student, 'ugdetails', None)
-            if not ug:
-                ug = UGDetails.objects.filter(student=student).first()
             check_fields(ug, ['ug_course', 'ug_college_name', 'ug_college_address', 'ug_university', 'ug_ogpa', 'ug_year_of_passing'])
         except Exception:
             check_fields(None, ['ug_course', 'ug_college_name', 'ug_college_address', 'ug_university', 'ug_ogpa', 'ug_year_of_passing'])
@@ -761,8 +772,6 @@ def get_profile_completion_data(student):
     if is_phd:
         try:
             pg = getattr(student, 'pgdetails', None)
-            if not pg:
-                pg = PGDetails.objects.filter(student=student).first()
             check_fields(pg, ['pg_course', 'pg_college_name', 'pg_college_address', 'pg_university', 'pg_ogpa', 'pg_year_of_passing'])
         except Exception:
             check_fields(None, ['pg_course', 'pg_college_name', 'pg_college_address', 'pg_university', 'pg_ogpa', 'pg_year_of_passing'])
@@ -770,8 +779,6 @@ def get_profile_completion_data(student):
     # 8. Student Documents
     try:
         docs = getattr(student, 'studentdocuments', None)
-        if not docs:
-            docs = StudentDocuments.objects.filter(student=student).first()
         
         doc_fields = ['student_photo', 'student_id_card', 'community_certificate', 'aadhaar_card', 'sslc_marksheet', 'bank_passbook']
         if not is_lateral:
@@ -854,7 +861,7 @@ def student_profile(request):
     Displays the full profile (bio-data) of the student.
     """
     roll_number = request.session.get('student_roll_number')
-    student = get_object_or_404(Student, roll_number=roll_number)
+    student = principals.current_student_or_404(request)
     if student.program_level == 'PHD':
         return redirect('scholar_profile')
     
@@ -899,7 +906,7 @@ from django.contrib import messages
 @student_login_required
 def student_editprofile(request):
     roll_number = request.session.get('student_roll_number')
-    student = Student.objects.get(roll_number=roll_number)
+    student = principals.current_student(request)
     if student.program_level == 'PHD':
         return redirect('scholar_edit_profile')
     
@@ -937,7 +944,9 @@ def student_editprofile(request):
         scholarship_info.is_7_5_reservation = (request.POST.get('is_7_5_reservation') == 'yes')
         scholarship_info.save()
         
-        # Update document uploads
+        # Update document uploads. Only the fields changed here are saved: files sent straight
+        # to the bucket (static/js/direct_upload.js) are stored by a worker, not by this post
+        changed_docs = []
         for field in ['student_photo', 'student_id_card', 'community_certificate', 'aadhaar_card', 
                       'first_graduate_certificate', 'sslc_marksheet', 'hsc_marksheet', 
                       'income_certificate', 'bank_passbook', 'driving_license',
@@ -947,10 +956,13 @@ def student_editprofile(request):
                 if file_field:
                     file_field.delete(save=False)
                 setattr(student_docs, field, None)
+                changed_docs.append(field)
             elif field in request.FILES:
                 setattr(student_docs, field, request.FILES[field])
+                changed_docs.append(field)
         
-        student_docs.save()
+        if changed_docs:
+            student_docs.save(update_fields=changed_docs)
         
         from staffs.utils import log_audit
         log_audit(request, 'update', actor_type='student', actor_id=student.roll_number, actor_name=student.student_name, object_type='Student', object_id=student.roll_number, message='Updated profile/personal details')
@@ -1013,11 +1025,11 @@ def password_reset_verify(request):
                 
                 # Generate OTP
                 import random
+                from staffs.utils import set_password_reset_otp
                 otp = str(random.randint(100000, 999999))
                 
-                # Store in session with expiry
-                request.session['reset_otp'] = otp
-                request.session['reset_otp_expiry'] = (timezone.now() + datetime.timedelta(minutes=10)).isoformat()
+                # Store in the cache, which expires it
+                set_password_reset_otp('student', student.pk, otp)
                 
                 # Send Email
                 from django.core.mail import send_mail
@@ -1070,32 +1082,26 @@ def password_reset_verify(request):
 def password_reset_otp_verify(request):
     """Step 2.5: Verify the entered OTP."""
     if request.method == 'POST':
+        from staffs.utils import get_password_reset_otp, clear_password_reset_otp
+
         entered_otp = request.POST.get('otp')
-        session_otp = request.session.get('reset_otp')
-        expiry_str = request.session.get('reset_otp_expiry')
+        student_pk = request.session.get('reset_student_pk')
+        # None once the 10 minutes are up
+        sent_otp = get_password_reset_otp('student', student_pk)
         
-        if not session_otp or not expiry_str:
-            messages.error(request, 'No OTP found or session expired. Please request a new one.')
+        if not sent_otp:
+            messages.error(request, 'No OTP found or OTP expired. Please request a new one.')
             return redirect('password_reset_verify') # Redirects back effectively re-rendering p2 or needing logic
 
-        # Check expiry
-        expiry_time = datetime.datetime.fromisoformat(expiry_str)       
-        if timezone.now() > expiry_time:
-            messages.error(request, 'OTP has expired. Please request a new one.')
-            return redirect('password_reset_identify') # Or handle better re-flow
-
-        if entered_otp == session_otp:
+        if entered_otp == sent_otp:
             # Success
             request.session['reset_verified'] = True
-            # clear OTP session
-            del request.session['reset_otp']
-            del request.session['reset_otp_expiry']
+            clear_password_reset_otp('student', student_pk)
             return redirect('password_reset_confirm')
         else:
             messages.error(request, 'Invalid OTP. Please try again.')
             # Re-render the OTP page
             # We need student email mask again, but student obj is in session PK
-            student_pk = request.session.get('reset_student_pk')
             student = Student.objects.get(pk=student_pk)
             return render(request, 'p2_otp.html', {
                  'email_mask': student.student_email
@@ -1129,7 +1135,7 @@ def password_reset_confirm(request):
         student.save()
 
         # Cleanup Session
-        keys_to_delete = ['reset_student_pk', 'reset_verified', 'reset_otp', 'reset_otp_expiry', 'student_roll_number']
+        keys_to_delete = ['reset_student_pk', 'reset_verified', 'student_roll_number']
         for key in keys_to_delete:
             if key in request.session:
                 del request.session[key]
@@ -1150,7 +1156,7 @@ def student_attendance(request):
     """Displays student's attendance data course-wise."""
     roll_number = request.session.get('student_roll_number')
     try:
-        student = Student.objects.get(roll_number=roll_number)
+        student = principals.current_student(request)
     except Student.DoesNotExist:
         request.session.flush()
         return redirect('student_login')
@@ -1171,14 +1177,21 @@ def student_attendance(request):
     total_classes_overall = 0
     present_total_overall = 0
     
-    for subject in subjects:
-        attendance_entries = StudentAttendance.objects.filter(
-            student=student,
-            subject=subject
+    # Totals for every subject in one grouped query
+    attendance_counts = {
+        row['subject_id']: row
+        for row in StudentAttendance.objects.filter(student=student, subject__in=subjects).values('subject_id').annotate(
+            total=Count('id'),
+            present=Count('id', filter=Q(status='Present')),
+            absent=Count('id', filter=Q(status='Absent')),
         )
-        total_classes = attendance_entries.count()
-        present_count = attendance_entries.filter(status='Present').count()
-        absent_count = attendance_entries.filter(status='Absent').count()
+    }
+
+    for subject in subjects:
+        counts = attendance_counts.get(subject.id, {})
+        total_classes = counts.get('total', 0)
+        present_count = counts.get('present', 0)
+        absent_count = counts.get('absent', 0)
         
         if total_classes > 0:
             percentage = (present_count / total_classes) * 100
@@ -1249,7 +1262,7 @@ def student_marks(request):
     """Displays student's marks with pre-processed chart data."""
     roll_number = request.session.get('student_roll_number')
     try:
-        student = Student.objects.get(roll_number=roll_number)
+        student = principals.current_student(request)
     except Student.DoesNotExist:
         request.session.flush()
         return redirect('student_login')
@@ -1345,7 +1358,7 @@ def export_student_marks_csv(request):
     from .models import StudentMarks
 
     roll_number = request.session.get('student_roll_number')
-    student = Student.objects.get(roll_number=roll_number)
+    student = principals.current_student(request)
     
     response = HttpResponse(content_type='text/csv')
     response['Content-Disposition'] = f'attachment; filename="Marks_{student.roll_number}.csv"'
@@ -1377,7 +1390,7 @@ def cgpa_history(request):
     Displays the detailed CGPA history of the student with visualizations and AI insights.
     """
     roll_number = request.session.get('student_roll_number')
-    student = get_object_or_404(Student, roll_number=roll_number)
+    student = principals.current_student_or_404(request)
 
     # Fetch all stored GPA records
     gpa_records = StudentGPA.objects.filter(student=student).order_by('semester')
@@ -1501,7 +1514,7 @@ def export_student_attendance_csv(request):
     from .models import StudentAttendance
     
     roll_number = request.session.get('student_roll_number')
-    student = Student.objects.get(roll_number=roll_number)
+    student = principals.current_student(request)
     
     response = HttpResponse(content_type='text/csv')
     response['Content-Disposition'] = f'attachment; filename="Attendance_{student.roll_number}.csv"'
@@ -1538,7 +1551,7 @@ def export_student_attendance_csv(request):
 @student_login_required
 def resume_builder(request):
     roll_number = request.session.get('student_roll_number')
-    student = Student.objects.get(roll_number=roll_number)
+    student = principals.current_student(request)
     
     # Forms
     skill_form = StudentSkillForm()
@@ -1588,18 +1601,16 @@ def resume_builder(request):
 @student_login_required
 def generate_resume_pdf(request):
     roll_number = request.session.get('student_roll_number')
-    student = Student.objects.get(roll_number=roll_number)
+    student = principals.current_student(request)
     
     # Fetch subjects for coursework section
     from staffs.models import Subject
     subjects = Subject.objects.filter(semester=student.current_semester)
     
-    # Check for AI Data in Session
-    ai_data = request.session.get('ai_resume_data', None)
-    
-    # If standard type requested, force ignore AI data
-    if request.GET.get('type') == 'standard':
-        ai_data = None
+    # Latest finished AI resume, unless the standard type is requested
+    ai_data = None
+    if request.GET.get('type') != 'standard':
+        ai_data = resume_jobs.current_result(roll_number)
     
     # Gather all data
     context = {
@@ -1638,12 +1649,14 @@ def generate_resume_pdf(request):
 
 
 @require_http_methods(["POST"])
-def ai_generate_resume(request):
+async def ai_generate_resume(request):
     """
-    Generate AI-enhanced resume content for the logged-in student.
+    Queue AI-enhanced resume generation for the logged-in student. Returns 202 with the job
+    to poll through get_ai_resume_status, or 200 with the stored result when the profile is
+    unchanged since it was last generated.
     """
     # 1. Authentication check
-    roll_number = request.session.get('student_roll_number')
+    roll_number = await request.session.aget('student_roll_number')
     if not roll_number:
         return JsonResponse({
             'error': 'Authentication required',
@@ -1651,11 +1664,7 @@ def ai_generate_resume(request):
         }, status=401)
     
     try:
-        student = Student.objects.select_related(
-            'ugdetails', 'pgdetails', 'phddetails', 'personalinfo'
-        ).prefetch_related(
-            'skills', 'projects'
-        ).get(roll_number=roll_number)
+        student = await sync_to_async(_get_resume_student)(roll_number)
     except Student.DoesNotExist:
         return JsonResponse({
             'error': 'Student not found',
@@ -1664,7 +1673,7 @@ def ai_generate_resume(request):
     
     # 2. Gather comprehensive student data
     try:
-        student_data = _prepare_student_data(student)
+        student_data = await sync_to_async(_prepare_student_data)(student)
     except Exception as e:
         logger.error(f"Error preparing student data for {roll_number}: {str(e)}")
         return JsonResponse({
@@ -1679,39 +1688,41 @@ def ai_generate_resume(request):
             'message': 'Please complete your academic information before generating a resume.'
         }, status=400)
     
-    # 4. Call AI service
-    logger.info(f"Generating AI resume for {student.student_name} ({roll_number})")
-    ai_result = ai_utils.generate_resume_content(student_data)
-    
-    # 5. Handle AI service errors
-    if 'error' in ai_result:
-        logger.error(f"AI generation failed for {roll_number}: {ai_result['error']}")
-        return JsonResponse({
-            'error': 'AI generation failed',
-            'message': ai_result['error'],
-            'fallback': 'You can still download your resume with existing data.'
-        }, status=500)
-    
-    # 6. Store in session with metadata
-    request.session['ai_resume_data'] = {
-        **ai_result,
-        'generated_at': str(timezone.now()),
-        'student_name': student.student_name,
-        'version': '2.0'
+    # 4. Queue generation; an unchanged profile reuses its stored result
+    job = await sync_to_async(resume_jobs.request_resume)(student, student_data)
+    logger.info(f"AI resume job {job.pk} for {student.student_name} ({roll_number}): {job.status}")
+    return JsonResponse(_resume_job_response(job), status=200 if job.status == 'done' else 202)
+
+
+def _resume_job_response(job):
+    response = {
+        'job_id': job.pk,
+        'status': job.status,
+        'status_url': f"{reverse('ai_resume_status')}?job={job.pk}",
     }
-    request.session.modified = True
-    
-    # 7. Return success with preview data
-    return JsonResponse({
-        'success': True,
-        'message': 'Resume generated successfully!',
-        'data': {
-            'summary_preview': ai_result.get('summary', '')[:150] + '...',
-            'project_count': len(ai_result.get('projects_enhanced', [])),
-            'skill_count': len(ai_result.get('hard_skills', [])),
-            'generated_at': str(timezone.now())
-        }
-    })
+    if job.status == 'done':
+        ai_result = job.result
+        response.update({
+            'success': True,
+            'message': 'Resume generated successfully!',
+            'data': {
+                'summary_preview': ai_result.get('summary', '')[:150] + '...',
+                'project_count': len(ai_result.get('projects_enhanced', [])),
+                'skill_count': len(ai_result.get('hard_skills', [])),
+                'generated_at': ai_result.get('generated_at'),
+            },
+        })
+    else:
+        response.update({'success': True, 'message': 'Your resume is being generated.'})
+    return response
+
+
+def _get_resume_student(roll_number):
+    return Student.objects.select_related(
+        'ugdetails', 'pgdetails', 'phddetails', 'personalinfo'
+    ).prefetch_related(
+        'skills', 'projects'
+    ).get(roll_number=roll_number)
 
 
 def _prepare_student_data(student):
@@ -1767,11 +1778,12 @@ def _get_student_department(student):
 @require_http_methods(["POST"])
 def clear_ai_resume(request):
     """
-    Clear AI-generated resume data from session.
+    Delete the student's AI-generated resume results, including a generation in progress.
     """
-    if 'ai_resume_data' in request.session:
-        del request.session['ai_resume_data']
-        request.session.modified = True
+    roll_number = request.session.get('student_roll_number')
+    # Results used to be kept in the session
+    request.session.pop('ai_resume_data', None)
+    if roll_number and AIResumeJob.objects.filter(student_id=roll_number).delete()[0]:
         return JsonResponse({'success': True, 'message': 'AI resume data cleared.'})
     
     return JsonResponse({'success': False, 'message': 'No AI resume data to clear.'})
@@ -1781,7 +1793,7 @@ def clear_ai_resume(request):
 def bonafide_list(request):
     """Lists student's bonafide requests."""
     roll_number = request.session.get('student_roll_number')
-    student = Student.objects.get(roll_number=roll_number)
+    student = principals.current_student(request)
     
     requests = BonafideRequest.objects.filter(student=student).order_by('-created_at')
 
@@ -1838,7 +1850,7 @@ def bonafide_list(request):
 def download_bonafide(request, request_id):
     """Generates PDF for approved bona fide certificate."""
     roll_number = request.session.get('student_roll_number')
-    student = Student.objects.get(roll_number=roll_number)
+    student = principals.current_student(request)
     
     bonafide = get_object_or_404(BonafideRequest, id=request_id, student=student)
     
@@ -1869,12 +1881,19 @@ def download_bonafide(request, request_id):
 @require_http_methods(["GET"])
 def get_ai_resume_status(request):
     """
-    Check if AI-generated resume exists in session.
+    Check if an AI-generated resume exists and, with ?job=<id>, report the state of that
+    generation job for the page to poll.
     """
-    ai_data = request.session.get('ai_resume_data')
-    
+    roll_number = request.session.get('student_roll_number')
+    # Results used to be kept in the session; drop any left over so it stays small
+    request.session.pop('ai_resume_data', None)
+    if not roll_number:
+        return JsonResponse({'exists': False})
+
+    response = {'exists': False}
+    ai_data = resume_jobs.current_result(roll_number)
     if ai_data:
-        return JsonResponse({
+        response.update({
             'exists': True,
             'generated_at': ai_data.get('generated_at'),
             'version': ai_data.get('version'),
@@ -1884,15 +1903,19 @@ def get_ai_resume_status(request):
                 'skill_count': len(ai_data.get('hard_skills', []))
             }
         })
-    
-    return JsonResponse({'exists': False})
+
+    job_id = request.GET.get('job', '')
+    if job_id.isdigit():
+        job = AIResumeJob.objects.filter(pk=job_id, student_id=roll_number).values('id', 'status', 'error').first()
+        response['job'] = job
+    return JsonResponse(response)
 
 # --- Leave Request Views ---
 
 @student_login_required
 def apply_leave(request):
     roll_number = request.session.get('student_roll_number')
-    student = Student.objects.get(roll_number=roll_number)
+    student = principals.current_student(request)
     
     if request.method == 'POST':
         form = LeaveRequestForm(request.POST, request.FILES)
@@ -1940,7 +1963,7 @@ def apply_leave(request):
 @student_login_required
 def leave_history(request):
     roll_number = request.session.get('student_roll_number')
-    student = Student.objects.get(roll_number=roll_number)
+    student = principals.current_student(request)
     
     # Fetch all requests ordered by latest first
     leaves = LeaveRequest.objects.filter(student=student).order_by('-created_at')
@@ -1950,7 +1973,7 @@ def leave_history(request):
 @student_login_required
 def request_bonafide(request):
     roll_number = request.session.get('student_roll_number')
-    student = Student.objects.get(roll_number=roll_number)
+    student = principals.current_student(request)
 
     if request.method == 'POST':
         bonafide_type = request.POST.get('bonafide_type')
@@ -2012,7 +2035,7 @@ def upload_result(request):
     if 'student_roll_number' not in request.session:
         return redirect('student_login')
     
-    student = Student.objects.get(roll_number=request.session['student_roll_number'])
+    student = principals.current_student(request)
     
     # Fetch subjects for the student's current semester
     from staffs.models import Subject
@@ -2045,7 +2068,7 @@ def upload_result(request):
 def gpa_calculator(request):
     """Renders the GPA Calculator page."""
     roll_number = request.session.get('student_roll_number')
-    student = Student.objects.get(roll_number=roll_number)
+    student = principals.current_student(request)
     
     # Fetch existing GPA records
     gpa_records = StudentGPA.objects.filter(student=student).order_by('semester')
@@ -2060,8 +2083,8 @@ def gpa_calculator(request):
 
 @student_login_required
 @require_http_methods(["POST"])
-def extract_grades_api(request):
-    """API to extract grades from uploaded image using Gemini."""
+async def extract_grades_api(request):
+    """API to extract grades from uploaded image using Gemini (async: no thread is held while Gemini reads it)."""
     try:
         if 'result_image' not in request.FILES:
             return JsonResponse({'error': 'No image uploaded'}, status=400)
@@ -2069,7 +2092,7 @@ def extract_grades_api(request):
         image_file = request.FILES['result_image']
         
         # Call AI Utility (API Key handled by env)
-        extraction_result = ai_utils.extract_grades_from_image(image_file)
+        extraction_result = await ai_utils.aextract_grades_from_image(image_file)
         
         if 'error' in extraction_result:
             return JsonResponse({'error': extraction_result['error']}, status=500)
@@ -2087,7 +2110,7 @@ def save_gpa_api(request):
     """API to save calculated GPA for a semester."""
     try:
         roll_number = request.session.get('student_roll_number')
-        student = Student.objects.get(roll_number=roll_number)
+        student = principals.current_student(request)
         
         data = json.loads(request.body)
         semester = int(data.get('semester'))
@@ -2122,7 +2145,7 @@ def get_gpa_data(request):
     """API to fetch stored GPA and Subject Data for a specific semester."""
     try:
         roll_number = request.session.get('student_roll_number')
-        student = Student.objects.get(roll_number=roll_number)
+        student = principals.current_student(request)
         semester = request.GET.get('semester')
         
         if not semester:
@@ -2172,7 +2195,7 @@ def add_skill_api(request):
              return JsonResponse({'success': False, 'error': 'Skill name is required'})
 
         roll_number = request.session.get('student_roll_number')
-        student = Student.objects.get(roll_number=roll_number)
+        student = principals.current_student(request)
         
         skill = StudentSkill.objects.create(
             student=student, 
@@ -2191,7 +2214,7 @@ def delete_skill_api(request):
         skill_id = data.get('skill_id')
         
         roll_number = request.session.get('student_roll_number')
-        student = Student.objects.get(roll_number=roll_number)
+        student = principals.current_student(request)
         
         StudentSkill.objects.filter(id=skill_id, student=student).delete()
         return JsonResponse({'success': True})
@@ -2214,7 +2237,7 @@ def add_project_api(request):
              return JsonResponse({'success': False, 'error': 'Title and Description are required'})
 
         roll_number = request.session.get('student_roll_number')
-        student = Student.objects.get(roll_number=roll_number)
+        student = principals.current_student(request)
         
         project = StudentProject.objects.create(
             student=student, 
@@ -2235,7 +2258,7 @@ def delete_project_api(request):
         project_id = data.get('project_id')
         
         roll_number = request.session.get('student_roll_number')
-        student = Student.objects.get(roll_number=roll_number)
+        student = principals.current_student(request)
         
         StudentProject.objects.filter(id=project_id, student=student).delete()
         return JsonResponse({'success': True})
@@ -2243,10 +2266,9 @@ def delete_project_api(request):
          return JsonResponse({'success': False, 'error': str(e)})
 
 # --- Test Notification ---
-from webpush import send_group_notification
 
 @student_login_required
-def send_test_notification(request):
+async def send_test_notification(request):
     if request.method == 'POST':
         try:
             # Handle both JSON and Form data
@@ -2257,7 +2279,7 @@ def send_test_notification(request):
             else:
                 message = request.POST.get('message', 'Test Notification')
 
-            roll_number = request.session.get('student_roll_number')
+            roll_number = await request.session.aget('student_roll_number')
             if not roll_number:
                 return JsonResponse({'status': 'error', 'message': 'Not logged in'}, status=401)
             
@@ -2271,7 +2293,8 @@ def send_test_notification(request):
             }
             
             # Send to the group (which should contain this user's subscription)
-            send_group_notification(group_name=group_name, payload=payload, ttl=1000)
+            from staffs.utils import asend_group_notification
+            await asend_group_notification(group_name, payload, ttl=1000)
             return JsonResponse({'status': 'success', 'message': 'Notification sent!'})
         except Exception as e:
              return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
@@ -2284,7 +2307,7 @@ def upload_fee_challan(request):
         roll_number = request.session.get('student_roll_number')
         if not roll_number:
             return redirect('student_login')
-        student = Student.objects.get(roll_number=roll_number)
+        student = principals.current_student(request)
         scholarship_info, _ = ScholarshipInfo.objects.get_or_create(student=student)
         
         is_7_5 = (request.POST.get('is_7_5_reservation') == 'yes')
@@ -2305,12 +2328,15 @@ def upload_fee_challan(request):
                 )
                 
                 record.is_hosteler = is_hosteler
-                if 'tuition_fee_challan' in request.FILES:
-                    record.tuition_fee_challan = request.FILES['tuition_fee_challan']
-                if 'hostel_fee_challan' in request.FILES:
-                    record.hostel_fee_challan = request.FILES['hostel_fee_challan']
+                update_fields = ['is_hosteler']
+                for field in ('tuition_fee_challan', 'hostel_fee_challan'):
+                    if field in request.FILES:
+                        setattr(record, field, request.FILES[field])
+                        update_fields.append(field)
                 
-                record.save()
+                # Only what was posted: a challan sent straight to the bucket (ssm.direct_uploads)
+                # may be stored on this record by a worker in the meantime
+                record.save(update_fields=update_fields)
                 messages.success(request, f'Fee challans for Year {academic_year} uploaded successfully!')
             else:
                 messages.error(request, 'Please select an academic year.')
@@ -2338,7 +2364,7 @@ def apply_document_request(request):
     if student_id:
         student = get_object_or_404(Student, pk=student_id)
     else:
-        student = get_object_or_404(Student, roll_number=roll_number)
+        student = principals.current_student_or_404(request)
 
     if request.method == 'POST':
         document_type = request.POST.get('document_type', '').strip()
@@ -2399,7 +2425,7 @@ def apply_scholarship(request):
     if student_id:
         student = get_object_or_404(Student, pk=student_id)
     elif roll_number:
-        student = get_object_or_404(Student, roll_number=roll_number)
+        student = principals.current_student_or_404(request)
     else:
         messages.error(request, 'Please log in to access the scholarship application portal.')
         return redirect('student_login')
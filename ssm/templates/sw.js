@@ -1,74 +1,96 @@
 {% load static %}
-const CACHE_NAME = 'au-it-dept-v1';
-const DYNAMIC_CACHE = 'au-it-dept-dynamic-v1';
-const ASSETS_TO_CACHE = [
-    "{% static 'imgs/annamalai.png' %}",
-    "{% static 'css/student_style.css' %}",
-    "/offline/"
-];
-
-// Install event: Cache core assets
+// Precached static files, fingerprinted: rendered by ssm.precache.service_worker_view
+const PRECACHE_VERSION = '{{ precache_version }}';
+const PRECACHE = 'au-precache-' + PRECACHE_VERSION;
+const PRECACHE_URLS = {{ precache_urls|safe }};
+const OFFLINE_URL = '/offline/';
+const STATIC_PREFIX = '{% get_static_prefix %}';
+// Allowlisted JSON GETs, served stale-while-revalidate (settings.SW_STALE_WHILE_REVALIDATE)
+const JSON_CACHE = 'au-json-v1';
+const STALE_WHILE_REVALIDATE = {{ stale_while_revalidate|safe }};
+// Fonts and libraries from these hosts are cached with this version's static files
+const CACHE_FIRST_ORIGINS = {{ cache_first_origins|safe }};
+
+// Install: store this version's static files and the offline page before taking over
 self.addEventListener('install', (event) => {
     self.skipWaiting(); // Force waiting SW to become active
     event.waitUntil(
-        caches.open(CACHE_NAME).then((cache) => {
-            return cache.addAll(ASSETS_TO_CACHE);
-        })
+        caches.open(PRECACHE).then((cache) => cache.addAll(PRECACHE_URLS.concat([OFFLINE_URL])))
     );
 });
 
-// Activate event: Clean up old caches
+// Activate: evict every other version's cache (and the old page caches, which held logged-in HTML)
 self.addEventListener('activate', (event) => {
     event.waitUntil(
         Promise.all([
             self.clients.claim(), // Become available to all pages
-            caches.keys().then((cacheNames) => {
-                return Promise.all(
-                    cacheNames.map((cache) => {
-                        if (cache !== CACHE_NAME && cache !== DYNAMIC_CACHE) {
-                            return caches.delete(cache);
-                        }
-                    })
-                );
-            })
+            caches.keys().then((cacheNames) => Promise.all(
+                cacheNames
+                    .filter((cache) => cache !== PRECACHE && cache !== JSON_CACHE)
+                    .map((cache) => caches.delete(cache))
+            ))
         ])
     );
 });
 
-// Fetch event: Network First, then Cache, then Offline Page
+// Static files never change under a fingerprinted URL, so the cache answers first
+function cacheFirst(request) {
+    return caches.open(PRECACHE).then((cache) => cache.match(request).then((cached) => {
+        if (cached) return cached;
+        return fetch(request).then((response) => {
+            if (response.ok || response.type === 'opaque') cache.put(request, response.clone());
+            return response;
+        });
+    }));
+}
+
+function staleWhileRevalidate(event) {
+    const refreshed = fetch(event.request).then((response) => {
+        if (response.ok) {
+            const copy = response.clone();
+            caches.open(JSON_CACHE).then((cache) => cache.put(event.request, copy));
+        }
+        return response;
+    });
+    event.waitUntil(refreshed.catch(() => null));
+    return caches.open(JSON_CACHE).then((cache) => cache.match(event.request)).then((cached) => cached || refreshed);
+}
+
+// Fetch: pages always come from the network (the offline page if it is down); only static
+// files and the allowlisted JSON are answered from the device
 self.addEventListener('fetch', (event) => {
-    // Skip cross-origin requests
-    if (!event.request.url.startsWith(self.location.origin)) return;
-
-    event.respondWith(
-        fetch(event.request)
-            .then((fetchRes) => {
-                // Cache successful GET requests
-                if (!fetchRes || fetchRes.status !== 200 || fetchRes.type !== 'basic') {
-                    return fetchRes;
-                }
-                // Clone response to cache it
-                const responseToCache = fetchRes.clone();
-                if (event.request.method === 'GET') {
-                    caches.open(DYNAMIC_CACHE).then((cache) => {
-                        cache.put(event.request, responseToCache);
-                    });
-                }
-                return fetchRes;
-            })
-            .catch(() => {
-                // If network fails, try cache
-                return caches.match(event.request).then((cachedRes) => {
-                    if (cachedRes) return cachedRes;
-                    // If not in cache and it's a page navigation, show offline page
-                    if (event.request.headers.get('accept').includes('text/html')) {
-                        return caches.match('/offline/');
-                    }
-                });
-            })
-    );
+    const request = event.request;
+    if (request.method !== 'GET') return;
+    const url = new URL(request.url);
+
+    if (url.origin !== self.location.origin) {
+        if (CACHE_FIRST_ORIGINS.includes(url.origin)) event.respondWith(cacheFirst(request));
+        return;
+    }
+    if (url.pathname.startsWith(STATIC_PREFIX)) {
+        event.respondWith(cacheFirst(request));
+    } else if (STALE_WHILE_REVALIDATE.includes(url.pathname)) {
+        event.respondWith(staleWhileRevalidate(event));
+    } else if (request.mode === 'navigate') {
+        // The cached JSON belongs to whoever is logged in; drop it when they log out
+        if (url.pathname.endsWith('/logout/')) event.waitUntil(caches.delete(JSON_CACHE));
+        event.respondWith(fetch(request).catch(() => caches.match(OFFLINE_URL)));
+    }
+});
+
+// ==========================================
+// OFFLINE ATTENDANCE (Background Sync)
+// ==========================================
+
+importScripts("{% static 'js/attendance_queue.js' %}");
+
+// Registered by the attendance console when a sheet is saved offline; the browser fires it
+// once the connection is back, and again later if the flush fails
+self.addEventListener('sync', function (event) {
+    if (event.tag === 'attendance-sync') {
+        event.waitUntil(self.AttendanceQueue.flush());
+    }
 });
-// ... existing code ...
 
 // ==========================================
 // WEB PUSH NOTIFICATIONS